@@ -1,11 +1,13 @@
 import gpiod
 import time
 import os
+import threading
 import board
 import busio
 import numpy as np
 
 from utils.utils import _CUSTOM_PRINT_FUNC
+from i2c_arbiter import PRIORITY_SAFETY, PRIORITY_CONTROL, PRIORITY_TELEMETRY
 
 # Job IDs (Upper 3 bits of the first byte)
 JOB_INIT_PWM = 0b000  # Initialize PWM (8 bytes)
@@ -15,6 +17,10 @@ JOB_LED_TOG = 0b011  # Turn Onboard LED ON (0 bytes)
 JOB_GET_STATE = 0b100  # Get PWM state (2 bytes)
 JOB_GET_FREQ = 0b101  # Get PWM frequency (2 bytes)
 JOB_GET_DUTY = 0b110  # Get PWM duty cycle (2 bytes)
+JOB_SET_DUTY_MULTI = 0b111  # Set several PWM duty cycles (4 bytes per channel: duty, pin, channel)
+
+# A frame carries at most 31 payload bytes
+MAX_DUTY_UPDATES_PER_FRAME = 31 // 4
 
 # I2C Commands
 ESP_READY = 0x01
@@ -22,11 +28,30 @@ ESP_NOT_READY = 0x02
 ESP_OK = 0x03
 ESP_NOT_OK = 0x04
 
+# Time the bus is held after each duty-cycle frame
+DUTY_WRITE_HOLD_SEC = 0.1
+
+# Switching these off always goes on the bus: the ESP32 may have reset or lost
+# a frame since the shadow state confirmed 0, and pump OFF writes are rare
+ALWAYS_WRITE_OFF = ('water_pump', 'fertilizer_pump')
+
 class GH_Actuators:     
-    def __init__(self, esp32_i2c_address: int, i2c_bus: busio.I2C = busio.I2C(board.SCL, board.SDA), frame_endianes: str = 'big'):
+    def __init__(self, esp32_i2c_address: int, i2c_bus: busio.I2C = busio.I2C(board.SCL, board.SDA), frame_endianes: str = 'big',
+                 min_duty_delta: int = 0, refresh_sec: float = 30.0, batch_duty_frames: bool = False):
         self.__esp32_i2c_address = esp32_i2c_address
         self.__i2c_bus = i2c_bus
         self.__frame_endianes = frame_endianes
+        # Shadow state: channel -> (duty confirmed by the last successful write, monotonic time of that write)
+        self.__shadow = {}
+        self.__shadow_lock = threading.Lock()
+        self.__min_duty_delta = int(min_duty_delta)
+        self.__refresh_sec = float(refresh_sec)
+        self.__write_stats = {}
+        self.__frames_sent = 0
+        self.__batch_duty_frames = batch_duty_frames
+        # Change observers: callback(device_name, duty_cycle) per applied change
+        self.__listeners = []
+        self.__notified = {}
         self.__heater_mqtt_dc_value = 0
         self.__heater_fan_mqtt_dc_value = 0
         self.__fan_mqtt_dc_value = 0
@@ -37,8 +62,7 @@ class GH_Actuators:
 
     def restart_esp32(self) -> bool:
         try:
-            while not self.__i2c_bus.try_lock():
-                time.sleep(0.1)
+            self.__lock_bus(PRIORITY_SAFETY)
             # create the frame to send to esp32
             frame = b''
             # create the first byte to send to esp32
@@ -50,6 +74,8 @@ class GH_Actuators:
             # get the ready byte from esp32            
             time.sleep(0.1)
             self.__i2c_bus.unlock()
+            # the ESP32 comes back with its boot defaults — nothing is confirmed any more
+            self.invalidate_shadow_state()
             return True            
         except Exception as e:
             _CUSTOM_PRINT_FUNC(f"Error restarting ESP32: {e}")
@@ -58,8 +84,7 @@ class GH_Actuators:
     
     def toggle_esp32_onboard_led(self) -> bool:
         try:
-            while not self.__i2c_bus.try_lock():
-                time.sleep(0.1)
+            self.__lock_bus(PRIORITY_TELEMETRY)
             # create the frame to send to esp32
             frame = b''
             # create the first byte to send to esp32
@@ -78,8 +103,7 @@ class GH_Actuators:
 
     def __send_init_request(self, pin: int, channel: int, timer_src: int, frequency: int, duty_cycle: int, device_name: str) -> bool:
         try:
-            while not self.__i2c_bus.try_lock():
-                time.sleep(0.1)
+            self.__lock_bus(PRIORITY_CONTROL)
             # create the frame to send to esp32
             frame = (frequency.to_bytes(4, self.__frame_endianes) + duty_cycle.to_bytes(2, self.__frame_endianes) + pin.to_bytes(1, self.__frame_endianes) + channel.to_bytes(1, self.__frame_endianes) + timer_src.to_bytes(1, self.__frame_endianes))
             # send command and frame size
@@ -90,34 +114,186 @@ class GH_Actuators:
             self.__i2c_bus.writeto(self.__esp32_i2c_address, frame)
             time.sleep(0.5)
             self.__i2c_bus.unlock()
+            self.__confirm_write(channel, duty_cycle)
+            self.__notify_applied(device_name, duty_cycle)
             return True
         except Exception as e:
             _CUSTOM_PRINT_FUNC(f"Error sending init request: {e}")
+            self.__forget_channel(channel)
             self.__i2c_bus.unlock()
             return False
 
-    def __send_duty_cycle_update_request(self, duty_cycle: int, pin: int, channel: int, device_name: str) -> bool:
-        try:
-            while not self.__i2c_bus.try_lock():
-                time.sleep(0.1)
+    def __lock_bus(self, priority: int):
+        """Take the I2C bus: queue on the arbiter if the bus is an I2CBusClient, else poll try_lock()."""
+        acquire = getattr(self.__i2c_bus, 'acquire', None)
+        if acquire is not None:
+            acquire(priority)
+            return
+        while not self.__i2c_bus.try_lock():
+            time.sleep(0.1)
+
+    # ── Change events ─────────────────────────────────────────────────────────
+
+    def add_change_listener(self, callback):
+        """
+        Call callback(device_name, duty_cycle) whenever a device's duty cycle
+        changes on the ESP32. It runs in the thread that made the write, right
+        after the frame went out, so it should only hand the event off.
+        """
+        with self.__shadow_lock:
+            if callback not in self.__listeners:
+                self.__listeners.append(callback)
+
+    def remove_change_listener(self, callback):
+        with self.__shadow_lock:
+            if callback in self.__listeners:
+                self.__listeners.remove(callback)
+
+    def __notify_applied(self, device_name: str, duty_cycle: int):
+        with self.__shadow_lock:
+            if self.__notified.get(device_name) == duty_cycle:
+                return      # refresh write or a second path to the same value
+            self.__notified[device_name] = duty_cycle
+            listeners = list(self.__listeners)
+        for callback in listeners:
+            try:
+                callback(device_name, duty_cycle)
+            except Exception as e:
+                _CUSTOM_PRINT_FUNC(f"[Actuators] Change listener error: {e}")
+
+    # ── Shadow state ──────────────────────────────────────────────────────────
+
+    def __stats_for(self, device_name: str) -> dict:
+        return self.__write_stats.setdefault(device_name, {'sent': 0, 'skipped': 0, 'refreshes': 0, 'failed': 0})
+
+    def __is_redundant_write(self, channel: int, duty_cycle: int, device_name: str) -> bool:
+        """
+        True when the channel is already confirmed at (or within min_duty_delta of)
+        duty_cycle and the confirmation is younger than refresh_sec. Switching a
+        channel fully off or on from anything else is never skipped, nor is
+        switching off a device in ALWAYS_WRITE_OFF.
+        """
+        if duty_cycle == 0 and device_name in ALWAYS_WRITE_OFF:
+            return False
+        with self.__shadow_lock:
+            stats = self.__stats_for(device_name)
+            confirmed = self.__shadow.get(channel)
+            if confirmed is None:
+                return False
+            confirmed_duty, confirmed_at = confirmed
+            if duty_cycle == confirmed_duty:
+                same = True
+            elif duty_cycle in (0, 4095, 4096) or confirmed_duty in (0, 4095, 4096):
+                same = False
+            else:
+                same = abs(duty_cycle - confirmed_duty) < self.__min_duty_delta
+            if not same:
+                return False
+            if time.monotonic() - confirmed_at >= self.__refresh_sec:
+                stats['refreshes'] += 1
+                return False
+            stats['skipped'] += 1
+            return True
+
+    def __confirm_write(self, channel: int, duty_cycle: int):
+        with self.__shadow_lock:
+            self.__shadow[channel] = (duty_cycle, time.monotonic())
+
+    def __forget_channel(self, channel: int):
+        with self.__shadow_lock:
+            self.__shadow.pop(channel, None)
+
+    def invalidate_shadow_state(self):
+        """Forget every confirmed duty cycle so the next write to each channel goes on the bus."""
+        with self.__shadow_lock:
+            self.__shadow.clear()
+
+    def configure_write_dedup(self, min_duty_delta: int = None, refresh_sec: float = None):
+        with self.__shadow_lock:
+            if min_duty_delta is not None:
+                self.__min_duty_delta = int(min_duty_delta)
+            if refresh_sec is not None:
+                self.__refresh_sec = float(refresh_sec)
+
+    def get_write_stats(self) -> dict:
+        """Duty-cycle updates sent vs. skipped by the shadow-state check, per device and in total."""
+        with self.__shadow_lock:
+            devices = {name: dict(stats) for name, stats in self.__write_stats.items()}
+            shadow = {ch: duty for ch, (duty, _) in self.__shadow.items()}
+            frames = self.__frames_sent
+        totals = {key: sum(d[key] for d in devices.values()) for key in ('sent', 'skipped', 'refreshes', 'failed')}
+        requested = totals['sent'] + totals['skipped']
+        return {
+            'min_duty_delta':     self.__min_duty_delta,
+            'refresh_sec':        self.__refresh_sec,
+            'batch_duty_frames':  self.__batch_duty_frames,
+            **totals,
+            'frames':             frames,
+            'skip_ratio':         round(totals['skipped'] / requested, 4) if requested else None,
+            'bus_time_saved_sec': round((requested - frames) * DUTY_WRITE_HOLD_SEC, 1),
+            'devices':            devices,
+            'confirmed_channels': shadow,
+        }
+
+    def __send_duty_cycle_update_request(self, duty_cycle: int, pin: int, channel: int, device_name: str,
+                                         force: bool = False) -> bool:
+        return self.__send_duty_cycle_updates([(duty_cycle, pin, channel, device_name)], force)
+
+    def __send_duty_cycle_updates(self, updates: list, force: bool = False) -> bool:
+        """
+        Send (duty_cycle, pin, channel, device_name) updates, skipping the ones the
+        shadow state says are redundant unless force is set. Two or more remaining
+        non-zero updates go out as JOB_SET_DUTY_MULTI frames when batching is enabled.
+        """
+        for duty_cycle, _, _, _ in updates:
             if duty_cycle < 0 or duty_cycle > 4096:
                 _CUSTOM_PRINT_FUNC("Duty cycle must be between 0 and 4096")
-                self.__i2c_bus.unlock()
                 return False
-            # create the frame to send to esp32
-            frame = (duty_cycle.to_bytes(2, self.__frame_endianes) + pin.to_bytes(1, self.__frame_endianes) + channel.to_bytes(1, self.__frame_endianes))
+        pending = updates if force else [u for u in updates if not self.__is_redundant_write(u[2], u[0], u[3])]
+        if not pending:
+            return True
+        # switching off never rides a JOB_SET_DUTY_MULTI frame: firmware without job 7
+        # would drop it unacknowledged and the shadow state would still confirm it
+        single = [u for u in pending if u[0] == 0]
+        batched = [u for u in pending if u[0] != 0]
+        if len(batched) == 1 or not self.__batch_duty_frames:
+            single, batched = pending, []
+        ok = all([self.__write_duty_frame(JOB_SET_DUTY, [u]) for u in single])
+        for i in range(0, len(batched), MAX_DUTY_UPDATES_PER_FRAME):
+            ok = self.__write_duty_frame(JOB_SET_DUTY_MULTI, batched[i:i + MAX_DUTY_UPDATES_PER_FRAME]) and ok
+        return ok
+
+    def __write_duty_frame(self, job: int, updates: list) -> bool:
+        try:
+            # switching loads off is the safe direction — it jumps the bus queue
+            self.__lock_bus(PRIORITY_SAFETY if all(u[0] == 0 for u in updates) else PRIORITY_CONTROL)
+            # create the frame to send to esp32: one (duty, pin, channel) block per update
+            frame = b''.join(duty_cycle.to_bytes(2, self.__frame_endianes) + pin.to_bytes(1, self.__frame_endianes) + channel.to_bytes(1, self.__frame_endianes)
+                             for duty_cycle, pin, channel, _ in updates)
             # create the first byte to send to esp32
-            first_byte = JOB_SET_DUTY << 5 | len(frame) & 0x1F
+            first_byte = job << 5 | len(frame) & 0x1F
             # complete the 32 bytes
             frame = first_byte.to_bytes(1, self.__frame_endianes) + frame + b'\x00' * (32 - len(frame) - 1)
-            # _CUSTOM_PRINT_FUNC(f"setting {device_name} to duty cycle {duty_cycle}: {frame.hex()}")
-            # get the ready byte from esp32
+            # _CUSTOM_PRINT_FUNC(f"setting {[u[3] for u in updates]} to duty cycles {[u[0] for u in updates]}: {frame.hex()}")
             self.__i2c_bus.writeto(self.__esp32_i2c_address, frame) 
-            time.sleep(0.1)
+            time.sleep(DUTY_WRITE_HOLD_SEC)
             self.__i2c_bus.unlock()
+            with self.__shadow_lock:
+                self.__frames_sent += 1
+            for duty_cycle, _, channel, device_name in updates:
+                self.__confirm_write(channel, duty_cycle)
+                with self.__shadow_lock:
+                    self.__stats_for(device_name)['sent'] += 1
+            for duty_cycle, _, _, device_name in updates:
+                self.__notify_applied(device_name, duty_cycle)
             return True
         except Exception as e:
             # _CUSTOM_PRINT_FUNC(f"Error sending duty cycle update request: {e}")
+            # the frame may or may not have landed — make the next write go out
+            for _, _, channel, device_name in updates:
+                self.__forget_channel(channel)
+                with self.__shadow_lock:
+                    self.__stats_for(device_name)['failed'] += 1
             self.__i2c_bus.unlock()
             return False          
         
@@ -133,10 +309,10 @@ class GH_Actuators:
             # _CUSTOM_PRINT_FUNC(f"Error setting up heater: {e}")
             return False
 
-    def set_heater_duty_cycle(self, duty_cycle: int) -> bool:
+    def set_heater_duty_cycle(self, duty_cycle: int, force: bool = False) -> bool:
         try:
             self.__heater_duty_cycle = duty_cycle
-            return self.__send_duty_cycle_update_request(duty_cycle, self.__heater_pin, self.__heater_channel, "heater")        
+            return self.__send_duty_cycle_update_request(duty_cycle, self.__heater_pin, self.__heater_channel, "heater", force)        
         except Exception as e:
             # _CUSTOM_PRINT_FUNC(f"Error setting heater duty cycle: {e}")
             return False           
@@ -153,10 +329,10 @@ class GH_Actuators:
             # _CUSTOM_PRINT_FUNC(f"Error setting up heater fan: {e}")
             return False
     
-    def set_heater_fan_duty_cycle(self, duty_cycle: int) -> bool:
+    def set_heater_fan_duty_cycle(self, duty_cycle: int, force: bool = False) -> bool:
         try:
             self.__heater_fan_duty_cycle = duty_cycle
-            return self.__send_duty_cycle_update_request(duty_cycle, self.__heater_fan_pin, self.__heater_fan_channel, "heater_fan")
+            return self.__send_duty_cycle_update_request(duty_cycle, self.__heater_fan_pin, self.__heater_fan_channel, "heater_fan", force)
         except Exception as e:
             # _CUSTOM_PRINT_FUNC(f"Error setting heater fan duty cycle: {e}")
             return False
@@ -173,10 +349,10 @@ class GH_Actuators:
             # _CUSTOM_PRINT_FUNC(f"Error setting up fan: {e}")
             return False
     
-    def set_fan_duty_cycle(self, duty_cycle: int) -> bool:
+    def set_fan_duty_cycle(self, duty_cycle: int, force: bool = False) -> bool:
         try:
             self.__fan_duty_cycle = duty_cycle
-            return self.__send_duty_cycle_update_request(duty_cycle, self.__fan_pin, self.__fan_channel, "fan")
+            return self.__send_duty_cycle_update_request(duty_cycle, self.__fan_pin, self.__fan_channel, "fan", force)
         except Exception as e:
             # _CUSTOM_PRINT_FUNC(f"Error setting fan duty cycle: {e}")
             return False
@@ -193,10 +369,10 @@ class GH_Actuators:
             # _CUSTOM_PRINT_FUNC(f"Error setting up light: {e}")
             return False
     
-    def set_light_strip_1_duty_cycle(self, duty_cycle: int) -> bool:
+    def set_light_strip_1_duty_cycle(self, duty_cycle: int, force: bool = False) -> bool:
         try:
             self.__light_duty_cycle = duty_cycle
-            return self.__send_duty_cycle_update_request(duty_cycle, self.__light_pin, self.__light_channel, "light_strip_1")
+            return self.__send_duty_cycle_update_request(duty_cycle, self.__light_pin, self.__light_channel, "light_strip_1", force)
         except Exception as e:
             # _CUSTOM_PRINT_FUNC(f"Error setting light duty cycle: {e}")
             return False
@@ -213,14 +389,38 @@ class GH_Actuators:
             # _CUSTOM_PRINT_FUNC(f"Error setting up light strip 2: {e}")
             return False
         
-    def set_light_strip_2_duty_cycle(self, duty_cycle: int) -> bool:
+    def set_light_strip_2_duty_cycle(self, duty_cycle: int, force: bool = False) -> bool:
         try:
             self.__light_strip_2_duty_cycle = duty_cycle
-            return self.__send_duty_cycle_update_request(duty_cycle, self.__light_strip_2_pin, self.__light_strip_2_channel, "light_strip_2")
+            return self.__send_duty_cycle_update_request(duty_cycle, self.__light_strip_2_pin, self.__light_strip_2_channel, "light_strip_2", force)
         except Exception as e:
             # _CUSTOM_PRINT_FUNC(f"Error setting light strip 2 duty cycle: {e}")
             return False
 
+    def set_light_strips_duty_cycle(self, duty_cycle: int, force: bool = False) -> bool:
+        """Set both light strips in one frame."""
+        try:
+            self.__light_duty_cycle = duty_cycle
+            self.__light_strip_2_duty_cycle = duty_cycle
+            return self.__send_duty_cycle_updates([
+                (duty_cycle, self.__light_pin, self.__light_channel, "light_strip_1"),
+                (duty_cycle, self.__light_strip_2_pin, self.__light_strip_2_channel, "light_strip_2"),
+            ], force)
+        except Exception as e:
+            return False
+
+    def set_heater_and_heater_fan_duty_cycle(self, duty_cycle: int, force: bool = False) -> bool:
+        """Set the heater and heater fan in one frame."""
+        try:
+            self.__heater_duty_cycle = duty_cycle
+            self.__heater_fan_duty_cycle = duty_cycle
+            return self.__send_duty_cycle_updates([
+                (duty_cycle, self.__heater_pin, self.__heater_channel, "heater"),
+                (duty_cycle, self.__heater_fan_pin, self.__heater_fan_channel, "heater_fan"),
+            ], force)
+        except Exception as e:
+            return False
+
     def setup_water_pump_esp32(self, pin: int, channel: int, timer_src: int, frequency: int, duty_cycle: int) -> bool:
         self.__water_pump_pin = pin
         self.__water_pump_channel = channel
@@ -233,10 +433,10 @@ class GH_Actuators:
             # _CUSTOM_PRINT_FUNC(f"Error setting up water pump: {e}")
             return False
     
-    def set_water_pump_duty_cycle(self, duty_cycle: int) -> bool:
+    def set_water_pump_duty_cycle(self, duty_cycle: int, force: bool = False) -> bool:
         try:
             self.__water_pump_duty_cycle = duty_cycle
-            return self.__send_duty_cycle_update_request(duty_cycle, self.__water_pump_pin, self.__water_pump_channel, "water_pump")
+            return self.__send_duty_cycle_update_request(duty_cycle, self.__water_pump_pin, self.__water_pump_channel, "water_pump", force)
         except Exception as e:
             # _CUSTOM_PRINT_FUNC(f"Error setting water pump duty cycle: {e}")
             return False
@@ -252,10 +452,10 @@ class GH_Actuators:
         except Exception as e:
             return False
 
-    def set_fertilizer_pump_duty_cycle(self, duty_cycle: int) -> bool:
+    def set_fertilizer_pump_duty_cycle(self, duty_cycle: int, force: bool = False) -> bool:
         try:
             self.__fertilizer_pump_duty_cycle = duty_cycle
-            return self.__send_duty_cycle_update_request(duty_cycle, self.__fertilizer_pump_pin, self.__fertilizer_pump_channel, "fertilizer_pump")
+            return self.__send_duty_cycle_update_request(duty_cycle, self.__fertilizer_pump_pin, self.__fertilizer_pump_channel, "fertilizer_pump", force)
         except Exception as e:
             return False
 
@@ -343,13 +543,13 @@ class GH_Actuators:
         MAX_RETRIES = 3
         all_ok = True
         for name, fn in [
-            ("water_pump",       lambda: self.set_water_pump_duty_cycle(0)),
-            ("fertilizer_pump",  lambda: self.set_fertilizer_pump_duty_cycle(0)),
-            ("heater",           lambda: self.set_heater_duty_cycle(0)),
-            ("heater_fan",       lambda: self.set_heater_fan_duty_cycle(0)),
-            ("fan",              lambda: self.set_fan_duty_cycle(0)),
-            ("light_strip_1",    lambda: self.set_light_strip_1_duty_cycle(0)),
-            ("light_strip_2",    lambda: self.set_light_strip_2_duty_cycle(0)),
+            ("water_pump",       lambda: self.set_water_pump_duty_cycle(0, force=True)),
+            ("fertilizer_pump",  lambda: self.set_fertilizer_pump_duty_cycle(0, force=True)),
+            ("heater",           lambda: self.set_heater_duty_cycle(0, force=True)),
+            ("heater_fan",       lambda: self.set_heater_fan_duty_cycle(0, force=True)),
+            ("fan",              lambda: self.set_fan_duty_cycle(0, force=True)),
+            ("light_strip_1",    lambda: self.set_light_strip_1_duty_cycle(0, force=True)),
+            ("light_strip_2",    lambda: self.set_light_strip_2_duty_cycle(0, force=True)),
         ]:
             ok = False
             for _ in range(MAX_RETRIES):
@@ -0,0 +1,167 @@
+import time
+import threading
+import numpy as np
+from adafruit_ads1x15.ads1x15 import Mode
+from adafruit_ads1x15.analog_in import AnalogIn
+from utils.utils import _CUSTOM_PRINT_FUNC
+
+# Full-scale input range (V) for each ADS1115 PGA gain setting
+_PGA_RANGE = {2/3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
+
+
+class ScanStaleError(OSError):
+    """A channel has not been scanned for longer than the scanner's max age"""
+
+
+class ADS1115Scanner:
+    """
+    Background scan engine for the ADS1115.
+
+    Runs the ADC at a fixed data rate and round-robins the configured channels
+    at scan_rate_hz. Each channel visit takes `oversample` single-shot
+    conversions and stores their median in a small per-channel ring buffer.
+    Readers are served from memory, so I2C traffic from the ADC is fixed at
+    len(channels) * oversample * scan_rate_hz conversions per second no matter
+    how many threads ask for a value.
+
+    Conversion errors are only counted, so a channel whose last scan is older
+    than max_age_scans scan periods raises ScanStaleError instead of serving
+    the frozen value.
+    """
+    def __init__(self, ads_sensor, channels, data_rate=860, oversample=4, scan_rate_hz=20.0, ring_size=8,
+                 max_age_scans=5):
+        self.__ads_sensor   = ads_sensor
+        self.__channels     = list(channels)
+        self.__data_rate    = data_rate
+        self.__oversample   = max(1, int(oversample))
+        self.__scan_period  = 1.0 / scan_rate_hz
+        self.__ring_size    = max(1, int(ring_size))
+        self.__max_age      = max(1, int(max_age_scans)) * self.__scan_period
+        self.__analog_in    = {}
+        self.__rings        = {ch: np.zeros(self.__ring_size) for ch in self.__channels}
+        self.__ring_index   = {ch: 0 for ch in self.__channels}
+        self.__ring_count   = {ch: 0 for ch in self.__channels}
+        self.__last_update  = {ch: None for ch in self.__channels}
+        self.__last_scan    = {ch: None for ch in self.__channels}    # monotonic, for the age check
+        self.__lock         = threading.Lock()
+        self.__running      = False
+        self.__thread       = None
+        self.__conversions  = 0
+        self.__errors       = 0
+        self.__overruns     = 0
+        self.__stale_reads  = 0
+        self.__started_at   = None
+
+    def start(self) -> bool:
+        """Configure the ADC and start the scan thread"""
+        if self.__running:
+            return True
+        try:
+            self.__ads_sensor.mode = Mode.SINGLE
+            self.__ads_sensor.data_rate = self.__data_rate
+            for ch in self.__channels:
+                self.__analog_in[ch] = AnalogIn(self.__ads_sensor, ch)
+        except Exception as err:
+            _CUSTOM_PRINT_FUNC(f"[ADS1115] Could not configure scan mode: {err}")
+            return False
+        self.__running = True
+        self.__started_at = time.monotonic()
+        self.__thread = threading.Thread(target=self.__scan_loop, daemon=True)
+        self.__thread.start()
+        _CUSTOM_PRINT_FUNC(
+            f"[ADS1115] Scan mode on channels {self.__channels} — "
+            f"{self.__data_rate} SPS, x{self.__oversample} oversampling, {1.0 / self.__scan_period:.1f} Hz"
+        )
+        return True
+
+    def stop(self):
+        self.__running = False
+        if self.__thread is not None:
+            self.__thread.join(timeout=1.0)
+            self.__thread = None
+
+    def is_running(self) -> bool:
+        return self.__running
+
+    def has_channel(self, ch) -> bool:
+        return self.__running and ch in self.__rings
+
+    def __scan_loop(self):
+        next_deadline = time.monotonic()
+        samples = np.zeros(self.__oversample)
+        while self.__running:
+            for ch in self.__channels:
+                n = 0
+                for _ in range(self.__oversample):
+                    try:
+                        samples[n] = self.__analog_in[ch].value
+                        n += 1
+                    except Exception:
+                        self.__errors += 1
+                self.__conversions += n
+                if n == 0:
+                    continue
+                value = float(np.median(samples[:n]))
+                with self.__lock:
+                    idx = self.__ring_index[ch]
+                    self.__rings[ch][idx] = value
+                    self.__ring_index[ch] = (idx + 1) % self.__ring_size
+                    self.__ring_count[ch] = min(self.__ring_count[ch] + 1, self.__ring_size)
+                    self.__last_update[ch] = time.time()
+                    self.__last_scan[ch] = time.monotonic()
+
+            # Fixed-rate schedule: sleep until the next scan slot, never drift
+            next_deadline += self.__scan_period
+            delay = next_deadline - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            else:
+                self.__overruns += 1
+                next_deadline = time.monotonic()
+
+    def get_raw(self, ch, window=1):
+        """
+        Raw ADC value for channel ch — median of the last `window` scans.
+        Returns None until the channel has been scanned at least once and
+        raises ScanStaleError when its last scan is older than the max age.
+        """
+        with self.__lock:
+            count = self.__ring_count.get(ch, 0)
+            if count == 0:
+                return None
+            age = time.monotonic() - self.__last_scan[ch]
+            if age > self.__max_age:
+                self.__stale_reads += 1
+                raise ScanStaleError(f"ADS1115 channel {ch} last scanned {age:.2f}s ago")
+            window = max(1, min(int(window), count))
+            idx = self.__ring_index[ch]
+            recent = np.take(self.__rings[ch], range(idx - window, idx), mode='wrap')
+            return float(np.median(recent))
+
+    def get_voltage(self, ch, window=1):
+        """Voltage for channel ch, converted with the ADC's current gain"""
+        raw = self.get_raw(ch, window)
+        if raw is None:
+            return None
+        return raw * _PGA_RANGE.get(self.__ads_sensor.gain, 4.096) / 32767.0
+
+    def get_last_update(self, ch):
+        """Wall-clock time of the last completed scan of channel ch"""
+        return self.__last_update.get(ch)
+
+    def get_stats(self) -> dict:
+        """Scan engine bus utilisation and error counters"""
+        elapsed = (time.monotonic() - self.__started_at) if self.__started_at else 0.0
+        return {
+            'running':                 self.__running,
+            'channels':                list(self.__channels),
+            'data_rate':               self.__data_rate,
+            'oversample':              self.__oversample,
+            'scan_rate_hz':            round(1.0 / self.__scan_period, 2),
+            'planned_conversions_sec': round(len(self.__channels) * self.__oversample / self.__scan_period, 1),
+            'actual_conversions_sec':  round(self.__conversions / elapsed, 1) if elapsed > 0 else 0.0,
+            'conversions':             self.__conversions,
+            'errors':                  self.__errors,
+            'overruns':                self.__overruns,
+            'stale_reads':             self.__stale_reads,
+        }
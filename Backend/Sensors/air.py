@@ -1,57 +1,126 @@
+import time
+import threading
 import adafruit_dht
 from utils.utils import _CUSTOM_PRINT_FUNC
 
+_DHT22_MIN_INTERVAL_SEC = 2.0    # DHT22 datasheet: at least 2 s between reads
+_DHT22_MAX_BACKOFF_SEC  = 30.0   # cap on the retry delay after repeated failures
+
+
 class AirSensor:
     """
     Class for handling air-related sensor functionality including:
     - Temperature and humidity via DHT22 sensor
+
+    Temperature and humidity come from one combined DHT22 acquisition.
+    A new acquisition is only attempted once the minimum interval has passed
+    (doubled after every consecutive failure, up to _DHT22_MAX_BACKOFF_SEC);
+    every getter is served from the last good sample.
     """
-    def __init__(self):
+    def __init__(self, health_registry=None):
+        self.__health = health_registry
+        self.__dht22 = None
+        self.__read_lock = threading.Lock()
+        self.__reset_sample()
+
+    def __reset_sample(self):
         self.__prev_temp = 0.0
         self.__prev_temp_F = 0.0
         self.__prev_hum = 0.0
-        
+        self.__last_attempt = 0.0
+        self.__last_good_time = None
+        self.__last_error = None
+        self.__attempts = 0
+        self.__successes = 0
+        self.__consecutive_failures = 0
+
     def set_dht22_pin(self, pin):
         """Set up the DHT22 sensor with the specified pin"""
         self.__dht22 = adafruit_dht.DHT22(pin)
-        self.__prev_temp = 0.0
-        self.__prev_temp_F = 0.0
-        self.__prev_hum = 0.0
+        with self.__read_lock:
+            self.__reset_sample()
+
+    def __next_read_delay(self):
+        """Minimum interval, doubled for every consecutive failed read."""
+        if self.__consecutive_failures == 0:
+            return _DHT22_MIN_INTERVAL_SEC
+        return min(_DHT22_MIN_INTERVAL_SEC * (2 ** self.__consecutive_failures), _DHT22_MAX_BACKOFF_SEC)
+
+    def __sample(self):
+        """Refresh the cached temperature/humidity sample if the DHT22 may be read again."""
+        with self.__read_lock:
+            if self.__dht22 is None:
+                return
+            now = time.monotonic()
+            if self.__last_attempt and now - self.__last_attempt < self.__next_read_delay():
+                return
+            self.__last_attempt = now
+            self.__attempts += 1
+            t0 = time.monotonic()
+            try:
+                # Reading .temperature triggers the measurement; .humidity is
+                # served by the driver from the same bit-banged frame.
+                tempC = self.__dht22.temperature
+                hum = self.__dht22.humidity
+                if tempC is None or hum is None:
+                    raise RuntimeError("DHT22 returned an incomplete sample")
+            except Exception as err:
+                self.__consecutive_failures += 1
+                self.__last_error = str(err)
+                if self.__health is not None:
+                    self.__health.record('air', False, time.monotonic() - t0, error=str(err))
+                if self.__consecutive_failures == 1 or self.__consecutive_failures % 10 == 0:
+                    _CUSTOM_PRINT_FUNC(
+                        f"Sensors: DHT22 read failed ({err}) — "
+                        f"{self.__consecutive_failures} in a row, next try in {self.__next_read_delay():.0f}s"
+                    )
+                return
+            self.__prev_temp = tempC
+            self.__prev_temp_F = tempC * (9.0/5.0) + 32.0
+            self.__prev_hum = hum
+            self.__last_good_time = time.time()
+            self.__successes += 1
+            self.__consecutive_failures = 0
+            if self.__health is not None:
+                self.__health.record('air', True, time.monotonic() - t0, (tempC, hum))
 
     def get_air_temperature_C(self):
         """Get air temperature in Celsius"""
-        try:
-            tempC = self.__dht22.temperature
-            if tempC is None:
-                return self.__prev_temp
-            self.__prev_temp = tempC
-            return tempC
-        except Exception as err:
-            _CUSTOM_PRINT_FUNC(f"Sensors: {err}")
-            return self.__prev_temp
-    
+        self.__sample()
+        return self.__prev_temp
+
     def get_air_temperature_F(self):
         """Get air temperature in Fahrenheit"""
-        try:
-            tempC = self.get_air_temperature_C()
-            if tempC == None:
-                return self.__prev_temp_F
-            
-            self.__prev_temp_F = tempC * (9.0/5.0) + 32.0
-            return self.__prev_temp_F
-        except RuntimeError as err:
-            _CUSTOM_PRINT_FUNC(f"Sensors: {err.args[0]}")
-            return self.__prev_temp_F
+        self.__sample()
+        return self.__prev_temp_F
 
     def get_air_humidity(self):
         """Get air humidity percentage"""
-        try:
-            hum = self.__dht22.humidity
-            if hum == None:
-                return self.__prev_hum
+        self.__sample()
+        return self.__prev_hum
 
-            self.__prev_hum = hum
-            return hum
-        except Exception as err:
-            _CUSTOM_PRINT_FUNC(f"Sensors: {err}")
-            return self.__prev_hum
+    def get_air_values(self):
+        """
+        Get temperature and humidity from the same sample.
+        Returns temp_C, humidity respectively.
+        """
+        self.__sample()
+        return self.__prev_temp, self.__prev_hum
+
+    def has_sample(self):
+        """True once at least one good DHT22 sample has been read"""
+        return self.__last_good_time is not None
+
+    def get_read_stats(self):
+        """Return DHT22 read success-rate statistics"""
+        with self.__read_lock:
+            failures = self.__attempts - self.__successes
+            return {
+                'attempts':             self.__attempts,
+                'successes':            self.__successes,
+                'failures':             failures,
+                'success_rate':         round(self.__successes / self.__attempts, 4) if self.__attempts else None,
+                'consecutive_failures': self.__consecutive_failures,
+                'last_good_time':       self.__last_good_time,
+                'last_error':           self.__last_error,
+            }
@@ -0,0 +1,133 @@
+import math
+import time
+import threading
+import numpy as np
+
+_MAD_SCALE = 1.4826   # MAD → standard deviation for Gaussian noise
+
+
+class ChannelConditioner:
+    """
+    Signal conditioning for one sensor channel:
+      1. Hampel filter — a sample further than n_sigmas robust deviations from
+         the window median is replaced by that median
+      2. rate-of-change limit — output moves at most max_rate units per second
+      3. EMA smoothing — y += ema_alpha * (x - y)
+
+    The window is a preallocated NumPy ring buffer, so the cost per sample is
+    constant. Samples arriving less than min_dt seconds after the last
+    accepted one only refresh the raw value; they do not advance the filters,
+    so several consumers polling the same cached driver sample don't compound it.
+    """
+    def __init__(self, window=7, n_sigmas=3.0, min_mad=0.0, ema_alpha=1.0, max_rate=None, min_dt=0.0):
+        self.__window    = max(3, int(window))
+        self.__n_sigmas  = float(n_sigmas)
+        self.__min_mad   = float(min_mad)
+        self.__ema_alpha = float(ema_alpha)
+        self.__max_rate  = max_rate
+        self.__min_dt    = float(min_dt)
+        self.__buf       = np.zeros(self.__window)
+        self.__idx       = 0
+        self.__count     = 0
+        self.__raw       = None
+        self.__value     = None
+        self.__last_t    = None
+        self.__samples   = 0
+        self.__outliers  = 0
+        self.__limited   = 0
+        self.__invalid   = 0
+
+    def update(self, raw, t=None):
+        """Feed one raw sample and return the conditioned value (None until the first valid sample)."""
+        if t is None:
+            t = time.monotonic()
+        if raw is None or (isinstance(raw, float) and math.isnan(raw)):
+            self.__invalid += 1
+            return self.__value
+        raw = float(raw)
+        self.__raw = raw
+        if self.__last_t is not None and t - self.__last_t < self.__min_dt:
+            return self.__value
+        dt = (t - self.__last_t) if self.__last_t is not None else None
+        self.__last_t = t
+        self.__samples += 1
+
+        self.__buf[self.__idx] = raw
+        self.__idx = (self.__idx + 1) % self.__window
+        self.__count = min(self.__count + 1, self.__window)
+
+        x = raw
+        if self.__count >= 3:
+            win = self.__buf if self.__count == self.__window else self.__buf[:self.__count]
+            med = np.median(win)
+            mad = max(_MAD_SCALE * np.median(np.abs(win - med)), self.__min_mad)
+            if abs(raw - med) > self.__n_sigmas * mad:
+                x = float(med)
+                self.__outliers += 1
+
+        if self.__value is None:
+            self.__value = x
+            return self.__value
+
+        # Rate limiting starts once the window is full, so a glitch in the very
+        # first sample cannot pin the output far from the real value
+        if self.__max_rate is not None and dt is not None and self.__count == self.__window:
+            max_step = self.__max_rate * dt
+            if abs(x - self.__value) > max_step:
+                x = self.__value + math.copysign(max_step, x - self.__value)
+                self.__limited += 1
+
+        self.__value += self.__ema_alpha * (x - self.__value)
+        return self.__value
+
+    def get_value(self):
+        return self.__value
+
+    def get_raw(self):
+        return self.__raw
+
+    def get_stats(self) -> dict:
+        return {
+            'raw':       self.__raw,
+            'value':     self.__value,
+            'samples':   self.__samples,
+            'outliers':  self.__outliers,
+            'limited':   self.__limited,
+            'invalid':   self.__invalid,
+        }
+
+
+class SignalConditioner:
+    """
+    Per-channel conditioning stage between the sensor drivers and consumers.
+    Channels are created from a {name: ChannelConditioner kwargs} mapping;
+    readings for unknown channels pass through unchanged.
+    """
+    def __init__(self, channel_config=None):
+        self.__channels = {}
+        self.__lock = threading.Lock()
+        for name, kwargs in (channel_config or {}).items():
+            self.__channels[name] = ChannelConditioner(**kwargs)
+
+    def has_channel(self, name) -> bool:
+        return name in self.__channels
+
+    def update(self, name, raw, t=None):
+        """Condition one sample; returns raw unchanged for unconfigured channels."""
+        channel = self.__channels.get(name)
+        if channel is None:
+            return raw
+        with self.__lock:
+            value = channel.update(raw, t)
+        return raw if value is None else value
+
+    def get(self, name):
+        """Return (raw, conditioned) for a channel, or (None, None) if unknown."""
+        channel = self.__channels.get(name)
+        if channel is None:
+            return None, None
+        return channel.get_raw(), channel.get_value()
+
+    def get_stats(self) -> dict:
+        with self.__lock:
+            return {name: ch.get_stats() for name, ch in self.__channels.items()}
@@ -9,9 +9,13 @@ class ElectricitySensor:
     Class for handling electricity-related sensor functionality including:
     - Voltage, current, power, energy, frequency, power factor, and alarm via UART
     """
-    def __init__(self):
+    def __init__(self, health_registry=None):
         self.last_time_reset = None
-        pass
+        self.__health = health_registry
+
+    def __record(self, ok, t0, value=None, error=None):
+        if self.__health is not None:
+            self.__health.record('electricity', ok, time.monotonic() - t0, value, error)
         
     def set_electricity_sensor_pin(self):
         """Set up the UART configuration for electricity sensor"""
@@ -98,11 +102,13 @@ class ElectricitySensor:
         Get electricity values from the sensor.
         Returns voltage, current, power, energy, frequency, power_factor, alarm respectively.
         """
+        t0 = time.monotonic()
         try:
             self.__send_electricity_modbus_request()
             resp = self.__get_electricity_modbus_response()
             # _CUSTOM_PRINT_FUNC(f"Electricity Modbus Response (hex): {''.join([f'{x:02x}' for x in resp])}")
             if resp == None:
+                self.__record(False, t0, error="no valid response")
                 return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
 
             # voltage is 2 bytes, current is 4 bytes, power is 4 bytes, energy is 4 bytes, frequency is 2 bytes, power factor is 2 bytes, alarm is 2 bytes
@@ -119,9 +125,12 @@ class ElectricitySensor:
             frequency = frequency / 10.0
             power_factor = power_factor / 100.0            
 
-            return voltage, current, power, energy, frequency, power_factor, alarm
+            values = (voltage, current, power, energy, frequency, power_factor, alarm)
+            self.__record(True, t0, values)
+            return values
         except Exception as err:
             _CUSTOM_PRINT_FUNC(f'Sensor Error: {err.args[0]}')
+            self.__record(False, t0, error=str(err))
             return 0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.0
 
 
@@ -0,0 +1,161 @@
+import time
+import bisect
+import threading
+from collections import namedtuple
+
+# Latency histogram bucket upper edges (ms); the last bucket is open-ended
+LATENCY_BUCKETS_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000)
+
+# value: last good value, age_sec: seconds since it was read,
+# quality: 'good'    — last read succeeded and is fresh
+#          'held'    — last read failed, value is the previous good one, still fresh
+#          'stale'   — last good value is older than the source's stale_after_sec
+#          'missing' — no good read yet
+SensorReading = namedtuple('SensorReading', ['value', 'age_sec', 'quality', 'error'])
+
+
+class LatencyHistogram:
+    def __init__(self):
+        self.counts = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+        self.total = 0
+        self.sum_ms = 0.0
+        self.max_ms = 0.0
+
+    def add(self, ms):
+        self.counts[bisect.bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+        self.total += 1
+        self.sum_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+
+    def merge(self, other):
+        for i, c in enumerate(other.counts):
+            self.counts[i] += c
+        self.total += other.total
+        self.sum_ms += other.sum_ms
+        self.max_ms = max(self.max_ms, other.max_ms)
+
+    def percentile(self, p):
+        """Upper edge of the bucket holding the p-th percentile (ms)"""
+        if self.total == 0:
+            return None
+        rank = p / 100.0 * self.total
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank and c:
+                return LATENCY_BUCKETS_MS[i] if i < len(LATENCY_BUCKETS_MS) else self.max_ms
+        return self.max_ms
+
+    def to_dict(self):
+        labels = [f"<={edge}ms" for edge in LATENCY_BUCKETS_MS] + [f">{LATENCY_BUCKETS_MS[-1]}ms"]
+        return {
+            'count':   self.total,
+            'mean_ms': round(self.sum_ms / self.total, 3) if self.total else None,
+            'p50_ms':  self.percentile(50),
+            'p95_ms':  self.percentile(95),
+            'p99_ms':  self.percentile(99),
+            'max_ms':  round(self.max_ms, 3),
+            'buckets': dict(zip(labels, self.counts)),
+        }
+
+
+class _Source:
+    def __init__(self, bus, stale_after_sec):
+        self.bus = bus
+        self.stale_after_sec = stale_after_sec
+        self.reads = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.last_ok = None
+        self.last_value = None
+        self.last_good_time = None     # monotonic
+        self.last_good_wall = None
+        self.last_error = None
+        self.histogram = LatencyHistogram()
+
+
+class SensorHealthRegistry:
+    """
+    Per-source read health: outcome, latency and last good value of every
+    driver read. Sources are grouped by the bus they use, so the latency
+    histograms show which bus eats the cycle budget.
+    """
+    def __init__(self, default_stale_sec=60.0):
+        self.__default_stale_sec = float(default_stale_sec)
+        self.__sources = {}
+        self.__lock = threading.Lock()
+
+    def register(self, source, bus, stale_after_sec=None):
+        with self.__lock:
+            if source not in self.__sources:
+                self.__sources[source] = _Source(bus, stale_after_sec or self.__default_stale_sec)
+
+    def set_stale_after(self, source, stale_after_sec):
+        with self.__lock:
+            if source in self.__sources:
+                self.__sources[source].stale_after_sec = float(stale_after_sec)
+
+    def record(self, source, ok, latency_sec, value=None, error=None):
+        """Record one read attempt. value is kept only for successful reads."""
+        with self.__lock:
+            src = self.__sources.get(source)
+            if src is None:
+                src = self.__sources[source] = _Source('unknown', self.__default_stale_sec)
+            src.reads += 1
+            src.histogram.add(latency_sec * 1000.0)
+            src.last_ok = bool(ok)
+            if ok:
+                src.consecutive_failures = 0
+                src.last_value = value
+                src.last_good_time = time.monotonic()
+                src.last_good_wall = time.time()
+            else:
+                src.failures += 1
+                src.consecutive_failures += 1
+                src.last_error = error
+
+    def __quality(self, src, age):
+        if src.last_good_time is None:
+            return 'missing'
+        if age > src.stale_after_sec:
+            return 'stale'
+        return 'good' if src.last_ok else 'held'
+
+    def get(self, source) -> SensorReading:
+        """Last good value of a source with its age and quality"""
+        with self.__lock:
+            src = self.__sources.get(source)
+            if src is None:
+                return SensorReading(None, None, 'missing', None)
+            age = None if src.last_good_time is None else time.monotonic() - src.last_good_time
+            error = None if src.last_ok else src.last_error
+            return SensorReading(src.last_value, age, self.__quality(src, age), error)
+
+    def get_quality(self, source) -> str:
+        return self.get(source).quality
+
+    def get_stats(self) -> dict:
+        now = time.monotonic()
+        with self.__lock:
+            sources, buses = {}, {}
+            for name, src in self.__sources.items():
+                age = None if src.last_good_time is None else now - src.last_good_time
+                sources[name] = {
+                    'bus':                  src.bus,
+                    'quality':              self.__quality(src, age),
+                    'age_sec':              None if age is None else round(age, 3),
+                    'stale_after_sec':      src.stale_after_sec,
+                    'reads':                src.reads,
+                    'failures':             src.failures,
+                    'success_rate':         round(1 - src.failures / src.reads, 4) if src.reads else None,
+                    'consecutive_failures': src.consecutive_failures,
+                    'last_good_time':       src.last_good_wall,
+                    'last_error':           src.last_error,
+                    'latency':              src.histogram.to_dict(),
+                }
+                bus = buses.setdefault(src.bus, LatencyHistogram())
+                bus.merge(src.histogram)
+            return {
+                'sources': sources,
+                'buses':   {name: {**h.to_dict(), 'total_ms': round(h.sum_ms, 1)} for name, h in buses.items()},
+            }
@@ -1,3 +1,4 @@
+import time
 from adafruit_ads1x15.analog_in import AnalogIn
 # import adafruit_veml7700
 from utils.utils import _CUSTOM_PRINT_FUNC
@@ -7,13 +8,17 @@ class LightSensor:
     Class for handling light-related sensor functionality including:
     - Light intensity via ADS1115
     """
-    def __init__(self, ads_sensor=None, ads_channels=None, I2C=None):
+    def __init__(self, ads_sensor=None, ads_channels=None, I2C=None, health_registry=None):
+        self.__health = health_registry
         self.__ads_sensor = ads_sensor
         self.__ads_channels = ads_channels
         self.__light_sensor_resistance = 10000.0 # about 10K ohm
         self.__last_voltage = 0.0
         self.__last_current = 0.0
         self.__last_lux = 0.0        
+        self.__light_ch = None
+        self.__scanner = None
+        self.__voltage_error = None
 
         # Initialize the light sensor veml7700
         # try:
@@ -41,6 +46,7 @@ class LightSensor:
         """Set the ADS1115 channel for light intensity sensor"""
         try:
             self.ads_light = AnalogIn(self.__ads_sensor, self.__ads_channels[ch])
+            self.__light_ch = self.__ads_channels[ch]
             self.__last_voltage = 0.0
             self.__last_current = 0.0
             self.__last_lux = 0.0
@@ -50,9 +56,17 @@ class LightSensor:
             _CUSTOM_PRINT_FUNC(f'Sensor Error: {err.args[0]}')
             return False
 
+    def set_ads1115_scanner(self, scanner):
+        """Serve light readings from an ADS1115Scanner instead of single-shot conversions"""
+        self.__scanner = scanner
+
     def __get_lux_raw(self):
         """Get raw light sensor value"""
         try:            
+            if self.__scanner is not None and self.__scanner.has_channel(self.__light_ch):
+                val = self.__scanner.get_raw(self.__light_ch)
+                if val is not None:
+                    return val
             val = self.ads_light.value
             return val
         except RuntimeError as err:
@@ -61,11 +75,21 @@ class LightSensor:
 
     def __get_lux_voltage(self, ads_reading = 0.0):
         """Get light sensor voltage"""
+        # A stale scan raises ScanStaleError (an OSError) like a failed conversion,
+        # so the light loop skips the cycle instead of acting on a frozen value
         try:
+            if self.__scanner is not None and self.__scanner.has_channel(self.__light_ch):
+                voltage = self.__scanner.get_voltage(self.__light_ch)
+                if voltage is not None:
+                    self.__last_voltage = voltage
+                    self.__voltage_error = None
+                    return self.__last_voltage
             self.__last_voltage = self.ads_light.voltage
+            self.__voltage_error = None
             return self.__last_voltage
         except RuntimeError as err:
             _CUSTOM_PRINT_FUNC(f'Sensor Error: {err.args[0]}')
+            self.__voltage_error = str(err)
             return self.__last_voltage
 
     def __get_lux_current(self, voltage = 0.0):
@@ -79,12 +103,26 @@ class LightSensor:
     
     def get_light_intensity(self):
         """Get light intensity in lux"""
+        t0 = time.monotonic()
         try:
             self.__last_lux = self.__get_lux_current(self.__get_lux_voltage()) * 1000000.0 * 2.0
+            if self.__voltage_error is None:
+                self.__record(True, t0, self.__last_lux)
+            else:
+                self.__record(False, t0, error=self.__voltage_error)
             return self.__last_lux
         except RuntimeError as err:
             _CUSTOM_PRINT_FUNC(f'Sensor Error: {err.args[0]}')
+            self.__record(False, t0, error=str(err))
             return self.__last_lux
+        except OSError as err:
+            # Failed conversion or stale scan — a failed read, and the caller skips the cycle
+            self.__record(False, t0, error=str(err))
+            raise
+
+    def __record(self, ok, t0, value=None, error=None):
+        if self.__health is not None:
+            self.__health.record('light', ok, time.monotonic() - t0, value, error)
 
 
     def get_light_intensity_veml(self):
@@ -0,0 +1,82 @@
+import time
+import threading
+from collections import deque
+
+
+class PulseCounter:
+    """
+    Thread-safe pulse counting engine for YF-S201 style flow sensors.
+
+    Edges are ingested in batches with their kernel timestamps (ns, monotonic
+    clock). Flow rate is derived from the spacing of recent pulses rather than
+    from a once-per-second count, and the count/reset handoff is a single
+    locked swap so no pulse can fall between reading and clearing the counter.
+    """
+    def __init__(self, pulses_per_litre=450.0, window_sec=1.0, stale_sec=2.0, history=256):
+        self.__pulses_per_litre = float(pulses_per_litre)
+        self.__window_ns        = int(window_sec * 1e9)
+        self.__stale_ns         = int(stale_sec * 1e9)
+        self.__timestamps       = deque(maxlen=history)
+        self.__pending          = 0     # pulses not yet handed to take_count()
+        self.__total            = 0     # pulses since creation (never reset)
+        self.__lock             = threading.Lock()
+
+    def feed(self, timestamps_ns):
+        """Ingest a batch of rising-edge timestamps (ns), oldest first."""
+        n = len(timestamps_ns)
+        if n == 0:
+            return 0
+        with self.__lock:
+            self.__timestamps.extend(timestamps_ns)
+            self.__pending += n
+            self.__total += n
+        return n
+
+    def take_count(self) -> int:
+        """Atomically return the pulses counted since the previous call and reset to zero."""
+        with self.__lock:
+            count, self.__pending = self.__pending, 0
+        return count
+
+    def take_volume(self) -> float:
+        """Atomically take the pending pulses and return them as litres."""
+        return self.take_count() / self.__pulses_per_litre
+
+    def get_total_pulses(self) -> int:
+        return self.__total
+
+    def flow_rate_l_min(self, now_ns=None) -> float:
+        """
+        Flow rate (L/min) from the inter-pulse intervals inside the last window.
+        Falls back to the last interval at low flow, decays once pulses stop
+        and reports 0 after stale_sec without a pulse.
+        """
+        if now_ns is None:
+            now_ns = time.monotonic_ns()
+        with self.__lock:
+            n_total = len(self.__timestamps)
+            if n_total < 2:
+                return 0.0
+            last = self.__timestamps[-1]
+            since_last = now_ns - last
+            if since_last > self.__stale_ns:
+                return 0.0
+            cutoff = last - self.__window_ns
+            first = self.__timestamps[-2]
+            n = 2
+            # Walk back through the window; deque indexing from the right is cheap
+            for i in range(n_total - 3, -1, -1):
+                ts = self.__timestamps[i]
+                if ts < cutoff:
+                    break
+                first = ts
+                n += 1
+        span = last - first
+        if span <= 0:
+            return 0.0
+        freq_hz = (n - 1) * 1e9 / span
+        # No pulse for longer than the current period means flow is dropping
+        if since_last > span / (n - 1):
+            freq_hz = min(freq_hz, 1e9 / since_last)
+        # YF-S201: F(Hz) = 7.5 * Q(L/min), i.e. pulses_per_litre / 60
+        return freq_hz * 60.0 / self.__pulses_per_litre
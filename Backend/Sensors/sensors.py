@@ -12,6 +12,9 @@ from .air import AirSensor
 from .electricity import ElectricitySensor
 from .light import LightSensor
 from .water import WaterFlowSensor
+from .ads_scanner import ADS1115Scanner
+from .conditioning import SignalConditioner
+from .health import SensorHealthRegistry
 from utils.utils import _CUSTOM_PRINT_FUNC
 
 class GH_Sensors:
@@ -45,13 +48,108 @@ class GH_Sensors:
                 f"RS485 soil/EC sensor and pumps are unaffected."
             )
 
+        # Read health of every driver, grouped by the bus it uses
+        self.health = SensorHealthRegistry()
+        self.health.register('air',               'dht22')
+        self.health.register('soil',              'rs485')
+        self.health.register('electricity',       'pzem_uart')
+        self.health.register('light',             'i2c')
+        self.health.register('soil_moisture_ads', 'i2c')
+
         # Initialize sensor drivers
-        self.soil_sensor        = SoilSensor(self.__ads_sensor, self.__ads_channels)
-        self.air_sensor         = AirSensor()
-        self.electricity_sensor = ElectricitySensor()
-        self.light_sensor       = LightSensor(ads_sensor=self.__ads_sensor, ads_channels=self.__ads_channels, I2C=self.__general_i2c)
+        self.soil_sensor        = SoilSensor(self.__ads_sensor, self.__ads_channels, health_registry=self.health)
+        self.air_sensor         = AirSensor(health_registry=self.health)
+        self.electricity_sensor = ElectricitySensor(health_registry=self.health)
+        self.light_sensor       = LightSensor(ads_sensor=self.__ads_sensor, ads_channels=self.__ads_channels, I2C=self.__general_i2c, health_registry=self.health)
         self.water_flow_sensor      = WaterFlowSensor(mongo_db_handler=mongo_db_handler, state_key="water_amount")
         self.fertilizer_flow_sensor = WaterFlowSensor(mongo_db_handler=mongo_db_handler, state_key="fertilizer_amount")
+        self.ads_scanner            = None
+        self.conditioner            = SignalConditioner()
+
+    # Sensor health
+    def configure_sensor_health(self, stale_after):
+        """Set per-source staleness limits ({source: seconds})"""
+        for source, seconds in stale_after.items():
+            self.health.set_stale_after(source, seconds)
+
+    def get_sensor_reading(self, source):
+        """
+        Last good value of a source ('air', 'soil', 'electricity', 'light',
+        'soil_moisture_ads') as a SensorReading(value, age_sec, quality, error).
+        """
+        return self.health.get(source)
+
+    def get_sensor_health(self):
+        """Get per-source read statistics and per-bus latency histograms"""
+        return self.health.get_stats()
+
+    # Signal conditioning
+    def configure_conditioning(self, channel_config):
+        """Set up per-channel outlier rejection / smoothing ({channel: filter kwargs})"""
+        self.conditioner = SignalConditioner(channel_config)
+
+    def get_air_values_conditioned(self):
+        """
+        Get conditioned air temperature (Celsius) and humidity.
+        Returns temp_C, humidity respectively.
+        """
+        temp_c, humidity = self.get_air_values()
+        if not self.air_sensor.has_sample():
+            return temp_c, humidity
+        return (self.conditioner.update('air_temperature', temp_c),
+                self.conditioner.update('air_humidity', humidity))
+
+    def get_light_intensity_conditioned(self):
+        """Get conditioned light intensity in lux"""
+        return self.conditioner.update('light_intensity', self.get_light_intensity())
+
+    def get_soil_values_conditioned(self):
+        """
+        Get conditioned soil values.
+        Returns ph_val, ec_val, humi_val, temp_val respectively.
+        A failed RS485 read (all zeros) does not enter the filters.
+        """
+        values = self.get_soil_values()
+        if not any(values):
+            values = (None, None, None, None)
+        conditioned = (self.conditioner.update('soil_ph', values[0]),
+                       self.conditioner.update('soil_ec', values[1]),
+                       self.conditioner.update('soil_humidity', values[2]),
+                       self.conditioner.update('soil_temperature', values[3]))
+        return tuple(0.0 if v is None else v for v in conditioned)
+
+    def get_raw_and_conditioned(self, channel):
+        """Return (raw, conditioned) for a conditioned channel"""
+        return self.conditioner.get(channel)
+
+    def get_conditioning_stats(self):
+        """Get per-channel conditioning statistics"""
+        return self.conditioner.get_stats()
+
+    # ADS1115 scan mode
+    def start_ads1115_scan(self, channels, data_rate=860, oversample=4, scan_rate_hz=20.0, ring_size=8,
+                           max_age_scans=5):
+        """
+        Run the ADS1115 in background scan mode over the given channels.
+        Light and ADS soil moisture readers are then served from memory; a
+        channel not scanned for max_age_scans scan periods raises ScanStaleError.
+        """
+        if self.__ads_sensor is None:
+            _CUSTOM_PRINT_FUNC("[Sensors] ADS1115 not available — scan mode not started.")
+            return False
+        scanner = ADS1115Scanner(self.__ads_sensor, channels, data_rate=data_rate,
+                                 oversample=oversample, scan_rate_hz=scan_rate_hz, ring_size=ring_size,
+                                 max_age_scans=max_age_scans)
+        if not scanner.start():
+            return False
+        self.ads_scanner = scanner
+        self.light_sensor.set_ads1115_scanner(scanner)
+        self.soil_sensor.set_ads1115_scanner(scanner)
+        return True
+
+    def get_ads1115_scan_stats(self):
+        """Get ADS1115 scan engine statistics (None if scan mode is off)"""
+        return self.ads_scanner.get_stats() if self.ads_scanner is not None else None
 
 
     def set_water_flow_sensor_pin(self, pin):
@@ -66,6 +164,10 @@ class GH_Sensors:
         """Get total water amount in liters"""
         return self.water_flow_sensor.get_total_water_amount()
 
+    def get_water_counted_volume(self):
+        """Litres counted by the water flow sensor (live, for volumetric dosing)"""
+        return self.water_flow_sensor.get_counted_volume()
+
     def reset_water_amount(self):
         """Reset the total water amount to zero"""
         return self.water_flow_sensor.reset_water_amount()
@@ -82,10 +184,19 @@ class GH_Sensors:
         """Get total fertilizer amount in liters"""
         return self.fertilizer_flow_sensor.get_total_water_amount()
     
+    def get_fertilizer_counted_volume(self):
+        """Litres counted by the fertilizer flow sensor (live, for volumetric dosing)"""
+        return self.fertilizer_flow_sensor.get_counted_volume()
+
     def reset_fertilizer_amount(self):
         """Reset the total fertilizer amount to zero"""
         return self.fertilizer_flow_sensor.reset_water_amount()
 
+    def stop_flow_sensors(self):
+        """Stop both flow sensors and flush their totals to disk and MongoDB"""
+        self.water_flow_sensor.stop()
+        self.fertilizer_flow_sensor.stop()
+
     # Soil sensor functions - delegated to soil_sensor
     def set_soil_sensor_pins(self):
         """Set up the soil sensor pins"""
@@ -143,6 +254,17 @@ class GH_Sensors:
         """Get air humidity percentage"""
         return self.air_sensor.get_air_humidity()
 
+    def get_air_values(self):
+        """
+        Get air temperature (Celsius) and humidity from one DHT22 sample.
+        Returns temp_C, humidity respectively.
+        """
+        return self.air_sensor.get_air_values()
+
+    def get_dht22_read_stats(self):
+        """Get DHT22 read success-rate statistics"""
+        return self.air_sensor.get_read_stats()
+
     # Light sensor functions - delegated to light_sensor
     def set_light_intensity_ads1115_channel(self, ch):
         """Set the ADS1115 channel for light intensity sensor"""
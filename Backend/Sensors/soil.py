@@ -1,3 +1,4 @@
+import time
 import serial
 import struct
 import numpy as np
@@ -12,9 +13,12 @@ class SoilSensor:
     - Soil moisture, pH, EC, humidity, and temperature via UART
     - Soil moisture via ADS1115
     """
-    def __init__(self, ads_sensor=None, ads_channels=None):
+    def __init__(self, ads_sensor=None, ads_channels=None, health_registry=None):
+        self.__health = health_registry
         self.__ads_sensor = ads_sensor
         self.__ads_channels = ads_channels
+        self.__moisture_ch = None
+        self.__scanner = None
         
         # moisture sensor calibration values
         self.__MOISTURE_SENSOR_VERY_DRY_VAL = 18000
@@ -38,116 +42,79 @@ class SoilSensor:
         # _CUSTOM_PRINT_FUNC(f'soil response: {response.hex()}')
         return response if len(response) >= 11 else None
 
-    def get_ph(self):
-        """Get soil pH value"""
-        try:        
+    def __read_soil_registers(self, label):
+        """
+        One Modbus transaction with the soil probe.
+        Returns ph_val, ec_val, humi_val, temp_val, or None if the read failed.
+        The outcome and latency are recorded in the health registry.
+        """
+        t0 = time.monotonic()
+        values, error = None, None
+        try:
             self.__send_modbus_request()
             resp = self.__get_modbus_response()
 
             if resp == None:
-                return 0.0
+                error = "no response"
+            elif resp[1] != 0x03:
+                _CUSTOM_PRINT_FUNC(f"Invalid response for Soil {label} request!")
+                error = f"invalid function code 0x{resp[1]:02x}"
+            else:
+                ph_val = struct.unpack(">H", resp[9:11])[0] / 10.0
+                ec_val = struct.unpack(">H", resp[7:9])[0]
+                humi_val = struct.unpack(">H", resp[3:5])[0] / 10.0
+                temp_val = struct.unpack(">H", resp[5:7])[0] / 10.0
+                values = (ph_val, ec_val, humi_val, temp_val)
+        except RuntimeError as err:
+            _CUSTOM_PRINT_FUNC(f'Sensor Error: {err.args[0]}')
+            error = str(err)
+        except Exception as err:
+            self.__record('soil', False, t0, None, str(err))
+            raise
+        self.__record('soil', values is not None, t0, values, error)
+        return values
 
-            if resp[1] != 0x03:
-                _CUSTOM_PRINT_FUNC("Invalid response for Soil PH request!")
-                return 0.0
-            
-            ph_val = struct.unpack(">H", resp[9:11])[0] / 10.0
+    def __record(self, source, ok, t0, value=None, error=None):
+        if self.__health is not None:
+            self.__health.record(source, ok, time.monotonic() - t0, value, error)
 
-            return ph_val
-        except RuntimeError as err:
-            _CUSTOM_PRINT_FUNC(f"Sensor Error: {err.args[0]}")
-            return 0.0
+    def get_ph(self):
+        """Get soil pH value"""
+        values = self.__read_soil_registers("PH")
+        return values[0] if values is not None else 0.0
 
     def get_ec(self):
         """Get soil EC (Electrical Conductivity) value"""
-        try:            
-            self.__send_modbus_request()
-            resp = self.__get_modbus_response()
-
-            if resp == None:
-                return 0.0
-
-            if resp[1] != 0x03:
-                _CUSTOM_PRINT_FUNC("Invalid response for Soil EC request!")
-                return 0.0
-            
-            ec_val = struct.unpack(">H", resp[7:9])[0]
-
-            return ec_val
-        except RuntimeError as err:
-            _CUSTOM_PRINT_FUNC(f"Sensor Error: {err.args[0]}")
-            return 0.0
+        values = self.__read_soil_registers("EC")
+        return values[1] if values is not None else 0.0
 
     def get_soil_humidity(self):
         """Get soil humidity value"""
-        try:
-            self.__send_modbus_request()
-            resp = self.__get_modbus_response()
+        values = self.__read_soil_registers("Humidity")
+        return values[2] if values is not None else 0.0
 
-            if resp == None:
-                return 0.0
-
-            if resp[1] != 0x03:
-                _CUSTOM_PRINT_FUNC("Invalid response for Soil Humidity request!")
-                return 0.0
-            
-            humi_val = struct.unpack(">H", resp[3:5])[0] / 10.0
-
-            return humi_val
-        except RuntimeError as err:
-            _CUSTOM_PRINT_FUNC(f'Sensor Error: {err.args[0]}')
-            return 0.0
-    
     def get_soil_temperature(self):
         """Get soil temperature value"""
-        try:            
-            self.__send_modbus_request()
-            resp = self.__get_modbus_response()
-
-            if resp == None:
-                return 0.0
-            
-            if resp[1] != 0x03:
-                _CUSTOM_PRINT_FUNC("Invalid response for Soil Temperature request!")
-                return 0.0
-            
-            temp_val = struct.unpack(">H", resp[5:7])[0] / 10.0
-
-            return temp_val
-        except RuntimeError as err:
-            _CUSTOM_PRINT_FUNC(f'Sensor Error: {err.args[0]}')
-            return 0.0
+        values = self.__read_soil_registers("Temperature")
+        return values[3] if values is not None else 0.0
 
     def get_soil_values(self):
         """
         Get all soil values from the sensor.
         Returns ph_val, ec_val, humi_val, temp_val respectively.
         """
-        try:
-            self.__send_modbus_request()
-            resp = self.__get_modbus_response()
-
-            if resp == None:
-                return 0.0, 0.0, 0.0, 0.0
-
-            if resp[1] != 0x03:
-                _CUSTOM_PRINT_FUNC("Invalid response for Soil Values request!")
-                return 0.0, 0.0, 0.0, 0.0
-            
-            ph_val = struct.unpack(">H", resp[9:11])[0] / 10.0
-            ec_val = struct.unpack(">H", resp[7:9])[0]
-            humi_val = struct.unpack(">H", resp[3:5])[0] / 10.0
-            temp_val = struct.unpack(">H", resp[5:7])[0] / 10.0
-
-            return ph_val, ec_val, humi_val, temp_val
-        except RuntimeError as err:
-            _CUSTOM_PRINT_FUNC(f'Sensor Error: {err.args[0]}')
-            return 0.0, 0.0, 0.0, 0.0
+        values = self.__read_soil_registers("Values")
+        return values if values is not None else (0.0, 0.0, 0.0, 0.0)
 
     # ADS1115 soil moisture functions
     def set_soil_moisture_ads1115_channel(self, ch):
         """Set the ADS1115 channel for soil moisture sensor"""
         self.__ads_moisture = AnalogIn(self.__ads_sensor, self.__ads_channels[ch])
+        self.__moisture_ch = self.__ads_channels[ch]
+
+    def set_ads1115_scanner(self, scanner):
+        """Serve ADS1115 soil moisture readings from an ADS1115Scanner"""
+        self.__scanner = scanner
 
     def calibrate_soil_moisture_ads1115(self, dry_value, wet_value):
         """Calibrate soil moisture sensor with dry and wet values"""
@@ -156,10 +123,21 @@ class SoilSensor:
 
     def get_soil_moisture_ads1115(self):
         """Get soil moisture percentage from ADS1115"""
+        t0 = time.monotonic()
         try:
-            moisture_raw = self.__ads_moisture.value
+            moisture_raw = None
+            if self.__scanner is not None and self.__scanner.has_channel(self.__moisture_ch):
+                moisture_raw = self.__scanner.get_raw(self.__moisture_ch)    # raises ScanStaleError if frozen
+            if moisture_raw is None:
+                moisture_raw = self.__ads_moisture.value
             moisture_perc = np.interp(moisture_raw, [self.__MOISTURE_SENSOR_VERY_WET_VAL, self.__MOISTURE_SENSOR_VERY_DRY_VAL], [100, 0])
+            self.__record('soil_moisture_ads', True, t0, float(moisture_perc))
             return moisture_perc
         except RuntimeError as err:
             _CUSTOM_PRINT_FUNC(f'Sensor Error: {err.args[0]}')
+            self.__record('soil_moisture_ads', False, t0, None, str(err))
             return 0.0
+        except OSError as err:
+            # Failed conversion or stale scan — recorded as a failed read, raised as before
+            self.__record('soil_moisture_ads', False, t0, None, str(err))
+            raise
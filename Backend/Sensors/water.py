@@ -1,8 +1,11 @@
+import os
+import json
 import time
 import threading
 import importlib.util
 import sys
 from utils.utils import _CUSTOM_PRINT_FUNC
+from .pulse_counter import PulseCounter
 
 
 def _load_system_gpiod():
@@ -22,34 +25,108 @@ def _load_system_gpiod():
 
 _gpiod = _load_system_gpiod()
 
-_SAVE_INTERVAL_SEC = 1   # save water_amount to MongoDB every N seconds
+_SAVE_INTERVAL_SEC        = 1       # how often the persist loop checks the total
+_PERSIST_DELTA_L          = 0.01    # push to MongoDB once the total moved by this many litres
+_PERSIST_HEARTBEAT_SEC    = 600     # ...or at least this often while anything is unsaved
+_CHECKPOINT_DIR           = 'consumption'
 
 
 class WaterFlowSensor:
     """
     Water flow sensor (YF-S201) — pulse counting, flow rate, total volume.
-    Persists water_amount to MongoDB (system_state collection) every second.
+
+    The total is checkpointed to a local file every second it changes, and
+    pushed to MongoDB (system_state collection) only when it moved by more
+    than persist_delta_l, on a slow heartbeat, and on stop().
     """
     PULSES_PER_LITRE = 450.0
 
-    def __init__(self, mongo_db_handler=None, state_key="water_amount"):
+    def __init__(self, mongo_db_handler=None, state_key="water_amount",
+                 persist_delta_l=_PERSIST_DELTA_L, heartbeat_sec=_PERSIST_HEARTBEAT_SEC,
+                 checkpoint_dir=_CHECKPOINT_DIR):
         self.__mongo      = mongo_db_handler
         self.__state_key  = state_key
+        self.__persist_delta_l = persist_delta_l
+        self.__heartbeat_sec   = heartbeat_sec
+        self.__checkpoint_path = os.path.join(checkpoint_dir, f"{state_key}.json") if checkpoint_dir else None
         self.__water_flow_running = False
         self.__flow_rate   = 0.0
         self.__water_amount = 0.0
-        self.__counter     = 0
+        self.__counter     = PulseCounter(pulses_per_litre=self.PULSES_PER_LITRE)
+        self.__amount_lock = threading.Lock()
         self.__line        = None
-
-        # Load saved total from MongoDB
-        if self.__mongo is not None:
+        self.__persist_lock     = threading.Lock()
+        self.__remote_value     = None    # last total written to MongoDB
+        self.__remote_time      = 0.0
+        self.__checkpoint_value = None    # last total written to the local checkpoint
+        self.__remote_writes    = 0
+        self.__remote_skipped   = 0
+
+        # Load saved total — the local checkpoint is never older than MongoDB,
+        # so it wins when present; MongoDB covers a fresh SD card.
+        local = self.__read_checkpoint()
+        if local is not None:
+            self.__water_amount = local
+            self.__checkpoint_value = local
+            _CUSTOM_PRINT_FUNC(f"[WaterFlow] Loaded {self.__state_key}={self.__water_amount:.4f} L from local checkpoint")
+        elif self.__mongo is not None:
             try:
                 saved = self.__mongo.get_state(self.__state_key)
                 if saved is not None:
                     self.__water_amount = float(saved)
+                    self.__remote_value = self.__water_amount
                     _CUSTOM_PRINT_FUNC(f"[WaterFlow] Loaded {self.__state_key}={self.__water_amount:.4f} L from MongoDB")
             except Exception as e:
                 _CUSTOM_PRINT_FUNC(f"[WaterFlow] Could not load {self.__state_key} from MongoDB: {e}")
+        self.__remote_time = time.monotonic()
+
+    def __read_checkpoint(self):
+        """Return the total from the local checkpoint file, or None."""
+        if self.__checkpoint_path is None:
+            return None
+        try:
+            with open(self.__checkpoint_path, 'r') as f:
+                return float(json.load(f)['value'])
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            _CUSTOM_PRINT_FUNC(f"[WaterFlow] Ignoring unreadable checkpoint {self.__checkpoint_path}: {e}")
+            return None
+
+    def __write_checkpoint(self, value):
+        """Atomically replace the local checkpoint (write temp file, fsync, rename)."""
+        if self.__checkpoint_path is None or value == self.__checkpoint_value:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.__checkpoint_path) or '.', exist_ok=True)
+            tmp_path = self.__checkpoint_path + '.tmp'
+            with open(tmp_path, 'w') as f:
+                json.dump({'value': value, 'timestamp': time.time()}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.__checkpoint_path)
+            self.__checkpoint_value = value
+        except Exception as e:
+            _CUSTOM_PRINT_FUNC(f"[WaterFlow] Could not write checkpoint {self.__checkpoint_path}: {e}")
+
+    def __write_remote(self, value):
+        if self.__mongo is None:
+            return
+        try:
+            if self.__mongo.upsert_state(self.__state_key, value):
+                self.__remote_value = value
+                self.__remote_time = time.monotonic()
+                self.__remote_writes += 1
+        except Exception as e:
+            _CUSTOM_PRINT_FUNC(f"[WaterFlow] Could not save {self.__state_key}: {e}")
+
+    def flush(self):
+        """Write the current total to the local checkpoint and MongoDB immediately."""
+        with self.__persist_lock:
+            value = round(self.__water_amount, 4)
+            self.__write_checkpoint(value)
+            if value != self.__remote_value:
+                self.__write_remote(value)
 
     def set_water_flow_sensor_pin(self, pin: int):
         chip = _gpiod.Chip('/dev/gpiochip4')
@@ -59,7 +136,7 @@ class WaterFlowSensor:
             type=_gpiod.LINE_REQ_EV_RISING_EDGE,
             flags=_gpiod.LINE_REQ_FLAG_BIAS_PULL_UP,
         )
-        self.__counter = 0
+        self.__counter.take_count()
         self.__water_flow_running = True
 
         threading.Thread(target=self.__pulse_counter,  daemon=True).start()
@@ -68,41 +145,75 @@ class WaterFlowSensor:
         _CUSTOM_PRINT_FUNC(f"[WaterFlow] Sensor ready on GPIO {pin}")
 
     def __pulse_counter(self):
+        """Drain all queued edge events per wakeup and hand their kernel timestamps to the counter."""
+        rising = _gpiod.LineEvent.RISING_EDGE
         while self.__water_flow_running:
             if self.__line.event_wait(sec=1):
-                event = self.__line.event_read()
-                if event.type == _gpiod.LineEvent.RISING_EDGE:
-                    self.__counter += 1
+                events = self.__line.event_read_multiple()
+                self.__counter.feed([
+                    ev.sec * 1_000_000_000 + ev.nsec for ev in events if ev.type == rising
+                ])
 
     def __calc_flow_rate(self):
         while self.__water_flow_running:
             time.sleep(1)
-            count = self.__counter
-            self.__counter = 0
-            # YF-S201: F(Hz) = 7.5 * Q(L/min)  →  Q = count / 7.5
-            self.__flow_rate = count / 7.5
-            self.__water_amount += self.__flow_rate / 60.0  # L/min → L per second
+            # take_volume() swaps the pending count out under a lock — no pulse is lost
+            litres = self.__counter.take_volume()
+            self.__flow_rate = self.__counter.flow_rate_l_min()
+            with self.__amount_lock:
+                self.__water_amount += litres
 
     def __persist_loop(self):
-        """Save water_amount to MongoDB every _SAVE_INTERVAL_SEC seconds."""
+        """
+        Checkpoint locally whenever the total changed; write MongoDB only when
+        it moved by persist_delta_l or the heartbeat expired with unsaved data.
+        """
         while self.__water_flow_running:
             time.sleep(_SAVE_INTERVAL_SEC)
-            if self.__mongo is not None:
-                try:
-                    self.__mongo.upsert_state(self.__state_key, round(self.__water_amount, 4))
-                except Exception as e:
-                    _CUSTOM_PRINT_FUNC(f"[WaterFlow] Could not save {self.__state_key}: {e}")
+            with self.__persist_lock:
+                value = round(self.__water_amount, 4)
+                self.__write_checkpoint(value)
+                if value == self.__remote_value:
+                    continue
+                moved = abs(value - (self.__remote_value or 0.0)) >= self.__persist_delta_l
+                stale = time.monotonic() - self.__remote_time >= self.__heartbeat_sec
+                if moved or stale or self.__remote_value is None:
+                    self.__write_remote(value)
+                else:
+                    self.__remote_skipped += 1
 
     def get_water_flow_rate(self) -> float:
-        return self.__flow_rate
+        if not self.__water_flow_running:
+            return self.__flow_rate
+        # Computed from inter-pulse intervals on demand — sub-second resolution
+        return self.__counter.flow_rate_l_min()
 
     def get_total_water_amount(self) -> float:
         return self.__water_amount
 
+    def get_counted_volume(self) -> float:
+        """
+        Litres counted since the sensor was created. Moves with every drained
+        edge batch rather than on the 1 s total tick, so a dosing pump can be
+        stopped on it; only differences between two calls are meaningful.
+        """
+        return self.__counter.get_total_pulses() / self.PULSES_PER_LITRE
+
+    def get_persist_stats(self) -> dict:
+        """Remote write counters for the change-driven persistence."""
+        return {
+            'remote_writes':   self.__remote_writes,
+            'remote_skipped':  self.__remote_skipped,
+            'remote_value':    self.__remote_value,
+            'checkpoint_value': self.__checkpoint_value,
+        }
+
     def stop(self):
         self.__water_flow_running = False
-        if self.__mongo is not None:
-            self.__mongo.upsert_state(self.__state_key, round(self.__water_amount, 4))
+        # Fold in pulses counted since the last 1 s tick before the final flush
+        with self.__amount_lock:
+            self.__water_amount += self.__counter.take_volume()
+        self.flush()
         if self.__line:
             try:
                 self.__line.release()
@@ -110,7 +221,7 @@ class WaterFlowSensor:
                 pass
 
     def reset_water_amount(self):
-        self.__water_amount = 0.0
-        if self.__mongo is not None:
-            self.__mongo.upsert_state(self.__state_key, 0.0)
+        with self.__amount_lock:
+            self.__water_amount = 0.0
+        self.flush()
         _CUSTOM_PRINT_FUNC(f"[WaterFlow] {self.__state_key} reset to 0.")
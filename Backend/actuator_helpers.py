@@ -22,26 +22,18 @@ def init(env_actuators):
 
 
 def set_all_light_strip_dc(duty_cycle=0):
-    """Set the duty cycle for both light strips."""
-    while not _env_actuators.set_light_strip_1_duty_cycle(duty_cycle):
-        _CUSTOM_PRINT_FUNC("Setting light strip 1 duty cycle again...")
-        time.sleep(0.1)
-
-    while not _env_actuators.set_light_strip_2_duty_cycle(duty_cycle):
-        _CUSTOM_PRINT_FUNC("Setting light strip 2 duty cycle again...")
+    """Set the duty cycle for both light strips (one ESP32 frame)."""
+    while not _env_actuators.set_light_strips_duty_cycle(duty_cycle):
+        _CUSTOM_PRINT_FUNC("Setting light strips duty cycle again...")
         time.sleep(0.1)
 
     return True
 
 
 def set_all_heater_dc(duty_cycle=0):
-    """Set the duty cycle for both heater and heater fan."""
-    while not _env_actuators.set_heater_duty_cycle(duty_cycle):
-        _CUSTOM_PRINT_FUNC("Setting heater duty cycle again...")
-        time.sleep(0.1)
-
-    while not _env_actuators.set_heater_fan_duty_cycle(duty_cycle):
-        _CUSTOM_PRINT_FUNC("Setting heater fan duty cycle again...")
+    """Set the duty cycle for both heater and heater fan (one ESP32 frame)."""
+    while not _env_actuators.set_heater_and_heater_fan_duty_cycle(duty_cycle):
+        _CUSTOM_PRINT_FUNC("Setting heater and heater fan duty cycle again...")
         time.sleep(0.1)
 
     return True
@@ -41,6 +41,10 @@ import atexit
 _acquire_lockfile()
 atexit.register(_release_lockfile)
 
+# config selects the hardware backend; with HARDWARE_BACKEND == 'sim' it
+# installs the simulated board/busio/serial/gpiod modules, so import it first
+from config import HARDWARE_BACKEND
+
 import board
 import busio
 from flask import Flask
@@ -55,6 +59,17 @@ from rpi_camera         import GH_Camera
 from setpoints          import GH_Setpoints
 from plant_health       import PlantHealthChecker
 from serial_logger      import serial_logger_task
+from telemetry_store    import TelemetryStore
+from i2c_arbiter        import I2CBusArbiter, PRIORITY_CONTROL, PRIORITY_TELEMETRY
+from control_scheduler  import ControlScheduler, WakeEvent
+from temperature_mpc    import FOPDTModel
+from autotune           import AutotuneService
+from irrigation_planner import IrrigationPlanner
+from fertilizer_planner import FertilizerPlanner
+from dli_planner        import DLIPlanner
+from tariff             import Tariff
+from tou_planner        import TOUPlanner
+from energy_meter       import EnergyMeter
 
 import actuator_helpers
 import capture_manager
@@ -70,8 +85,66 @@ from config import (
     ADS1115_LIGHT_CH,
     ADS1115_SOIL_DRY_VAL,
     ADS1115_SOIL_WET_VAL,
+    ADS1115_SCAN_ENABLED,
+    ADS1115_SCAN_DATA_RATE,
+    ADS1115_SCAN_OVERSAMPLE,
+    ADS1115_SCAN_RATE_HZ,
+    ADS1115_SCAN_RING_SIZE,
+    ADS1115_SCAN_MAX_AGE_SCANS,
+    SIGNAL_CONDITIONING,
+    SENSOR_STALE_AFTER_SEC,
+    TELEMETRY_RETENTION_SEC,
+    TELEMETRY_CHANNELS,
     ESP32_I2C_ADDRESS,
     ESP32_ENDIANNESS,
+    ESP32_MIN_DUTY_DELTA,
+    ESP32_REFRESH_SEC,
+    ESP32_BATCH_DUTY_FRAMES,
+    TEMPERATURE_CONTROLLER,
+    MPC_INITIAL_MODEL,
+    MPC_HORIZON_STEPS,
+    MPC_CONTROL_MOVES,
+    MPC_HEATER_POWER_W,
+    MPC_FAN_POWER_W,
+    MPC_ERROR_COST_NIS_C2_HOUR,
+    MPC_REIDENTIFY_SEC,
+    MPC_IDENTIFY_WINDOW_SEC,
+    MPC_MIN_FIT_R2,
+    ELECTRICITY_PRICE_PER_KWH_NIS,
+    AUTOTUNE_OPTIONS,
+    LIGHT_SLOW_SAMPLE_SEC,
+    LIGHT_STEADY_BAND_LUX,
+    LIGHT_STEADY_AFTER_SEC,
+    SOIL_PLANNER_ENABLED,
+    SOIL_PLANNER_MIN_PULSE_SEC,
+    SOIL_PLANNER_PRIOR_DRYING_PCT_H,
+    SOIL_PLANNER_MAX_READ_SEC,
+    SOIL_PLANNER_READ_FRACTION,
+    WATER_DOSE_ML_PER_SEC,
+    FERTILIZER_DOSE_ML_PER_SEC,
+    DOSE_TIME_CAP_FACTOR,
+    DOSE_MIN_COUNTED_FRACTION,
+    FERTILIZER_PLANNER_ENABLED,
+    FERTILIZER_PLANNER_MAX_DOSE_ML,
+    FERTILIZER_PLANNER_SEED_DAYS,
+    DLI_ENABLED,
+    DLI_TARGET_MOL_M2_D,
+    DLI_LUX_TO_PPFD,
+    DLI_PHOTOPERIOD_HOURS,
+    DLI_LED_POWER_W,
+    DLI_LED_LUX_FULL,
+    ELECTRICITY_TOU_BANDS,
+    ELECTRICITY_OFF_PEAK_PRICE_PER_KWH_NIS,
+    TOU_PLANNER_ENABLED,
+    TOU_PEAK_RATIO,
+    TOU_PREHEAT_C,
+    TOU_SETBACK_C,
+    TOU_PREHEAT_HOURS,
+    TOU_MIN_AIR_C,
+    TOU_MAX_AIR_C,
+    ENERGY_METER_ENABLED,
+    ENERGY_METER_SAMPLE_SEC,
+    ENERGY_METER_RATED_W,
     MQTT_HOST, MQTT_PORT, MQTT_USER, MQTT_PASS,
     MONGO_URI, MONGO_DB_NAME,
     AWS_S3_BUCKET, AWS_REGION,
@@ -86,9 +159,11 @@ mongo_db_handler = MongoDBHandler(MONGO_URI, MONGO_DB_NAME)
 # ── Hardware setup ────────────────────────────────────────────────────────────
 
 i2c = busio.I2C(board.SCL, board.SDA)
+# ESP32 and ADS1115 share the bus: actuators queue ahead of ADC conversions
+i2c_arbiter = I2CBusArbiter(i2c)
 fertilizer_flow_sensor_pin = 16
 _CUSTOM_PRINT_FUNC("[STARTUP] Initializing sensors — checking ADS1115 at 0x48...")
-env_sensors = GH_Sensors(i2c, mongo_db_handler=mongo_db_handler)
+env_sensors = GH_Sensors(i2c_arbiter.client(PRIORITY_TELEMETRY), mongo_db_handler=mongo_db_handler)
 if env_sensors._ads_ok:
     _CUSTOM_PRINT_FUNC("[STARTUP] ADS1115 OK — light sensor active.")
 else:
@@ -96,10 +171,21 @@ else:
         "[STARTUP] WARNING: ADS1115 not detected. Light sensor disabled. "
         "Water pump and fertilizer pump are NOT affected — they use the RS485 soil sensor."
     )
+env_sensors.configure_conditioning(SIGNAL_CONDITIONING)
+env_sensors.configure_sensor_health(SENSOR_STALE_AFTER_SEC)
 env_sensors.set_dht22_pin(DHT22_PIN)
 env_sensors.set_soil_moisture_ads1115_channel(ADS1115_SOIL_CH)
 env_sensors.set_light_intensity_ads1115_channel(ADS1115_LIGHT_CH)
 env_sensors.calibrate_soil_moisture_ads1115(ADS1115_SOIL_DRY_VAL, ADS1115_SOIL_WET_VAL)
+if ADS1115_SCAN_ENABLED and env_sensors._ads_ok:
+    env_sensors.start_ads1115_scan(
+        [ADS1115_LIGHT_CH, ADS1115_SOIL_CH],
+        data_rate=ADS1115_SCAN_DATA_RATE,
+        oversample=ADS1115_SCAN_OVERSAMPLE,
+        scan_rate_hz=ADS1115_SCAN_RATE_HZ,
+        ring_size=ADS1115_SCAN_RING_SIZE,
+        max_age_scans=ADS1115_SCAN_MAX_AGE_SCANS,
+    )
 env_sensors.set_soil_sensor_pins()
 env_sensors.set_electricity_sensor_pin()
 try:
@@ -112,7 +198,13 @@ try:
 except OSError as e:
     _CUSTOM_PRINT_FUNC(f"[Warning] Fertilizer flow sensor GPIO busy ({e}) — continuing without it")
 
-env_actuators = GH_Actuators(ESP32_I2C_ADDRESS, i2c, ESP32_ENDIANNESS)
+atexit.register(env_sensors.stop_flow_sensors)
+
+env_actuators = GH_Actuators(
+    ESP32_I2C_ADDRESS, i2c_arbiter.client(PRIORITY_CONTROL), ESP32_ENDIANNESS,
+    min_duty_delta=ESP32_MIN_DUTY_DELTA, refresh_sec=ESP32_REFRESH_SEC,
+    batch_duty_frames=ESP32_BATCH_DUTY_FRAMES,
+)
 setpoints     = GH_Setpoints(mqtt_handler, mongo_db_handler, env_actuators)
 
 
@@ -159,8 +251,8 @@ time.sleep(5)
 
 # ── Explicit pump OFF — safety guarantee on every startup ────────────────────
 _CUSTOM_PRINT_FUNC("[STARTUP] Setting all pumps to OFF (safety init)...")
-env_actuators.set_water_pump_duty_cycle(0)
-env_actuators.set_fertilizer_pump_duty_cycle(0)
+env_actuators.set_water_pump_duty_cycle(0, force=True)
+env_actuators.set_fertilizer_pump_duty_cycle(0, force=True)
 _CUSTOM_PRINT_FUNC("[STARTUP] Water pump OFF. Fertilizer pump OFF.")
 
 # ── MQTT subscriptions / publications ─────────────────────────────────────────
@@ -224,22 +316,23 @@ mongo_db_handler.create_collection("plant_images",   "plant image",  {"_id": "",
 s3_handler          = S3Handler(AWS_S3_BUCKET, AWS_REGION)
 plant_health_checker = PlantHealthChecker()
 camera              = GH_Camera()
+telemetry_store     = TelemetryStore(TELEMETRY_CHANNELS, retention_sec=TELEMETRY_RETENTION_SEC)
 
 # ── Semaphores / events ───────────────────────────────────────────────────────
 
 temperature_semaphore   = threading.Semaphore(1)
-temperature_pause_event = threading.Event()
+temperature_pause_event = WakeEvent()
 temperature_pause_event.set()
 
 light_semaphore   = threading.Semaphore(1)
-light_pause_event = threading.Event()
+light_pause_event = WakeEvent()
 light_pause_event.set()
 
 soil_semaphore   = threading.Semaphore(1)
-soil_pause_event = threading.Event()
+soil_pause_event = WakeEvent()
 soil_pause_event.set()
 
-fertilizer_pause_event = threading.Event()
+fertilizer_pause_event = WakeEvent()
 fertilizer_pause_event.set()
 
 electricity_semaphore   = threading.Semaphore(1)
@@ -248,6 +341,70 @@ electricity_pause_event.set()
 
 water_flow_semaphore = threading.Semaphore(1)
 
+# Temperature, light, soil and fertilizer loops all run on this one scheduler thread
+control_scheduler = ControlScheduler()
+
+
+# Relay autotuning of the PID loops, driven from the API
+autotune_service = AutotuneService(setpoints, mongo_db_handler)
+
+
+# Time-of-use tariff for the energy cost, and the setpoint shaping around its peak bands
+tariff = Tariff(ELECTRICITY_TOU_BANDS, ELECTRICITY_OFF_PEAK_PRICE_PER_KWH_NIS) if ELECTRICITY_TOU_BANDS \
+    else Tariff(off_peak_price=ELECTRICITY_PRICE_PER_KWH_NIS)
+tou_planner = None
+if TOU_PLANNER_ENABLED and ELECTRICITY_TOU_BANDS:
+    tou_planner = TOUPlanner(
+        tariff,
+        peak_ratio=TOU_PEAK_RATIO,
+        preheat_c=TOU_PREHEAT_C,
+        setback_c=TOU_SETBACK_C,
+        preheat_hours=TOU_PREHEAT_HOURS,
+        min_air_c=TOU_MIN_AIR_C,
+        max_air_c=TOU_MAX_AIR_C,
+    )
+
+
+# 1 Hz PZEM sampling split over the actuators by their duty-change power steps
+energy_meter = None
+if ENERGY_METER_ENABLED:
+    def _read_power():
+        electricity_semaphore.acquire()
+        try:
+            voltage, _, power, *_ = env_sensors.get_electricity_values()
+        finally:
+            electricity_semaphore.release()
+        return power if voltage > 0 else None      # a failed read returns all zeros
+
+    energy_meter = EnergyMeter(
+        _read_power,
+        ENERGY_METER_RATED_W,
+        tariff=tariff,
+        sample_sec=ENERGY_METER_SAMPLE_SEC,
+        state_store=mongo_db_handler,
+    )
+    env_actuators.add_change_listener(energy_meter.on_duty_change)
+
+
+# Daily light integral plan for the light loop (None → the light setpoint is held around the clock)
+dli_planner = None
+if DLI_ENABLED:
+    dli_planner = DLIPlanner(
+        target_mol=DLI_TARGET_MOL_M2_D,
+        lux_to_ppfd=DLI_LUX_TO_PPFD,
+        photoperiod=DLI_PHOTOPERIOD_HOURS,
+        led_power_w=DLI_LED_POWER_W,
+        led_lux_full=DLI_LED_LUX_FULL,
+        state_store=mongo_db_handler,
+        tou_planner=tou_planner,
+    )
+
+
+def _wake_control_tasks(field, value):
+    """Setpoint / mode change → run the affected control steps now instead of after their wait."""
+    for task in control_loops.SETPOINT_TASKS.get(field, ()):
+        control_scheduler.wake(task)
+
 # ── Module initialisation ─────────────────────────────────────────────────────
 
 actuator_helpers.init(env_actuators)
@@ -262,6 +419,8 @@ app_loop.init(
     temperature_semaphore, light_semaphore, soil_semaphore,
     electricity_semaphore, water_flow_semaphore,
     resources_interval_hours=RESOURCES_CONSUMPTION_LOG_AND_RESET_INTERVAL,
+    telemetry_store=telemetry_store,
+    tariff=tariff,
 )
 
 # ── Flask application ─────────────────────────────────────────────────────────
@@ -275,6 +434,13 @@ routes.init_routes(
     camera, s3_handler, mongo_db_handler,
     temperature_semaphore, light_semaphore, soil_semaphore,
     electricity_semaphore, water_flow_semaphore,
+    telemetry_store=telemetry_store,
+    i2c_arbiter=i2c_arbiter,
+    control_scheduler=control_scheduler,
+    autotune_service=autotune_service,
+    dli_planner=dli_planner,
+    tou_planner=tou_planner,
+    energy_meter=energy_meter,
 )
 
 
@@ -310,24 +476,83 @@ if __name__ == "__main__":
         ),
     )
 
-    temperature_thread = threading.Thread(
-        target=control_loops.temperature_sp_adjustment_task,
-        args=(env_sensors, env_actuators, setpoints, temperature_semaphore, temperature_pause_event),
-    )
-    light_thread = threading.Thread(
-        target=control_loops.light_sp_adjustment_task,
-        args=(env_sensors, env_actuators, setpoints, light_semaphore, light_pause_event),
+    if TEMPERATURE_CONTROLLER == 'mpc':
+        temperature_step = control_loops.make_temperature_mpc_step(
+            env_sensors, env_actuators, setpoints, temperature_semaphore,
+            FOPDTModel(r2=None, **MPC_INITIAL_MODEL),
+            telemetry_store=telemetry_store,
+            reidentify_sec=MPC_REIDENTIFY_SEC,
+            identify_window_sec=MPC_IDENTIFY_WINDOW_SEC,
+            min_fit_r2=MPC_MIN_FIT_R2,
+            horizon_steps=MPC_HORIZON_STEPS,
+            control_moves=MPC_CONTROL_MOVES,
+            heater_power_w=MPC_HEATER_POWER_W,
+            fan_power_w=MPC_FAN_POWER_W,
+            price_per_kwh=ELECTRICITY_PRICE_PER_KWH_NIS,
+            error_cost_per_c2_hour=MPC_ERROR_COST_NIS_C2_HOUR,
+            tou_planner=tou_planner,
+        )
+    else:
+        temperature_step = control_loops.make_temperature_step(
+            env_sensors, env_actuators, setpoints, temperature_semaphore, tou_planner=tou_planner,
+        )
+    light_step = control_loops.make_light_step(
+        env_sensors, env_actuators, setpoints, light_semaphore,
+        slow_sample_time=LIGHT_SLOW_SAMPLE_SEC,
+        steady_band=LIGHT_STEADY_BAND_LUX,
+        steady_after_sec=LIGHT_STEADY_AFTER_SEC,
+        dli_planner=dli_planner,
     )
-    soil_thread = threading.Thread(
-        target=control_loops.set_soil_moisture_setpoint_task,
-        args=(env_sensors, env_actuators, setpoints, soil_semaphore, soil_pause_event, mongo_db_handler, light_pause_event),
+    if hasattr(temperature_step, 'set_gains'):     # the MPC has no PID gains to tune
+        autotune_service.register_loop('temperature', temperature_step, temperature_pause_event,
+                                       setpoints.get_temperature_setpoint, **AUTOTUNE_OPTIONS['temperature'])
+    autotune_service.register_loop('light', light_step, light_pause_event,
+                                   setpoints.get_light_setpoint, **AUTOTUNE_OPTIONS['light'])
+    autotune_service.load_persisted_gains()
+
+    control_scheduler.add_task('temperature', temperature_step, pause_event=temperature_pause_event)
+    control_scheduler.add_task('light', light_step, pause_event=light_pause_event)
+    irrigation_planner = None
+    if SOIL_PLANNER_ENABLED:
+        irrigation_planner = IrrigationPlanner(
+            min_pulse_sec=SOIL_PLANNER_MIN_PULSE_SEC,
+            prior_drying_pct_h=SOIL_PLANNER_PRIOR_DRYING_PCT_H,
+            max_read_sec=SOIL_PLANNER_MAX_READ_SEC,
+            read_fraction=SOIL_PLANNER_READ_FRACTION,
+        )
+    control_scheduler.add_task(
+        'soil',
+        control_loops.make_soil_moisture_step(env_sensors, env_actuators, setpoints, soil_semaphore, mongo_db_handler,
+                                              light_pause_event, planner=irrigation_planner,
+                                              dose_ml_per_sec=WATER_DOSE_ML_PER_SEC,
+                                              dose_time_factor=DOSE_TIME_CAP_FACTOR,
+                                              dose_min_fraction=DOSE_MIN_COUNTED_FRACTION),
+        pause_event=soil_pause_event,
     )
-    fertilizer_thread = threading.Thread(
-        target=control_loops.fertilizer_pump_control_task,
-        args=(env_sensors, env_actuators, setpoints, soil_semaphore, fertilizer_pause_event, mongo_db_handler),
-        kwargs={'light_pause_event': light_pause_event},
+    fertilizer_planner = None
+    if FERTILIZER_PLANNER_ENABLED and FERTILIZER_DOSE_ML_PER_SEC is not None:
+        fertilizer_planner = FertilizerPlanner(max_dose_ml=FERTILIZER_PLANNER_MAX_DOSE_ML)
+        since = datetime.datetime.now() - datetime.timedelta(days=FERTILIZER_PLANNER_SEED_DAYS)
+        seeded = fertilizer_planner.seed(
+            mongo_db_handler.get_pump_logs(limit=1000, pump_type='fertilizer', since=since),
+            mongo_db_handler.get_sensor_history(since, sensor_ids=['soil_ec']),
+            FERTILIZER_DOSE_ML_PER_SEC,
+        )
+        _CUSTOM_PRINT_FUNC(f"[Fertilizer] Dose planner seeded from {seeded} logged doses.")
+    control_scheduler.add_task(
+        'fertilizer',
+        control_loops.make_fertilizer_step(env_sensors, env_actuators, setpoints, soil_semaphore, mongo_db_handler,
+                                           light_pause_event=light_pause_event, planner=fertilizer_planner,
+                                           dose_ml_per_sec=FERTILIZER_DOSE_ML_PER_SEC,
+                                           dose_time_factor=DOSE_TIME_CAP_FACTOR,
+                                           dose_min_fraction=DOSE_MIN_COUNTED_FRACTION),
+        pause_event=fertilizer_pause_event,
     )
+    setpoints.add_change_listener(_wake_control_tasks)
+    atexit.register(control_scheduler.stop)
+    control_thread = threading.Thread(target=control_scheduler.run)
     app_thread = threading.Thread(target=app_loop.app_task)
+    actuator_state_thread = threading.Thread(target=app_loop.actuator_state_task, daemon=True)
 
     daily_capture_thread = threading.Thread(
         target=capture_manager.daily_capture_task,
@@ -335,20 +560,19 @@ if __name__ == "__main__":
         daemon=True,
     )
 
-    temperature_thread.start()
-    light_thread.start()
-    soil_thread.start()
-    fertilizer_thread.start()
+    control_thread.start()
     app_thread.start()
+    actuator_state_thread.start()
     daily_capture_thread.start()
+    if energy_meter is not None:
+        atexit.register(energy_meter.stop)
+        energy_meter_thread = threading.Thread(target=energy_meter.run, daemon=True)
+        energy_meter_thread.start()
 
     _CUSTOM_PRINT_FUNC("Starting serial logger thread...")
     set_serial_log_enabled(True)
     serial_logger_thread.start()
 
     serial_logger_thread.join()
-    temperature_thread.join()
-    light_thread.join()
-    soil_thread.join()
-    fertilizer_thread.join()
+    control_thread.join()
     app_thread.join()
@@ -1,14 +1,18 @@
 """
 app_loop.py — Main sensor-polling / actuator-logging background loop.
 
-Call init() once at startup, then start a thread targeting app_task().
-get_last_sensor_update() and _sensor_cache / _sensor_cache_lock are exported
-for use by other modules (e.g. routes).
+Call init() once at startup, then start threads targeting app_task() and
+actuator_state_task(). get_last_sensor_update() and _sensor_cache /
+_sensor_cache_lock are exported for use by other modules (e.g. routes).
 """
+import time
+import queue
 import datetime
 import threading
 
 import actuator_helpers
+import loop_timing
+from tariff import Tariff
 from utils.utils import _CUSTOM_PRINT_FUNC
 from config import (
     WATER_PRICE_PER_LITER_NIS,
@@ -32,6 +36,8 @@ _light_sem      = None
 _soil_sem       = None
 _elec_sem       = None
 _wf_sem         = None
+_telemetry      = None
+_tariff         = None
 _resources_interval_hours = 1
 
 # Running resource totals — always growing, saved every 10s, survive restarts
@@ -39,6 +45,33 @@ _total_water_liters      = 0.0
 _total_energy_wh         = 0.0
 _total_fertilizer_liters = 0.0
 
+# Energy and its cost per tariff band: band → [Wh, ₪]. Energy counted before
+# bands were tracked is kept under 'unbanded' at the flat price.
+_energy_by_band          = {}
+
+# Actuator changes reported by GH_Actuators, published by actuator_state_task()
+_actuator_events = queue.Queue()
+
+# GH_Actuators device → (MQTT topic segment, MongoDB actuator name).
+# heater_fan and light_strip_2 always follow heater and light_strip_1.
+_PUBLISHED_ACTUATORS = {
+    'heater':          ('heater',          'heater'),
+    'light_strip_1':   ('light',           'light'),
+    'water_pump':      ('water_pump',      'water pump'),
+    'fertilizer_pump': ('fertilizer_pump', 'fertilizer pump'),
+    'fan':             ('fan',             'fan'),
+}
+
+# app_task() wakes this often to check its 10 s / 1 s / hourly schedules
+APP_LOOP_TICK_SEC = 0.1
+
+# Level changes of one actuator are published at most this often (latest value
+# wins); switching it on or off is published at once
+ACTUATOR_PUBLISH_MIN_INTERVAL_SEC = 1.0
+
+# Sources whose last read failed — logged only when the set changes
+_last_skipped_reads = ()
+
 # Previous sensor readings — used to compute deltas (handles hourly resets cleanly)
 _prev_water_sensor      = 0.0
 _prev_energy_sensor     = 0.0
@@ -48,10 +81,10 @@ _prev_fertilizer_sensor = 0.0
 def init(env_sensors, env_actuators, setpoints, mqtt_handler, mongo_db_handler,
          temperature_semaphore, light_semaphore, soil_semaphore,
          electricity_semaphore, water_flow_semaphore,
-         resources_interval_hours=1):
+         resources_interval_hours=1, telemetry_store=None, tariff=None):
     global _env_sensors, _env_actuators, _setpoints, _mqtt_handler, _mongo_db
     global _temp_sem, _light_sem, _soil_sem, _elec_sem, _wf_sem
-    global _resources_interval_hours
+    global _resources_interval_hours, _telemetry, _tariff
     _env_sensors   = env_sensors
     _env_actuators = env_actuators
     _setpoints     = setpoints
@@ -63,6 +96,87 @@ def init(env_sensors, env_actuators, setpoints, mqtt_handler, mongo_db_handler,
     _elec_sem      = electricity_semaphore
     _wf_sem        = water_flow_semaphore
     _resources_interval_hours = resources_interval_hours
+    _telemetry     = telemetry_store
+    _tariff        = tariff if tariff is not None else Tariff(off_peak_price=ELECTRICITY_PRICE_PER_KWH_NIS)
+    _env_actuators.add_change_listener(_on_actuator_change)
+
+
+def _on_actuator_change(device_name, duty_cycle):
+    # Runs in the thread that wrote to the ESP32 — just queue it
+    if device_name in _PUBLISHED_ACTUATORS:
+        _actuator_events.put((device_name, duty_cycle))
+
+
+def _publish_actuator_state(device_name, duty_cycle):
+    topic, db_name = _PUBLISHED_ACTUATORS[device_name]
+    try:
+        if duty_cycle == 0:
+            _mqtt_handler.publish(f"env_monitoring_system/actuators/{topic}/state", 'Off')
+        else:
+            _mqtt_handler.publish(
+                f"env_monitoring_system/actuators/{topic}/state",
+                f'On at {duty_cycle * 100 / 4095:.2f}%',
+            )
+        _mongo_db.upsert_actuator_data(db_name, duty_cycle)
+    except Exception as e:
+        _CUSTOM_PRINT_FUNC(f"[AppLoop] Error publishing {device_name} state: {e}")
+
+
+def actuator_state_task():
+    """
+    Publish actuator state changes to MQTT and MongoDB as GH_Actuators applies
+    them: on / off at once, level changes (e.g. the 10 Hz light PID) at most
+    every ACTUATOR_PUBLISH_MIN_INTERVAL_SEC per device, latest value wins.
+    """
+    published = {}    # device → (monotonic, duty) of its last publish
+    pending = {}      # device → latest duty held back by the interval
+    while True:
+        timeout = None
+        if pending:
+            due = min(published[d][0] for d in pending) + ACTUATOR_PUBLISH_MIN_INTERVAL_SEC
+            timeout = max(0.0, due - time.monotonic())
+        try:
+            device_name, duty_cycle = _actuator_events.get(timeout=timeout)
+            pending[device_name] = duty_cycle
+            while True:
+                device_name, duty_cycle = _actuator_events.get_nowait()
+                pending[device_name] = duty_cycle
+        except queue.Empty:
+            pass
+        now = time.monotonic()
+        for device_name, duty_cycle in list(pending.items()):
+            last = published.get(device_name)
+            switched = last is None or (duty_cycle == 0) != (last[1] == 0)
+            if not switched and now - last[0] < ACTUATOR_PUBLISH_MIN_INTERVAL_SEC:
+                continue
+            del pending[device_name]
+            if last is not None and duty_cycle == last[1]:
+                continue
+            _publish_actuator_state(device_name, duty_cycle)
+            published[device_name] = (now, duty_cycle)
+
+
+def _raw_sensor_values() -> dict:
+    """Unconditioned driver readings behind the conditioned values in the cache."""
+    raw = {}
+    for channel in ('air_temperature', 'air_humidity', 'light_intensity',
+                    'soil_ph', 'soil_ec', 'soil_humidity', 'soil_temperature'):
+        raw[channel], _ = _env_sensors.get_raw_and_conditioned(channel)
+    return raw
+
+
+def _loggable(source, allow_held=False) -> bool:
+    """
+    True if the source's latest read is a real measurement. A failed read
+    leaves zeros (or the previous value) behind, which must not be logged as data.
+    """
+    quality = _env_sensors.get_sensor_reading(source).quality
+    return quality == 'good' or (allow_held and quality == 'held')
+
+
+def get_telemetry_store():
+    """In-memory recent history (TelemetryStore), or None if not configured."""
+    return _telemetry
 
 
 def get_last_sensor_update():
@@ -79,6 +193,14 @@ def get_total_fertilizer_liters() -> float:
 def get_total_energy_wh() -> float:
     return _total_energy_wh
 
+def get_energy_cost_nis() -> float:
+    return sum(cost for _, cost in _energy_by_band.values())
+
+def get_energy_by_band() -> dict:
+    """{band: {'energy_wh', 'cost_nis'}} since the last resource reset."""
+    return {band: {'energy_wh': round(wh, 3), 'cost_nis': round(cost, 4)}
+            for band, (wh, cost) in _energy_by_band.items()}
+
 def reset_resources():
     """Reset all resource counters to zero — call when starting a new plant cycle."""
     global _total_water_liters, _total_fertilizer_liters, _total_energy_wh
@@ -86,6 +208,7 @@ def reset_resources():
     _total_water_liters      = 0.0
     _total_fertilizer_liters = 0.0
     _total_energy_wh         = 0.0
+    _energy_by_band.clear()
     # Reset the flow sensor hardware counters (total volume) to zero
     _env_sensors.reset_water_amount()
     _env_sensors.reset_fertilizer_amount()
@@ -101,6 +224,7 @@ def reset_resources():
     _mongo_db.upsert_state('total_water_liters',      0.0)
     _mongo_db.upsert_state('total_fertilizer_liters', 0.0)
     _mongo_db.upsert_state('total_energy_wh',         0.0)
+    _mongo_db.upsert_state('energy_by_band',          {})
     # Clear all historical logs for the new plant cycle
     _mongo_db.clear_collection('sensors_data')
     _mongo_db.clear_collection('actuators_data')
@@ -125,6 +249,7 @@ def app_task():
     global last_sensor_update
     global _total_water_liters, _total_energy_wh, _total_fertilizer_liters
     global _prev_water_sensor, _prev_energy_sensor, _prev_fertilizer_sensor
+    global _last_skipped_reads
 
     last_sensor_update    = datetime.datetime.now() - datetime.timedelta(seconds=10)
     last_actuators_update = datetime.datetime.now() - datetime.timedelta(seconds=1)
@@ -139,6 +264,13 @@ def app_task():
     saved = _mongo_db.get_state('total_fertilizer_liters')
     if saved is not None:
         _total_fertilizer_liters = float(saved)
+    saved = _mongo_db.get_state('energy_by_band')
+    if isinstance(saved, dict):
+        _energy_by_band.update({band: [float(wh), float(cost)] for band, (wh, cost) in saved.items()})
+    unbanded = _total_energy_wh - sum(wh for wh, _ in _energy_by_band.values())
+    if unbanded > 0.001:
+        wh, cost = _energy_by_band.get('unbanded', [0.0, 0.0])
+        _energy_by_band['unbanded'] = [wh + unbanded, cost + unbanded / 1000.0 * ELECTRICITY_PRICE_PER_KWH_NIS]
 
     # Snapshot sensor values at startup — used to avoid double-counting
     # (sensors may have resumed from their own saved state)
@@ -180,156 +312,208 @@ def app_task():
             f"Last resources reset and log time was : {last_resources_reset_and_log}"
         )
 
-    prev_light_duty_cycle      = 0.0
-    prev_heater_duty_cycle     = 0.0
-    prev_heater_fan_duty_cycle = 0.0
-    prev_fan_duty_cycle        = 0.0
-    prev_water_pump_duty_cycle = 0.0
-    prev_fertilizer_pump_duty_cycle = 0.0
-
+    timer = loop_timing.register('app', APP_LOOP_TICK_SEC)
+    next_tick = time.monotonic()
     while True:
+      timer.begin(next_tick)
       try:
         # ── Sensor reads every 10 s ───────────────────────────────────────────
         if (datetime.datetime.now() - last_sensor_update).total_seconds() > 10:
             # Defaults so cache update never fails on a partial read
             air_temp_c = air_temp_f = air_humidity = 0.0
             light_intensity = 0.0
+            light_read = False
             soil_ph = soil_ec = soil_humidity = soil_temp = 0.0
             voltage = current = power = energy = frequency = power_factor = 0.0
             alarm = False
 
-            _temp_sem.acquire()
-            try:
-                air_temp_c   = _env_sensors.get_air_temperature_C()
-                air_temp_f   = _env_sensors.get_air_temperature_F()
-                air_humidity = _env_sensors.get_air_humidity()
-            except Exception as e:
-                _CUSTOM_PRINT_FUNC(f"[AppLoop] Error reading temperature: {e}")
-            finally:
-                _temp_sem.release()
-
-            _light_sem.acquire()
-            try:
-                light_intensity = _env_sensors.get_light_intensity()
-            except Exception as e:
-                _CUSTOM_PRINT_FUNC(f"[AppLoop] Error reading light: {e}")
-            finally:
-                _light_sem.release()
-
-            _soil_sem.acquire()
-            try:
-                soil_ph, soil_ec, soil_humidity, soil_temp = _env_sensors.get_soil_values()
-            except Exception as e:
-                _CUSTOM_PRINT_FUNC(f"[AppLoop] Error reading soil: {e}")
-            finally:
-                _soil_sem.release()
-
-            _elec_sem.acquire()
-            try:
-                voltage, current, power, energy, frequency, power_factor, alarm = (
-                    _env_sensors.get_electricity_values()
+            with loop_timing.phase('read'):
+                _temp_sem.acquire()
+                try:
+                    air_temp_c, air_humidity = _env_sensors.get_air_values_conditioned()
+                    air_temp_f   = air_temp_c * (9.0/5.0) + 32.0
+                except Exception as e:
+                    _CUSTOM_PRINT_FUNC(f"[AppLoop] Error reading temperature: {e}")
+                finally:
+                    _temp_sem.release()
+
+                _light_sem.acquire()
+                try:
+                    light_intensity = _env_sensors.get_light_intensity_conditioned()
+                    light_read = True
+                except Exception as e:
+                    _CUSTOM_PRINT_FUNC(f"[AppLoop] Error reading light: {e}")
+                finally:
+                    _light_sem.release()
+
+                _soil_sem.acquire()
+                try:
+                    soil_ph, soil_ec, soil_humidity, soil_temp = _env_sensors.get_soil_values_conditioned()
+                except Exception as e:
+                    _CUSTOM_PRINT_FUNC(f"[AppLoop] Error reading soil: {e}")
+                finally:
+                    _soil_sem.release()
+
+                _elec_sem.acquire()
+                try:
+                    voltage, current, power, energy, frequency, power_factor, alarm = (
+                        _env_sensors.get_electricity_values()
+                    )
+                except Exception as e:
+                    _CUSTOM_PRINT_FUNC(f"[AppLoop] Error reading electricity: {e}")
+                finally:
+                    _elec_sem.release()
+
+            with loop_timing.phase('compute'):
+                air_ok   = _loggable('air', allow_held=True)      # DHT22 getters serve the last good sample
+                # A raised read leaves 0.0 behind; a held one still returned the last good value
+                light_ok = light_read and _loggable('light', allow_held=True)
+                soil_ok  = _loggable('soil')
+                elec_ok  = _loggable('electricity')
+                if not elec_ok:
+                    # A failed PZEM read returns zeros — hold the last good values and
+                    # the energy snapshot so recovery doesn't count the whole meter again
+                    elec = _env_sensors.get_sensor_reading('electricity')
+                    if elec.quality == 'held':
+                        voltage, current, power, _, frequency, power_factor, alarm = elec.value
+                    energy = _prev_energy_sensor
+
+            with loop_timing.phase('write'):
+                # MQTT publish — sensors
+                _mqtt_handler.publish("env_monitoring_system/sensors/air_temperature_C", air_temp_c)
+                _mqtt_handler.publish("env_monitoring_system/sensors/air_humidity",      air_humidity)
+                _mqtt_handler.publish("env_monitoring_system/sensors/light_intensity",   light_intensity)
+                _mqtt_handler.publish("env_monitoring_system/sensors/soil_ph",           soil_ph)
+                _mqtt_handler.publish("env_monitoring_system/sensors/soil_ec",           soil_ec)
+                _mqtt_handler.publish("env_monitoring_system/sensors/soil_temp",         soil_temp)
+                _mqtt_handler.publish("env_monitoring_system/sensors/soil_humidity",     soil_humidity)
+                _mqtt_handler.publish("env_monitoring_system/sensors/voltage",           voltage)
+                _mqtt_handler.publish("env_monitoring_system/sensors/current",           current)
+                _mqtt_handler.publish("env_monitoring_system/resources/energy",          energy)
+                _mqtt_handler.publish(
+                    "env_monitoring_system/resources/water_amount",
+                    _env_sensors.get_total_water_amount(),
                 )
-            except Exception as e:
-                _CUSTOM_PRINT_FUNC(f"[AppLoop] Error reading electricity: {e}")
-            finally:
-                _elec_sem.release()
 
-            # MQTT publish — sensors
-            _mqtt_handler.publish("env_monitoring_system/sensors/air_temperature_C", air_temp_c)
-            _mqtt_handler.publish("env_monitoring_system/sensors/air_humidity",      air_humidity)
-            _mqtt_handler.publish("env_monitoring_system/sensors/light_intensity",   light_intensity)
-            _mqtt_handler.publish("env_monitoring_system/sensors/soil_ph",           soil_ph)
-            _mqtt_handler.publish("env_monitoring_system/sensors/soil_ec",           soil_ec)
-            _mqtt_handler.publish("env_monitoring_system/sensors/soil_temp",         soil_temp)
-            _mqtt_handler.publish("env_monitoring_system/sensors/soil_humidity",     soil_humidity)
-            _mqtt_handler.publish("env_monitoring_system/sensors/voltage",           voltage)
-            _mqtt_handler.publish("env_monitoring_system/sensors/current",           current)
-            _mqtt_handler.publish("env_monitoring_system/resources/energy",          energy)
-            _mqtt_handler.publish(
-                "env_monitoring_system/resources/water_amount",
-                _env_sensors.get_total_water_amount(),
-            )
-
-            # MongoDB insert — sensors
-            _mongo_db.insert_sensor_data("air temp",        air_temp_c)
-            _mongo_db.insert_sensor_data("air humidity",    air_humidity)
-            _mongo_db.insert_sensor_data("light intensity", light_intensity)
-            _mongo_db.insert_sensor_data("soil ph",         soil_ph)
-            _mongo_db.insert_sensor_data("soil ec",         soil_ec)
-            _mongo_db.insert_sensor_data("soil temp",       soil_temp)
-            _mongo_db.insert_sensor_data("soil humidity",   soil_humidity)
+                # MongoDB insert — sensors (only real measurements, never failed-read defaults)
+                if air_ok:
+                    _mongo_db.insert_sensor_data("air temp",        air_temp_c)
+                    _mongo_db.insert_sensor_data("air humidity",    air_humidity)
+                if light_ok:
+                    _mongo_db.insert_sensor_data("light intensity", light_intensity)
+                if soil_ok:
+                    _mongo_db.insert_sensor_data("soil ph",         soil_ph)
+                    _mongo_db.insert_sensor_data("soil ec",         soil_ec)
+                    _mongo_db.insert_sensor_data("soil temp",       soil_temp)
+                    _mongo_db.insert_sensor_data("soil humidity",   soil_humidity)
+                skipped = tuple(name for name, ok in (('air', air_ok), ('light', light_ok),
+                                                      ('soil', soil_ok), ('electricity', elec_ok)) if not ok)
+                if skipped != _last_skipped_reads:
+                    _CUSTOM_PRINT_FUNC(
+                        f"[AppLoop] Not logging failed reads: {', '.join(skipped)}" if skipped
+                        else "[AppLoop] All sensor reads healthy again"
+                    )
+                    _last_skipped_reads = skipped
 
             last_sensor_update = datetime.datetime.now()
 
             # Water flow / fertilizer flow reads
-            _wf = _ff = _wa = _fa = 0.0
-            _wf_sem.acquire()
-            try:
-                _wf = _env_sensors.get_water_flow_rate()
-                _wa = _env_sensors.get_total_water_amount()
-                _ff = _env_sensors.get_fertilizer_flow_rate()
-                _fa = _env_sensors.get_total_fertilizer_amount()
-            except Exception as e:
-                _CUSTOM_PRINT_FUNC(f"[AppLoop] Error reading flow sensors: {e}")
-            finally:
-                _wf_sem.release()
-
-            # Delta-based accumulation
-            delta_water      = max(0.0, _wa  - _prev_water_sensor)
-            delta_energy     = max(0.0, energy - _prev_energy_sensor)
-            delta_fertilizer = max(0.0, _fa  - _prev_fertilizer_sensor)
-
-            _total_water_liters      = round(_total_water_liters      + delta_water,      4)
-            _total_energy_wh         = round(_total_energy_wh         + delta_energy,     4)
-            _total_fertilizer_liters = round(_total_fertilizer_liters + delta_fertilizer, 4)
-
-            _prev_water_sensor      = _wa
-            _prev_energy_sensor     = energy
-            _prev_fertilizer_sensor = _fa
-
-            water_cost_nis = round(_total_water_liters      * WATER_PRICE_PER_LITER_NIS,                4)
-            elec_cost_nis  = round((_total_energy_wh / 1000.0) * ELECTRICITY_PRICE_PER_KWH_NIS,         4)
-            fert_cost_nis  = round((_total_fertilizer_liters / 5.0) * FERTILIZER_PRICE_PER_5_LITERS_NIS, 4)
-            total_cost_nis = round(water_cost_nis + elec_cost_nis + fert_cost_nis,                      4)
-
-            # Update sensor cache FIRST — before any MQTT/MongoDB that could fail
-            with _sensor_cache_lock:
-                _sensor_cache.update({
-                    'air_temperature':      air_temp_c,
-                    'air_humidity':         air_humidity,
-                    'light_intensity':      light_intensity,
-                    'soil_ph':              soil_ph,
-                    'soil_ec':              soil_ec,
-                    'soil_humidity':        soil_humidity,
-                    'soil_temperature':     soil_temp,
-                    'water_flow':           _wf,
-                    'water_amount':         _total_water_liters,
-                    'fertilizer_flow':      _ff,
-                    'fertilizer_amount':    _total_fertilizer_liters,
-                    'voltage':              voltage,
-                    'current':              current,
-                    'power':                power,
-                    'energy':               _total_energy_wh,
-                    'frequency':            frequency,
-                    'power_factor':         power_factor,
-                    'water_cost_nis':       water_cost_nis,
-                    'electricity_cost_nis': elec_cost_nis,
-                    'fertilizer_cost_nis':  fert_cost_nis,
-                    'total_cost_nis':       total_cost_nis,
-                })
-
-            _mqtt_handler.publish("env_monitoring_system/sensors/fertilizer_flow",     _ff)
-            _mqtt_handler.publish("env_monitoring_system/resources/fertilizer_amount", _fa)
-
-            # Save totals to system_state every 10s — survives any restart
-            _mongo_db.upsert_state('total_water_liters',      _total_water_liters)
-            _mongo_db.upsert_state('total_energy_wh',         _total_energy_wh)
-            _mongo_db.upsert_state('total_fertilizer_liters', _total_fertilizer_liters)
-
-            # Upsert resources collection (1 doc per resource, updated live)
-            _mongo_db.upsert_resource_data("water consumption",      _total_water_liters,      cost_nis=water_cost_nis)
-            _mongo_db.upsert_resource_data("energy consumption",     _total_energy_wh,         cost_nis=elec_cost_nis)
-            _mongo_db.upsert_resource_data("fertilizer consumption", _total_fertilizer_liters, cost_nis=fert_cost_nis)
+            with loop_timing.phase('read'):
+                _wf = _ff = _wa = _fa = 0.0
+                _wf_sem.acquire()
+                try:
+                    _wf = _env_sensors.get_water_flow_rate()
+                    _wa = _env_sensors.get_total_water_amount()
+                    _ff = _env_sensors.get_fertilizer_flow_rate()
+                    _fa = _env_sensors.get_total_fertilizer_amount()
+                except Exception as e:
+                    _CUSTOM_PRINT_FUNC(f"[AppLoop] Error reading flow sensors: {e}")
+                finally:
+                    _wf_sem.release()
+
+            with loop_timing.phase('compute'):
+                # Delta-based accumulation
+                delta_water      = max(0.0, _wa  - _prev_water_sensor)
+                delta_energy     = max(0.0, energy - _prev_energy_sensor)
+                delta_fertilizer = max(0.0, _fa  - _prev_fertilizer_sensor)
+
+                _total_water_liters      = round(_total_water_liters      + delta_water,      4)
+                _total_energy_wh         = round(_total_energy_wh         + delta_energy,     4)
+                _total_fertilizer_liters = round(_total_fertilizer_liters + delta_fertilizer, 4)
+
+                # Each 10 s of energy is priced at the tariff band it was drawn in
+                if delta_energy > 0:
+                    band, price = _tariff.band_at(datetime.datetime.now())
+                    wh, cost = _energy_by_band.get(band, [0.0, 0.0])
+                    _energy_by_band[band] = [wh + delta_energy, cost + delta_energy / 1000.0 * price]
+
+                _prev_water_sensor      = _wa
+                _prev_energy_sensor     = energy
+                _prev_fertilizer_sensor = _fa
+
+                water_cost_nis = round(_total_water_liters      * WATER_PRICE_PER_LITER_NIS,                4)
+                elec_cost_nis  = round(get_energy_cost_nis(),                                              4)
+                fert_cost_nis  = round((_total_fertilizer_liters / 5.0) * FERTILIZER_PRICE_PER_5_LITERS_NIS, 4)
+                total_cost_nis = round(water_cost_nis + elec_cost_nis + fert_cost_nis,                      4)
+
+                # Update sensor cache FIRST — before any MQTT/MongoDB that could fail
+                with _sensor_cache_lock:
+                    _sensor_cache.update({
+                        'air_temperature':      air_temp_c,
+                        'air_humidity':         air_humidity,
+                        'light_intensity':      light_intensity,
+                        'soil_ph':              soil_ph,
+                        'soil_ec':              soil_ec,
+                        'soil_humidity':        soil_humidity,
+                        'soil_temperature':     soil_temp,
+                        'water_flow':           _wf,
+                        'water_amount':         _total_water_liters,
+                        'fertilizer_flow':      _ff,
+                        'fertilizer_amount':    _total_fertilizer_liters,
+                        'voltage':              voltage,
+                        'current':              current,
+                        'power':                power,
+                        'energy':               _total_energy_wh,
+                        'frequency':            frequency,
+                        'power_factor':         power_factor,
+                        'water_cost_nis':       water_cost_nis,
+                        'electricity_cost_nis': elec_cost_nis,
+                        'fertilizer_cost_nis':  fert_cost_nis,
+                        'total_cost_nis':       total_cost_nis,
+                        'raw':                  _raw_sensor_values(),
+                        'sensor_quality':       {
+                            source: _env_sensors.get_sensor_reading(source).quality
+                            for source in ('air', 'light', 'soil', 'electricity')
+                        },
+                    })
+
+            with loop_timing.phase('write'):
+                if _telemetry is not None:
+                    samples = {'fertilizer_flow': _ff}
+                    if air_ok:
+                        samples.update(air_temperature=air_temp_c, air_humidity=air_humidity)
+                    if light_ok:
+                        samples.update(light_intensity=light_intensity)
+                    if soil_ok:
+                        samples.update(soil_ph=soil_ph, soil_ec=soil_ec,
+                                       soil_humidity=soil_humidity, soil_temperature=soil_temp)
+                    if elec_ok:
+                        samples.update(voltage=voltage, current=current, power=power)
+                    _telemetry.append_many(samples)
+
+                _mqtt_handler.publish("env_monitoring_system/sensors/fertilizer_flow",     _ff)
+                _mqtt_handler.publish("env_monitoring_system/resources/fertilizer_amount", _fa)
+
+                # Save totals to system_state every 10s — survives any restart
+                _mongo_db.upsert_state('total_water_liters',      _total_water_liters)
+                _mongo_db.upsert_state('total_energy_wh',         _total_energy_wh)
+                _mongo_db.upsert_state('total_fertilizer_liters', _total_fertilizer_liters)
+                _mongo_db.upsert_state('energy_by_band',          {band: list(v) for band, v in _energy_by_band.items()})
+
+                # Upsert resources collection (1 doc per resource, updated live)
+                _mongo_db.upsert_resource_data("water consumption",      _total_water_liters,      cost_nis=water_cost_nis)
+                _mongo_db.upsert_resource_data("energy consumption",     _total_energy_wh,         cost_nis=elec_cost_nis)
+                _mongo_db.upsert_resource_data("fertilizer consumption", _total_fertilizer_liters, cost_nis=fert_cost_nis)
 
         # ── Sensor reset every N hours ────────────────────────────────────────
         # Totals are already saved every 10s, so just reset the hardware counters.
@@ -361,93 +545,42 @@ def app_task():
 
             _CUSTOM_PRINT_FUNC("[Resources] Sensor reset done — totals preserved in system_state")
 
-        # ── Actuator state publish every 1 s ─────────────────────────────────
+        # ── Manual values, water flow and duty-cycle history every 1 s ───────
+        # (actuator state changes are published by actuator_state_task)
         if (datetime.datetime.now() - last_actuators_update).total_seconds() > 1:
             last_actuators_update = datetime.datetime.now()
 
             if _setpoints.get_operation_mode() == 'manual':
-                actuator_helpers.set_actuators_manual_values()
+                with loop_timing.phase('write'):
+                    actuator_helpers.set_actuators_manual_values()
 
-            _wf_sem.acquire()
-            try:
-                water_flow = _env_sensors.get_water_flow_rate()
+            with loop_timing.phase('read'):
+                _wf_sem.acquire()
+                try:
+                    water_flow = _env_sensors.get_water_flow_rate()
+                finally:
+                    _wf_sem.release()
+
+            with loop_timing.phase('write'):
                 _mongo_db.insert_sensor_data("water flow", water_flow)
                 _mqtt_handler.publish(
                     "env_monitoring_system/sensors/water_flow", water_flow
                 )
-            finally:
-                _wf_sem.release()
-
-            heater_duty_cycle      = _env_actuators.get_heater_duty_cycle()
-            light_duty_cycle       = _env_actuators.get_light_strip_1_duty_cycle()
-            water_pump_duty_cycle  = _env_actuators.get_water_pump_duty_cycle()
-            fertilizer_pump_duty_cycle = _env_actuators.get_fertilizer_pump_duty_cycle()
-            fan_duty_cycle         = _env_actuators.get_fan_duty_cycle()
-
-            if heater_duty_cycle != prev_heater_duty_cycle:
-                prev_heater_duty_cycle = heater_duty_cycle
-                if heater_duty_cycle == 0:
-                    _mqtt_handler.publish(
-                        "env_monitoring_system/actuators/heater/state", 'Off'
-                    )
-                else:
-                    _mqtt_handler.publish(
-                        "env_monitoring_system/actuators/heater/state",
-                        f'On at {heater_duty_cycle * 100 / 4095:.2f}%',
-                    )
-                _mongo_db.upsert_actuator_data("heater", heater_duty_cycle)
-
-            if light_duty_cycle != prev_light_duty_cycle:
-                prev_light_duty_cycle = light_duty_cycle
-                if light_duty_cycle == 0:
-                    _mqtt_handler.publish(
-                        "env_monitoring_system/actuators/light/state", 'Off'
-                    )
-                else:
-                    _mqtt_handler.publish(
-                        "env_monitoring_system/actuators/light/state",
-                        f'On at {light_duty_cycle * 100 / 4095:.2f}%',
-                    )
-                _mongo_db.upsert_actuator_data("light", light_duty_cycle)
-
-            if water_pump_duty_cycle != prev_water_pump_duty_cycle:
-                prev_water_pump_duty_cycle = water_pump_duty_cycle
-                if water_pump_duty_cycle == 0:
-                    _mqtt_handler.publish(
-                        "env_monitoring_system/actuators/water_pump/state", 'Off'
-                    )
-                else:
-                    _mqtt_handler.publish(
-                        "env_monitoring_system/actuators/water_pump/state",
-                        f'On at {water_pump_duty_cycle * 100 / 4095:.2f}%',
-                    )
-                _mongo_db.upsert_actuator_data("water pump", water_pump_duty_cycle)
-
-            if fertilizer_pump_duty_cycle != prev_fertilizer_pump_duty_cycle:
-                prev_fertilizer_pump_duty_cycle = fertilizer_pump_duty_cycle
-                if fertilizer_pump_duty_cycle == 0:
-                    _mqtt_handler.publish(
-                        "env_monitoring_system/actuators/fertilizer_pump/state", 'Off'
-                    )
-                else:
-                    _mqtt_handler.publish(
-                        "env_monitoring_system/actuators/fertilizer_pump/state",
-                        f'On at {fertilizer_pump_duty_cycle * 100 / 4095:.2f}%',
-                    )
-                _mongo_db.upsert_actuator_data("fertilizer pump", fertilizer_pump_duty_cycle)
 
-            if fan_duty_cycle != prev_fan_duty_cycle:
-                prev_fan_duty_cycle = fan_duty_cycle
-                if fan_duty_cycle == 0:
-                    _mqtt_handler.publish(
-                        "env_monitoring_system/actuators/fan/state", 'Off'
-                    )
-                else:
-                    _mqtt_handler.publish(
-                        "env_monitoring_system/actuators/fan/state",
-                        f'On at {fan_duty_cycle * 100 / 4095:.2f}%',
-                    )
-                _mongo_db.upsert_actuator_data("fan", fan_duty_cycle)
+                if _telemetry is not None:
+                    _telemetry.append_many({
+                        'water_flow':         water_flow,
+                        'heater_dc':          _env_actuators.get_heater_duty_cycle(),
+                        'light_dc':           _env_actuators.get_light_strip_1_duty_cycle(),
+                        'fan_dc':             _env_actuators.get_fan_duty_cycle(),
+                        'water_pump_dc':      _env_actuators.get_water_pump_duty_cycle(),
+                        'fertilizer_pump_dc': _env_actuators.get_fertilizer_pump_duty_cycle(),
+                    })
 
       except Exception as e:
           _CUSTOM_PRINT_FUNC(f"[AppLoop] Cycle error (will retry): {e}")
+
+      timer.end()
+      # Anchored to the schedule; after an overrun, carry on from now
+      next_tick = max(next_tick + APP_LOOP_TICK_SEC, time.monotonic())
+      time.sleep(max(0.0, next_tick - time.monotonic()))
@@ -0,0 +1,243 @@
+"""
+autotune.py — Relay-feedback (Åström–Hägglund) PID autotuning in the running app.
+
+AutotuneService pauses a control loop through its pause event, drives the
+loop's own actuator path with a relay around the setpoint, and measures the
+limit cycle that results:
+
+    relay amplitude d  = (high - low) / 2        (PID output units)
+    oscillation  a     = half the PV peak-to-peak
+    Ku = 4d / (π · sqrt(a² - ε²))                ε = relay hysteresis
+    Pu = oscillation period
+
+Gains follow the Ziegler–Nichols closed-loop rule already used by
+tests/PID-tuning/ziegler_nichols_autotuner_simple_pid.py
+(Kp = 0.6 Ku, Ki = 1.2 Ku / Pu, Kd = 0.075 Ku Pu).
+
+The experiment aborts — actuators off, loop resumed — when the PV leaves its
+safety band, the sensor keeps failing, the time limit runs out, the operation
+mode changes or cancel() is called. Progress is kept as a numbered event list
+so the API can stream it. Results are only applied (and persisted to
+system_state) when apply() is called.
+"""
+import math
+import time
+import threading
+from collections import deque
+
+from utils.utils import _CUSTOM_PRINT_FUNC
+
+# Consecutive failed reads that abort an experiment
+MAX_READ_FAILURES = 5
+# Progress events kept for streaming
+MAX_EVENTS = 2000
+
+
+class AutotuneService:
+    def __init__(self, setpoints, mongo_db_handler=None):
+        self.__setpoints = setpoints
+        self.__mongo_db = mongo_db_handler
+        self.__loops = {}
+        self.__cond = threading.Condition()
+        self.__events = deque(maxlen=MAX_EVENTS)
+        self.__seq = 0
+        self.__thread = None
+        self.__cancel = threading.Event()
+        self.__state = 'idle'         # idle | running | done | aborted | failed
+        self.__active = None
+        self.__results = {}
+
+    # ── Registration / persistence ──────────────────────────────────────────
+    def register_loop(self, name, step, pause_event, setpoint_getter, **relay_options):
+        """
+        Make a PID step tunable. step must expose read / actuate / set_gains /
+        get_gains (control_loops._expose_pid). relay_options: high, low,
+        hysteresis, cycles, max_duration_sec, pv_min, pv_max.
+        """
+        self.__loops[name] = {
+            'step': step,
+            'pause_event': pause_event,
+            'setpoint': setpoint_getter,
+            'options': relay_options,
+        }
+
+    def load_persisted_gains(self):
+        """Apply gains saved by an earlier apply(); call once at startup."""
+        if self.__mongo_db is None:
+            return
+        for name, loop in self.__loops.items():
+            try:
+                saved = self.__mongo_db.get_state(f'pid_gains_{name}')
+            except Exception as e:
+                _CUSTOM_PRINT_FUNC(f"[Autotune] Could not load {name} gains: {e}")
+                continue
+            if saved:
+                loop['step'].set_gains(float(saved['kp']), float(saved['ki']), float(saved['kd']))
+                _CUSTOM_PRINT_FUNC(f"[Autotune] Loaded persisted {name} gains: {saved}")
+
+    # ── Progress events ─────────────────────────────────────────────────────
+    def __emit(self, kind, **data):
+        with self.__cond:
+            self.__seq += 1
+            self.__events.append({'seq': self.__seq, 'time': time.time(), 'event': kind, **data})
+            self.__cond.notify_all()
+        if kind != 'sample':
+            _CUSTOM_PRINT_FUNC(f"[Autotune] {kind}: {data}")
+
+    def wait_events(self, after_seq=0, timeout=15.0) -> list:
+        """Events newer than after_seq; blocks up to timeout while there are none and a run is active."""
+        with self.__cond:
+            if self.__seq <= after_seq and self.__state == 'running':
+                self.__cond.wait(timeout)
+            return [e for e in self.__events if e['seq'] > after_seq]
+
+    # ── Control ─────────────────────────────────────────────────────────────
+    def start(self, name, setpoint=None, **overrides):
+        """Start an experiment on a registered loop. Returns (ok, message)."""
+        loop = self.__loops.get(name)
+        if loop is None:
+            return False, f"unknown loop '{name}' (tunable: {', '.join(self.__loops)})"
+        with self.__cond:
+            if self.__state == 'running':
+                return False, f"autotune of '{self.__active}' already running"
+            if not loop['pause_event'].is_set():
+                return False, f"{name} loop is paused (manual mode?) — autotune needs it running"
+            options = {**loop['options'], **overrides}
+            options['setpoint'] = float(setpoint if setpoint is not None else loop['setpoint']())
+            self.__state = 'running'
+            self.__active = name
+            self.__cancel.clear()
+        self.__thread = threading.Thread(target=self.__run, args=(name, loop, options), daemon=True)
+        self.__thread.start()
+        return True, f"autotune of '{name}' started"
+
+    def cancel(self):
+        self.__cancel.set()
+
+    def apply(self, name):
+        """Apply the last successful result for a loop and persist it. Returns (ok, message)."""
+        result = self.__results.get(name)
+        loop = self.__loops.get(name)
+        if loop is None or result is None:
+            return False, f"no autotune result for '{name}'"
+        gains = result['gains']
+        loop['step'].set_gains(gains['kp'], gains['ki'], gains['kd'])
+        if self.__mongo_db is not None:
+            self.__mongo_db.upsert_state(f'pid_gains_{name}', gains)
+        self.__emit('applied', loop=name, gains=gains)
+        return True, gains
+
+    def get_status(self) -> dict:
+        with self.__cond:
+            return {
+                'state':   self.__state,
+                'loop':    self.__active,
+                'last_seq': self.__seq,
+                'results': dict(self.__results),
+                'gains':   {name: loop['step'].get_gains() for name, loop in self.__loops.items()},
+            }
+
+    # ── Experiment ──────────────────────────────────────────────────────────
+    def __abort_reason(self, options, mode, pause_event, pv, started, read_failures):
+        if self.__cancel.is_set():
+            return 'cancelled'
+        if pause_event.is_set():
+            # e.g. the end of a soil pump pulse or camera capture resumes the light loop
+            return 'loop resumed by another task'
+        if self.__setpoints.get_operation_mode() != mode:
+            return 'operation mode changed'
+        if read_failures >= MAX_READ_FAILURES:
+            return f'{read_failures} consecutive sensor read failures'
+        if pv is not None and not options['pv_min'] <= pv <= options['pv_max']:
+            return f"PV {pv:.2f} outside safety band {options['pv_min']}–{options['pv_max']}"
+        if time.monotonic() - started > options['max_duration_sec']:
+            return f"no stable oscillation within {options['max_duration_sec']}s"
+        return None
+
+    def __run(self, name, loop, options):
+        step, pause_event = loop['step'], loop['pause_event']
+        mode = self.__setpoints.get_operation_mode()
+        sp, eps = options['setpoint'], options['hysteresis']
+        high, low, cycles = options['high'], options['low'], options['cycles']
+
+        pause_event.clear()
+        # Let a step that was already dispatched finish before taking over the actuators
+        time.sleep(min(step.sample_time, 1.0))
+        self.__emit('started', loop=name, **options)
+
+        started = time.monotonic()
+        output = high
+        switches = []            # monotonic times of low → high switches
+        extremes = []            # (max, min) of each completed cycle
+        cycle_max, cycle_min = -math.inf, math.inf
+        read_failures = 0
+        result, reason = None, None
+        try:
+            step.actuate(output)
+            while True:
+                t_sample = time.monotonic()
+                pv = step.read()
+                read_failures = 0 if pv is not None else read_failures + 1
+                reason = self.__abort_reason(options, mode, pause_event, pv, started, read_failures)
+                if reason:
+                    break
+                if pv is not None:
+                    cycle_max, cycle_min = max(cycle_max, pv), min(cycle_min, pv)
+                    if output == high and pv > sp + eps:
+                        output = low
+                        step.actuate(output)
+                    elif output == low and pv < sp - eps:
+                        output = high
+                        step.actuate(output)
+                        switches.append(t_sample)
+                        if len(switches) >= 2:
+                            extremes.append((cycle_max, cycle_min))
+                            self.__emit('cycle', loop=name, cycle=len(extremes),
+                                        period_sec=round(switches[-1] - switches[-2], 2),
+                                        amplitude=round((cycle_max - cycle_min) / 2, 3))
+                        cycle_max, cycle_min = pv, pv
+                    self.__emit('sample', loop=name, pv=round(pv, 3), output=output)
+                # The first cycle is transient; keep going until `cycles` more are in
+                if len(extremes) > cycles:
+                    result = self.__compute(options, switches, extremes[1:])
+                    break
+                self.__cancel.wait(max(0.0, step.sample_time - (time.monotonic() - t_sample)))
+        except Exception as e:
+            reason = f'error: {e}'
+        finally:
+            try:
+                step.actuate(0)
+            except Exception as e:
+                _CUSTOM_PRINT_FUNC(f"[Autotune] WARNING: could not switch {name} actuators off: {e}")
+            if self.__setpoints.get_operation_mode() == mode and not pause_event.is_set():
+                pause_event.set()
+
+        # State and final event change together, so a streaming client never sees one without the other
+        with self.__cond:
+            if result is not None:
+                self.__results[name] = result
+                self.__state = 'done'
+                self.__emit('done', loop=name, **result)
+            else:
+                self.__state = 'failed' if reason and reason.startswith('error') else 'aborted'
+                self.__emit('aborted', loop=name, reason=reason)
+
+    @staticmethod
+    def __compute(options, switches, extremes):
+        periods = [b - a for a, b in zip(switches, switches[1:])][-len(extremes):]
+        pu = sum(periods) / len(periods)
+        a = sum((mx - mn) / 2 for mx, mn in extremes) / len(extremes)
+        d = (options['high'] - options['low']) / 2
+        eps = options['hysteresis']
+        ku = 4 * d / (math.pi * math.sqrt(a * a - eps * eps)) if a > eps else 4 * d / (math.pi * a)
+        return {
+            'ku': round(ku, 6),
+            'pu_sec': round(pu, 3),
+            'amplitude': round(a, 4),
+            'gains': {
+                'kp': round(0.6 * ku, 6),
+                'ki': round(1.2 * ku / pu, 6),
+                'kd': round(0.075 * ku * pu, 6),
+            },
+            'finished_at': time.time(),
+        }
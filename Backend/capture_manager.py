@@ -52,22 +52,16 @@ def _toggle_flash_light(state=1):
         if _prev_light_dc > 0:
             if _setpoints.get_operation_mode() == "autonomous":
                 _light_pause_event.clear()  # Pause light PID thread
-            while not _env_actuators.set_light_strip_1_duty_cycle(0):
-                _CUSTOM_PRINT_FUNC("Turning off light strip 1 for capture...")
-                time.sleep(0.1)
-            while not _env_actuators.set_light_strip_2_duty_cycle(0):
-                _CUSTOM_PRINT_FUNC("Turning off light strip 2 for capture...")
+            while not _env_actuators.set_light_strips_duty_cycle(0):
+                _CUSTOM_PRINT_FUNC("Turning off light strips for capture...")
                 time.sleep(0.1)
             _CUSTOM_PRINT_FUNC(f"[Capture] Light was at {_prev_light_dc} → turned OFF for capture")
         else:
             _CUSTOM_PRINT_FUNC("[Capture] Light already off — no change before capture")
     else:
         # Restore light to exactly what it was before the capture
-        while not _env_actuators.set_light_strip_1_duty_cycle(_prev_light_dc):
-            _CUSTOM_PRINT_FUNC("Restoring light strip 1 to previous state...")
-            time.sleep(0.1)
-        while not _env_actuators.set_light_strip_2_duty_cycle(_prev_light_dc):
-            _CUSTOM_PRINT_FUNC("Restoring light strip 2 to previous state...")
+        while not _env_actuators.set_light_strips_duty_cycle(_prev_light_dc):
+            _CUSTOM_PRINT_FUNC("Restoring light strips to previous state...")
             time.sleep(0.1)
         if _setpoints.get_operation_mode() == "autonomous":
             _light_pause_event.set()  # Resume light PID thread
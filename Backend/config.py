@@ -3,6 +3,20 @@ config.py — All constants and hardware configuration for PlantMind AI.
 Change values here to affect the whole application.
 """
 import os
+
+# ── Hardware backend ──────────────────────────────────────────────────────────
+# 'pi'  — real Raspberry Pi peripherals
+# 'sim' — simulated rig (simulation/hardware.py): fake I2C/UART/GPIO devices
+#         driven by a greenhouse physics model, so the app runs on any Linux box
+HARDWARE_BACKEND      = os.environ.get('PLANTMIND_HARDWARE', 'pi')
+SIM_SEED              = int(os.environ['PLANTMIND_SIM_SEED']) if os.environ.get('PLANTMIND_SIM_SEED') else None
+SIM_DHT22_FAILURE_RATE = 0.1
+
+if HARDWARE_BACKEND == 'sim':
+    # Must run before anything imports board / busio / serial / gpiod
+    from simulation.hardware import install as _install_simulated_hardware
+    _install_simulated_hardware(seed=SIM_SEED, dht22_failure_rate=SIM_DHT22_FAILURE_RATE)
+
 import board
 
 # ── Timing intervals ──────────────────────────────────────────────────────────
@@ -18,10 +32,169 @@ ADS1115_LIGHT_CH        = 1
 ADS1115_SOIL_DRY_VAL    = 18000
 ADS1115_SOIL_WET_VAL    = 7000
 
+# ── ADS1115 scan mode ─────────────────────────────────────────────────────────
+ADS1115_SCAN_ENABLED       = True
+ADS1115_SCAN_DATA_RATE     = 860     # samples per second (ADS1115 max)
+ADS1115_SCAN_OVERSAMPLE    = 4       # conversions per channel visit, median-filtered
+ADS1115_SCAN_RATE_HZ       = 20.0    # channel round-robin rate (2x the light PID rate)
+ADS1115_SCAN_RING_SIZE     = 8       # filtered samples kept per channel
+ADS1115_SCAN_MAX_AGE_SCANS = 5       # unscanned for longer → reads raise instead of serving a frozen value
+
+# ── Sensor signal conditioning ────────────────────────────────────────────────
+# Per channel: Hampel window / n_sigmas / min_mad (robust-deviation floor, in
+# sensor units), EMA alpha, max rate of change (units/s, None = off) and the
+# minimum spacing between samples that advance the filters (s).
+SIGNAL_CONDITIONING = {
+    'air_temperature':  {'window': 7, 'n_sigmas': 3.0, 'min_mad': 0.2,  'ema_alpha': 0.5, 'max_rate': 0.05, 'min_dt': 2.0},
+    'air_humidity':     {'window': 7, 'n_sigmas': 3.0, 'min_mad': 1.0,  'ema_alpha': 0.5, 'max_rate': 0.5,  'min_dt': 2.0},
+    'light_intensity':  {'window': 5, 'n_sigmas': 5.0, 'min_mad': 5.0,  'ema_alpha': 0.6, 'max_rate': None, 'min_dt': 0.05},
+    'soil_ph':          {'window': 5, 'n_sigmas': 3.0, 'min_mad': 0.1,  'ema_alpha': 0.5, 'max_rate': None, 'min_dt': 1.0},
+    'soil_ec':          {'window': 5, 'n_sigmas': 3.0, 'min_mad': 20.0, 'ema_alpha': 0.5, 'max_rate': None, 'min_dt': 1.0},
+    'soil_humidity':    {'window': 5, 'n_sigmas': 3.0, 'min_mad': 1.0,  'ema_alpha': 0.5, 'max_rate': None, 'min_dt': 1.0},
+    'soil_temperature': {'window': 5, 'n_sigmas': 3.0, 'min_mad': 0.2,  'ema_alpha': 0.5, 'max_rate': None, 'min_dt': 1.0},
+}
+
+# ── Sensor health ─────────────────────────────────────────────────────────────
+# A source's last good value counts as stale after this many seconds
+SENSOR_STALE_AFTER_SEC = {
+    'air':               30.0,    # DHT22 backs off up to 30 s after failures
+    'soil':              60.0,
+    'electricity':       60.0,
+    'light':             5.0,
+    'soil_moisture_ads': 30.0,
+}
+
+# ── In-memory telemetry history ───────────────────────────────────────────────
+# Ring buffers sized for TELEMETRY_RETENTION_SEC at each channel's sample
+# period (s). 24 h of all channels below is roughly 10 MB.
+TELEMETRY_RETENTION_SEC = 24 * 3600
+TELEMETRY_CHANNELS = {
+    'air_temperature':  10.0,
+    'air_humidity':     10.0,
+    'light_intensity':  10.0,
+    'soil_ph':          10.0,
+    'soil_ec':          10.0,
+    'soil_humidity':    10.0,
+    'soil_temperature': 10.0,
+    'voltage':          10.0,
+    'current':          10.0,
+    'power':            10.0,
+    'water_flow':       1.0,
+    'fertilizer_flow':  10.0,
+    'heater_dc':        1.0,
+    'light_dc':         1.0,
+    'fan_dc':           1.0,
+    'water_pump_dc':    1.0,
+    'fertilizer_pump_dc': 1.0,
+}
+
+# ── Temperature controller ────────────────────────────────────────────────────
+# 'pid' — heater / fan PID with a 1 °C deadband
+# 'mpc' — model-predictive split-range control (temperature_mpc.py)
+TEMPERATURE_CONTROLLER = os.environ.get('PLANTMIND_TEMPERATURE_CONTROLLER', 'pid')
+
+# Starting FOPDT model for the MPC, replaced by fits from the telemetry history:
+# °C at full heater / fan duty, time constant (s), dead time (s), ambient (°C)
+MPC_INITIAL_MODEL          = {'k_heat': 20.0, 'k_cool': -8.0, 'tau_sec': 3600.0, 'dead_sec': 30.0, 'ambient_c': 20.0}
+MPC_HORIZON_STEPS          = 90       # x 10 s = 15 min
+MPC_CONTROL_MOVES          = 6        # move blocks across the horizon
+MPC_HEATER_POWER_W         = 154.0    # heater + heater fan at full duty
+MPC_FAN_POWER_W            = 4.0
+MPC_ERROR_COST_NIS_C2_HOUR = 0.5      # cost of 1 °C error held for an hour
+MPC_REIDENTIFY_SEC         = 3600
+MPC_IDENTIFY_WINDOW_SEC    = 6 * 3600
+MPC_MIN_FIT_R2             = 0.9
+
+# ── PID relay autotune (autotune.py) ──────────────────────────────────────────
+# Relay outputs are in each PID's output units (temperature: -1..1, light: duty).
+# The experiment aborts if the PV leaves [pv_min, pv_max] or runs past max_duration_sec.
+AUTOTUNE_OPTIONS = {
+    'temperature': {'high': 0.6, 'low': -0.6, 'hysteresis': 0.2, 'cycles': 3,
+                    'max_duration_sec': 4 * 3600, 'pv_min': 12.0, 'pv_max': 32.0},
+    'light':       {'high': 3000, 'low': 0, 'hysteresis': 15.0, 'cycles': 4,
+                    'max_duration_sec': 300, 'pv_min': 0.0, 'pv_max': 5000.0},
+}
+
+# ── Light PID adaptive sample rate ────────────────────────────────────────────
+# Once the lux error has stayed within ±LIGHT_STEADY_BAND_LUX for
+# LIGHT_STEADY_AFTER_SEC the light loop samples every LIGHT_SLOW_SAMPLE_SEC
+# instead of every 0.1 s; it goes back to 0.1 s on a disturbance or setpoint
+# change. LIGHT_SLOW_SAMPLE_SEC = None keeps the fixed 10 Hz rate.
+LIGHT_SLOW_SAMPLE_SEC  = 1.0
+LIGHT_STEADY_BAND_LUX  = 20.0
+LIGHT_STEADY_AFTER_SEC = 30.0
+
+# ── Predictive irrigation ─────────────────────────────────────────────────────
+# With SOIL_PLANNER_ENABLED the soil loop pulses below (soil moisture setpoint
+# − hysteresis), sizes each pulse to reach the setpoint and schedules its reads
+# from the learned drying rate (irrigation_planner.py). False keeps the fixed
+# moisture bands. The pump caps in control_loops.py apply either way. Check
+# with tests/irrigation_planner_check.py before enabling it.
+# SOIL_PLANNER_PRIOR_DRYING_PCT_H holds the drying rate fit while every pulse
+# is the same length; the reads take over as soon as they can.
+SOIL_PLANNER_ENABLED            = False
+SOIL_PLANNER_MIN_PULSE_SEC      = 0.5
+SOIL_PLANNER_PRIOR_DRYING_PCT_H = 0.5
+SOIL_PLANNER_MAX_READ_SEC       = 1800     # longest gap between soil loop reads
+SOIL_PLANNER_READ_FRACTION      = 0.7      # read at this fraction of the predicted time to the trigger
+
+# ── Volumetric dosing ─────────────────────────────────────────────────────────
+# Nominal flow (mL/s) of each pump at its control-loop duty cycle. When set, a
+# pulse of N s is dosed as N × this many mL counted on the pump's YF-S201 flow
+# sensor, so the volume does not depend on supply pressure; the pump stops at
+# DOSE_TIME_CAP_FACTOR × N s (never above the loop's hard cap) if the target is
+# not reached. A sensor that has counted less than DOSE_MIN_COUNTED_FRACTION of
+# the dose by N s is not trusted and the pump stops at N s. Measure each pump
+# on the rig with tests/test_water_pump_and_sensor.py (L/min ÷ 0.06) before
+# setting it — the YF-S201 needs ≥ 1 L/min to count reliably.
+# None → timed pulses.
+WATER_DOSE_ML_PER_SEC      = None     # water pump at duty 1800
+FERTILIZER_DOSE_ML_PER_SEC = None     # fertilizer pump at duty 2662
+DOSE_TIME_CAP_FACTOR       = 2.0
+DOSE_MIN_COUNTED_FRACTION  = 0.5
+
+# ── Model-based EC dosing ─────────────────────────────────────────────────────
+# With FERTILIZER_PLANNER_ENABLED the fertilizer loop learns the EC rise per mL
+# of fertilizer (seeded from pump_logs and the soil EC history at start-up),
+# doses what it needs to reach its EC target and probes the EC every few
+# minutes after a dose until it settles (fertilizer_planner.py). Needs
+# FERTILIZER_DOSE_ML_PER_SEC: its mL/µS gain is only as good as that flow, so
+# enable it once the fertilizer pump has been measured on the rig.
+# False keeps the fixed EC bands and hourly checks.
+FERTILIZER_PLANNER_ENABLED     = False
+FERTILIZER_PLANNER_MAX_DOSE_ML = 10.0      # per dose; the 2 s pump cap applies too
+FERTILIZER_PLANNER_SEED_DAYS   = 14        # pump_logs / EC history used for the initial gain
+
+# ── Daily light integral ──────────────────────────────────────────────────────
+# With DLI_ENABLED the light setpoint is a ceiling: the light loop lights only
+# what the day still needs to reach DLI_TARGET_MOL_M2_D, inside the photoperiod,
+# counting the daylight the sensor has measured (dli_planner.py). Savings are
+# reported under /api/resources. The default target is the current 600 lux held
+# for 16 h; lettuce wants 12–17 mol/m²/day under a calibrated PAR sensor.
+DLI_ENABLED            = True
+DLI_TARGET_MOL_M2_D    = 0.64
+DLI_LUX_TO_PPFD        = 0.0185       # µmol/m²/s per lux (sunlight; white LEDs ~0.015–0.019)
+DLI_PHOTOPERIOD_HOURS  = (5.0, 23.0)  # local time; lights stay off outside
+DLI_LED_POWER_W        = 48.0         # both light strips at full duty
+DLI_LED_LUX_FULL       = 600.0        # lux both strips add at full duty, at the sensor
+
 # ── ESP32 I2C ─────────────────────────────────────────────────────────────────
 ESP32_I2C_ADDRESS  = 0x30
 ESP32_ENDIANNESS   = 'big'
 
+# Duty-cycle writes that would not change a channel are not sent: a write is skipped
+# when it is within ESP32_MIN_DUTY_DELTA of the last confirmed value (full off/on always
+# go out), unless that confirmation is older than ESP32_REFRESH_SEC.
+ESP32_MIN_DUTY_DELTA = 8      # counts of 4095 (~0.2 %)
+ESP32_REFRESH_SEC    = 30.0
+
+# Send updates to several channels (both light strips, heater + heater fan) as one
+# JOB_SET_DUTY_MULTI frame. Needs firmware that handles job 7 — no firmware in this
+# repo does yet (only the simulator), and the ESP32 does not acknowledge frames, so a
+# dropped job 7 frame would still be confirmed in the shadow state. Switching off is
+# always sent as one JOB_SET_DUTY frame per channel, batched or not.
+ESP32_BATCH_DUTY_FRAMES = False
+
 # ── MQTT (HiveMQ cloud) ───────────────────────────────────────────────────────
 MQTT_HOST = "114fcbcf879e4e88a21d9f0bd7ab1ccc.s1.eu.hivemq.cloud"
 MQTT_PORT = 8883
@@ -40,3 +213,48 @@ AWS_REGION    = os.environ.get('AWS_REGION', 'eu-west-1')
 WATER_PRICE_PER_LITER_NIS         = 0.00851  # 8.51 ₪/m³ low domestic tariff → ₪/L
 ELECTRICITY_PRICE_PER_KWH_NIS     = 0.6432   # ₪/kWh including VAT
 FERTILIZER_PRICE_PER_5_LITERS_NIS = 1.0      # ₪ per 5 litres of fertilizer solution
+
+# ── Time-of-use electricity tariff (tariff.py) ────────────────────────────────
+# Energy is priced per band: the first band whose months, weekdays (0 = Monday)
+# and local hours [start, end) match sets the price, any other time is
+# off-peak. Rates are ₪/kWh including VAT — copy them from the supplier's
+# current TOU table. [] → every kWh at ELECTRICITY_PRICE_PER_KWH_NIS, which
+# stays the flat reference price (MPC energy cost, DLI savings, backtests).
+_SUN_TO_THU = (6, 0, 1, 2, 3)
+ELECTRICITY_TOU_BANDS = [
+    {'name': 'peak', 'price': 1.6931, 'months': (6, 7, 8, 9),      'days': _SUN_TO_THU, 'hours': (17, 23)},
+    {'name': 'peak', 'price': 1.2103, 'months': (12, 1, 2),                             'hours': (17, 22)},
+    {'name': 'peak', 'price': 0.4993, 'months': (3, 4, 5, 10, 11), 'days': _SUN_TO_THU, 'hours': (17, 22)},
+]
+ELECTRICITY_OFF_PEAK_PRICE_PER_KWH_NIS = 0.4565
+
+# With TOU_PLANNER_ENABLED the temperature loop heats to setpoint +
+# TOU_PREHEAT_C for TOU_PREHEAT_HOURS before a band priced at least
+# TOU_PEAK_RATIO × off-peak and holds setpoint − TOU_SETBACK_C inside it; the
+# DLI plan lights ahead of the band and only what is still missing inside it
+# (tou_planner.py). The setpoints account for the loop's deadband, so the air
+# is regulated within [TOU_MIN_AIR_C, TOU_MAX_AIR_C]; if it still falls 0.5 °C
+# below TOU_MIN_AIR_C the setback ends for the rest of the band. A long
+# pre-heat loses more heat than it shifts. Backtest with tests/tou_backtest.py.
+TOU_PLANNER_ENABLED = True
+TOU_PEAK_RATIO      = 1.5
+TOU_PREHEAT_C       = 1.0
+TOU_SETBACK_C       = 1.0
+TOU_PREHEAT_HOURS   = 0.5
+TOU_MIN_AIR_C       = 19.5
+TOU_MAX_AIR_C       = 26.0
+
+# ── Per-actuator energy (energy_meter.py) ─────────────────────────────────────
+# The PZEM power is sampled every ENERGY_METER_SAMPLE_SEC and its energy split
+# over the actuators with power models fitted from the steps at duty changes.
+# ENERGY_METER_RATED_W (W at full duty) is where each model starts; the
+# pumps are mostly pulsed too briefly to fit, so theirs usually stands.
+ENERGY_METER_ENABLED    = True
+ENERGY_METER_SAMPLE_SEC = 1.0
+ENERGY_METER_RATED_W    = {
+    'heater':          MPC_HEATER_POWER_W,
+    'lights':          DLI_LED_POWER_W,
+    'fan':             MPC_FAN_POWER_W,
+    'water_pump':      12.0,
+    'fertilizer_pump': 12.0,
+}
@@ -1,19 +1,87 @@
 """
-control_loops.py — PID and hysteresis control loop thread functions.
+control_loops.py — PID and hysteresis control loop steps.
 
-Each function is designed to run as a daemon thread target.
+Each make_*_step() function builds one control loop and returns its step:
+a callable that runs a single cycle and returns the delay (s) until the
+next one. The steps are run by control_scheduler.ControlScheduler.
 All dependencies are passed as arguments so the functions are self-contained.
+Each step marks its sensor read / compute / actuator write phases with
+loop_timing.phase() so /api/debug/loops shows where the cycle goes.
+
+The PID steps also expose read(), actuate(output), get_gains() and
+set_gains(kp, ki, kd), so the autotune service can drive the same sensor and
+actuator path with the loop paused and retune it without a restart.
+
+Time comes from the clock (and, in the pump steps, sleep) arguments, so
+simulation/replay.py can run the same steps on a virtual clock.
+
+A step may be woken early (setpoint or mode change). Safety waits — soil
+absorb time, fertilizer settle time, sensor-failure locks — are therefore
+kept as state inside the step, not as the scheduling delay, so an early
+wake re-evaluates but never fires a pump sooner than allowed.
 """
 import time
 import datetime
 from simple_pid import PID
+
+import loop_timing
+from temperature_mpc import TemperatureMPC, identify_from_telemetry
 from utils.utils import _CUSTOM_PRINT_FUNC
 
+# Setpoint / mode fields (GH_Setpoints change events) → scheduler tasks to wake
+SETPOINT_TASKS = {
+    'temperature':     ('temperature',),
+    'light':           ('light',),
+    'soil_moisture':   ('soil',),
+    'soil_hysteresis': ('soil',),
+    'soil_ec':         ('fertilizer',),
+    'soil_ph':         ('fertilizer',),
+    'operation_mode':  ('temperature', 'light', 'soil', 'fertilizer'),
+}
 
-def temperature_sp_adjustment_task(
-    env_sensors, env_actuators, setpoints,
-    temperature_semaphore, temperature_pause_event,
-):
+
+def _expose_pid(step, pid, read, actuate, set_gains, sample_time, output_limits):
+    """Attach the autotune hooks of a PID step."""
+    step.read = read
+    step.actuate = actuate
+    step.set_gains = set_gains
+    step.get_gains = lambda: dict(zip(('kp', 'ki', 'kd'), pid.tunings))
+    step.sample_time = sample_time
+    step.output_limits = output_limits
+
+
+# Stop reasons of a volumetric dose whose counted volume is not trusted: the
+# pump ran the timed pulse, so the dose is taken as nominal
+UNTRUSTED_FLOW = ('no_flow', 'low_flow')
+
+
+def _hold_for_volume(read_volume, start_l, target_l, nominal_sec, cap_sec, clock, sleep, min_fraction=0.5,
+                     poll_sec=0.05):
+    """
+    Keep a running pump on until the flow sensor has counted target_l litres
+    since start_l, or cap_sec passes. A sensor that has counted nothing
+    ('no_flow') or less than min_fraction of the target ('low_flow') by
+    nominal_sec (the timed pulse for the same dose) is not trusted to extend
+    the pulse. Returns (on_sec, stop_reason).
+    """
+    start = clock()
+    while True:
+        elapsed = clock() - start
+        delivered = read_volume() - start_l
+        if delivered >= target_l:
+            return elapsed, 'volume'
+        if elapsed >= cap_sec:
+            return elapsed, 'time_cap'
+        if elapsed >= nominal_sec and delivered < target_l * min_fraction:
+            return elapsed, 'no_flow' if delivered <= 0 else 'low_flow'
+        sleep(min(poll_sec, cap_sec - elapsed))
+
+
+def make_temperature_step(env_sensors, env_actuators, setpoints, temperature_semaphore,
+                          deadband=1.0, tou_planner=None, clock=time.monotonic):
+    # With a tou_planner.TOUPlanner the setpoint is raised ahead of expensive
+    # tariff bands and lowered inside them (pre-heat / setback), within the
+    # planner's comfort bounds on the measured air temperature.
     # PID controller parameters - easily tunable
     KP_TEMP = 1034.05  # Proportional gain
     KI_TEMP = 1.52     # Integral gain
@@ -21,92 +89,215 @@ def temperature_sp_adjustment_task(
 
     OUTPUT_LIMITS = (-1, 1)
     SAMPLE_TIME   = 10
-    DEADBAND      = 1.0  # °C
+    DEADBAND      = deadband  # °C — heater and fan both off while the error is inside it
 
     # Actuator power limits
     MIN_POWER  = 500
     MAX_POWER  = 4095
     POWER_RANGE = MAX_POWER - MIN_POWER
 
+    # The scheduler paces the calls; sample_time=None lets a woken step compute at once
     temperature_pid = PID(
         KP_TEMP, KI_TEMP, KD_TEMP,
         setpoint=0,
-        sample_time=SAMPLE_TIME,
+        sample_time=None,
         output_limits=OUTPUT_LIMITS,
+        time_fn=clock,
     )
     temperature_pid.proportional_on_measurement = False
 
-    while True:
-        temperature_pause_event.wait()
+    def _read():
+        """Conditioned air temperature, or None if the read failed."""
+        with loop_timing.phase('read'):
+            try:
+                temperature_semaphore.acquire()
+                current_temp, _ = env_sensors.get_air_values_conditioned()
+                return current_temp
+            except Exception as e:
+                _CUSTOM_PRINT_FUNC(f"[TEMP] Error reading temperature: {e}")
+                return None
+            finally:
+                temperature_semaphore.release()
+
+    def _actuate(control_output):
+        """PID output in -1..1 → heater (> 0), fan (< 0) or all off."""
+        if control_output > 0:  # HEATING
+            heat_power_scaled = control_output
+            heater_duty_cycle = int(MIN_POWER + (POWER_RANGE * heat_power_scaled))
+            heater_duty_cycle = max(MIN_POWER, min(MAX_POWER, heater_duty_cycle))
+            _CUSTOM_PRINT_FUNC(f"[TEMP] HEATING → heater duty={heater_duty_cycle}")
+            with loop_timing.phase('write'):
+                heater_ok = env_actuators.set_heater_and_heater_fan_duty_cycle(heater_duty_cycle)
+                env_actuators.set_fan_duty_cycle(0)
+            if not heater_ok:
+                _CUSTOM_PRINT_FUNC("[TEMP] WARNING: heater / heater fan set failed")
+
+        elif control_output < 0:  # COOLING
+            cool_power_scaled = abs(control_output)
+            fan_duty_cycle = int(MIN_POWER + (POWER_RANGE * cool_power_scaled))
+            fan_duty_cycle = max(MIN_POWER, min(MAX_POWER, fan_duty_cycle))
+            _CUSTOM_PRINT_FUNC(f"[TEMP] COOLING → fan duty={fan_duty_cycle}")
+            with loop_timing.phase('write'):
+                env_actuators.set_heater_and_heater_fan_duty_cycle(0)
+                fan_ok = env_actuators.set_fan_duty_cycle(fan_duty_cycle)
+            if not fan_ok:
+                _CUSTOM_PRINT_FUNC("[TEMP] WARNING: fan set failed")
+
+        else:  # IDLE
+            _CUSTOM_PRINT_FUNC("[TEMP] IDLE — all actuators OFF")
+            with loop_timing.phase('write'):
+                env_actuators.set_heater_and_heater_fan_duty_cycle(0)
+                env_actuators.set_fan_duty_cycle(0)
+
+    def step():
         _CUSTOM_PRINT_FUNC(f"[TEMP] Mode={setpoints.get_operation_mode()} | PID loop running")
 
+        current_temp = _read()
+        if current_temp is None:
+            return SAMPLE_TIME
+
         temperature_set_point = setpoints.get_temperature_setpoint()
+        if tou_planner is not None:
+            temperature_set_point = tou_planner.temperature_setpoint(temperature_set_point, current_temp, DEADBAND)
         temperature_pid.setpoint = temperature_set_point
 
-        try:
-            temperature_semaphore.acquire()
-            current_temp = env_sensors.get_air_temperature_C()
-        except Exception as e:
-            _CUSTOM_PRINT_FUNC(f"[TEMP] Error reading temperature: {e}")
-            continue
-        finally:
-            temperature_semaphore.release()
-
         _CUSTOM_PRINT_FUNC(
             f"[TEMP] Temp={current_temp:.2f}°C  Setpoint={temperature_set_point:.2f}°C"
             f"  Error={temperature_set_point - current_temp:.2f}"
         )
 
-        raw_output = temperature_pid(current_temp)
+        with loop_timing.phase('compute'):
+            raw_output = temperature_pid(current_temp)
 
-        # Anti-windup
-        if (raw_output >= OUTPUT_LIMITS[1] and (temperature_set_point - current_temp) > 0) or \
-           (raw_output <= OUTPUT_LIMITS[0] and (temperature_set_point - current_temp) < 0):
-            temperature_pid._integral -= (temperature_set_point - current_temp) * KI_TEMP * SAMPLE_TIME
+            # Anti-windup
+            if (raw_output >= OUTPUT_LIMITS[1] and (temperature_set_point - current_temp) > 0) or \
+               (raw_output <= OUTPUT_LIMITS[0] and (temperature_set_point - current_temp) < 0):
+                temperature_pid._integral -= (temperature_set_point - current_temp) * temperature_pid.Ki * SAMPLE_TIME
 
-        control_output = raw_output
-        if abs(temperature_set_point - current_temp) < DEADBAND:
-            control_output = 0
+            control_output = raw_output
+            if abs(temperature_set_point - current_temp) < DEADBAND:
+                control_output = 0
 
         _CUSTOM_PRINT_FUNC(
             f"[TEMP] PID output={control_output:.4f}"
             f"  Action={'HEATING' if control_output > 0 else 'COOLING' if control_output < 0 else 'IDLE'}"
         )
 
-        if control_output > 0:  # HEATING
-            heat_power_scaled = control_output
-            heater_duty_cycle = int(MIN_POWER + (POWER_RANGE * heat_power_scaled))
-            heater_duty_cycle = max(MIN_POWER, min(MAX_POWER, heater_duty_cycle))
-            _CUSTOM_PRINT_FUNC(f"[TEMP] HEATING → heater duty={heater_duty_cycle}")
-            if not env_actuators.set_heater_duty_cycle(heater_duty_cycle):
-                _CUSTOM_PRINT_FUNC("[TEMP] WARNING: heater set failed")
-            if not env_actuators.set_heater_fan_duty_cycle(heater_duty_cycle):
-                _CUSTOM_PRINT_FUNC("[TEMP] WARNING: heater fan set failed")
-            env_actuators.set_fan_duty_cycle(0)
+        _actuate(control_output)
+        return SAMPLE_TIME
 
-        elif control_output < 0:  # COOLING
-            cool_power_scaled = abs(control_output)
-            fan_duty_cycle = int(MIN_POWER + (POWER_RANGE * cool_power_scaled))
-            fan_duty_cycle = max(MIN_POWER, min(MAX_POWER, fan_duty_cycle))
-            _CUSTOM_PRINT_FUNC(f"[TEMP] COOLING → fan duty={fan_duty_cycle}")
-            env_actuators.set_heater_duty_cycle(0)
-            env_actuators.set_heater_fan_duty_cycle(0)
-            if not env_actuators.set_fan_duty_cycle(fan_duty_cycle):
-                _CUSTOM_PRINT_FUNC("[TEMP] WARNING: fan set failed")
+    def set_gains(kp, ki, kd):
+        temperature_pid.tunings = (kp, ki, kd)
+        temperature_pid.reset()
 
-        else:  # IDLE
-            _CUSTOM_PRINT_FUNC("[TEMP] IDLE — all actuators OFF")
-            env_actuators.set_heater_duty_cycle(0)
-            env_actuators.set_heater_fan_duty_cycle(0)
-            env_actuators.set_fan_duty_cycle(0)
+    _expose_pid(step, temperature_pid, _read, _actuate, set_gains, SAMPLE_TIME, OUTPUT_LIMITS)
+    if tou_planner is not None:
+        step.get_stats = lambda: {'tou': tou_planner.get_stats()}
+    return step
 
-        time.sleep(SAMPLE_TIME)
 
+def make_temperature_mpc_step(
+    env_sensors, env_actuators, setpoints, temperature_semaphore,
+    model, telemetry_store=None, reidentify_sec=3600, identify_window_sec=6 * 3600,
+    min_fit_r2=0.9, tou_planner=None, clock=time.monotonic, **mpc_options,
+):
+    """
+    Model-predictive alternative to make_temperature_step (see temperature_mpc.py).
 
-def light_sp_adjustment_task(
-    env_sensors, env_actuators, setpoints,
-    light_semaphore, light_pause_event,
+    Starts from `model` and, with a telemetry store, re-identifies the FOPDT
+    model from the last identify_window_sec of history every reidentify_sec,
+    keeping the new fit only if its R² reaches min_fit_r2. A tou_planner
+    shapes the setpoint around expensive tariff bands, as in the PID step.
+    """
+    SAMPLE_TIME = 10
+
+    # Actuator power limits — below MIN_POWER the heater / fan does nothing useful
+    MIN_POWER = 500
+    MAX_POWER = 4095
+
+    mpc = TemperatureMPC(model, dt_sec=SAMPLE_TIME, **mpc_options)
+    next_identify = clock() + reidentify_sec
+
+    def _duty(fraction):
+        duty = int(fraction * MAX_POWER)
+        if duty < MIN_POWER // 2:
+            return 0
+        return max(MIN_POWER, min(MAX_POWER, duty))
+
+    def _reidentify():
+        nonlocal next_identify
+        next_identify = clock() + reidentify_sec
+        fitted = identify_from_telemetry(telemetry_store, identify_window_sec, SAMPLE_TIME, default=mpc.model)
+        if fitted is None or fitted.r2 is None or fitted.r2 < min_fit_r2:
+            _CUSTOM_PRINT_FUNC(f"[TEMP] MPC model not re-identified (fit={fitted}) — keeping {mpc.model}")
+            return
+        _CUSTOM_PRINT_FUNC(f"[TEMP] MPC model re-identified: {fitted}")
+        mpc.set_model(fitted)
+
+    def step():
+        _CUSTOM_PRINT_FUNC(f"[TEMP] Mode={setpoints.get_operation_mode()} | MPC loop running")
+
+        with loop_timing.phase('read'):
+            try:
+                temperature_semaphore.acquire()
+                current_temp, _ = env_sensors.get_air_values_conditioned()
+            except Exception as e:
+                _CUSTOM_PRINT_FUNC(f"[TEMP] Error reading temperature: {e}")
+                return SAMPLE_TIME
+            finally:
+                temperature_semaphore.release()
+
+        temperature_set_point = setpoints.get_temperature_setpoint()
+        if tou_planner is not None:
+            temperature_set_point = tou_planner.temperature_setpoint(temperature_set_point, current_temp)
+
+        with loop_timing.phase('compute'):
+            if telemetry_store is not None and clock() >= next_identify:
+                _reidentify()
+            heater, fan = mpc.step(current_temp, temperature_set_point)
+            heater_duty_cycle, fan_duty_cycle = _duty(heater), _duty(fan)
+
+        _CUSTOM_PRINT_FUNC(
+            f"[TEMP] Temp={current_temp:.2f}°C  Setpoint={temperature_set_point:.2f}°C"
+            f"  heater duty={heater_duty_cycle}  fan duty={fan_duty_cycle}"
+        )
+
+        with loop_timing.phase('write'):
+            heater_ok = env_actuators.set_heater_and_heater_fan_duty_cycle(heater_duty_cycle)
+            fan_ok = env_actuators.set_fan_duty_cycle(fan_duty_cycle)
+        if not heater_ok:
+            _CUSTOM_PRINT_FUNC("[TEMP] WARNING: heater / heater fan set failed")
+        if not fan_ok:
+            _CUSTOM_PRINT_FUNC("[TEMP] WARNING: fan set failed")
+
+        return SAMPLE_TIME
+
+    if tou_planner is not None:
+        step.get_stats = lambda: {**mpc.get_stats(), 'tou': tou_planner.get_stats()}
+    else:
+        step.get_stats = mpc.get_stats
+    return step
+
+
+def make_light_step(
+    env_sensors, env_actuators, setpoints, light_semaphore,
+    slow_sample_time=None, steady_band=20.0, steady_after_sec=30.0, dli_planner=None,
+    clock=time.monotonic,
 ):
+    """
+    PID on lux. With slow_sample_time set the loop is adaptive: once the error
+    has stayed within ±steady_band lux for steady_after_sec it drops from
+    SAMPLE_TIME to slow_sample_time, and snaps back to SAMPLE_TIME as soon as
+    the error leaves the band or the setpoint changes. With the light setpoint
+    at 0 there is nothing to track, so the loop is steady straight away.
+
+    With a dli_planner.DLIPlanner the user's light setpoint is the ceiling:
+    the loop tracks the planner's setpoint, which lights only what the day's
+    light integral target still needs, inside the photoperiod.
+
+    step.get_stats() reports the mode and the cycles saved against the fixed
+    rate — each cycle is one light read and one light-strip duty write request.
+    """
     # PID controller parameters - easily tunable
     KP_LIGHT = 20   # Proportional gain
     KI_LIGHT = 7.5  # Integral gain
@@ -118,56 +309,118 @@ def light_sp_adjustment_task(
     light_pid = PID(
         KP_LIGHT, KI_LIGHT, KD_LIGHT,
         setpoint=0,
-        sample_time=SAMPLE_TIME,
+        sample_time=None,
         output_limits=OUTPUT_LIMITS,
+        time_fn=clock,
     )
     light_pid.proportional_on_measurement = False
 
     prev_set_point = 0
+    prev_requested = 0
+    in_band_since = None           # monotonic — error entered the band
+    slow = False
+    stats = {'cycles': 0, 'slow_cycles': 0, 'to_slow': 0, 'to_fast': 0}
+
+    def _next_delay(light_set_point, light_intensity):
+        """Pick the next sample period from how long the error has been in the band."""
+        nonlocal in_band_since, slow
+        if slow_sample_time is None:
+            return SAMPLE_TIME
+        now = clock()
+        if light_set_point <= 0 or abs(light_set_point - light_intensity) <= steady_band:
+            if in_band_since is None:
+                in_band_since = now
+            steady = light_set_point <= 0 or now - in_band_since >= steady_after_sec
+        else:
+            in_band_since = None
+            steady = False
 
-    while True:
-        light_pause_event.wait()
-
-        light_set_point = setpoints.get_light_setpoint()
+        if steady != slow:
+            slow = steady
+            stats['to_slow' if slow else 'to_fast'] += 1
+            _CUSTOM_PRINT_FUNC(
+                f"[Light] {'Steady' if slow else 'Disturbance'} — sampling every "
+                f"{slow_sample_time if slow else SAMPLE_TIME}s"
+            )
+        if slow:
+            stats['slow_cycles'] += 1
+            return slow_sample_time
+        return SAMPLE_TIME
+
+    def _read():
+        """Conditioned light intensity (lux), or None if the read failed."""
+        with loop_timing.phase('read'):
+            try:
+                light_semaphore.acquire()
+                return env_sensors.get_light_intensity_conditioned()
+            except Exception as e:
+                _CUSTOM_PRINT_FUNC(f"[Light] ERROR reading light sensor (ADS1115?): {e} — skipping cycle.")
+                return None
+            finally:
+                light_semaphore.release()
+
+    def _actuate(duty_cycle):
+        # A failed write is retried by the next cycle instead of spinning here
+        with loop_timing.phase('write'):
+            env_actuators.set_light_strips_duty_cycle(int(duty_cycle))
+
+    def step():
+        nonlocal prev_set_point, prev_requested, in_band_since
+
+        requested = setpoints.get_light_setpoint()
+        light_set_point = dli_planner.setpoint(requested) if dli_planner is not None else requested
         light_pid.setpoint = light_set_point
 
-        try:
-            light_semaphore.acquire()
-            light_intensity = env_sensors.get_light_intensity()
-        except Exception as e:
-            _CUSTOM_PRINT_FUNC(f"[Light] ERROR reading light sensor (ADS1115?): {e} — skipping cycle.")
-            time.sleep(SAMPLE_TIME)  # prevent rapid spin if ADS1115 is unavailable
-            continue
-        finally:
-            light_semaphore.release()
+        light_intensity = _read()
+        if light_intensity is None:
+            return SAMPLE_TIME
 
-        if prev_set_point != light_set_point:
-            light_pid.reset()
-            prev_set_point = light_set_point
+        with loop_timing.phase('compute'):
+            if prev_set_point != light_set_point:
+                if prev_requested != requested or light_set_point <= 0:
+                    light_pid.reset()   # a re-plan moves the target without dropping the integral
+                prev_set_point = light_set_point
+                in_band_since = None    # a new setpoint starts fast again
+            prev_requested = requested
 
-        if light_set_point > 0:
-            duty_cycle = light_pid(light_intensity)
+            if light_set_point > 0:
+                duty_cycle = int(light_pid(light_intensity))
+            else:
+                duty_cycle = 0
+                light_pid.reset()
 
-            while not env_actuators.set_light_strip_1_duty_cycle(int(duty_cycle)):
-                time.sleep(0.1)
+        _actuate(duty_cycle)
+        if dli_planner is not None:
+            dli_planner.observe(light_intensity, duty_cycle, requested)
 
-            while not env_actuators.set_light_strip_2_duty_cycle(int(duty_cycle)):
-                time.sleep(0.1)
-        else:
-            while not env_actuators.set_light_strip_1_duty_cycle(0):
-                time.sleep(0.1)
+        stats['cycles'] += 1
+        return _next_delay(light_set_point, light_intensity)
 
-            while not env_actuators.set_light_strip_2_duty_cycle(0):
-                time.sleep(0.1)
+    def get_stats():
+        saved = 0 if slow_sample_time is None else stats['slow_cycles'] * (slow_sample_time / SAMPLE_TIME - 1)
+        return {
+            'adaptive':      slow_sample_time is not None,
+            'mode':          'slow' if slow else 'fast',
+            'sample_sec':    slow_sample_time if slow else SAMPLE_TIME,
+            'cycles_saved':  int(saved),
+            **stats,
+            **({'dli': dli_planner.get_stats()} if dli_planner is not None else {}),
+        }
 
-            light_pid.reset()
+    def set_gains(kp, ki, kd):
+        light_pid.tunings = (kp, ki, kd)
+        light_pid.reset()
 
-        time.sleep(SAMPLE_TIME)
+    step.get_stats = get_stats
+    _expose_pid(step, light_pid, _read, _actuate, set_gains, SAMPLE_TIME, OUTPUT_LIMITS)
+    return step
 
 
-def set_soil_moisture_setpoint_task(
+def make_soil_moisture_step(
     env_sensors, env_actuators, setpoints,
-    soil_semaphore, soil_pause_event, db_handler, light_pause_event=None,
+    soil_semaphore, db_handler, light_pause_event=None,
+    planner=None, dose_ml_per_sec=None, dose_time_factor=2.0, dose_min_fraction=0.5,
+    clock=time.monotonic, sleep=time.sleep,
 ):
     """
     Graduated pulse irrigation based on soil moisture level.
@@ -177,6 +430,18 @@ def set_soil_moisture_setpoint_task(
       moisture 51–59%   → 1s pump pulse, wait 45 min
       moisture >= 60%   → pump OFF, check every 30s
 
+    With an irrigation_planner.IrrigationPlanner the loop is predictive
+    instead: it pulses below (soil moisture setpoint − hysteresis), sizes the
+    pulse to reach the setpoint from the learned per-second gain, and reads
+    again just before the learned drying rate reaches the trigger. Until the
+    planner has estimates it falls back to the graduated pulses / 30s checks.
+
+    With dose_ml_per_sec (the pump's nominal flow at PUMP_DC) a pulse of N s
+    is dosed by volume: the pump stops once the water flow sensor has counted
+    N × dose_ml_per_sec mL, or after dose_time_factor × N s (never above
+    MAX_PUMP_SEC). If the sensor has counted less than dose_min_fraction of
+    the dose by N s it is not trusted and the pulse ends there.
+
     Safety guards:
       - RS485 None/NaN/0/<=5% all treated as sensor errors, never as dry soil
       - 3 consecutive failed/suspicious reads → pump locked for 1 hour
@@ -197,77 +462,159 @@ def set_soil_moisture_setpoint_task(
 
     first_valid_read = False       # pump is blocked until first valid sensor reading
     consecutive_failures = 0
-    pump_activation_times = []    # timestamps of recent pump activations
+    pump_activation_times = []    # monotonic times of recent pump activations
+    locked_until = 0.0             # monotonic — sensor-failure lock
+    absorb_until = 0.0             # monotonic — no new pulse before this
 
     def _fire_pump(pulse_sec):
         nonlocal pump_activation_times
         pulse_sec = min(pulse_sec, MAX_PUMP_SEC)  # hard safety cap
-        now = datetime.datetime.now()
+        now = clock()
 
         # Remove activations older than 1 hour
-        pump_activation_times = [t for t in pump_activation_times
-                                  if (now - t).total_seconds() < 3600]
+        pump_activation_times = [t for t in pump_activation_times if now - t < 3600]
 
         if len(pump_activation_times) >= MAX_PUMPS_PER_HOUR:
             _CUSTOM_PRINT_FUNC(
                 f"[Soil] SAFETY: pump fired {len(pump_activation_times)} times in the last hour "
                 f"(max={MAX_PUMPS_PER_HOUR}). Skipping activation."
             )
-            return False
+            return None
 
         if light_pause_event is not None:
             light_pause_event.clear()
-            time.sleep(0.2)
+            sleep(0.2)
 
-        _CUSTOM_PRINT_FUNC(
-            f"[Soil] Pump ON — {pulse_sec}s pulse at {now.strftime('%H:%M:%S')}"
-        )
+        target_l = None
+        if dose_ml_per_sec is not None:
+            target_l = pulse_sec * dose_ml_per_sec / 1000.0
+            start_l = env_sensors.get_water_counted_volume()
+            _CUSTOM_PRINT_FUNC(
+                f"[Soil] Pump ON — {target_l * 1000:.0f} mL dose at {datetime.datetime.now().strftime('%H:%M:%S')}"
+            )
+        else:
+            _CUSTOM_PRINT_FUNC(
+                f"[Soil] Pump ON — {pulse_sec}s pulse at {datetime.datetime.now().strftime('%H:%M:%S')}"
+            )
         env_actuators.set_water_pump_duty_cycle(PUMP_DC)
         env_actuators.set_mqtt_dc_value_water_pump(PUMP_DC)
-        time.sleep(pulse_sec)
+        if target_l is not None:
+            on_sec, stop_reason = _hold_for_volume(
+                env_sensors.get_water_counted_volume, start_l, target_l, pulse_sec,
+                min(MAX_PUMP_SEC, pulse_sec * dose_time_factor), clock, sleep, dose_min_fraction,
+            )
+        else:
+            sleep(pulse_sec)
         # Retry pump OFF — must succeed; I2C failure cannot leave pump running
         for _att in range(5):
             if env_actuators.set_water_pump_duty_cycle(0):
                 break
             _CUSTOM_PRINT_FUNC(f"[Soil] WARNING: pump OFF command failed (attempt {_att+1}/5) — retrying")
-            time.sleep(0.2)
+            sleep(0.2)
         env_actuators.set_mqtt_dc_value_water_pump(0)
-        _CUSTOM_PRINT_FUNC(
-            f"[Soil] Pump OFF — finished {pulse_sec}s pulse at "
-            f"{datetime.datetime.now().strftime('%H:%M:%S')}"
-        )
+        if target_l is not None:
+            delivered_l = env_sensors.get_water_counted_volume() - start_l
+            _CUSTOM_PRINT_FUNC(
+                f"[Soil] Pump OFF — {delivered_l * 1000:.0f}/{target_l * 1000:.0f} mL in {on_sec:.2f}s "
+                f"({stop_reason}) at {datetime.datetime.now().strftime('%H:%M:%S')}"
+            )
+        else:
+            _CUSTOM_PRINT_FUNC(
+                f"[Soil] Pump OFF — finished {pulse_sec}s pulse at "
+                f"{datetime.datetime.now().strftime('%H:%M:%S')}"
+            )
 
         if light_pause_event is not None:
             light_pause_event.set()
 
         pump_activation_times.append(now)
 
-        flow_rate = 0.0
-        try:
-            flow_rate = env_sensors.get_water_flow_rate()
-        except Exception:
-            pass
-
-        db_handler.insert_pump_log('water', pulse_sec, PUMP_DC, flow_rate)
+        if target_l is not None:
+            # Mean flow of the dose; the planner gets the dose back in nominal pump-seconds
+            db_handler.insert_pump_log('water', round(on_sec, 3), PUMP_DC, delivered_l / on_sec * 60.0,
+                                       target_ml=target_l * 1000, delivered_ml=delivered_l * 1000,
+                                       stop_reason=stop_reason)
+            dosed = on_sec if stop_reason in UNTRUSTED_FLOW else delivered_l * 1000 / dose_ml_per_sec
+        else:
+            flow_rate = 0.0
+            try:
+                flow_rate = env_sensors.get_water_flow_rate()
+            except Exception:
+                pass
+            db_handler.insert_pump_log('water', pulse_sec, PUMP_DC, flow_rate)
+            dosed = pulse_sec
         _CUSTOM_PRINT_FUNC(
             f"[Soil] Waiting {ABSORB_WAIT_SEC}s for water to absorb..."
         )
-        return True
+        return dosed
+
+    def _pulse(pulse_sec):
+        """Fire a pulse unless the last one is still absorbing; returns the next delay."""
+        nonlocal absorb_until
+        remaining = absorb_until - clock()
+        if remaining > 0:
+            _CUSTOM_PRINT_FUNC(f"[Soil] Still absorbing the last pulse — next pulse allowed in {remaining:.0f}s.")
+            return remaining
+        with loop_timing.phase('write'):
+            dosed = _fire_pump(pulse_sec)
+        if dosed is not None:
+            absorb_until = clock() + ABSORB_WAIT_SEC
+            if planner is not None and dosed > 0:
+                planner.record_pulse(dosed)
+            return ABSORB_WAIT_SEC
+        return CHECK_INTERVAL
+
+    def _band_pulse(soil_humidity):
+        """Graduated pulse length for a moisture below MOISTURE_OK."""
+        if soil_humidity > MOISTURE_MID:
+            return 1
+        if soil_humidity > MOISTURE_LOW:
+            return 1.5
+        return 2
+
+    def _planned(soil_humidity):
+        """Planner mode: trigger and target come from the soil moisture setpoint."""
+        remaining = absorb_until - clock()
+        if remaining > 0:
+            # Woken while a pulse is still spreading — the reading would skew both estimates
+            return remaining
+        with loop_timing.phase('compute'):
+            planner.observe(soil_humidity)
+            target = setpoints.get_soil_humidity_setpoint()
+            trigger = target - setpoints.get_soil_humidity_hysteresis()
+            if soil_humidity > trigger:
+                delay = planner.next_read_delay(soil_humidity, trigger)
+            else:
+                pulse_sec = planner.pulse_for(soil_humidity, target)
+        if soil_humidity > trigger:
+            _CUSTOM_PRINT_FUNC(f"[Soil] Moisture OK (pulse below {trigger:.1f}%) — next read in {delay:.0f}s.")
+            return delay
+        if pulse_sec is None:
+            pulse_sec = _band_pulse(soil_humidity)
+        _CUSTOM_PRINT_FUNC(
+            f"[Soil] Moisture {soil_humidity:.1f}% below {trigger:.1f}% — "
+            f"firing {pulse_sec}s pulse towards {target:.1f}%."
+        )
+        return _pulse(pulse_sec)
 
-    while True:
-        soil_pause_event.wait()
-
-        soil_semaphore.acquire()
-        try:
-            _, _, soil_humidity, _ = env_sensors.get_soil_values()
-        except Exception as e:
-            _CUSTOM_PRINT_FUNC(f"[Soil] ERROR reading sensor (I2C/RS485?): {e} — pump forced OFF.")
-            env_actuators.set_water_pump_duty_cycle(0)
-            consecutive_failures += 1
-            time.sleep(CHECK_INTERVAL)
-            continue
-        finally:
-            soil_semaphore.release()
+    def step():
+        nonlocal consecutive_failures, first_valid_read, locked_until
+
+        remaining = locked_until - clock()
+        if remaining > 0:
+            return remaining        # woken during the sensor lock — pump stays off
+
+        with loop_timing.phase('read'):
+            soil_semaphore.acquire()
+            try:
+                _, _, soil_humidity, _ = env_sensors.get_soil_values()
+            except Exception as e:
+                _CUSTOM_PRINT_FUNC(f"[Soil] ERROR reading sensor (I2C/RS485?): {e} — pump forced OFF.")
+                env_actuators.set_water_pump_duty_cycle(0)
+                consecutive_failures += 1
+                return CHECK_INTERVAL
+            finally:
+                soil_semaphore.release()
 
         # Failed read — None, NaN, 0, or below the plausible floor all mean RS485 failure
         _rs485_bad = (
@@ -289,11 +636,10 @@ def set_soil_moisture_setpoint_task(
                     f"Pump disabled for {SENSOR_LOCK_SEC}s."
                 )
                 env_actuators.set_water_pump_duty_cycle(0)
-                time.sleep(SENSOR_LOCK_SEC)
+                locked_until = clock() + SENSOR_LOCK_SEC
                 consecutive_failures = 0
-            else:
-                time.sleep(CHECK_INTERVAL)
-            continue
+                return SENSOR_LOCK_SEC
+            return CHECK_INTERVAL
 
         # Successful read — reset failure counter
         consecutive_failures = 0
@@ -302,36 +648,35 @@ def set_soil_moisture_setpoint_task(
             _CUSTOM_PRINT_FUNC("[Soil] First valid moisture read confirmed. Automatic pump control enabled.")
         _CUSTOM_PRINT_FUNC(f"[Soil] Moisture={soil_humidity:.1f}%")
 
+        if planner is not None:
+            return _planned(soil_humidity)
+
         if soil_humidity >= MOISTURE_OK:
             _CUSTOM_PRINT_FUNC("[Soil] Moisture OK — no irrigation needed.")
-            time.sleep(CHECK_INTERVAL)
+            return CHECK_INTERVAL
 
         elif soil_humidity > MOISTURE_MID:
             _CUSTOM_PRINT_FUNC(f"[Soil] Moisture {soil_humidity:.1f}% (51–59%) — firing 1s pulse.")
-            if _fire_pump(1):
-                time.sleep(ABSORB_WAIT_SEC)
-            else:
-                time.sleep(CHECK_INTERVAL)
+            return _pulse(1)
 
         elif soil_humidity > MOISTURE_LOW:
             _CUSTOM_PRINT_FUNC(f"[Soil] Moisture {soil_humidity:.1f}% (46–50%) — firing 1.5s pulse.")
-            if _fire_pump(1.5):
-                time.sleep(ABSORB_WAIT_SEC)
-            else:
-                time.sleep(CHECK_INTERVAL)
+            return _pulse(1.5)
 
         else:
             _CUSTOM_PRINT_FUNC(f"[Soil] Moisture {soil_humidity:.1f}% (<= 45%) — firing 2s pulse.")
-            if _fire_pump(2):
-                time.sleep(ABSORB_WAIT_SEC)
-            else:
-                time.sleep(CHECK_INTERVAL)
+            return _pulse(2)
 
+    if planner is not None:
+        step.get_stats = planner.get_stats
+    return step
 
-def fertilizer_pump_control_task(
+
+def make_fertilizer_step(
     env_sensors, env_actuators, setpoints,
-    soil_semaphore, fertilizer_pause_event, db_handler,
-    light_pause_event=None,
+    soil_semaphore, db_handler,
+    light_pause_event=None, planner=None, dose_ml_per_sec=None, dose_time_factor=2.0, dose_min_fraction=0.5,
+    clock=time.monotonic, sleep=time.sleep,
 ):
     """
     Graduated EC-based fertilization for lettuce.
@@ -343,6 +688,15 @@ def fertilizer_pump_control_task(
       EC 1000–1200      → low: fire 1s fertilizer pulse, wait 1 hour
       EC 700–1000       → very low: fire 1.5s fertilizer pulse, wait 1 hour
       EC < 700          → critically low: fire 2s fertilizer pulse, wait 1 hour
+
+    With dose_ml_per_sec the fertilizer pulses are dosed by volume on the
+    fertilizer flow sensor, as in make_soil_moisture_step (cap MAX_PULSE_SEC).
+
+    With a fertilizer_planner.FertilizerPlanner (needs dose_ml_per_sec) a low
+    EC gets the dose the learned EC-per-mL gain says reaches EC_TARGET, and
+    the loop probes the EC every few minutes after a dose until it has
+    settled instead of waiting a fixed hour. Until the planner has a gain it
+    falls back to the graduated pulses.
     """
     FERT_DC         = 2662   # fertilizer pump duty cycle (~65%)
     WATER_DC        = 1800
@@ -371,6 +725,8 @@ def fertilizer_pump_control_task(
     first_valid_read = False       # pump blocked until first valid EC reading
     consecutive_failures  = 0
     pump_activation_times = []
+    locked_until = 0.0             # monotonic — sensor-failure lock
+    hold_until   = 0.0             # monotonic — no pump action (dose or dilution) before this
 
     def _alert(msg):
         _CUSTOM_PRINT_FUNC(f"[Fertilizer] ALERT: {msg}")
@@ -378,10 +734,10 @@ def fertilizer_pump_control_task(
     def _dilute_with_water():
         if light_pause_event is not None:
             light_pause_event.clear()
-            time.sleep(0.2)
+            sleep(0.2)
         _CUSTOM_PRINT_FUNC(f"[Fertilizer] Water pump ON — dilution pulse {WATER_PULSE_SEC}s")
         env_actuators.set_water_pump_duty_cycle(WATER_DC)
-        time.sleep(WATER_PULSE_SEC)
+        sleep(WATER_PULSE_SEC)
         env_actuators.set_water_pump_duty_cycle(0)
         _CUSTOM_PRINT_FUNC("[Fertilizer] Water pump OFF — dilution done.")
         if light_pause_event is not None:
@@ -390,82 +746,176 @@ def fertilizer_pump_control_task(
     def _fire_fertilizer(pulse_sec):
         nonlocal pump_activation_times
         pulse_sec = min(pulse_sec, MAX_PULSE_SEC)  # hard safety cap
-        now = datetime.datetime.now()
+        now = clock()
 
         # Remove activations older than 1 hour
-        pump_activation_times = [t for t in pump_activation_times
-                                  if (now - t).total_seconds() < 3600]
+        pump_activation_times = [t for t in pump_activation_times if now - t < 3600]
 
         if len(pump_activation_times) >= MAX_PUMPS_PER_HOUR:
             _CUSTOM_PRINT_FUNC(
                 f"[Fertilizer] SAFETY: pump fired {len(pump_activation_times)}x in last hour "
                 f"(max={MAX_PUMPS_PER_HOUR}). Skipping activation."
             )
-            return False
+            return None
 
         if light_pause_event is not None:
             light_pause_event.clear()
-            time.sleep(0.2)
+            sleep(0.2)
 
-        _CUSTOM_PRINT_FUNC(
-            f"[Fertilizer] Pump ON — {pulse_sec}s pulse at {now.strftime('%H:%M:%S')}"
-        )
+        target_l = None
+        if dose_ml_per_sec is not None:
+            target_l = pulse_sec * dose_ml_per_sec / 1000.0
+            start_l = env_sensors.get_fertilizer_counted_volume()
+            _CUSTOM_PRINT_FUNC(
+                f"[Fertilizer] Pump ON — {target_l * 1000:.1f} mL dose at {datetime.datetime.now().strftime('%H:%M:%S')}"
+            )
+        else:
+            _CUSTOM_PRINT_FUNC(
+                f"[Fertilizer] Pump ON — {pulse_sec}s pulse at {datetime.datetime.now().strftime('%H:%M:%S')}"
+            )
         pump_on_ok = False
         for _att in range(10):
             if env_actuators.set_fertilizer_pump_duty_cycle(FERT_DC):
                 pump_on_ok = True
                 break
             _CUSTOM_PRINT_FUNC(f"[Fertilizer] WARNING: pump ON failed (attempt {_att+1}/10)")
-            time.sleep(0.1)
+            sleep(0.1)
         if not pump_on_ok:
             _CUSTOM_PRINT_FUNC("[Fertilizer] ERROR: Could not turn ON fertilizer pump — aborting pulse.")
             env_actuators.set_fertilizer_pump_duty_cycle(0)
             if light_pause_event is not None:
                 light_pause_event.set()
-            return False
-        time.sleep(pulse_sec)
-
+            return None
         fert_flow_rate = 0.0
-        try:
-            fert_flow_rate = env_sensors.get_fertilizer_flow_rate()
-        except Exception:
-            pass
+        if target_l is not None:
+            on_sec, stop_reason = _hold_for_volume(
+                env_sensors.get_fertilizer_counted_volume, start_l, target_l, pulse_sec,
+                min(MAX_PULSE_SEC, pulse_sec * dose_time_factor), clock, sleep, dose_min_fraction,
+            )
+        else:
+            sleep(pulse_sec)
+            try:
+                fert_flow_rate = env_sensors.get_fertilizer_flow_rate()
+            except Exception:
+                pass
 
         # Retry pump OFF — must succeed; I2C failure cannot leave pump running
         for _att in range(10):
             if env_actuators.set_fertilizer_pump_duty_cycle(0):
                 break
             _CUSTOM_PRINT_FUNC(f"[Fertilizer] WARNING: pump OFF failed (attempt {_att+1}/10) — retrying")
-            time.sleep(0.1)
+            sleep(0.1)
 
-        _CUSTOM_PRINT_FUNC(
-            f"[Fertilizer] Pump OFF — finished {pulse_sec}s at "
-            f"{datetime.datetime.now().strftime('%H:%M:%S')}. "
-            f"Cooldown {SETTLE_WAIT_SEC}s."
-        )
+        if target_l is not None:
+            delivered_l = env_sensors.get_fertilizer_counted_volume() - start_l
+            _CUSTOM_PRINT_FUNC(
+                f"[Fertilizer] Pump OFF — {delivered_l * 1000:.1f}/{target_l * 1000:.1f} mL in {on_sec:.2f}s "
+                f"({stop_reason}) at {datetime.datetime.now().strftime('%H:%M:%S')}. "
+                f"Cooldown {SETTLE_WAIT_SEC}s."
+            )
+        else:
+            _CUSTOM_PRINT_FUNC(
+                f"[Fertilizer] Pump OFF — finished {pulse_sec}s at "
+                f"{datetime.datetime.now().strftime('%H:%M:%S')}. "
+                f"Cooldown {SETTLE_WAIT_SEC}s."
+            )
 
         if light_pause_event is not None:
             light_pause_event.set()
 
         pump_activation_times.append(now)
-        db_handler.insert_pump_log('fertilizer', pulse_sec, FERT_DC, fert_flow_rate)
-        return True
+        if target_l is not None:
+            db_handler.insert_pump_log('fertilizer', round(on_sec, 3), FERT_DC, delivered_l / on_sec * 60.0,
+                                       target_ml=target_l * 1000, delivered_ml=delivered_l * 1000,
+                                       stop_reason=stop_reason)
+        else:
+            db_handler.insert_pump_log('fertilizer', pulse_sec, FERT_DC, fert_flow_rate)
+        # The dose in mL (nominal for timed pulses); pulse seconds without a nominal flow
+        if target_l is None:
+            return pulse_sec * dose_ml_per_sec if dose_ml_per_sec is not None else pulse_sec
+        return on_sec * dose_ml_per_sec if stop_reason in UNTRUSTED_FLOW else delivered_l * 1000
+
+    def _hold_remaining():
+        remaining = hold_until - clock()
+        if remaining > 0:
+            _CUSTOM_PRINT_FUNC(f"[Fertilizer] Last pump action still settling — next action allowed in {remaining:.0f}s.")
+        return remaining
+
+    def _dose(pulse_sec, soil_ec=None):
+        nonlocal hold_until
+        remaining = _hold_remaining()
+        if remaining > 0:
+            return remaining
+        with loop_timing.phase('write'):
+            dosed = _fire_fertilizer(pulse_sec)
+        if dosed is None:
+            return CHECK_INTERVAL
+        if planner is not None:
+            planner.record_dose(dosed, soil_ec)
+            delay = planner.next_read_delay()
+            hold_until = clock() + delay
+            return delay
+        hold_until = clock() + SETTLE_WAIT_SEC
+        return SETTLE_WAIT_SEC
+
+    def _next_check():
+        """Probe a settling dose sooner than the hourly check."""
+        if planner is not None and planner.settling():
+            return planner.next_read_delay()
+        return CHECK_INTERVAL
+
+    def _planned_dose(soil_ec, soil_ph):
+        """Planner mode below EC_TARGET; None falls back to the graduated pulses."""
+        if planner.settling():
+            delay = planner.next_read_delay()
+            _CUSTOM_PRINT_FUNC(f"[Fertilizer] EC={soil_ec:.1f} — last dose still settling, probing again in {delay:.0f}s.")
+            return delay
+        with loop_timing.phase('compute'):
+            dose_ml = planner.dose_for(soil_ec, EC_TARGET)
+        if dose_ml is None:
+            return None
+        _CUSTOM_PRINT_FUNC(f"[Fertilizer] EC={soil_ec:.1f} below {EC_TARGET:.0f} — dosing {dose_ml} mL.")
+        if soil_ph > PH_HIGH_WARN:
+            _alert(f"pH={soil_ph:.2f} high, but EC low. Fertilizing anyway.")
+        return _dose(dose_ml / dose_ml_per_sec, soil_ec)
+
+    def _dilute():
+        nonlocal hold_until
+        remaining = _hold_remaining()
+        if remaining > 0:
+            return remaining
+        with loop_timing.phase('write'):
+            _dilute_with_water()
+        hold_until = clock() + CHECK_INTERVAL
+        return CHECK_INTERVAL
 
-    while True:
-        fertilizer_pause_event.wait()
+    def _sensor_failure():
+        nonlocal consecutive_failures, locked_until
+        if consecutive_failures >= MAX_FAILURES_BEFORE_LOCK:
+            locked_until = clock() + SENSOR_LOCK_SEC
+            consecutive_failures = 0
+            return SENSOR_LOCK_SEC
+        return CHECK_INTERVAL
+
+    def step():
+        nonlocal consecutive_failures, first_valid_read
+
+        remaining = locked_until - clock()
+        if remaining > 0:
+            return remaining        # woken during the sensor lock — pump stays off
 
         # ── Read sensors ───────────────────────────────────────────────────────
-        soil_semaphore.acquire()
-        try:
-            soil_ph, soil_ec, _, _ = env_sensors.get_soil_values()
-        except Exception as e:
-            _CUSTOM_PRINT_FUNC(f"[Fertilizer] ERROR reading sensor: {e} — pump disabled this cycle.")
-            env_actuators.set_fertilizer_pump_duty_cycle(0)
-            consecutive_failures += 1
-            time.sleep(CHECK_INTERVAL)
-            continue
-        finally:
-            soil_semaphore.release()
+        with loop_timing.phase('read'):
+            soil_semaphore.acquire()
+            try:
+                soil_ph, soil_ec, _, _ = env_sensors.get_soil_values()
+            except Exception as e:
+                _CUSTOM_PRINT_FUNC(f"[Fertilizer] ERROR reading sensor: {e} — pump disabled this cycle.")
+                env_actuators.set_fertilizer_pump_duty_cycle(0)
+                consecutive_failures += 1
+                return CHECK_INTERVAL
+            finally:
+                soil_semaphore.release()
 
         # ── Validate sensor readings before any pump decision ─────────────────
         # Check for None or NaN first — range comparison crashes on None
@@ -483,11 +933,7 @@ def fertilizer_pump_control_task(
                     f"[Fertilizer] SAFETY LOCK: {consecutive_failures} bad RS485 reads. "
                     f"Pump disabled for {SENSOR_LOCK_SEC}s."
                 )
-                time.sleep(SENSOR_LOCK_SEC)
-                consecutive_failures = 0
-            else:
-                time.sleep(CHECK_INTERVAL)
-            continue
+            return _sensor_failure()
 
         ec_valid = EC_MIN_VALID <= soil_ec <= EC_MAX_VALID
         ph_valid = PH_MIN_VALID <= soil_ph <= PH_MAX_VALID
@@ -505,11 +951,7 @@ def fertilizer_pump_control_task(
                     f"[Fertilizer] SAFETY LOCK: {consecutive_failures} bad EC reads. "
                     f"Pump disabled for {SENSOR_LOCK_SEC}s."
                 )
-                time.sleep(SENSOR_LOCK_SEC)
-                consecutive_failures = 0
-            else:
-                time.sleep(CHECK_INTERVAL)
-            continue
+            return _sensor_failure()
 
         if not ph_valid:
             _CUSTOM_PRINT_FUNC(
@@ -522,6 +964,9 @@ def fertilizer_pump_control_task(
             first_valid_read = True
             _CUSTOM_PRINT_FUNC("[Fertilizer] First valid EC/pH read confirmed. Automatic fertilizer control enabled.")
         _CUSTOM_PRINT_FUNC(f"[Fertilizer] EC={soil_ec:.1f} µS/cm  pH={soil_ph:.2f}")
+        if planner is not None:
+            with loop_timing.phase('compute'):
+                planner.observe(soil_ec)
 
         # ── 1. EC DANGER ───────────────────────────────────────────────────────
         if soil_ec >= EC_DANGER:
@@ -530,9 +975,7 @@ def fertilizer_pump_control_task(
                 f"DANGER: EC={soil_ec:.1f} µS/cm critically high (>= {EC_DANGER:.0f}). "
                 f"Root burn risk! Fertilizer pump LOCKED OFF. Activating water to dilute."
             )
-            _dilute_with_water()
-            time.sleep(CHECK_INTERVAL)
-            continue
+            return _dilute()
 
         # ── 2. EC too high ─────────────────────────────────────────────────────
         if soil_ec >= EC_HIGH:
@@ -541,9 +984,7 @@ def fertilizer_pump_control_task(
                 f"[Fertilizer] EC={soil_ec:.1f} too high (>= {EC_HIGH:.0f}). "
                 f"Pump OFF. Activating water to dilute."
             )
-            _dilute_with_water()
-            time.sleep(CHECK_INTERVAL)
-            continue
+            return _dilute()
 
         # ── 3. EC OK ───────────────────────────────────────────────────────────
         if soil_ec >= EC_TARGET:
@@ -553,36 +994,33 @@ def fertilizer_pump_control_task(
             )
             if soil_ph > PH_HIGH_WARN:
                 _alert(f"pH={soil_ph:.2f} high. Add pH Down manually.")
-            time.sleep(CHECK_INTERVAL)
-            continue
+            return _next_check()
+
+        if planner is not None:
+            delay = _planned_dose(soil_ec, soil_ph)
+            if delay is not None:
+                return delay
 
         # ── 4. EC 1000–1200 → 1 second pulse ──────────────────────────────────
         if soil_ec >= EC_MID:
             _CUSTOM_PRINT_FUNC(f"[Fertilizer] EC={soil_ec:.1f} (1000–1200) — firing 1s pulse.")
             if soil_ph > PH_HIGH_WARN:
                 _alert(f"pH={soil_ph:.2f} high, but EC low. Fertilizing anyway.")
-            if _fire_fertilizer(1):
-                time.sleep(SETTLE_WAIT_SEC)
-            else:
-                time.sleep(CHECK_INTERVAL)
-            continue
+            return _dose(1, soil_ec)
 
         # ── 5. EC 700–1000 → 1.5 second pulse ────────────────────────────────
         if soil_ec >= EC_LOW:
             _CUSTOM_PRINT_FUNC(f"[Fertilizer] EC={soil_ec:.1f} (700–1000) — firing 1.5s pulse.")
             if soil_ph > PH_HIGH_WARN:
                 _alert(f"pH={soil_ph:.2f} high, but EC low. Fertilizing anyway.")
-            if _fire_fertilizer(1.5):
-                time.sleep(SETTLE_WAIT_SEC)
-            else:
-                time.sleep(CHECK_INTERVAL)
-            continue
+            return _dose(1.5, soil_ec)
 
         # ── 6. EC < 700 → 2 second pulse ─────────────────────────────────────
         _CUSTOM_PRINT_FUNC(f"[Fertilizer] EC={soil_ec:.1f} critically low (< 700) — firing 2s pulse.")
         if soil_ph > PH_HIGH_WARN:
             _alert(f"pH={soil_ph:.2f} high, but EC critically low. Fertilizing anyway.")
-        if _fire_fertilizer(2):
-            time.sleep(SETTLE_WAIT_SEC)
-        else:
-            time.sleep(CHECK_INTERVAL)
+        return _dose(2, soil_ec)
+
+    if planner is not None:
+        step.get_stats = planner.get_stats
+    return step
@@ -0,0 +1,210 @@
+"""
+control_scheduler.py — One thread runs every control loop step.
+
+Each control loop is a step callable that does one cycle and returns the
+delay (s) until it wants to run again. ControlScheduler keeps the next run
+of every task in a heap ordered by monotonic time and sleeps on a condition
+variable until the earliest one is due, so:
+
+  - periods are anchored to the scheduled start, not to when the work ended,
+    and do not drift;
+  - a long wait (45 min soil absorb, 1 h sensor lock) is just a far-away heap
+    entry — wake() pulls it forward at once, stop() ends the loop at once;
+  - a task gated on a WakeEvent is parked while the event is clear and runs
+    as soon as someone sets it (mode change, end of a camera capture).
+
+Every step runs inside a loop_timing cycle named after its task, so its
+jitter, overruns and read / compute / write split show up in /api/debug/loops.
+
+run_until() dispatches the same heap on a virtual clock without waiting; the
+accelerated replay harness (simulation/replay.py) uses it to run days of
+control in seconds.
+"""
+import time
+import heapq
+import threading
+import itertools
+
+import loop_timing
+from utils.utils import _CUSTOM_PRINT_FUNC
+
+# A paused task gated on a plain threading.Event is re-checked this often
+PAUSED_RECHECK_SEC = 1.0
+# Delay before re-running a step that raised
+ERROR_RETRY_SEC = 1.0
+
+
+class WakeEvent(threading.Event):
+    """threading.Event that also wakes the scheduler tasks gated on it when set()."""
+    def __init__(self):
+        super().__init__()
+        self.__callbacks = []
+
+    def add_wake_callback(self, callback):
+        self.__callbacks.append(callback)
+
+    def set(self):
+        super().set()
+        for callback in list(self.__callbacks):
+            callback()
+
+
+class _Task:
+    def __init__(self, name, step, pause_event, timer):
+        self.name = name
+        self.step = step
+        self.pause_event = pause_event
+        self.timer = timer
+        self.due = 0.0
+        self.version = 0          # bumps on reschedule; older heap entries are stale
+        self.wake_pending = False
+        self.parked = False       # paused on a WakeEvent, not in the heap
+        self.runs = 0
+        self.errors = 0
+        self.last_error = None
+
+
+class ControlScheduler:
+    def __init__(self, clock=time.monotonic, publish_timing=True):
+        self.__clock = clock
+        # Off for replays, so a virtual-clock run does not replace the app's /api/debug/loops timers
+        self.__publish_timing = publish_timing
+        self.__heap = []          # (due, seq, name, version)
+        self.__tasks = {}
+        self.__seq = itertools.count()
+        self.__cond = threading.Condition()
+        self.__current = None
+        self.__running = True
+
+    def add_task(self, name, step, pause_event=None, start_delay_sec=0.0):
+        """Register step() under name. It first runs start_delay_sec from now."""
+        if self.__publish_timing:
+            timer = loop_timing.register(name, clock=self.__clock)
+        else:
+            timer = loop_timing.LoopTimer(name, clock=self.__clock)
+        task = _Task(name, step, pause_event, timer)
+        if hasattr(pause_event, 'add_wake_callback'):
+            pause_event.add_wake_callback(lambda: self.wake(name))
+        with self.__cond:
+            self.__tasks[name] = task
+            self.__push(task, self.__clock() + start_delay_sec)
+
+    def __push(self, task, due):
+        task.due = due
+        task.parked = False
+        task.version += 1
+        heapq.heappush(self.__heap, (due, next(self.__seq), task.name, task.version))
+        self.__cond.notify()
+
+    def wake(self, name=None):
+        """
+        Run a task (all tasks if name is None) as soon as the dispatcher is free.
+        Waking the task that is running makes it run again right after it returns.
+        """
+        with self.__cond:
+            tasks = self.__tasks.values() if name is None else [self.__tasks[name]] if name in self.__tasks else []
+            now = self.__clock()
+            for task in tasks:
+                if task is self.__current:
+                    task.wake_pending = True
+                elif task.parked or task.due > now:
+                    self.__push(task, now)
+
+    def stop(self):
+        with self.__cond:
+            self.__running = False
+            self.__cond.notify_all()
+
+    def __drop_stale(self):
+        while self.__heap and self.__heap[0][3] != self.__tasks[self.__heap[0][2]].version:
+            heapq.heappop(self.__heap)
+
+    def __next_due_task(self):
+        """Block until a task is due; None once stopped. Called with the lock held."""
+        while self.__running:
+            self.__drop_stale()
+            if not self.__heap:
+                self.__cond.wait()
+                continue
+            due, _, name, _ = self.__heap[0]
+            delay = due - self.__clock()
+            if delay <= 0:
+                heapq.heappop(self.__heap)
+                return self.__tasks[name]
+            self.__cond.wait(delay)
+        return None
+
+    def run(self):
+        """Dispatch loop — the thread target. Returns after stop()."""
+        while True:
+            with self.__cond:
+                task = self.__next_due_task()
+                if task is None:
+                    return
+                self.__current = task
+                task.wake_pending = False
+                scheduled = task.due
+            self.__dispatch(task, scheduled)
+
+    def run_until(self, end, advance_to):
+        """
+        Dispatch every task due before end without waiting: advance_to(t) moves
+        a virtual clock forward to each due time instead. For replays only —
+        nothing else may be waiting on this scheduler.
+        """
+        while self.__running:
+            with self.__cond:
+                self.__drop_stale()
+                if not self.__heap or self.__heap[0][0] >= end:
+                    return
+                due, _, name, _ = heapq.heappop(self.__heap)
+                advance_to(due)
+                task = self.__tasks[name]
+                self.__current = task
+                task.wake_pending = False
+            self.__dispatch(task, due)
+
+    def __dispatch(self, task, scheduled):
+        """Run one due task and put it back in the heap (or park it)."""
+        if task.pause_event is not None and not task.pause_event.is_set():
+            # Parked: a WakeEvent brings it back when set, a plain Event is polled
+            delay = None if hasattr(task.pause_event, 'add_wake_callback') else PAUSED_RECHECK_SEC
+        else:
+            task.timer.begin(scheduled)
+            try:
+                delay = task.step()
+                task.runs += 1
+            except Exception as e:
+                task.errors += 1
+                task.last_error = str(e)
+                _CUSTOM_PRINT_FUNC(f"[Scheduler] {task.name} step failed: {e}")
+                delay = ERROR_RETRY_SEC
+            task.timer.end(delay)
+
+        with self.__cond:
+            self.__current = None
+            now = self.__clock()
+            if task.wake_pending or (task.pause_event is not None and delay is None and task.pause_event.is_set()):
+                self.__push(task, now)
+            elif delay is not None:
+                # Anchor to the scheduled start; after an overrun, start again from now
+                self.__push(task, max(scheduled + delay, now))
+            else:
+                task.parked = True
+
+    def get_tasks(self) -> dict:
+        with self.__cond:
+            now = self.__clock()
+            return {
+                name: {
+                    'paused':          task.pause_event is not None and not task.pause_event.is_set(),
+                    'running':         task is self.__current,
+                    'next_run_in_sec': None if task.parked else round(max(0.0, task.due - now), 3),
+                    'runs':            task.runs,
+                    'errors':          task.errors,
+                    'last_error':      task.last_error,
+                    # Steps may report their own state (e.g. the adaptive light rate)
+                    **({'stats': task.step.get_stats()} if hasattr(task.step, 'get_stats') else {}),
+                }
+                for name, task in self.__tasks.items()
+            }
@@ -0,0 +1,183 @@
+"""
+dli_planner.py — Daily light integral (DLI) accounting and supplemental light plan.
+
+DLIPlanner integrates the light sensor over the day (lux → PPFD with
+lux_to_ppfd, PPFD·dt → mol/m²) and turns the day's DLI target into the light
+loop's setpoint:
+
+  - inside the photoperiod the setpoint is the light level that delivers the
+    rest of the target in the time left, re-planned every replan_sec and
+    never above the user's light setpoint; daylight that runs ahead of the
+    plan lowers the rest of the day's setpoint;
+  - outside the photoperiod, or once the target is reached, it is 0.
+
+Because the PID only adds LED light up to the setpoint, the LED energy for a
+day is the target minus the daylight counted towards it — nothing is lit
+past the target or at night, which is where the Wh are saved.
+
+With a tou_planner.TOUPlanner the plan also keeps LED load out of the
+expensive tariff window: before it the setpoint is what the cheap hours
+left must deliver (up to the user's setpoint — lighting ahead), inside it
+only what the cheap hours left cannot.
+
+Energy is accounted from the LED duty (led_power_w at full duty) against a
+baseline of the user's setpoint held around the clock, with the daylight
+share estimated as measured lux − led_lux_full × duty. The day's totals are
+kept in system_state (state_key) so a restart does not relight the day.
+"""
+import time
+import datetime
+from collections import deque
+
+_DUTY_FULL = 4095.0
+_MAX_GAP_SEC = 60.0        # longer gaps between readings are not integrated
+
+
+class DLIPlanner:
+    def __init__(self, target_mol=0.64, lux_to_ppfd=0.0185, photoperiod=(5.0, 23.0),
+                 led_power_w=48.0, led_lux_full=600.0, replan_sec=300.0, setpoint_step_lux=5.0,
+                 state_store=None, state_key='dli_day', history_days=7, tou_planner=None,
+                 clock=time.monotonic, wallclock=datetime.datetime.now):
+        self.__target = float(target_mol)
+        self.__lux_to_ppfd = float(lux_to_ppfd)
+        self.__start_h, self.__end_h = (float(h) for h in photoperiod)
+        self.__led_power = float(led_power_w)
+        self.__led_lux_full = float(led_lux_full)
+        self.__replan = float(replan_sec)
+        self.__step = float(setpoint_step_lux)
+        self.__store = state_store
+        self.__state_key = state_key
+        self.__tou = tou_planner
+        self.__clock = clock
+        self.__wallclock = wallclock
+
+        self.__day = self.__new_day(wallclock().date())
+        self.__history = deque(maxlen=history_days)
+        self.__last = None             # (t, duty, requested) of the previous reading
+        self.__setpoint = None
+        self.__planned_at = None
+        self.__saved_at = None
+        self.__restore()
+
+    @staticmethod
+    def __new_day(date):
+        return {'date': date.isoformat(), 'mol': 0.0, 'led_wh': 0.0, 'baseline_wh': 0.0, 'lit_sec': 0.0}
+
+    def __restore(self):
+        if self.__store is None:
+            return
+        saved = self.__store.get_state(self.__state_key)
+        if isinstance(saved, dict) and saved.get('date') == self.__day['date']:
+            self.__day.update({k: float(saved[k]) for k in ('mol', 'led_wh', 'baseline_wh', 'lit_sec') if k in saved})
+
+    def __save(self, now):
+        if self.__store is not None:
+            self.__store.upsert_state(self.__state_key, dict(self.__day))
+        self.__saved_at = now
+
+    # ── Accounting ────────────────────────────────────────────────────────────
+    def observe(self, lux, duty_cycle, requested):
+        """
+        A light reading (lux) and the LED duty (0–4095) applied from now on;
+        requested is the user's light setpoint, used for the baseline.
+        """
+        now = self.__clock()
+        date = self.__wallclock().date()
+        if date.isoformat() != self.__day['date']:
+            self.__history.append(self.__summary(self.__day))
+            self.__day = self.__new_day(date)
+            self.__setpoint = None
+        if self.__last is not None:
+            t, duty, last_requested = self.__last
+            dt = now - t
+            if 0 < dt <= _MAX_GAP_SEC:
+                frac = duty / _DUTY_FULL
+                self.__day['mol'] += max(0.0, lux) * self.__lux_to_ppfd * dt / 1e6
+                self.__day['led_wh'] += frac * self.__led_power * dt / 3600.0
+                if frac > 0:
+                    self.__day['lit_sec'] += dt
+                if last_requested > 0:
+                    daylight = max(0.0, lux - self.__led_lux_full * frac)
+                    base_frac = min(1.0, max(0.0, (last_requested - daylight) / self.__led_lux_full))
+                    self.__day['baseline_wh'] += base_frac * self.__led_power * dt / 3600.0
+        self.__last = (now, float(duty_cycle), float(requested))
+        if self.__saved_at is None or now - self.__saved_at >= self.__replan:
+            self.__save(now)
+
+    # ── Plan ──────────────────────────────────────────────────────────────────
+    def __hours(self):
+        """(hour of day now, photoperiod seconds left)."""
+        wall = self.__wallclock()
+        hour = wall.hour + wall.minute / 60.0 + wall.second / 3600.0
+        if self.__start_h <= hour < self.__end_h:
+            return hour, (self.__end_h - hour) * 3600.0
+        return hour, 0.0
+
+    def setpoint(self, requested):
+        """Light setpoint (lux) for the loop, given the user's setpoint."""
+        now = self.__clock()
+        if requested <= 0:
+            return 0.0
+        if (self.__setpoint is not None and self.__planned_at is not None
+                and now - self.__planned_at < self.__replan):
+            return min(self.__setpoint, requested)
+        _, left = self.__hours()
+        remaining = self.__target - self.__day['mol']
+        if left <= 0 or remaining <= 0:
+            plan = 0.0
+        else:
+            lux_sec = remaining * 1e6 / self.__lux_to_ppfd
+            needed_lux = lux_sec / left if self.__tou is None else self.__shifted(lux_sec, left, requested)
+            plan = self.__step * round(needed_lux / self.__step)
+        self.__setpoint = plan
+        self.__planned_at = now
+        return min(plan, requested)
+
+    def __shifted(self, needed_lux_sec, left, requested):
+        """Lux to hold now so the expensive window gets only what the cheap hours cannot deliver."""
+        wall = self.__wallclock()
+        cheap, costly = self.__tou.split_seconds(wall, wall + datetime.timedelta(seconds=left))
+        if self.__tou.expensive(wall):
+            return max(0.0, needed_lux_sec - requested * cheap) / costly
+        return needed_lux_sec / cheap
+
+    # ── Report ────────────────────────────────────────────────────────────────
+    def __summary(self, day):
+        return {
+            'date':            day['date'],
+            'dli_mol':         round(day['mol'], 4),
+            'target_mol':      self.__target,
+            'led_wh':          round(day['led_wh'], 2),
+            'baseline_wh':     round(day['baseline_wh'], 2),
+            'saved_wh':        round(day['baseline_wh'] - day['led_wh'], 2),
+            'lit_hours':       round(day['lit_sec'] / 3600.0, 2),
+        }
+
+    def get_stats(self) -> dict:
+        """Today so far, the projection for the whole day and the finished days."""
+        hour, left = self.__hours()
+        day = self.__day
+        requested = self.__last[2] if self.__last is not None else 0.0
+        remaining = max(0.0, self.__target - day['mol'])
+        # Rest of the day without daylight: the plan lights what is missing,
+        # the baseline holds the user's setpoint until midnight
+        plan_rest_wh = 0.0 if left <= 0 else min(
+            remaining * 1e6 / self.__lux_to_ppfd, requested * left) / self.__led_lux_full * self.__led_power / 3600.0
+        base_rest_wh = min(1.0, requested / self.__led_lux_full) * self.__led_power * (24.0 - hour)
+        projected_led = day['led_wh'] + plan_rest_wh
+        projected_base = day['baseline_wh'] + base_rest_wh
+        history = list(self.__history)
+        return {
+            'today':             self.__summary(day),
+            'setpoint_lux':      self.__setpoint,
+            'photoperiod':       [self.__start_h, self.__end_h],
+            'in_photoperiod':    left > 0,
+            'remaining_mol':     round(remaining, 4),
+            'projected': {
+                'led_wh':      round(projected_led, 2),
+                'baseline_wh': round(projected_base, 2),
+                'saved_wh':    round(projected_base - projected_led, 2),
+            },
+            'history':           history,
+            'saved_wh_total':    round(sum(d['saved_wh'] for d in history) + day['baseline_wh'] - day['led_wh'], 2),
+        }
@@ -0,0 +1,253 @@
+"""
+energy_meter.py — Per-actuator energy from 1 Hz PZEM power sampling.
+
+EnergyMeter reads the PZEM-004T power every sample_sec and integrates it
+itself (trapezoid), so the energy does not depend on the device counter
+that app_loop resets every few hours. Each interval's energy is split over
+the actuator groups in ACTUATOR_GROUPS with a linear power model per group
+(W at full duty × duty fraction); what the models leave over is 'base'
+(Pi, ESP32, sensors), and models that overshoot the reading are scaled
+down to it, so the groups always add up to the measured energy.
+
+The models are fitted from the power steps around duty-cycle changes
+(GH_Actuators change events): the mean power and duty fractions over pre_sec
+before a change of at least min_step, and over post_sec once settle_sec has
+passed, give one equation ΔP = Σ w·Δf. A least-squares fit with forgetting,
+pulled towards the rated watts by prior_weight, solves for w. A step
+interrupted by another one before its window closes is dropped. Pump pulses
+are mostly shorter than the window, so their rated watts stand until a long
+enough pulse is seen.
+
+Energy and cost per group (₪ at the tariff band of each sample) and the
+fitted watts persist in system_state (state_key).
+"""
+import time
+import datetime
+import threading
+from collections import deque
+
+import numpy as np
+
+from utils.utils import _CUSTOM_PRINT_FUNC
+
+# Group → GH_Actuators device names that drive it (at the same duty)
+ACTUATOR_GROUPS = {
+    'heater':          ('heater', 'heater_fan'),
+    'lights':          ('light_strip_1', 'light_strip_2'),
+    'fan':             ('fan',),
+    'water_pump':      ('water_pump',),
+    'fertilizer_pump': ('fertilizer_pump',),
+}
+
+_DUTY_FULL = 4095.0
+_MAX_GAP_SEC = 10.0       # longer gaps between readings are not integrated
+_SAVE_EVERY_SEC = 60.0
+_SAME_STEP_SEC = 0.5      # changes this close together (e.g. both light strips) are one step
+
+
+class EnergyMeter:
+    def __init__(self, read_power, rated_w, tariff=None, sample_sec=1.0, pre_sec=3.0, settle_sec=1.5,
+                 post_sec=3.0, min_step=0.2, forget=0.98, prior_weight=0.5,
+                 state_store=None, state_key='energy_by_actuator',
+                 clock=time.monotonic, wallclock=datetime.datetime.now):
+        """read_power() returns the PZEM power (W), or None when the read failed."""
+        self.__read_power = read_power
+        self.__groups = list(ACTUATOR_GROUPS)
+        self.__rated = np.array([float(rated_w[g]) for g in self.__groups])
+        self.__tariff = tariff
+        self.__sample_sec = float(sample_sec)
+        self.__pre = float(pre_sec)
+        self.__settle = float(settle_sec)
+        self.__post = float(post_sec)
+        self.__min_step = float(min_step)
+        self.__forget = float(forget)
+        self.__prior_weight = float(prior_weight)
+        self.__store = state_store
+        self.__state_key = state_key
+        self.__clock = clock
+        self.__wallclock = wallclock
+
+        self.__lock = threading.Lock()
+        self.__stop = threading.Event()
+        self.__device_frac = {device: 0.0 for devices in ACTUATOR_GROUPS.values() for device in devices}
+        self.__fracs = np.zeros(len(self.__groups))
+        self.__samples = deque()           # (t, power, fracs) — long enough for one step window
+        self.__pending = []                # times of duty steps awaiting their post window
+        self.__last_step = None
+
+        n = len(self.__groups)
+        self.__prior = self.__rated.copy()
+        self.__sxx = np.zeros((n, n))      # Σ Δf·Δfᵀ, Σ Δf·ΔP — forgetting least squares
+        self.__sxy = np.zeros(n)
+        self.__watts = self.__prior.copy()
+        self.__energy = {g: [0.0, 0.0] for g in self.__groups + ['base']}    # group → [Wh, ₪]
+        self.__stats = {'samples': 0, 'failed_reads': 0, 'gap_sec': 0.0, 'measured_wh': 0.0,
+                        'steps_used': 0, 'steps_dropped': 0}
+        self.__last_power = None
+        self.__saved_at = None
+        self.__restore()
+
+    # ── Persistence ───────────────────────────────────────────────────────────
+    def __restore(self):
+        if self.__store is None:
+            return
+        saved = self.__store.get_state(self.__state_key)
+        if not isinstance(saved, dict):
+            return
+        for group, (wh, cost) in saved.get('energy', {}).items():
+            if group in self.__energy:
+                self.__energy[group] = [float(wh), float(cost)]
+        watts = saved.get('watts', {})
+        self.__prior = np.array([float(watts.get(g, w)) for g, w in zip(self.__groups, self.__rated)])
+        self.__watts = self.__prior.copy()
+
+    def __save(self, now):
+        if self.__store is not None:
+            self.__store.upsert_state(self.__state_key, {
+                'energy': {g: list(v) for g, v in self.__energy.items()},
+                'watts':  dict(zip(self.__groups, (round(float(w), 2) for w in self.__watts))),
+            })
+        self.__saved_at = now
+
+    def reset(self):
+        """Zero the energy totals (new plant cycle); the power models stay."""
+        with self.__lock:
+            self.__energy = {g: [0.0, 0.0] for g in self.__groups + ['base']}
+            self.__stats['measured_wh'] = 0.0
+            self.__save(self.__clock())
+
+    # ── Duty events ───────────────────────────────────────────────────────────
+    def on_duty_change(self, device_name, duty_cycle):
+        """GH_Actuators change listener."""
+        group = next((g for g, devices in ACTUATOR_GROUPS.items() if device_name in devices), None)
+        if group is None:
+            return
+        now = self.__clock()
+        with self.__lock:
+            frac = min(max(duty_cycle / _DUTY_FULL, 0.0), 1.0)
+            step = abs(frac - self.__device_frac[device_name])
+            self.__device_frac[device_name] = frac
+            devices = ACTUATOR_GROUPS[group]
+            self.__fracs[self.__groups.index(group)] = sum(self.__device_frac[d] for d in devices) / len(devices)
+            if step < self.__min_step or (self.__last_step is not None and now - self.__last_step < _SAME_STEP_SEC):
+                return
+            # A new step spoils the windows of the ones still settling
+            closed = [t for t in self.__pending if t + self.__settle + self.__post <= now]
+            self.__stats['steps_dropped'] += len(self.__pending) - len(closed)
+            self.__pending = closed
+            if self.__last_step is None or now - self.__pre >= self.__last_step + self.__settle:
+                self.__pending.append(now)
+            else:
+                self.__stats['steps_dropped'] += 1
+            self.__last_step = now
+
+    def __fit_step(self, t_step):
+        pre = [(p, f) for t, p, f in self.__samples if t_step - self.__pre <= t < t_step]
+        post = [(p, f) for t, p, f in self.__samples
+                if t_step + self.__settle <= t <= t_step + self.__settle + self.__post]
+        if len(pre) < 2 or len(post) < 2:
+            self.__stats['steps_dropped'] += 1
+            return
+        dp = np.mean([p for p, _ in post]) - np.mean([p for p, _ in pre])
+        df = np.mean([f for _, f in post], axis=0) - np.mean([f for _, f in pre], axis=0)
+        self.__sxx = self.__forget * self.__sxx + np.outer(df, df)
+        self.__sxy = self.__forget * self.__sxy + df * dp
+        ridge = self.__prior_weight * np.eye(len(self.__groups))
+        self.__watts = np.maximum(0.0, np.linalg.solve(self.__sxx + ridge, self.__sxy + ridge @ self.__prior))
+        self.__stats['steps_used'] += 1
+
+    # ── Sampling ──────────────────────────────────────────────────────────────
+    def sample(self):
+        """Read the power once, integrate since the last reading and fit any closed step."""
+        power = self.__read_power()
+        now = self.__clock()
+        with self.__lock:
+            if power is None:
+                self.__stats['failed_reads'] += 1
+                return
+            fracs = self.__fracs.copy()
+            if self.__samples:
+                t_prev, p_prev, f_prev = self.__samples[-1]
+                dt = now - t_prev
+                if 0 < dt <= _MAX_GAP_SEC:
+                    self.__integrate((p_prev + power) / 2.0, f_prev, dt)
+                elif dt > 0:
+                    self.__stats['gap_sec'] += dt
+            self.__samples.append((now, float(power), fracs))
+            self.__last_power = float(power)
+            self.__stats['samples'] += 1
+
+            horizon = self.__pre + self.__settle + self.__post + 2 * self.__sample_sec
+            while self.__samples and now - self.__samples[0][0] > horizon:
+                self.__samples.popleft()
+            due = [t for t in self.__pending if t + self.__settle + self.__post <= now]
+            for t_step in due:
+                self.__fit_step(t_step)
+            self.__pending = [t for t in self.__pending if t not in due]
+
+            if self.__saved_at is None or now - self.__saved_at >= _SAVE_EVERY_SEC:
+                self.__save(now)
+
+    def __allocate(self, power_w, fracs):
+        """Modelled power per group, scaled down to power_w (0 W included) when it exceeds it."""
+        modeled = self.__watts * fracs
+        total = modeled.sum()
+        if power_w is not None and total > 0 and total > power_w:
+            modeled *= max(power_w, 0.0) / total
+        return modeled
+
+    def __integrate(self, power_w, fracs, dt):
+        modeled = self.__allocate(power_w, fracs)
+        base = max(0.0, power_w - modeled.sum())
+        price = self.__tariff.price_at(self.__wallclock()) if self.__tariff is not None else 0.0
+        for group, watts in zip(self.__groups + ['base'], list(modeled) + [base]):
+            wh = float(watts) * dt / 3600.0
+            self.__energy[group][0] += wh
+            self.__energy[group][1] += wh / 1000.0 * price
+        self.__stats['measured_wh'] += float(power_w) * dt / 3600.0
+
+    def run(self):
+        """Sampling loop — the thread target. Returns after stop()."""
+        next_due = self.__clock()
+        while not self.__stop.is_set():
+            try:
+                self.sample()
+            except Exception as e:
+                _CUSTOM_PRINT_FUNC(f"[EnergyMeter] Sample error: {e}")
+            next_due += self.__sample_sec
+            delay = next_due - self.__clock()
+            if delay < 0:
+                next_due = self.__clock()      # fell behind — do not burst to catch up
+                delay = 0.0
+            self.__stop.wait(delay)
+
+    def stop(self):
+        self.__stop.set()
+
+    # ── Report ────────────────────────────────────────────────────────────────
+    def get_stats(self) -> dict:
+        with self.__lock:
+            fracs = self.__fracs.copy()
+            power = self.__last_power
+            modeled = self.__allocate(power, fracs)
+            actuators = {}
+            for i, group in enumerate(self.__groups):
+                wh, cost = self.__energy[group]
+                actuators[group] = {
+                    'energy_wh':    round(wh, 3),
+                    'cost_nis':     round(cost, 4),
+                    'power_w':      round(float(modeled[i]), 2),
+                    'duty_pct':     round(float(fracs[i]) * 100.0, 1),
+                    'model_w_full': round(float(self.__watts[i]), 2),
+                    'rated_w':      float(self.__rated[i]),
+                }
+            wh, cost = self.__energy['base']
+            return {
+                'sample_sec':  self.__sample_sec,
+                'power_w':     power,
+                'actuators':   actuators,
+                'base':        {'energy_wh': round(wh, 3), 'cost_nis': round(cost, 4),
+                                'power_w': None if power is None else round(max(0.0, power - float(modeled.sum())), 2)},
+                'total_cost_nis': round(sum(c for _, c in self.__energy.values()), 4),
+                **{k: round(v, 3) if isinstance(v, float) else v for k, v in self.__stats.items()},
+            }
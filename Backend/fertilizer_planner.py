@@ -0,0 +1,159 @@
+"""
+fertilizer_planner.py — Model-based EC dosing for the fertilizer loop.
+
+FertilizerPlanner learns how the soil EC answers a fertilizer dose:
+
+  - gain (µS/cm per mL): least-squares fit, with forgetting, of the EC rise
+    once each dose has settled (less the background drift over the same
+    time) against the delivered volume — small doses whose rise is mostly
+    probe noise carry little weight. seed() fills it from pump_logs and the
+    soil EC history so a restart does not start from zero;
+  - response time (s): when 90 % of that rise had reached the probe, read
+    off the probes taken while the dose settles; smoothed with an EMA;
+  - drift (µS/cm per s): EC change between doses (water dilution, uptake).
+
+A dose counts as settled when settle_reads consecutive probes move less than
+settle_band_us, or after max_settle_sec. The loop does not dose again
+before that, and sizes the next dose to reach the target from the gain,
+clipped to min_dose_ml … max_dose_ml. Until a gain exists the caller keeps
+its graduated pulses.
+"""
+import time
+
+# Rise (fraction of the settled rise) that defines the response time
+RESPONSE_FRACTION = 0.9
+
+
+class FertilizerPlanner:
+    def __init__(self, min_dose_ml=1.0, max_dose_ml=10.0, forget=0.8, gain_alpha=0.3, settle_band_us=15.0,
+                 settle_reads=2, probe_sec=300.0, min_settle_sec=600.0, max_settle_sec=3 * 3600,
+                 clock=time.monotonic):
+        self.__min_dose = float(min_dose_ml)
+        self.__max_dose = float(max_dose_ml)
+        self.__forget = float(forget)
+        self.__gain_alpha = float(gain_alpha)
+        self.__settle_band = float(settle_band_us)
+        self.__settle_reads = int(settle_reads)
+        self.__probe = float(probe_sec)
+        self.__min_settle = float(min_settle_sec)
+        self.__max_settle = float(max_settle_sec)
+        self.__clock = clock
+
+        self.__gain = None             # µS/cm per mL
+        self.__sxx = 0.0               # Σ ml², Σ ml·rise — forgetting least squares
+        self.__sxy = 0.0
+        self.__response = None         # s to RESPONSE_FRACTION of the settled rise
+        self.__drift = 0.0             # µS/cm per s between doses
+        self.__idle = None             # (t, ec) — last reading outside a dose response
+        self.__dose = None             # {'t', 'ml', 'before', 'reads': [(dt, ec)]} while settling
+        self.__stats = {'doses': 0, 'dosed_ml': 0.0, 'settled': 0, 'timed_out': 0,
+                        'gain_updates': 0, 'seeded_from': 0}
+        self.__last_plan = None
+
+    # ── Learning ──────────────────────────────────────────────────────────────
+    def seed(self, pump_logs, ec_history, ml_per_sec):
+        """
+        Initial gain from pump_logs documents (fertilizer pulses) and soil EC
+        sensors_data documents: the EC rise from the last reading before each
+        dose to the last one before the next dose (within max_settle_sec, at
+        least min_settle_sec later). Older logs without delivered_ml are
+        converted at ml_per_sec. Returns the number of doses used.
+        """
+        doses = sorted(
+            (doc['timestamp'].timestamp(),
+             doc['delivered_ml'] if doc.get('delivered_ml') is not None else doc['pulse_sec'] * ml_per_sec)
+            for doc in pump_logs if doc.get('pump') == 'fertilizer'
+        )
+        readings = [(doc['timestamp'].timestamp(), float(doc['sensor_value']))
+                    for doc in ec_history if doc.get('sensor_value') is not None]
+        used = 0
+        for i, (t_dose, ml) in enumerate(doses):
+            t_end = min(t_dose + self.__max_settle, doses[i + 1][0] if i + 1 < len(doses) else float('inf'))
+            before = [ec for t, ec in readings if t <= t_dose]
+            after = [ec for t, ec in readings if t_dose + self.__min_settle <= t < t_end]
+            if before and after and ml > 0:
+                self.__fit(ml, after[-1] - before[-1])
+                used += 1
+        self.__stats['seeded_from'] = used
+        return used
+
+    def __fit(self, ml, rise):
+        self.__sxx = self.__forget * self.__sxx + ml * ml
+        self.__sxy = self.__forget * self.__sxy + ml * rise
+        if self.__sxy > 0:
+            self.__gain = self.__sxy / self.__sxx
+
+    def record_dose(self, dosed_ml, ec_before):
+        """A dose of dosed_ml fired with the EC at ec_before."""
+        self.__dose = {'t': self.__clock(), 'ml': float(dosed_ml), 'before': float(ec_before), 'reads': []}
+        self.__stats['doses'] += 1
+        self.__stats['dosed_ml'] += dosed_ml
+
+    def observe(self, ec):
+        """A valid EC reading (µS/cm)."""
+        now = self.__clock()
+        if self.__dose is None:
+            if self.__idle is not None and now > self.__idle[0]:
+                rate = (ec - self.__idle[1]) / (now - self.__idle[0])
+                self.__drift = (1 - self.__gain_alpha) * self.__drift + self.__gain_alpha * rate
+            self.__idle = (now, float(ec))
+            return
+        dose = self.__dose
+        elapsed = now - dose['t']
+        dose['reads'].append((elapsed, float(ec)))
+        recent = [e for _, e in dose['reads'][-(self.__settle_reads + 1):]]
+        settled = (elapsed >= self.__min_settle and len(recent) > self.__settle_reads
+                   and max(recent) - min(recent) <= self.__settle_band)
+        if settled:
+            self.__learn(dose, elapsed, sum(recent) / len(recent))
+            self.__stats['settled'] += 1
+        elif elapsed >= self.__max_settle:
+            # Slower than the window allows — keep the gain, stretch the response time
+            self.__response = elapsed
+            self.__stats['timed_out'] += 1
+        else:
+            return
+        self.__dose = None
+        self.__idle = (now, float(ec))
+
+    def __learn(self, dose, elapsed, ec):
+        rise = ec - dose['before'] - self.__drift * elapsed
+        self.__fit(dose['ml'], rise)
+        self.__stats['gain_updates'] += 1
+        if rise <= self.__settle_band:
+            return                     # too small against the probe noise to time
+        t_resp = next((dt for dt, e in dose['reads']
+                       if e - dose['before'] - self.__drift * dt >= RESPONSE_FRACTION * rise), elapsed)
+        self.__response = t_resp if self.__response is None else \
+            (1 - self.__gain_alpha) * self.__response + self.__gain_alpha * t_resp
+
+    # ── Plan ──────────────────────────────────────────────────────────────────
+    def settling(self) -> bool:
+        """True while the last dose has not settled — no new dose yet."""
+        return self.__dose is not None
+
+    def next_read_delay(self):
+        """Seconds to the next probe of a settling dose; the first one at half the learned response time."""
+        elapsed = self.__clock() - self.__dose['t']
+        if not self.__dose['reads'] and self.__response is not None:
+            return max(self.__probe, 0.5 * self.__response - elapsed)
+        return self.__probe
+
+    def dose_for(self, ec, target):
+        """Dose (mL) to bring ec up to target, or None without a gain estimate."""
+        if self.__gain is None:
+            return None
+        dose_ml = (target - ec) / self.__gain
+        dose_ml = round(min(self.__max_dose, max(self.__min_dose, dose_ml)), 2)
+        self.__last_plan = {'dose_ml': dose_ml, 'target': target, 'from': round(ec, 1)}
+        return dose_ml
+
+    def get_stats(self) -> dict:
+        return {
+            'gain_us_per_ml':   None if self.__gain is None else round(self.__gain, 3),
+            'response_sec':     None if self.__response is None else round(self.__response),
+            'drift_us_per_h':   round(self.__drift * 3600.0, 2),
+            'settling':         self.__dose is not None,
+            'last_plan':        self.__last_plan,
+            **{k: round(v, 2) if isinstance(v, float) else v for k, v in self.__stats.items()},
+        }
@@ -0,0 +1,143 @@
+"""
+i2c_arbiter.py — Priority-ordered access to the shared I2C bus.
+
+The ESP32 (actuators) and the ADS1115 (light / soil ADC) share one busio.I2C.
+Instead of every caller spinning on try_lock(), callers queue on the arbiter
+in one of three priority classes and sleep until the bus is handed to them:
+
+    PRIORITY_SAFETY     switching a load off, stop-all
+    PRIORITY_CONTROL    control-loop duty writes, PWM init
+    PRIORITY_TELEMETRY  ADC conversions, diagnostics
+
+A higher class always goes first; within a class the bus is granted in
+arrival (FIFO) order. A transfer in progress is never pre-empted.
+
+Drivers get an I2CBusClient from arbiter.client(priority). It is a drop-in
+for busio.I2C: try_lock() blocks until the bus is granted and returns True,
+so the Adafruit drivers (and anything else written against busio) work
+unchanged.
+"""
+import time
+import threading
+import itertools
+from collections import deque
+
+from Sensors.health import LatencyHistogram
+
+PRIORITY_SAFETY    = 0
+PRIORITY_CONTROL   = 1
+PRIORITY_TELEMETRY = 2
+PRIORITY_NAMES = ('safety', 'control', 'telemetry')
+
+
+class I2CBusArbiter:
+    def __init__(self, i2c_bus):
+        self.__bus = i2c_bus
+        self.__cond = threading.Condition()
+        self.__queues = [deque() for _ in PRIORITY_NAMES]
+        self.__tickets = itertools.count()
+        self.__owner = None          # thread ident holding the bus
+        self.__depth = 0             # re-entrant acquisitions by the owner
+        self.__owner_priority = None
+        self.__granted_at = 0.0
+        self.__wait = [LatencyHistogram() for _ in PRIORITY_NAMES]
+        self.__hold = [LatencyHistogram() for _ in PRIORITY_NAMES]
+        self.__timeouts = [0] * len(PRIORITY_NAMES)
+        self.__max_queue = [0] * len(PRIORITY_NAMES)
+
+    def client(self, priority=PRIORITY_CONTROL):
+        """A busio.I2C-compatible handle whose try_lock() queues in the given class."""
+        return I2CBusClient(self, priority)
+
+    def __next_ticket(self):
+        for queue in self.__queues:
+            if queue:
+                return queue[0]
+        return None
+
+    def acquire(self, priority=PRIORITY_CONTROL, timeout=None) -> bool:
+        """Block until the bus is granted to this thread. False if timeout (s) expires first."""
+        me = threading.get_ident()
+        t_request = time.monotonic()
+        with self.__cond:
+            if self.__owner == me:
+                self.__depth += 1
+                return True
+            ticket = next(self.__tickets)
+            queue = self.__queues[priority]
+            queue.append(ticket)
+            self.__max_queue[priority] = max(self.__max_queue[priority], len(queue))
+            deadline = None if timeout is None else t_request + timeout
+            while self.__owner is not None or self.__next_ticket() != ticket:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    queue.remove(ticket)
+                    self.__timeouts[priority] += 1
+                    self.__cond.notify_all()
+                    return False
+                self.__cond.wait(remaining)
+            queue.popleft()
+            self.__owner = me
+            self.__depth = 1
+            self.__owner_priority = priority
+        # Nothing outside the arbiter should hold the bus, but never talk over it
+        while not self.__bus.try_lock():
+            time.sleep(0.001)
+        self.__granted_at = time.monotonic()
+        with self.__cond:
+            self.__wait[priority].add((self.__granted_at - t_request) * 1000.0)
+        return True
+
+    def release(self):
+        with self.__cond:
+            if self.__owner != threading.get_ident():
+                return
+            self.__depth -= 1
+            if self.__depth > 0:
+                return
+            self.__hold[self.__owner_priority].add((time.monotonic() - self.__granted_at) * 1000.0)
+            self.__bus.unlock()
+            self.__owner = None
+            self.__owner_priority = None
+            self.__cond.notify_all()
+
+    @property
+    def bus(self):
+        return self.__bus
+
+    def get_stats(self) -> dict:
+        """Per-class wait / hold time histograms, queue depth and timeouts."""
+        with self.__cond:
+            return {
+                'owner_priority': None if self.__owner_priority is None else PRIORITY_NAMES[self.__owner_priority],
+                'classes': {
+                    name: {
+                        'queued':    len(self.__queues[i]),
+                        'max_queue': self.__max_queue[i],
+                        'timeouts':  self.__timeouts[i],
+                        'wait':      self.__wait[i].to_dict(),
+                        'hold':      self.__hold[i].to_dict(),
+                    }
+                    for i, name in enumerate(PRIORITY_NAMES)
+                },
+            }
+
+
+class I2CBusClient:
+    """busio.I2C stand-in bound to one arbiter priority class."""
+    def __init__(self, arbiter, priority):
+        self.__arbiter = arbiter
+        self.__priority = priority
+
+    def try_lock(self) -> bool:
+        return self.__arbiter.acquire(self.__priority)
+
+    def acquire(self, priority=None, timeout=None) -> bool:
+        return self.__arbiter.acquire(self.__priority if priority is None else priority, timeout)
+
+    def unlock(self):
+        self.__arbiter.release()
+
+    def __getattr__(self, name):
+        # writeto, readfrom_into, writeto_then_readfrom, scan, ... go straight to the bus
+        return getattr(self.__arbiter.bus, name)
@@ -0,0 +1,159 @@
+"""
+irrigation_planner.py — Predictive read / pulse planning for the soil loop.
+
+IrrigationPlanner learns two numbers from the soil loop's own readings:
+
+  - drying rate (%/h) and
+  - pulse gain (% per pump-second),
+
+fitted together by least squares over the reads of the last window_sec:
+between two reads the moisture changes by −rate·Δt + gain·(pump-seconds fired
+in between), so a read taken after a pulse has been absorbed still measures
+the drying. That matters because a pulse often adds less than the soil loses
+during the absorb wait: the first read after it is already below the trigger,
+the loop pulses again and no two reads ever fall between the same pulses.
+While all the pulses in the window are the same length the two cannot be told
+apart from each other; prior_drying_pct_h (weighted like prior_weight hours
+of reads) settles the fit until the pulse lengths vary or the soil dries
+without a pulse. A fit with no positive gain (the water has not reached the
+probe, or noise) keeps the previous estimates.
+
+From these it plans:
+
+  - next_read_delay(): read again at read_fraction of the predicted time to
+    the trigger level, so reads thin out while the soil is far from dry and
+    tighten as it gets close (never below min_read_sec, never above
+    max_read_sec);
+  - pulse_for(): the pulse length that brings the moisture back to the
+    setpoint, clipped to min_pulse_sec … max_pulse_sec.
+
+Until an estimate exists the caller keeps its fixed behaviour (poll every
+min_read_sec, graduated pulses). The safety caps stay in the soil step.
+"""
+import time
+from collections import deque
+
+# A drying rate below this (%/h) counts as "not drying" — no crossing is predicted
+MIN_DRYING_PCT_H = 0.05
+
+
+class IrrigationPlanner:
+    def __init__(self, min_pulse_sec=0.5, max_pulse_sec=3.0, window_sec=12 * 3600,
+                 min_span_sec=900.0, min_samples=3, prior_drying_pct_h=None, prior_weight=1.0,
+                 read_fraction=0.7, min_read_sec=30.0, max_read_sec=1800.0, clock=time.monotonic):
+        self.__min_pulse = float(min_pulse_sec)
+        self.__max_pulse = float(max_pulse_sec)
+        self.__window = float(window_sec)
+        self.__min_span = float(min_span_sec)
+        self.__min_samples = int(min_samples)
+        self.__prior_rate = None if prior_drying_pct_h is None else float(prior_drying_pct_h)
+        self.__prior_weight = float(prior_weight)
+        self.__read_fraction = float(read_fraction)
+        self.__min_read = float(min_read_sec)
+        self.__max_read = float(max_read_sec)
+        self.__clock = clock
+
+        self.__intervals = deque()     # (t, Δt h, pump-seconds, Δmoisture) between consecutive reads
+        self.__last_read = None        # (t, moisture)
+        self.__pumped = 0.0            # pump-seconds fired since the last read
+        self.__rate = None             # %/s, positive = drying
+        self.__gain = None             # % per pump-second
+        self.__stats = {'reads': 0, 'pulses': 0, 'pulse_sec_total': 0.0, 'gain_updates': 0,
+                        'gain_rejected': 0, 'planned_reads': 0}
+        self.__last_plan = None
+
+    # ── Observations ──────────────────────────────────────────────────────────
+    def observe(self, moisture):
+        """A valid moisture reading (%)."""
+        now = self.__clock()
+        self.__stats['reads'] += 1
+        pumped = self.__pumped
+        if self.__last_read is not None and now > self.__last_read[0]:
+            t, before = self.__last_read
+            self.__intervals.append((now, (now - t) / 3600.0, pumped, float(moisture) - before))
+        self.__last_read = (now, float(moisture))
+        self.__pumped = 0.0
+        while self.__intervals and now - self.__intervals[0][0] > self.__window:
+            self.__intervals.popleft()
+        self.__fit(pulse_seen=pumped > 0)
+
+    def record_pulse(self, pulse_sec):
+        """A pulse of pulse_sec (pump-seconds) fired since the last reading."""
+        self.__pumped += pulse_sec
+        self.__stats['pulses'] += 1
+        self.__stats['pulse_sec_total'] += pulse_sec
+
+    def __fit(self, pulse_seen):
+        """
+        Least squares of Δm = −r·Δt + g·p over the window (r in %/h), with
+        the prior rate as a ridge on r. Leaves the estimates alone until the
+        reads span min_span_sec, and keeps them when the fit has no positive
+        gain.
+        """
+        if len(self.__intervals) < self.__min_samples or \
+                sum(dt for _, dt, _, _ in self.__intervals) * 3600.0 < self.__min_span:
+            return
+        s_tt = s_tp = s_pp = b_t = b_p = 0.0
+        for _, dt, p, dm in self.__intervals:
+            s_tt += dt * dt
+            s_tp += dt * p
+            s_pp += p * p
+            b_t -= dt * dm
+            b_p += p * dm
+        if self.__prior_rate is not None:
+            s_tt += self.__prior_weight
+            b_t += self.__prior_weight * self.__prior_rate
+        if s_pp == 0:
+            # No pulse in the window — the reads only measure the drying
+            if s_tt > 0:
+                self.__rate = b_t / s_tt / 3600.0
+            return
+        # Normal equations for (r, g): [[s_tt, −s_tp], [−s_tp, s_pp]]
+        det = s_tt * s_pp - s_tp * s_tp
+        if det <= 1e-9 * s_tt * s_pp:
+            return      # every pulse the same length and no prior — r and g not separable yet
+        rate_h = (b_t * s_pp + s_tp * b_p) / det
+        gain = (s_tt * b_p + s_tp * b_t) / det
+        if gain <= 0:
+            if pulse_seen:
+                self.__stats['gain_rejected'] += 1
+            return
+        self.__rate = rate_h / 3600.0
+        self.__gain = gain
+        if pulse_seen:
+            self.__stats['gain_updates'] += 1
+
+    # ── Plan ──────────────────────────────────────────────────────────────────
+    def next_read_delay(self, moisture, trigger):
+        """Seconds until the next read, while the moisture is above trigger."""
+        if self.__rate is None:
+            delay, eta = self.__min_read, None
+        elif self.__rate * 3600.0 < MIN_DRYING_PCT_H:
+            delay, eta = self.__max_read, None
+        else:
+            eta = (moisture - trigger) / self.__rate
+            delay = min(self.__max_read, max(self.__min_read, self.__read_fraction * eta))
+        if delay > self.__min_read:
+            self.__stats['planned_reads'] += 1
+        self.__last_plan = {'next_read_sec': round(delay, 1),
+                            'trigger_in_sec': None if eta is None else round(eta, 1)}
+        return delay
+
+    def pulse_for(self, moisture, target):
+        """Pulse length (s) to bring moisture up to target, or None without a gain estimate."""
+        if self.__gain is None:
+            return None
+        pulse_sec = (target - moisture) / self.__gain
+        pulse_sec = round(min(self.__max_pulse, max(self.__min_pulse, pulse_sec)), 2)
+        self.__last_plan = {'pulse_sec': pulse_sec, 'target': target}
+        return pulse_sec
+
+    def get_stats(self) -> dict:
+        return {
+            'drying_pct_h':       None if self.__rate is None else round(self.__rate * 3600.0, 3),
+            'gain_pct_per_sec':   None if self.__gain is None else round(self.__gain, 4),
+            'samples':            len(self.__intervals),
+            'pumped_since_read':  round(self.__pumped, 2),
+            'last_plan':          self.__last_plan,
+            **{k: round(v, 2) if isinstance(v, float) else v for k, v in self.__stats.items()},
+        }
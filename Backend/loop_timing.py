@@ -0,0 +1,126 @@
+"""
+loop_timing.py — Cycle timing of the control loops and the app loop.
+
+Every loop owns a LoopTimer. The code that paces the loop (ControlScheduler,
+app_loop.app_task) brackets each cycle with begin() / end(); the loop body
+marks where its time goes with phase():
+
+    with loop_timing.phase('read'):
+        value = env_sensors.get_light_intensity_conditioned()
+
+phase() finds the cycle running on the calling thread, so steps need no extra
+arguments. Phases should not nest. Time outside any phase (logging, lock-free
+bookkeeping) is reported as 'other'.
+
+Per loop: period and start-jitter histograms, cycle duration, time per phase,
+overruns (a cycle that took longer than its period) and missed cycles (a
+start that was late by a whole period or more).
+"""
+import time
+import threading
+from contextlib import contextmanager, nullcontext
+
+from Sensors.health import LatencyHistogram
+
+PHASES = ('read', 'compute', 'write')
+
+_timers = {}
+_timers_lock = threading.Lock()
+_local = threading.local()
+
+
+class LoopTimer:
+    def __init__(self, name, period_sec=None, clock=time.monotonic):
+        self.name = name
+        self.__clock = clock
+        self.__lock = threading.Lock()
+        self.__nominal_period = period_sec
+        self.__last_start = None
+        self.__start = None
+        self.__phase_ms = {}
+        self.__period = LatencyHistogram()
+        self.__jitter = LatencyHistogram()
+        self.__duration = LatencyHistogram()
+        self.__phases = {name: LatencyHistogram() for name in PHASES + ('other',)}
+        self.__cycles = 0
+        self.__overruns = 0
+        self.__missed = 0
+        self.__last_period_sec = period_sec
+
+    def begin(self, scheduled=None):
+        """Start a cycle. scheduled is when it should have started (same clock)."""
+        now = self.__clock()
+        with self.__lock:
+            if self.__last_start is not None:
+                self.__period.add((now - self.__last_start) * 1000.0)
+            if scheduled is not None:
+                late = max(0.0, now - scheduled)
+                self.__jitter.add(late * 1000.0)
+                if self.__last_period_sec and late >= self.__last_period_sec:
+                    self.__missed += 1
+            self.__last_start = now
+        self.__start = now
+        self.__phase_ms = {}
+        _local.timer = self
+
+    @contextmanager
+    def phase(self, name):
+        t0 = self.__clock()
+        try:
+            yield
+        finally:
+            self.__phase_ms[name] = self.__phase_ms.get(name, 0.0) + (self.__clock() - t0) * 1000.0
+
+    def end(self, period_sec=None):
+        """Close the cycle. period_sec is the delay until the next one (default: nominal)."""
+        if getattr(_local, 'timer', None) is self:
+            _local.timer = None
+        if self.__start is None:
+            return
+        duration_ms = (self.__clock() - self.__start) * 1000.0
+        period_sec = period_sec if period_sec is not None else self.__nominal_period
+        with self.__lock:
+            self.__cycles += 1
+            self.__duration.add(duration_ms)
+            for name, ms in self.__phase_ms.items():
+                self.__phases.setdefault(name, LatencyHistogram()).add(ms)
+            self.__phases['other'].add(max(0.0, duration_ms - sum(self.__phase_ms.values())))
+            if period_sec:
+                self.__last_period_sec = period_sec
+                if duration_ms > period_sec * 1000.0:
+                    self.__overruns += 1
+        self.__start = None
+
+    def to_dict(self) -> dict:
+        with self.__lock:
+            return {
+                'nominal_period_sec': self.__nominal_period,
+                'last_period_sec':    self.__last_period_sec,
+                'cycles':             self.__cycles,
+                'overruns':           self.__overruns,
+                'missed':             self.__missed,
+                'period':             self.__period.to_dict(),
+                'jitter':             self.__jitter.to_dict(),
+                'duration':           self.__duration.to_dict(),
+                'phases':             {name: h.to_dict() for name, h in self.__phases.items()},
+            }
+
+
+def register(name, period_sec=None, clock=time.monotonic) -> LoopTimer:
+    """Create (or replace) the timer of a loop."""
+    timer = LoopTimer(name, period_sec, clock)
+    with _timers_lock:
+        _timers[name] = timer
+    return timer
+
+
+def phase(name):
+    """Time a phase of the cycle running on this thread; no-op outside a cycle."""
+    timer = getattr(_local, 'timer', None)
+    return nullcontext() if timer is None else timer.phase(name)
+
+
+def get_stats() -> dict:
+    with _timers_lock:
+        timers = dict(_timers)
+    return {name: timer.to_dict() for name, timer in timers.items()}
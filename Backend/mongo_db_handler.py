@@ -200,6 +200,22 @@ class MongoDBHandler:
             _CUSTOM_PRINT_FUNC(f"Error retrieving latest document: {e}")
             return None
 
+    def get_sensor_history(self, since, until=None, sensor_ids=None) -> list:
+        """sensors_data readings with since <= timestamp < until, oldest first."""
+        try:
+            query = {'timestamp': {'$gte': since, **({'$lt': until} if until is not None else {})}}
+            if sensor_ids:
+                query['sensor_id'] = {'$in': list(sensor_ids)}
+            cursor = (
+                self.__db['sensors_data']
+                .find(query, {'_id': 0, 'sensor_id': 1, 'sensor_value': 1, 'timestamp': 1})
+                .sort('timestamp', pymongo.ASCENDING)
+            )
+            return list(cursor)
+        except Exception as e:
+            _CUSTOM_PRINT_FUNC(f"Error fetching sensor history: {e}")
+            return []
+
     def insert_capture_session(self, session_doc: dict) -> bool:
         """
         Store a full capture session document in the capture_sessions collection.
@@ -264,27 +280,42 @@ class MongoDBHandler:
             _CUSTOM_PRINT_FUNC(f"Error getting state '{key}': {e}")
             return None
 
-    def insert_pump_log(self, pump_type: str, pulse_sec: float, duty_cycle: int, flow_rate_l_min: float = 0.0) -> bool:
-        """Log a single pump pulse event to the pump_logs collection."""
+    def insert_pump_log(self, pump_type: str, pulse_sec: float, duty_cycle: int, flow_rate_l_min: float = 0.0,
+                        target_ml: float = None, delivered_ml: float = None, stop_reason: str = None) -> bool:
+        """
+        Log a single pump pulse event to the pump_logs collection.
+        Volumetric doses also record the target and the volume the flow sensor
+        counted, and why the pump stopped (volume / time_cap / no_flow / low_flow).
+        """
         try:
-            self.__db['pump_logs'].insert_one({
+            doc = {
                 'pump':            pump_type,
                 'timestamp':       datetime.datetime.now(),
                 'pulse_sec':       pulse_sec,
                 'duty_cycle':      duty_cycle,
                 'flow_rate_l_min': round(flow_rate_l_min, 4),
-            })
+            }
+            if target_ml is not None:
+                doc['target_ml'] = round(target_ml, 2)
+                doc['delivered_ml'] = round(delivered_ml, 2)
+                doc['stop_reason'] = stop_reason
+            self.__db['pump_logs'].insert_one(doc)
             return True
         except Exception as e:
             _CUSTOM_PRINT_FUNC(f"Error inserting pump log: {e}")
             return False
 
-    def get_pump_logs(self, limit: int = 50) -> list:
-        """Return the most recent pump pulse events, newest first."""
+    def get_pump_logs(self, limit: int = 50, pump_type: str = None, since=None) -> list:
+        """Return the most recent pump pulse events, newest first (optionally one pump / since a time)."""
         try:
+            query = {}
+            if pump_type is not None:
+                query['pump'] = pump_type
+            if since is not None:
+                query['timestamp'] = {'$gte': since}
             cursor = (
                 self.__db['pump_logs']
-                .find({}, {'_id': 0})
+                .find(query, {'_id': 0})
                 .sort('timestamp', pymongo.DESCENDING)
                 .limit(limit)
             )
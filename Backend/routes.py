@@ -5,12 +5,16 @@ Use init_routes() to create and register a Blueprint.
 The function receives every dependency the routes need so there are no
 module-level imports of hardware objects.
 """
+import json
+import math
 import threading
 
 import capture_manager
 import actuator_helpers
 import app_loop
+import loop_timing
 from flask import Blueprint, Response, jsonify, render_template, request
+from simulation.hardware import get_rig
 from utils.utils import _CUSTOM_PRINT_FUNC
 from config import (
     WATER_PRICE_PER_LITER_NIS,
@@ -32,6 +36,13 @@ def init_routes(
     soil_semaphore,
     electricity_semaphore,
     water_flow_semaphore,
+    telemetry_store=None,
+    i2c_arbiter=None,
+    control_scheduler=None,
+    autotune_service=None,
+    dli_planner=None,
+    tou_planner=None,
+    energy_meter=None,
 ):
     """Register all routes on *app* and return the Blueprint."""
 
@@ -45,20 +56,19 @@ def init_routes(
         try:
             temperature_semaphore.acquire()
             try:
-                air_temp_c   = env_sensors.get_air_temperature_C()
-                air_humidity = env_sensors.get_air_humidity()
+                air_temp_c, air_humidity = env_sensors.get_air_values_conditioned()
             finally:
                 temperature_semaphore.release()
 
             light_semaphore.acquire()
             try:
-                light_intensity = env_sensors.get_light_intensity()
+                light_intensity = env_sensors.get_light_intensity_conditioned()
             finally:
                 light_semaphore.release()
 
             soil_semaphore.acquire()
             try:
-                soil_ph, soil_ec, soil_humidity, soil_temp = env_sensors.get_soil_values()
+                soil_ph, soil_ec, soil_humidity, soil_temp = env_sensors.get_soil_values_conditioned()
             finally:
                 soil_semaphore.release()
 
@@ -83,7 +93,7 @@ def init_routes(
             total_energy_wh   = app_loop.get_total_energy_wh()
 
             water_cost = round(water_amount * WATER_PRICE_PER_LITER_NIS, 4)
-            elec_cost  = round(total_energy_wh * ELECTRICITY_PRICE_PER_KWH_NIS / 1000.0, 4)
+            elec_cost  = round(app_loop.get_energy_cost_nis(), 4)
             fert_cost  = round((fertilizer_amount / 5.0) * FERTILIZER_PRICE_PER_5_LITERS_NIS, 4)
             total_cost = round(water_cost + elec_cost + fert_cost, 4)
 
@@ -111,11 +121,91 @@ def init_routes(
                     'electricity_cost_nis': elec_cost,
                     'fertilizer_cost_nis':  fert_cost,
                     'total_cost_nis':       total_cost,
+                    'raw': {
+                        channel: env_sensors.get_raw_and_conditioned(channel)[0]
+                        for channel in ('air_temperature', 'air_humidity', 'light_intensity',
+                                        'soil_ph', 'soil_ec', 'soil_humidity', 'soil_temperature')
+                    },
                 },
             })
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
 
+    @bp.route('/api/sensors/conditioning', methods=['GET'])
+    def get_sensor_conditioning():
+        """Per-channel raw vs. conditioned values and outlier/rate-limit counters."""
+        try:
+            return jsonify({'success': True, 'channels': env_sensors.get_conditioning_stats()})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @bp.route('/api/sensors/health', methods=['GET'])
+    def get_sensor_health():
+        """Per-sensor quality, staleness, success rate and read-latency histograms per bus."""
+        try:
+            return jsonify({'success': True, **env_sensors.get_sensor_health()})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @bp.route('/api/simulation', methods=['GET'])
+    def get_simulation_state():
+        """Greenhouse model and simulated ESP32 state (HARDWARE_BACKEND == 'sim' only)."""
+        rig = get_rig()
+        if rig is None:
+            return jsonify({'success': False, 'error': 'Not running on the simulated rig'}), 404
+        return jsonify({'success': True, **rig.get_status()})
+
+    # ── Recent history (in-memory, no DB round-trip) ──────────────────────────
+
+    @bp.route('/api/history', methods=['GET'])
+    def get_history_channels():
+        """List the channels held in the in-memory telemetry store."""
+        if telemetry_store is None:
+            return jsonify({'success': False, 'error': 'Telemetry store not configured'}), 503
+        return jsonify({
+            'success':      True,
+            'channels':     telemetry_store.channels(),
+            'memory_bytes': telemetry_store.memory_bytes(),
+        })
+
+    @bp.route('/api/history/<channel>', methods=['GET'])
+    def get_history(channel):
+        """Recent samples of one channel. Query params: ?seconds=3600&max_points=500"""
+        if telemetry_store is None:
+            return jsonify({'success': False, 'error': 'Telemetry store not configured'}), 503
+        if not telemetry_store.has_channel(channel):
+            return jsonify({'success': False, 'error': f'Unknown channel: {channel}'}), 404
+        try:
+            seconds    = float(request.args.get('seconds', 3600))
+            max_points = max(1, int(request.args.get('max_points', 500)))
+            t, v = telemetry_store.window(channel, seconds)
+            if len(t) > max_points:
+                # Stride decimation keeps the newest sample
+                step = -(-len(t) // max_points)
+                t, v = t[::-1][::step][::-1], v[::-1][::step][::-1]
+            return jsonify({
+                'success':    True,
+                'channel':    channel,
+                'timestamps': t.round(3).tolist(),
+                'values':     v.tolist(),
+                'stats':      telemetry_store.stats(channel, seconds),
+            })
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @bp.route('/api/history/<channel>/stats', methods=['GET'])
+    def get_history_stats(channel):
+        """Mean / min / max / slope (units per second) over ?seconds=3600"""
+        if telemetry_store is None:
+            return jsonify({'success': False, 'error': 'Telemetry store not configured'}), 503
+        if not telemetry_store.has_channel(channel):
+            return jsonify({'success': False, 'error': f'Unknown channel: {channel}'}), 404
+        try:
+            seconds = float(request.args.get('seconds', 3600))
+            return jsonify({'success': True, 'channel': channel, 'stats': telemetry_store.stats(channel, seconds)})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
     # ── Actuator endpoints ────────────────────────────────────────────────────
 
     @bp.route('/api/actuators', methods=['GET'])
@@ -161,6 +251,112 @@ def init_routes(
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
 
+    @bp.route('/api/actuators/write_stats', methods=['GET'])
+    def get_actuator_write_stats():
+        """ESP32 duty-cycle frames sent vs. skipped because the channel was already at that value."""
+        try:
+            return jsonify({'success': True, 'data': env_actuators.get_write_stats()})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @bp.route('/api/i2c/arbiter', methods=['GET'])
+    def get_i2c_arbiter_stats():
+        """Per-priority-class I2C bus wait and hold time histograms."""
+        if i2c_arbiter is None:
+            return jsonify({'success': False, 'error': 'I2C arbiter not enabled'}), 404
+        try:
+            return jsonify({'success': True, 'data': i2c_arbiter.get_stats()})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @bp.route('/api/debug/loops', methods=['GET'])
+    def get_loop_timing():
+        """Period, jitter, overruns and read / compute / write time of every loop."""
+        try:
+            data = {'loops': loop_timing.get_stats()}
+            if control_scheduler is not None:
+                data['scheduler'] = control_scheduler.get_tasks()
+            return jsonify({'success': True, 'data': data})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    # ── PID autotune ──────────────────────────────────────────────────────────
+    @bp.route('/api/autotune', methods=['GET'])
+    def get_autotune_status():
+        """State of the relay autotune, last results and the gains in use."""
+        if autotune_service is None:
+            return jsonify({'success': False, 'error': 'Autotune not enabled'}), 404
+        return jsonify({'success': True, 'data': autotune_service.get_status()})
+
+    @bp.route('/api/autotune/start', methods=['POST'])
+    def start_autotune():
+        """Body: {loop, setpoint?, high?, low?, hysteresis?, cycles?, max_duration_sec?}"""
+        if autotune_service is None:
+            return jsonify({'success': False, 'error': 'Autotune not enabled'}), 404
+        data = request.get_json(silent=True) or {}
+        if not isinstance(data, dict):
+            return jsonify({'success': False, 'error': 'Body must be a JSON object'}), 400
+        try:
+            overrides = {key: float(data[key]) for key in ('setpoint', 'high', 'low', 'hysteresis', 'max_duration_sec')
+                         if data.get(key) is not None}
+            if not all(math.isfinite(value) for value in overrides.values()):
+                raise ValueError('not a finite number')
+            if data.get('cycles') is not None:
+                if isinstance(data['cycles'], bool) or float(data['cycles']) != int(data['cycles']):
+                    raise ValueError('cycles must be a whole number')
+                overrides['cycles'] = int(data['cycles'])
+            if overrides.get('cycles', 1) < 1:
+                raise ValueError('cycles must be at least 1')
+            if overrides.get('hysteresis', 0.0) < 0 or overrides.get('max_duration_sec', 1.0) <= 0:
+                raise ValueError('hysteresis must be >= 0 and max_duration_sec > 0')
+            if 'high' in overrides and 'low' in overrides and overrides['high'] <= overrides['low']:
+                raise ValueError('high must be above low')
+        except (TypeError, ValueError, OverflowError) as e:
+            return jsonify({'success': False, 'error': f'Invalid autotune parameter: {e}'}), 400
+        setpoint = overrides.pop('setpoint', None)
+        ok, message = autotune_service.start(str(data.get('loop', '')), setpoint=setpoint, **overrides)
+        return jsonify({'success': ok, 'message' if ok else 'error': message}), 200 if ok else 409
+
+    @bp.route('/api/autotune/cancel', methods=['POST'])
+    def cancel_autotune():
+        if autotune_service is None:
+            return jsonify({'success': False, 'error': 'Autotune not enabled'}), 404
+        autotune_service.cancel()
+        return jsonify({'success': True})
+
+    @bp.route('/api/autotune/apply', methods=['POST'])
+    def apply_autotune():
+        """Body: {loop}. Applies the last result to the running loop and persists it."""
+        if autotune_service is None:
+            return jsonify({'success': False, 'error': 'Autotune not enabled'}), 404
+        data = request.get_json(silent=True) or {}
+        ok, result = autotune_service.apply(data.get('loop', ''))
+        if not ok:
+            return jsonify({'success': False, 'error': result}), 404
+        return jsonify({'success': True, 'gains': result})
+
+    @bp.route('/api/autotune/stream', methods=['GET'])
+    def stream_autotune():
+        """Server-sent events with autotune progress; ?after=<seq> resumes a stream."""
+        if autotune_service is None:
+            return jsonify({'success': False, 'error': 'Autotune not enabled'}), 404
+        after = request.args.get('after', 0, type=int)
+
+        def generate():
+            seq = after
+            while True:
+                events = autotune_service.wait_events(seq)
+                for event in events:
+                    seq = event['seq']
+                    yield f"id: {seq}\ndata: {json.dumps(event)}\n\n"
+                if not events:
+                    if autotune_service.get_status()['state'] != 'running':
+                        return
+                    yield ": keep-alive\n\n"
+
+        return Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
     @bp.route('/api/actuators/heater', methods=['POST'])
     def control_heater():
         """Control heater — expects {state: 'on'/'off'} or {duty_cycle: 0-4095}."""
@@ -289,13 +485,54 @@ def init_routes(
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
 
-    # ── Resource reset ────────────────────────────────────────────────────────
+    # ── Resources ─────────────────────────────────────────────────────────────
+
+    @bp.route('/api/resources', methods=['GET'])
+    def get_resources():
+        """Running water / energy / fertilizer totals and costs (energy per tariff band), lighting and TOU plans."""
+        try:
+            water_amount      = app_loop.get_total_water_liters()
+            fertilizer_amount = app_loop.get_total_fertilizer_liters()
+            total_energy_wh   = app_loop.get_total_energy_wh()
+            data = {
+                'water_liters':         round(water_amount, 3),
+                'fertilizer_liters':    round(fertilizer_amount, 3),
+                'energy_wh':            round(total_energy_wh, 2),
+                'water_cost_nis':       round(water_amount * WATER_PRICE_PER_LITER_NIS, 4),
+                'electricity_cost_nis': round(app_loop.get_energy_cost_nis(), 4),
+                'electricity_by_band':  app_loop.get_energy_by_band(),
+                'fertilizer_cost_nis':  round((fertilizer_amount / 5.0) * FERTILIZER_PRICE_PER_5_LITERS_NIS, 4),
+            }
+            if dli_planner is not None:
+                lighting = dli_planner.get_stats()
+                lighting['saved_cost_nis_total'] = round(
+                    lighting['saved_wh_total'] * ELECTRICITY_PRICE_PER_KWH_NIS / 1000.0, 4)
+                lighting['projected']['saved_cost_nis'] = round(
+                    lighting['projected']['saved_wh'] * ELECTRICITY_PRICE_PER_KWH_NIS / 1000.0, 4)
+                data['lighting'] = lighting
+            if tou_planner is not None:
+                data['tariff'] = dict(tou_planner.get_stats(), **tou_planner.tariff.describe())
+            return jsonify({'success': True, 'data': data})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
+
+    @bp.route('/api/energy/actuators', methods=['GET'])
+    def get_energy_by_actuator():
+        """Energy, cost and present power per actuator from the 1 Hz PZEM sampling, and the fitted power models."""
+        if energy_meter is None:
+            return jsonify({'success': False, 'error': 'Energy meter not enabled'}), 404
+        try:
+            return jsonify({'success': True, 'data': energy_meter.get_stats()})
+        except Exception as e:
+            return jsonify({'success': False, 'error': str(e)}), 500
 
     @bp.route('/api/reset_resources', methods=['POST'])
     def reset_resources():
         """Reset all resource counters to zero for a new plant cycle."""
         try:
             app_loop.reset_resources()
+            if energy_meter is not None:
+                energy_meter.reset()
             return jsonify({'success': True, 'message': 'All resource counters reset to zero.'})
         except Exception as e:
             return jsonify({'success': False, 'error': str(e)}), 500
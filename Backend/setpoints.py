@@ -29,6 +29,7 @@ class GH_Setpoints:
         self.__mqtt_handler    = mqtt_handler
         self.__mongo_db_handler = mongo_db_handler
         self.__actuator_handler = actuator_handler
+        self.__listeners        = []   # callback(field, value) after every setpoint / mode change
 
         # Load the single setpoints document from MongoDB — overrides defaults if saved previously
         self._load_all_from_mongo()
@@ -72,6 +73,22 @@ class GH_Setpoints:
         except Exception as e:
             _CUSTOM_PRINT_FUNC(f"[Setpoints] Could not save '{field}' to MongoDB: {e}")
 
+    def add_change_listener(self, callback) -> None:
+        """Call callback(field, value) after a setpoint or the operation mode changes."""
+        if callback not in self.__listeners:
+            self.__listeners.append(callback)
+
+    def __changed(self, field: str, value) -> None:
+        self._save(field, value)
+        self.__notify(field, value)
+
+    def __notify(self, field: str, value) -> None:
+        for callback in list(self.__listeners):
+            try:
+                callback(field, value)
+            except Exception as e:
+                _CUSTOM_PRINT_FUNC(f"[Setpoints] Change listener error for '{field}': {e}")
+
     def save_all_setpoints(self) -> None:
         """Replace the single setpoints document with all current values."""
         try:
@@ -120,6 +137,8 @@ class GH_Setpoints:
                 if isinstance(event, threading.Event):
                     event.set()
 
+        self.__notify("operation_mode", mode)
+
     def get_operation_mode(self) -> str:
         return self.operation_mode
 
@@ -132,52 +151,52 @@ class GH_Setpoints:
 
     def set_temperature_setpoint(self, value: float) -> None:
         self.__temperature_setpoint = float(value)
-        self._save("temperature", float(value))
+        self.__changed("temperature", float(value))
         _CUSTOM_PRINT_FUNC(f"[Setpoints] Temperature → {value} °C")
 
     def set_humidity_setpoint(self, value: float) -> None:
         self.__humidity_setpoint = float(value)
-        self._save("humidity", float(value))
+        self.__changed("humidity", float(value))
         _CUSTOM_PRINT_FUNC(f"[Setpoints] Humidity → {value} %")
 
     def set_light_setpoint(self, value: float) -> None:
         self.__light_setpoint = float(value)
-        self._save("light", float(value))
+        self.__changed("light", float(value))
         _CUSTOM_PRINT_FUNC(f"[Setpoints] Light → {value}")
 
     def set_soil_ph_setpoint(self, value: float) -> None:
         self.__soil_ph_setpoint = float(value)
-        self._save("soil_ph", float(value))
+        self.__changed("soil_ph", float(value))
         _CUSTOM_PRINT_FUNC(f"[Setpoints] Soil pH → {value}")
 
     def set_soil_ec_setpoint(self, value: float) -> None:
         self.__soil_ec_setpoint = float(value)
-        self._save("soil_ec", float(value))
+        self.__changed("soil_ec", float(value))
         _CUSTOM_PRINT_FUNC(f"[Setpoints] Soil EC → {value} µS/cm")
 
     def set_soil_temp_setpoint(self, value: float) -> None:
         self.__soil_temp_setpoint = float(value)
-        self._save("soil_temp", float(value))
+        self.__changed("soil_temp", float(value))
         _CUSTOM_PRINT_FUNC(f"[Setpoints] Soil temp → {value} °C")
 
     def set_soil_humidity_setpoint(self, value: float) -> None:
         self.__soil_humidity_setpoint = float(value)
-        self._save("soil_moisture", float(value))
+        self.__changed("soil_moisture", float(value))
         _CUSTOM_PRINT_FUNC(f"[Setpoints] Soil moisture → {value} %")
 
     def set_soil_humidity_hysteresis(self, value: float) -> None:
         self.__soil_humidity_hysteresis = float(value)
-        self._save("soil_hysteresis", float(value))
+        self.__changed("soil_hysteresis", float(value))
         _CUSTOM_PRINT_FUNC(f"[Setpoints] Soil hysteresis → {value} %")
 
     def set_water_flow_setpoint(self, value: float) -> None:
         self.__water_flow_setpoint = float(value)
-        self._save("water_flow", float(value))
+        self.__changed("water_flow", float(value))
         _CUSTOM_PRINT_FUNC(f"[Setpoints] Water flow → {value} L/h")
 
     def set_fertilizer_flow_setpoint(self, value: float) -> None:
         self.__fertilizer_flow_setpoint = float(value)
-        self._save("fertilizer_flow", float(value))
+        self.__changed("fertilizer_flow", float(value))
         _CUSTOM_PRINT_FUNC(f"[Setpoints] Fertilizer flow → {value} L/h")
 
     # ── Getters ────────────────────────────────────────────────────────────────
@@ -0,0 +1,438 @@
+import time
+import random
+import struct
+import threading
+
+# ESP32 frame protocol — must match Actuators/actuators.py
+JOB_INIT_PWM  = 0b000
+JOB_SET_DUTY  = 0b001
+JOB_RESTART   = 0b010
+JOB_LED_TOG   = 0b011
+JOB_GET_STATE = 0b100
+JOB_GET_FREQ  = 0b101
+JOB_GET_DUTY  = 0b110
+JOB_SET_DUTY_MULTI = 0b111
+
+ESP_READY     = 0x01
+ESP_NOT_READY = 0x02
+ESP_OK        = 0x03
+ESP_NOT_OK    = 0x04
+
+_FRAME_SIZE = 32
+_I2C_BIT_TIME_SEC = 1.0 / 100_000    # standard-mode I2C
+
+
+def modbus_crc16(data):
+    """Modbus RTU CRC16 (poly 0xA001), as used by the soil probe and the PZEM-004T"""
+    crc = 0xFFFF
+    for byte in data:
+        crc ^= byte
+        for _ in range(8):
+            if crc & 0x0001:
+                crc = (crc >> 1) ^ 0xA001
+            else:
+                crc >>= 1
+    return crc
+
+
+# ── I2C ───────────────────────────────────────────────────────────────────────
+
+class SimI2CBus:
+    """
+    Stand-in for busio.I2C. Devices are attached by address; each transfer
+    takes the time the bytes would need on a 100 kHz bus. Like Blinka, the
+    lock is per bus object and try_lock() never blocks.
+    """
+    def __init__(self, devices):
+        self.__devices = devices
+        self.__lock = threading.Lock()
+
+    def try_lock(self) -> bool:
+        return self.__lock.acquire(blocking=False)
+
+    def unlock(self):
+        try:
+            self.__lock.release()
+        except RuntimeError:
+            pass
+
+    def scan(self):
+        return sorted(self.__devices.keys())
+
+    def __device(self, address):
+        device = self.__devices.get(address)
+        if device is None:
+            raise OSError(121, "Remote I/O error")    # what the Linux driver raises on a NACK
+        return device
+
+    def writeto(self, address, buffer, *, start=0, end=None):
+        data = bytes(buffer[start:end])
+        device = self.__device(address)
+        time.sleep((len(data) + 1) * 9 * _I2C_BIT_TIME_SEC)
+        device.i2c_write(data)
+
+    def readfrom_into(self, address, buffer, *, start=0, end=None):
+        end = len(buffer) if end is None else end
+        device = self.__device(address)
+        time.sleep((end - start + 1) * 9 * _I2C_BIT_TIME_SEC)
+        data = device.i2c_read(end - start)
+        buffer[start:end] = data
+
+    def writeto_then_readfrom(self, address, buffer_out, buffer_in, *,
+                              out_start=0, out_end=None, in_start=0, in_end=None):
+        self.writeto(address, buffer_out, start=out_start, end=out_end)
+        self.readfrom_into(address, buffer_in, start=in_start, end=in_end)
+
+    def deinit(self):
+        pass
+
+
+class SimESP32:
+    """
+    ESP32 PWM co-processor at 0x30. Decodes the 32-byte frames sent by
+    GH_Actuators (3-bit job id, 5-bit payload length) and drives the model
+    load wired to each LEDC channel. GET_* jobs queue a reply
+    (status byte + 2-byte value) for the next read.
+    """
+    def __init__(self, model, channel_loads, endianness='big'):
+        self.__model = model
+        self.__channel_loads = dict(channel_loads)
+        self.__endianness = endianness
+        self.__channels = {}       # channel -> {'pin', 'frequency', 'duty', 'timer'}
+        self.__reply = bytes([ESP_READY])
+        self.__led = False
+        self.frames = 0
+        self.bad_frames = 0
+        self.restarts = 0
+
+    def __int(self, data):
+        return int.from_bytes(data, self.__endianness)
+
+    def __apply(self, channel, duty):
+        self.__channels[channel]['duty'] = duty
+        load = self.__channel_loads.get(channel)
+        if load is not None:
+            self.__model.set_duty(load, duty)
+
+    def i2c_write(self, frame):
+        self.frames += 1
+        if len(frame) != _FRAME_SIZE:
+            self.bad_frames += 1
+            self.__reply = bytes([ESP_NOT_OK])
+            return
+        job = frame[0] >> 5
+        length = frame[0] & 0x1F
+        payload = frame[1:1 + length]
+        ok = True
+        if job == JOB_INIT_PWM and length >= 9:
+            channel = payload[7]
+            self.__channels[channel] = {
+                'frequency': self.__int(payload[0:4]),
+                'pin':       payload[6],
+                'timer':     payload[8],
+                'duty':      0,
+            }
+            self.__apply(channel, self.__int(payload[4:6]))
+        elif job == JOB_SET_DUTY and length >= 4:
+            duty, pin, channel = self.__int(payload[0:2]), payload[2], payload[3]
+            state = self.__channels.get(channel)
+            ok = state is not None and state['pin'] == pin and 0 <= duty <= 4096
+            if ok:
+                self.__apply(channel, duty)
+        elif job == JOB_SET_DUTY_MULTI and length >= 4 and length % 4 == 0:
+            # Reference behaviour for the batched frame: validate every block first,
+            # then apply all of them, so a bad block leaves every channel untouched
+            updates = [(self.__int(payload[i:i + 2]), payload[i + 2], payload[i + 3]) for i in range(0, length, 4)]
+            for duty, pin, channel in updates:
+                state = self.__channels.get(channel)
+                if state is None or state['pin'] != pin or not 0 <= duty <= 4096:
+                    ok = False
+            if ok:
+                for duty, _, channel in updates:
+                    self.__apply(channel, duty)
+        elif job == JOB_RESTART:
+            self.restarts += 1
+            for channel in list(self.__channels):
+                self.__apply(channel, 0)
+            self.__channels.clear()
+        elif job == JOB_LED_TOG:
+            self.__led = not self.__led
+        elif job in (JOB_GET_STATE, JOB_GET_FREQ, JOB_GET_DUTY) and length >= 1:
+            state = self.__channels.get(payload[0])
+            if state is None:
+                self.__reply = bytes([ESP_NOT_OK])
+                return
+            value = {JOB_GET_STATE: 1 if state['duty'] else 0,
+                     JOB_GET_FREQ:  min(state['frequency'], 0xFFFF),
+                     JOB_GET_DUTY:  state['duty']}[job]
+            self.__reply = bytes([ESP_OK]) + value.to_bytes(2, self.__endianness)
+            return
+        else:
+            ok = False
+        if not ok:
+            self.bad_frames += 1
+        self.__reply = bytes([ESP_OK if ok else ESP_NOT_OK])
+
+    def i2c_read(self, n):
+        reply, self.__reply = self.__reply, bytes([ESP_READY])
+        return (reply + b'\x00' * n)[:n]
+
+    def get_channels(self) -> dict:
+        return {ch: dict(state) for ch, state in self.__channels.items()}
+
+
+# ── ADS1115 ───────────────────────────────────────────────────────────────────
+
+class SimADS1115Inputs:
+    """
+    Analog front-end wired to the ADS1115 inputs. Each source maps a model
+    reading to a voltage: the LDR divider (lux = V * 200) and the capacitive
+    soil probe (wet ≈ 0.88 V, dry ≈ 2.25 V).
+    """
+    def __init__(self, model, channel_sources):
+        self.__model = model
+        self.__channel_sources = dict(channel_sources)
+
+    def voltage(self, channel):
+        source = self.__channel_sources.get(channel)
+        if source == 'light':
+            return self.__model.light_lux() / 200.0
+        if source == 'soil_moisture':
+            moisture = self.__model.soil()[0]
+            raw = 18000.0 - moisture / 100.0 * (18000.0 - 7000.0)
+            return raw * 4.096 / 32767.0
+        return 0.0
+
+    # The ADS1115 answers address probes; conversions go through the driver fake
+    def i2c_write(self, data):
+        pass
+
+    def i2c_read(self, n):
+        return b'\x00' * n
+
+
+# ── UART (Modbus RTU) ─────────────────────────────────────────────────────────
+
+class SimSoilProbe:
+    """7-in-1 RS485 soil probe: function 0x03, 4 registers (hum, temp, EC, pH)"""
+    def __init__(self, model):
+        self.__model = model
+
+    def handle(self, request):
+        if len(request) < 8 or request[0] != 0x01 or request[1] != 0x03:
+            return b''
+        if modbus_crc16(request[:6]) != struct.unpack("<H", request[6:8])[0]:
+            return b''
+        moisture, temp, ec, ph = self.__model.soil()
+        body = bytes([0x01, 0x03, 0x08]) + struct.pack(
+            ">HHHH", int(round(moisture * 10)), int(round(temp * 10)), int(round(ec)), int(round(ph * 10))
+        )
+        return body + struct.pack("<H", modbus_crc16(body))
+
+
+class SimPZEM004T:
+    """PZEM-004T v3: function 0x04 reads 10 input registers, 0x42 resets energy"""
+    def __init__(self, model):
+        self.__model = model
+
+    def handle(self, request):
+        if len(request) >= 8 and request[0] == 0x01 and request[1] == 0x04:
+            if modbus_crc16(request[:6]) != struct.unpack("<H", request[6:8])[0]:
+                return b''
+            voltage, current, power, energy, frequency, power_factor = self.__model.electricity()
+            current_raw = int(round(current * 1000))
+            power_raw = int(round(power * 10))
+            energy_raw = int(energy)
+            body = bytes([0x01, 0x04, 0x14]) + struct.pack(
+                ">HHHHHHHHHH",
+                int(round(voltage * 10)),
+                current_raw & 0xFFFF, (current_raw >> 16) & 0xFFFF,
+                power_raw & 0xFFFF, (power_raw >> 16) & 0xFFFF,
+                energy_raw & 0xFFFF, (energy_raw >> 16) & 0xFFFF,
+                int(round(frequency * 10)),
+                int(round(power_factor * 100)),
+                0,
+            )
+            return body + struct.pack("<H", modbus_crc16(body))
+        if len(request) >= 4 and request[0] == 0x01 and request[1] == 0x42:
+            if modbus_crc16(request[:2]) != struct.unpack("<H", request[2:4])[0]:
+                return b''
+            self.__model.reset_energy()
+            return bytes(request[:4])
+        return b''
+
+
+class SimSerial:
+    """
+    Stand-in for serial.Serial. Writes are handed to the responder attached
+    to the port; its reply becomes readable after the time it takes on the wire.
+    """
+    def __init__(self, responders, port=None, baudrate=9600, bytesize=8, parity='N',
+                 stopbits=1, timeout=None, **kwargs):
+        if port not in responders:
+            raise OSError(2, f"could not open port {port}: No such file or directory")
+        self.port = port
+        self.baudrate = baudrate
+        self.timeout = timeout
+        self.is_open = True
+        self.__responder = responders[port]
+        self.__rx = bytearray()
+        self.__ready_at = 0.0
+        self.__lock = threading.Lock()
+
+    @property
+    def in_waiting(self):
+        return len(self.__rx) if time.monotonic() >= self.__ready_at else 0
+
+    def write(self, data):
+        data = bytes(data)
+        char_time = 10.0 / self.baudrate
+        reply = self.__responder.handle(data)
+        with self.__lock:
+            self.__rx.extend(reply)
+            self.__ready_at = time.monotonic() + (len(data) + len(reply)) * char_time
+        return len(data)
+
+    def read(self, size=1):
+        delay = self.__ready_at - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        with self.__lock:
+            data = bytes(self.__rx[:size])
+            del self.__rx[:size]
+        if len(data) < size and self.timeout:
+            # A short reply means the real port would wait out the timeout
+            time.sleep(self.timeout)
+        return data
+
+    def reset_input_buffer(self):
+        with self.__lock:
+            self.__rx.clear()
+
+    def flush(self):
+        pass
+
+    def close(self):
+        self.is_open = False
+
+
+# ── DHT22 ─────────────────────────────────────────────────────────────────────
+
+class SimDHT22:
+    """
+    Stand-in for adafruit_dht.DHT22. Each .temperature access is a new
+    acquisition that takes ~5 ms and fails with RuntimeError at the rate the
+    bit-banged driver shows on a Pi; .humidity returns the same frame.
+    """
+    def __init__(self, model, pin=None, failure_rate=0.1, seed=None):
+        self.__model = model
+        self.__pin = pin
+        self.__failure_rate = failure_rate
+        self.__rng = random.Random(seed)
+        self.__humidity = None
+
+    @property
+    def temperature(self):
+        time.sleep(0.005)
+        if self.__rng.random() < self.__failure_rate:
+            raise RuntimeError("Checksum did not validate. Try again.")
+        temp, hum = self.__model.air()
+        self.__humidity = round(hum, 1)
+        return round(temp, 1)
+
+    @property
+    def humidity(self):
+        if self.__humidity is None:
+            _ = self.temperature
+        return self.__humidity
+
+    def exit(self):
+        pass
+
+
+# ── GPIO (libgpiod v1 flow-sensor edges) ──────────────────────────────────────
+
+class SimLineEvent:
+    RISING_EDGE = 1
+    FALLING_EDGE = 2
+
+    def __init__(self, type, timestamp_ns):
+        self.type = type
+        self.sec = timestamp_ns // 1_000_000_000
+        self.nsec = timestamp_ns % 1_000_000_000
+
+
+class SimFlowLine:
+    """
+    One GPIO line wired to a YF-S201 on a pump outlet. Edges are generated
+    from the pump's integrated volume (pulses_per_litre per litre), spread
+    evenly over the time since the last drain and timestamped on the
+    monotonic clock like kernel edge events.
+    """
+    def __init__(self, model, load, pulses_per_litre=450.0):
+        self.__model = model
+        self.__load = load
+        self.__pulses_per_litre = pulses_per_litre
+        self.__emitted = None
+        self.__last_ns = None
+        self.__pending = []
+        self.__requested = False
+
+    def request(self, consumer=None, type=None, flags=None, **kwargs):
+        self.__requested = True
+        self.__emitted = int(self.__model.pumped_volume(self.__load) * self.__pulses_per_litre)
+        self.__last_ns = time.monotonic_ns()
+
+    def __collect(self):
+        now_ns = time.monotonic_ns()
+        total = int(self.__model.pumped_volume(self.__load) * self.__pulses_per_litre)
+        n = total - self.__emitted
+        if n > 0:
+            span = now_ns - self.__last_ns
+            self.__pending.extend(
+                SimLineEvent(SimLineEvent.RISING_EDGE, self.__last_ns + span * (i + 1) // n) for i in range(n)
+            )
+            self.__emitted = total
+            self.__last_ns = now_ns
+        elif self.__model.flow_l_min(self.__load) == 0.0:
+            self.__last_ns = now_ns
+
+    def event_wait(self, sec=0, nsec=0):
+        if not self.__requested:
+            raise OSError(22, "line not requested")
+        deadline = time.monotonic() + sec + nsec / 1e9
+        while True:
+            self.__collect()
+            if self.__pending:
+                return True
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            time.sleep(min(remaining, 0.02))
+
+    def event_read(self):
+        self.__collect()
+        return self.__pending.pop(0) if self.__pending else None
+
+    def event_read_multiple(self):
+        self.__collect()
+        events, self.__pending = self.__pending[:16], self.__pending[16:]
+        return events
+
+    def release(self):
+        self.__requested = False
+
+
+class SimGpioChip:
+    def __init__(self, lines, path=None):
+        self.__lines = lines
+        self.path = path
+
+    def get_line(self, offset):
+        line = self.__lines.get(offset)
+        if line is None:
+            raise OSError(16, f"GPIO {offset} is not wired in the simulator")
+        return line
+
+    def close(self):
+        pass
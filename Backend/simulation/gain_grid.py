@@ -0,0 +1,270 @@
+"""
+gain_grid.py — Offline PID gain search on an identified FOPDT plant.
+
+Simulates thousands of (Kp, Ki, Kd, deadband) candidates at once: every
+candidate is one element of the NumPy state arrays, so a time step of the
+whole grid is a handful of vector operations. Chunks of the grid are spread
+over a multiprocessing pool.
+
+The simulated controller is the one in control_loops.py, per loop:
+
+  - temperature: simple_pid with output -1..1 every 10 s, integral clamped to
+    the output limits, the step's extra anti-windup, and a deadband in which
+    heater and fan are both off; output > 0 drives the heater and < 0 the
+    fan, each from MIN_POWER (500) up to 4095;
+  - light: output is the light-strip duty (0–4095) every 0.1 s; inside the
+    deadband the last duty is held.
+
+The plant is a temperature_mpc.FOPDTModel, with the gains in PV units at full
+duty (model_from_reaction_curve() converts the K / L / T of
+tests/PID-tuning/ziegler_nichols_open_loop.py). For the light loop k_heat is
+the lux of both strips at full duty and ambient_c the daylight lux.
+
+Each scenario is a setpoint step at t=0 and, halfway through, a step change
+of the ambient (a load disturbance). rank() orders candidates by a weighted
+score of IAE, overshoot and actuator effort; candidates that are still
+outside the settling band near the end of the run are ranked last.
+"""
+import math
+import itertools
+import multiprocessing
+from collections import namedtuple
+
+import numpy as np
+
+from temperature_mpc import FOPDTModel
+from .replay import LOOP_PV, RATED_POWER_W
+
+DUTY_FULL = 4095.0
+TEMPERATURE_MIN_POWER = 500
+
+LoopSpec = namedtuple('LoopSpec', [
+    'sample_sec', 'output_limits', 'split_range', 'anti_windup', 'deadband_mode',
+    'duration_sec', 'step', 'disturbance', 'power_w', 'deadbands',
+])
+
+LOOPS = {
+    'temperature': LoopSpec(
+        sample_sec=10.0, output_limits=(-1.0, 1.0), split_range=True, anti_windup=True,
+        deadband_mode='off', duration_sec=6 * 3600, step=3.0, disturbance=-2.0,
+        power_w=(RATED_POWER_W['heater'] + RATED_POWER_W['heater_fan'], RATED_POWER_W['fan']),
+        deadbands=(0.0, 0.25, 0.5, 1.0),
+    ),
+    'light': LoopSpec(
+        sample_sec=0.1, output_limits=(0.0, DUTY_FULL), split_range=False, anti_windup=False,
+        deadband_mode='hold', duration_sec=120.0, step=400.0, disturbance=-50.0,
+        power_w=(RATED_POWER_W['light_strip_1'] + RATED_POWER_W['light_strip_2'], 0.0),
+        deadbands=(0.0, 5.0, 10.0, 20.0),
+    ),
+}
+
+DEFAULT_WEIGHTS = {'iae': 1.0, 'overshoot': 1.0, 'effort': 0.5}
+
+
+def model_from_reaction_curve(analysis, ambient, k_cool=0.0):
+    """
+    FOPDTModel from analyze_reaction_curve() output: K is PV units per duty
+    unit (0–4095), L and T in seconds. ambient is the PV with the actuator off.
+    """
+    return FOPDTModel(
+        k_heat=float(analysis['K']) * DUTY_FULL,
+        k_cool=float(k_cool),
+        tau_sec=float(analysis['T']),
+        dead_sec=max(0.0, float(analysis['L'])),
+        ambient_c=float(ambient),
+        r2=None,
+    )
+
+
+def _gain_per_output(model, loop):
+    """Process gain per unit of PID output."""
+    if loop == 'temperature':
+        return model.k_heat * (DUTY_FULL - TEMPERATURE_MIN_POWER) / DUTY_FULL
+    return model.k_heat / DUTY_FULL
+
+
+def zn_gains(model, loop='temperature'):
+    """Ziegler–Nichols open-loop PID gains (as calculate_zn_open_loop_params) — the grid's centre."""
+    k = _gain_per_output(model, loop)
+    dead = max(model.dead_sec, LOOPS[loop].sample_sec)
+    kp = 1.2 * model.tau_sec / (k * dead)
+    return kp, kp / (2 * dead), kp * dead / 2
+
+
+def gain_grid(kp, ki, kd, deadband):
+    """Every combination of the given values, as flat arrays."""
+    combos = np.array(list(itertools.product(kp, ki, kd, deadband)), dtype=float)
+    return {'kp': combos[:, 0], 'ki': combos[:, 1], 'kd': combos[:, 2], 'deadband': combos[:, 3]}
+
+
+def default_grid(model, loop='temperature', points=16, span=10.0):
+    """Log-spaced Kp / Ki around the ZN gains (÷span … ×span), Kd from 0, the loop's deadbands."""
+    kp0, ki0, kd0 = zn_gains(model, loop)
+    return gain_grid(
+        np.geomspace(kp0 / span, kp0 * span, points),
+        np.geomspace(ki0 / span, ki0 * span, points),
+        np.concatenate(([0.0], np.geomspace(kd0 / span, kd0, 4))),
+        LOOPS[loop].deadbands,
+    )
+
+
+def simulate(model, kp, ki, kd, deadband, loop='temperature', setpoint=None, initial_pv=None,
+             duration_sec=None, disturbance=None, noise=0.0, seed=None) -> dict:
+    """
+    Run the scenario for every candidate at once. Returns arrays (one value per
+    candidate): iae, overshoot, settling_sec (nan if never settled), effort_sec
+    (full-duty seconds, heater + fan), energy_wh, moves (output travel in full
+    ranges), recovery_peak (largest error after the disturbance), settled.
+    """
+    spec = LOOPS[loop]
+    kp, ki, kd, deadband = np.broadcast_arrays(*(np.asarray(x, dtype=float) for x in (kp, ki, kd, deadband)))
+    kp, ki, kd, deadband = (x.ravel() for x in (kp, ki, kd, deadband))
+    n = kp.size
+
+    dt = spec.sample_sec
+    steps = int(round((duration_sec or spec.duration_sec) / dt))
+    disturb_at = steps // 2
+    initial_pv = model.ambient_c if initial_pv is None else float(initial_pv)
+    setpoint = initial_pv + spec.step if setpoint is None else float(setpoint)
+    disturbance = spec.disturbance if disturbance is None else float(disturbance)
+    band = LOOP_PV[loop][2]
+    direction = math.copysign(1.0, setpoint - initial_pv)
+    lo, hi = spec.output_limits
+
+    a = math.exp(-dt / model.tau_sec)
+    dead = int(round(model.dead_sec / dt))
+    # Same measurement noise for every candidate, so they are compared fairly
+    rng = np.random.default_rng(seed)
+    noise_seq = rng.normal(0.0, noise, steps) if noise > 0 else np.zeros(steps)
+
+    pv = np.full(n, initial_pv)
+    integral = np.zeros(n)
+    last_measured = None
+    last_out = np.zeros(n)
+    pipeline = np.zeros((dead + 1, 2, n))       # (heater, fan) duty fraction, dead-time delay line
+
+    iae = np.zeros(n)
+    overshoot = np.zeros(n)
+    last_outside = np.full(n, -1)
+    effort = np.zeros((2, n))
+    moves = np.zeros(n)
+    recovery_peak = np.zeros(n)
+    tail_peak = np.zeros(n)
+    tail_from = int(steps * 0.8)
+
+    for k in range(steps):
+        measured = pv + noise_seq[k]
+        error = setpoint - measured
+        integral = np.clip(integral + ki * error * dt, lo, hi)
+        derivative = 0.0 if last_measured is None else -kd * (measured - last_measured) / dt
+        last_measured = measured
+        raw = np.clip(kp * error + integral + derivative, lo, hi)
+        if spec.anti_windup:
+            windup = ((raw >= hi) & (error > 0)) | ((raw <= lo) & (error < 0))
+            integral = np.where(windup, integral - error * ki * dt, integral)
+
+        in_band = np.abs(error) < deadband
+        out = np.where(in_band, 0.0 if spec.deadband_mode == 'off' else last_out, raw)
+        if spec.split_range:
+            span = (DUTY_FULL - TEMPERATURE_MIN_POWER) / DUTY_FULL
+            base = TEMPERATURE_MIN_POWER / DUTY_FULL
+            heat = np.where(out > 0, base + span * out, 0.0)
+            cool = np.where(out < 0, base + span * -out, 0.0)
+        else:
+            heat = np.floor(out) / DUTY_FULL
+            cool = np.zeros(n)
+        moves += np.abs(out - last_out) / (hi - lo)
+        last_out = out
+        effort[0] += heat * dt
+        effort[1] += cool * dt
+
+        # Input chosen at k acts on the plant dead steps later
+        pipeline[k % (dead + 1)] = (heat, cool)
+        applied_heat, applied_cool = pipeline[(k + 1) % (dead + 1)] if dead else (heat, cool)
+        ambient = model.ambient_c + (disturbance if k >= disturb_at else 0.0)
+        pv = a * pv + (1 - a) * (ambient + model.k_heat * applied_heat + model.k_cool * applied_cool)
+
+        e = pv - setpoint
+        abs_e = np.abs(e)
+        iae += abs_e * dt
+        if k < disturb_at:
+            overshoot = np.maximum(overshoot, direction * e)
+            last_outside = np.where(abs_e > band, k, last_outside)
+        else:
+            recovery_peak = np.maximum(recovery_peak, abs_e)
+        if k >= tail_from:
+            tail_peak = np.maximum(tail_peak, abs_e)
+
+    settling = (last_outside + 1) * dt
+    settling = np.where(last_outside >= disturb_at - 1, np.nan, settling)
+    return {
+        'iae':           iae,
+        'overshoot':     overshoot,
+        'settling_sec':  settling,
+        'effort_sec':    effort.sum(axis=0),
+        'energy_wh':     (effort[0] * spec.power_w[0] + effort[1] * spec.power_w[1]) / 3600.0,
+        'moves':         moves,
+        'recovery_peak': recovery_peak,
+        'settled':       tail_peak <= band,
+    }
+
+
+def _evaluate_chunk(args):
+    model, grid, loop, scenario = args
+    return simulate(model, grid['kp'], grid['ki'], grid['kd'], grid['deadband'], loop=loop, **scenario)
+
+
+def evaluate_grid(model, grid, loop='temperature', processes=None, chunk_size=1024, **scenario) -> dict:
+    """
+    simulate() over a gain_grid() in chunks on a multiprocessing pool
+    (processes=1 runs in this process). Returns the grid with the metrics added.
+    """
+    n = len(grid['kp'])
+    chunks = [(model, {name: values[i:i + chunk_size] for name, values in grid.items()}, loop, scenario)
+              for i in range(0, n, chunk_size)]
+    if processes == 1 or len(chunks) == 1:
+        results = [_evaluate_chunk(chunk) for chunk in chunks]
+    else:
+        with multiprocessing.Pool(processes) as pool:
+            results = pool.map(_evaluate_chunk, chunks)
+    merged = {name: np.asarray(values) for name, values in grid.items()}
+    for metric in results[0]:
+        merged[metric] = np.concatenate([r[metric] for r in results])
+    return merged
+
+
+def rank(results, weights=None, top=20) -> list:
+    """
+    Best candidates first. Each weighted metric is divided by its median over
+    the settled candidates, so the weights trade relative, not absolute, units.
+    """
+    weights = weights or DEFAULT_WEIGHTS
+    metric_names = {'iae': 'iae', 'overshoot': 'overshoot', 'effort': 'effort_sec',
+                    'energy': 'energy_wh', 'moves': 'moves', 'recovery': 'recovery_peak'}
+    settled = results['settled']
+    pool = settled if settled.any() else np.ones_like(settled)
+    score = np.zeros(len(settled))
+    for name, weight in weights.items():
+        values = results[metric_names[name]]
+        scale = np.median(values[pool]) or 1.0
+        score += weight * values / scale
+    score = np.where(settled, score, np.inf)
+    order = np.lexsort((np.nan_to_num(score, posinf=np.finfo(float).max), ~settled))[:top]
+    ranked = []
+    for i in order:
+        ranked.append({
+            'kp':            round(float(results['kp'][i]), 6),
+            'ki':            round(float(results['ki'][i]), 6),
+            'kd':            round(float(results['kd'][i]), 6),
+            'deadband':      float(results['deadband'][i]),
+            'score':         None if not np.isfinite(score[i]) else round(float(score[i]), 4),
+            'settled':       bool(settled[i]),
+            'iae':           round(float(results['iae'][i]), 2),
+            'overshoot':     round(float(results['overshoot'][i]), 3),
+            'settling_sec':  None if np.isnan(results['settling_sec'][i]) else round(float(results['settling_sec'][i]), 1),
+            'effort_sec':    round(float(results['effort_sec'][i]), 1),
+            'energy_wh':     round(float(results['energy_wh'][i]), 3),
+            'moves':         round(float(results['moves'][i]), 2),
+            'recovery_peak': round(float(results['recovery_peak'][i]), 3),
+        })
+    return ranked
@@ -0,0 +1,229 @@
+"""
+hardware.py — Simulated Raspberry Pi rig for running PlantMind AI off the Pi.
+
+install() registers stand-ins for the hardware modules the app imports
+(board, busio, adafruit_dht, adafruit_ads1x15, serial, gpiod and the system
+libgpiod bindings loaded by Sensors/water.py). It must run before any of them
+is imported; config.py does this when HARDWARE_BACKEND == 'sim'.
+
+Every stand-in talks to one SimulatedRig: an ESP32 at 0x30 speaking the real
+frame protocol, an ADS1115 at 0x48, the RS485 soil probe and PZEM-004T on
+their UARTs (Modbus RTU with CRC), a DHT22 and the two YF-S201 flow lines,
+all backed by a GreenhouseModel that reacts to the actuator duty cycles.
+"""
+import sys
+import time
+import types
+import random
+import threading
+
+from utils.utils import _CUSTOM_PRINT_FUNC
+from .physics import GreenhouseModel
+from .devices import (
+    SimI2CBus, SimESP32, SimADS1115Inputs, SimSoilProbe, SimPZEM004T,
+    SimSerial, SimDHT22, SimFlowLine, SimGpioChip, SimLineEvent,
+)
+
+# Wiring of the physical rig — mirrors the setup calls in app.py and config.py
+ESP32_ADDRESS = 0x30
+ADS1115_ADDRESS = 0x48
+ESP32_CHANNEL_LOADS = {
+    0: 'light_strip_1',
+    5: 'light_strip_2',
+    1: 'heater',
+    2: 'heater_fan',
+    3: 'fan',
+    4: 'water_pump',
+    6: 'fertilizer_pump',
+}
+ADS1115_CHANNEL_SOURCES = {0: 'soil_moisture', 1: 'light'}
+SOIL_UART_PORT = '/dev/ttyAMA0'
+PZEM_UART_PORT = '/dev/ttyAMA1'
+FLOW_GPIO_LINES = {12: 'water_pump', 16: 'fertilizer_pump'}
+
+# Full-scale input range (V) for each ADS1115 PGA gain setting
+_PGA_RANGE = {2/3: 6.144, 1: 4.096, 2: 2.048, 4: 1.024, 8: 0.512, 16: 0.256}
+
+_rig = None
+
+
+class SimulatedRig:
+    """The simulated devices and the greenhouse model behind them."""
+    def __init__(self, model=None, endianness='big', dht22_failure_rate=0.1, seed=None):
+        self.model = model if model is not None else GreenhouseModel(seed=seed)
+        self.esp32 = SimESP32(self.model, ESP32_CHANNEL_LOADS, endianness)
+        self.ads_inputs = SimADS1115Inputs(self.model, ADS1115_CHANNEL_SOURCES)
+        self.i2c_devices = {ESP32_ADDRESS: self.esp32, ADS1115_ADDRESS: self.ads_inputs}
+        self.uart_responders = {
+            SOIL_UART_PORT: SimSoilProbe(self.model),
+            PZEM_UART_PORT: SimPZEM004T(self.model),
+        }
+        self.gpio_lines = {pin: SimFlowLine(self.model, load) for pin, load in FLOW_GPIO_LINES.items()}
+        self.dht22_failure_rate = dht22_failure_rate
+        self.seed = seed
+
+    def get_status(self) -> dict:
+        return {
+            'model':          self.model.snapshot(),
+            'esp32_channels': self.esp32.get_channels(),
+            'esp32_frames':   self.esp32.frames,
+            'esp32_bad_frames': self.esp32.bad_frames,
+        }
+
+
+def get_rig():
+    """The installed SimulatedRig, or None when running on real hardware."""
+    return _rig
+
+
+# ── Module builders ───────────────────────────────────────────────────────────
+
+def _module(name, **attrs):
+    mod = types.ModuleType(name)
+    mod.__dict__.update(attrs)
+    mod.__simulated__ = True
+    return mod
+
+
+class _Pin:
+    def __init__(self, pin_id):
+        self.id = pin_id
+
+    def __repr__(self):
+        return f"board.D{self.id}" if isinstance(self.id, int) else f"board.{self.id}"
+
+
+def _board_module():
+    pins = {f"D{i}": _Pin(i) for i in range(28)}
+    return _module('board', SCL=_Pin('SCL'), SDA=_Pin('SDA'), **pins)
+
+
+def _busio_module(rig):
+    def I2C(scl=None, sda=None, frequency=100000):
+        return SimI2CBus(rig.i2c_devices)
+    return _module('busio', I2C=I2C)
+
+
+def _dht_module(rig):
+    count = [0]
+
+    def DHT22(pin, use_pulseio=True):
+        count[0] += 1
+        seed = None if rig.seed is None else rig.seed + count[0]
+        return SimDHT22(rig.model, pin, rig.dht22_failure_rate, seed)
+    return _module('adafruit_dht', DHT22=DHT22, DHT11=DHT22)
+
+
+def _ads1x15_modules(rig):
+    class Mode:
+        CONTINUOUS = 0x0000
+        SINGLE = 0x0100
+
+    class ADS1115:
+        """Driver-level stand-in for adafruit_ads1x15.ads1115.ADS1115"""
+        rates = (8, 16, 32, 64, 128, 250, 475, 860)
+        gains = tuple(_PGA_RANGE.keys())
+
+        def __init__(self, i2c, gain=1, data_rate=None, mode=Mode.SINGLE, address=ADS1115_ADDRESS):
+            if address not in i2c.scan():
+                raise ValueError(f"No I2C device at address: 0x{address:x}")
+            self.i2c = i2c
+            self.address = address
+            self.gain = gain
+            self.data_rate = 128 if data_rate is None else data_rate
+            self.mode = mode
+            self.__rng = random.Random(rig.seed)
+
+        def read(self, pin):
+            # Hold the bus for the conversion like adafruit_bus_device.I2CDevice does
+            while not self.i2c.try_lock():
+                time.sleep(0)
+            try:
+                self.i2c.writeto(self.address, bytes([0x01, 0x00, 0x00]))
+                if self.mode == Mode.SINGLE:
+                    time.sleep(1.0 / self.data_rate)
+                buf = bytearray(2)
+                self.i2c.readfrom_into(self.address, buf)
+            finally:
+                self.i2c.unlock()
+            full_scale = _PGA_RANGE.get(self.gain, 4.096)
+            volts = rig.ads_inputs.voltage(pin) + self.__rng.gauss(0.0, 0.0005)
+            return int(min(max(volts / full_scale * 32767.0, -32768), 32767))
+
+    class AnalogIn:
+        def __init__(self, ads, positive_pin, negative_pin=None):
+            self.__ads = ads
+            self.__pin = positive_pin
+
+        @property
+        def value(self):
+            return self.__ads.read(self.__pin)
+
+        @property
+        def voltage(self):
+            return self.value * _PGA_RANGE.get(self.__ads.gain, 4.096) / 32767.0
+
+    pkg = _module('adafruit_ads1x15')
+    pkg.__path__ = []
+    ads1x15 = _module('adafruit_ads1x15.ads1x15', Mode=Mode)
+    ads1115 = _module('adafruit_ads1x15.ads1115', ADS1115=ADS1115, Mode=Mode, P0=0, P1=1, P2=2, P3=3)
+    analog_in = _module('adafruit_ads1x15.analog_in', AnalogIn=AnalogIn)
+    pkg.ads1x15, pkg.ads1115, pkg.analog_in = ads1x15, ads1115, analog_in
+    return {
+        'adafruit_ads1x15':           pkg,
+        'adafruit_ads1x15.ads1x15':   ads1x15,
+        'adafruit_ads1x15.ads1115':   ads1115,
+        'adafruit_ads1x15.analog_in': analog_in,
+    }
+
+
+def _serial_module(rig):
+    class SerialException(IOError):
+        pass
+
+    def Serial(port=None, *args, **kwargs):
+        return SimSerial(rig.uart_responders, port, *args, **kwargs)
+    return _module('serial', Serial=Serial, SerialException=SerialException,
+                   PARITY_NONE='N', EIGHTBITS=8, STOPBITS_ONE=1)
+
+
+def _gpiod_module(rig):
+    def Chip(path=None, *args):
+        return SimGpioChip(rig.gpio_lines, path)
+    return _module(
+        'gpiod', Chip=Chip, LineEvent=SimLineEvent,
+        LINE_REQ_DIR_IN=1, LINE_REQ_EV_FALLING_EDGE=2, LINE_REQ_EV_RISING_EDGE=3, LINE_REQ_EV_BOTH_EDGES=4,
+        LINE_REQ_FLAG_BIAS_PULL_UP=32, LINE_REQ_FLAG_BIAS_PULL_DOWN=16,
+    )
+
+
+_install_lock = threading.Lock()
+
+
+def install(rig=None, **rig_kwargs) -> SimulatedRig:
+    """
+    Register the simulated hardware modules in sys.modules and return the rig.
+    Safe to call more than once; the first rig stays installed.
+    """
+    global _rig
+    with _install_lock:
+        if _rig is not None:
+            return _rig
+        for name in ('board', 'busio', 'adafruit_dht', 'serial', 'gpiod'):
+            existing = sys.modules.get(name)
+            if existing is not None and not getattr(existing, '__simulated__', False):
+                _CUSTOM_PRINT_FUNC(f"[Simulation] WARNING: real '{name}' already imported — it will not be simulated")
+        _rig = rig if rig is not None else SimulatedRig(**rig_kwargs)
+        gpiod = _gpiod_module(_rig)
+        modules = {
+            'board':        _board_module(),
+            'busio':        _busio_module(_rig),
+            'adafruit_dht': _dht_module(_rig),
+            'serial':       _serial_module(_rig),
+            'gpiod':        gpiod,
+            '_system_gpiod': gpiod,   # Sensors/water.py caches the libgpiod v1 .so under this name
+        }
+        modules.update(_ads1x15_modules(_rig))
+        sys.modules.update(modules)
+        _CUSTOM_PRINT_FUNC("[Simulation] Hardware backend: simulated rig (ESP32, ADS1115, RS485 soil, PZEM-004T, DHT22, flow sensors)")
+        return _rig
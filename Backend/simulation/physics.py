@@ -0,0 +1,247 @@
+import math
+import time
+import random
+import threading
+
+# Actuator loads, in ESP32 PWM duty-cycle units (0–4095)
+LOADS = ('heater', 'heater_fan', 'fan', 'light_strip_1', 'light_strip_2', 'water_pump', 'fertilizer_pump')
+_DUTY_FULL = 4095.0
+
+
+def clear_day_lux(hour, peak_lux):
+    """Daylight on the model's sine-shaped day (06:00–18:00, peak at noon)."""
+    return max(0.0, math.sin(math.pi * (hour - 6.0) / 12.0)) * peak_lux
+
+
+class GreenhouseModel:
+    """
+    Lumped greenhouse physics driven by actuator duty cycles.
+
+    - Air: single thermal mass heated by the heater (coupled through the
+      heater fan) and the LED strips, losing heat to the outside through the
+      envelope and the ventilation fan. Humidity relaxes towards an
+      equilibrium that rises with soil moisture and falls with ventilation.
+    - Light: daylight on a sine-shaped day plus the two LED strips.
+    - Soil: moisture dries with temperature and light and rises with the
+      water pump; EC rises with fertilizer as it mixes through the root zone
+      (first order, EC_MIX_TAU_SEC) and is diluted by water; soil
+      temperature follows air temperature slowly.
+    - Electricity: per-load power draw integrated into an energy counter.
+    - Flow: cumulative pumped volume per pump, used for the flow sensors.
+
+    The model integrates lazily up to the clock time whenever it is read or
+    an input changes, so it needs no thread of its own. `clock` returns
+    seconds (monotonic) and `time_scale` multiplies elapsed time. `weather`,
+    if given, maps seconds since the start to (outside °C, daylight lux) in
+    place of the sine-shaped days (e.g. replay.HistorySource.weather()).
+    """
+    # Air
+    HEAT_CAPACITY_J_K     = 25000.0
+    ENVELOPE_UA_W_K       = 6.0
+    FAN_UA_W_K            = 18.0
+    HEATER_POWER_W        = 150.0
+    LED_POWER_W           = 24.0     # per strip
+    LED_HEAT_FRACTION     = 0.4
+    HUMIDITY_TAU_SEC      = 900.0
+    # Light
+    DAYLIGHT_PEAK_LUX     = 200.0
+    LED_LUX               = 300.0    # per strip at full duty
+    # Soil
+    DRYING_PCT_PER_HOUR   = 0.5      # at 20 °C, dark
+    MOISTURE_PCT_PER_L    = 60.0     # ~1.7 L of substrate: a 1 s pulse adds ~0.9 %
+    WATER_PUMP_L_MIN      = 2.0
+    FERTILIZER_PUMP_L_MIN = 0.5
+    EC_PER_L_FERTILIZER   = 2500.0   # uS/cm added per litre of concentrate
+    EC_DILUTION_PER_L     = 0.04     # fraction of EC washed out per litre of water
+    EC_MIX_TAU_SEC        = 900.0    # fertilizer reaches the EC probe with this time constant
+    SOIL_TEMP_TAU_SEC     = 3600.0
+    PUMP_DEADBAND         = 0.1      # fraction of full duty below which a pump stalls
+    # Electricity
+    BASE_POWER_W          = 6.0
+    FAN_POWER_W           = 4.0
+    PUMP_POWER_W          = 12.0
+    MAINS_VOLTAGE_V       = 230.0
+    MAINS_FREQUENCY_HZ    = 50.0
+    POWER_FACTOR          = 0.92
+
+    def __init__(self, outside_temp_c=20.0, outside_swing_c=4.0, start_hour=None,
+                 air_temp_c=22.0, air_humidity=60.0, soil_moisture=55.0, soil_ec=1200.0,
+                 clock=time.monotonic, time_scale=1.0, seed=None, weather=None):
+        self.__clock = clock
+        self.__time_scale = float(time_scale)
+        self.__lock = threading.RLock()
+        self.__rng = random.Random(seed)
+        self.__outside_temp_c = outside_temp_c
+        self.__outside_swing_c = outside_swing_c
+        self.__weather = weather
+        if start_hour is None:
+            lt = time.localtime()
+            start_hour = lt.tm_hour + lt.tm_min / 60.0
+        self.__start_hour = float(start_hour)
+
+        self.__duty = {load: 0.0 for load in LOADS}
+        self.__elapsed = 0.0
+        self.__last_clock = clock()
+        self.__air_temp = float(air_temp_c)
+        self.__air_hum = float(air_humidity)
+        self.__soil_moisture = float(soil_moisture)
+        self.__soil_ec = float(soil_ec)
+        self.__ec_unmixed = 0.0          # EC of concentrate pumped but not yet at the probe
+        self.__soil_temp = float(air_temp_c)
+        self.__energy_wh = 0.0
+        self.__volume_l = {'water_pump': 0.0, 'fertilizer_pump': 0.0}
+
+    # ── Inputs ────────────────────────────────────────────────────────────────
+    def set_duty(self, load, duty_cycle):
+        """Apply a new duty cycle (0–4095) to one load"""
+        if load not in self.__duty:
+            return
+        with self.__lock:
+            self.__advance()
+            self.__duty[load] = min(max(float(duty_cycle), 0.0), _DUTY_FULL)
+
+    def get_duty(self, load):
+        return self.__duty.get(load, 0.0)
+
+    def reset_energy(self):
+        with self.__lock:
+            self.__advance()
+            self.__energy_wh = 0.0
+
+    # ── Integration ───────────────────────────────────────────────────────────
+    def __frac(self, load):
+        return self.__duty[load] / _DUTY_FULL
+
+    def __pump_l_min(self, load, full_rate):
+        frac = self.__frac(load)
+        return 0.0 if frac < self.PUMP_DEADBAND else full_rate * frac
+
+    def __hour(self):
+        return (self.__start_hour + self.__elapsed / 3600.0) % 24.0
+
+    def __outside_temp(self):
+        if self.__weather is not None:
+            return self.__weather(self.__elapsed)[0]
+        # Coldest around 03:00, warmest around 15:00
+        return self.__outside_temp_c + self.__outside_swing_c * math.sin(2 * math.pi * (self.__hour() - 9.0) / 24.0)
+
+    def __daylight_lux(self):
+        if self.__weather is not None:
+            return self.__weather(self.__elapsed)[1]
+        return clear_day_lux(self.__hour(), self.DAYLIGHT_PEAK_LUX)
+
+    def __power_w(self):
+        return (self.BASE_POWER_W
+                + self.HEATER_POWER_W * self.__frac('heater')
+                + self.FAN_POWER_W * (self.__frac('heater_fan') + self.__frac('fan'))
+                + self.LED_POWER_W * (self.__frac('light_strip_1') + self.__frac('light_strip_2'))
+                + self.PUMP_POWER_W * (self.__frac('water_pump') + self.__frac('fertilizer_pump')))
+
+    def __advance(self):
+        now = self.__clock()
+        dt_total = (now - self.__last_clock) * self.__time_scale
+        self.__last_clock = now
+        # Fixed sub-steps keep the explicit Euler update stable for long gaps
+        while dt_total > 0:
+            dt = min(dt_total, 5.0)
+            self.__step(dt)
+            dt_total -= dt
+
+    def __step(self, dt):
+        heater_w = self.HEATER_POWER_W * self.__frac('heater') * (0.4 + 0.6 * self.__frac('heater_fan'))
+        led_w = self.LED_POWER_W * (self.__frac('light_strip_1') + self.__frac('light_strip_2'))
+        ua = self.ENVELOPE_UA_W_K + self.FAN_UA_W_K * self.__frac('fan')
+        q = heater_w + self.LED_HEAT_FRACTION * led_w - ua * (self.__air_temp - self.__outside_temp())
+        self.__air_temp += q * dt / self.HEAT_CAPACITY_J_K
+
+        hum_eq = 50.0 + 0.3 * (self.__soil_moisture - 50.0) - 15.0 * self.__frac('fan')
+        self.__air_hum += (min(max(hum_eq, 20.0), 95.0) - self.__air_hum) * dt / self.HUMIDITY_TAU_SEC
+
+        lux = self.__light_lux()
+        drying = self.DRYING_PCT_PER_HOUR / 3600.0 * (1.0 + 0.05 * (self.__air_temp - 20.0)) * (1.0 + lux / 2000.0)
+        water_l = self.__pump_l_min('water_pump', self.WATER_PUMP_L_MIN) * dt / 60.0
+        fert_l = self.__pump_l_min('fertilizer_pump', self.FERTILIZER_PUMP_L_MIN) * dt / 60.0
+        self.__volume_l['water_pump'] += water_l
+        self.__volume_l['fertilizer_pump'] += fert_l
+        self.__soil_moisture += (water_l + fert_l) * self.MOISTURE_PCT_PER_L - max(drying, 0.0) * dt
+        self.__soil_moisture = min(max(self.__soil_moisture, 0.0), 100.0)
+        self.__ec_unmixed += fert_l * self.EC_PER_L_FERTILIZER
+        mixed = self.__ec_unmixed * min(1.0, dt / self.EC_MIX_TAU_SEC)
+        self.__ec_unmixed -= mixed
+        self.__soil_ec += mixed - self.__soil_ec * water_l * self.EC_DILUTION_PER_L
+        self.__soil_ec = max(self.__soil_ec, 0.0)
+        self.__soil_temp += (self.__air_temp - self.__soil_temp) * dt / self.SOIL_TEMP_TAU_SEC
+
+        self.__energy_wh += self.__power_w() * dt / 3600.0
+        self.__elapsed += dt
+
+    def __light_lux(self):
+        return self.__daylight_lux() + self.LED_LUX * (self.__frac('light_strip_1') + self.__frac('light_strip_2'))
+
+    # ── Outputs ───────────────────────────────────────────────────────────────
+    def __noise(self, sigma):
+        return self.__rng.gauss(0.0, sigma) if sigma > 0 else 0.0
+
+    def air(self):
+        """Return air temperature (°C) and relative humidity (%)"""
+        with self.__lock:
+            self.__advance()
+            return self.__air_temp + self.__noise(0.05), min(max(self.__air_hum + self.__noise(0.3), 0.0), 100.0)
+
+    def light_lux(self):
+        with self.__lock:
+            self.__advance()
+            return max(0.0, self.__light_lux() + self.__noise(2.0))
+
+    def soil(self):
+        """Return soil moisture (%), temperature (°C), EC (uS/cm) and pH"""
+        with self.__lock:
+            self.__advance()
+            ph = 6.8 - 0.0004 * (self.__soil_ec - 1000.0)
+            return (self.__soil_moisture + self.__noise(0.2),
+                    self.__soil_temp + self.__noise(0.05),
+                    max(0.0, self.__soil_ec + self.__noise(5.0)),
+                    min(max(ph + self.__noise(0.02), 3.0), 9.0))
+
+    def electricity(self):
+        """Return voltage, current, power, energy (Wh), frequency, power factor"""
+        with self.__lock:
+            self.__advance()
+            voltage = self.MAINS_VOLTAGE_V + self.__noise(0.5)
+            power = self.__power_w()
+            current = power / (voltage * self.POWER_FACTOR)
+            return voltage, current, power, self.__energy_wh, self.MAINS_FREQUENCY_HZ, self.POWER_FACTOR
+
+    def pumped_volume(self, load):
+        """Total litres moved by a pump since the model started"""
+        with self.__lock:
+            self.__advance()
+            return self.__volume_l.get(load, 0.0)
+
+    def flow_l_min(self, load):
+        if load == 'water_pump':
+            return self.__pump_l_min(load, self.WATER_PUMP_L_MIN)
+        if load == 'fertilizer_pump':
+            return self.__pump_l_min(load, self.FERTILIZER_PUMP_L_MIN)
+        return 0.0
+
+    def snapshot(self) -> dict:
+        """Noise-free model state, for tests and the simulation status route"""
+        with self.__lock:
+            self.__advance()
+            return {
+                'elapsed_sec':     round(self.__elapsed, 3),
+                'hour':            round(self.__hour(), 3),
+                'outside_temp_c':  round(self.__outside_temp(), 3),
+                'air_temp_c':      round(self.__air_temp, 3),
+                'air_humidity':    round(self.__air_hum, 3),
+                'light_lux':       round(self.__light_lux(), 1),
+                'soil_moisture':   round(self.__soil_moisture, 3),
+                'soil_ec':         round(self.__soil_ec, 1),
+                'soil_temp_c':     round(self.__soil_temp, 3),
+                'power_w':         round(self.__power_w(), 2),
+                'energy_wh':       round(self.__energy_wh, 4),
+                'water_l':         round(self.__volume_l['water_pump'], 4),
+                'fertilizer_l':    round(self.__volume_l['fertilizer_pump'], 4),
+                'duty':            dict(self.__duty),
+            }
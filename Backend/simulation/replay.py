@@ -0,0 +1,629 @@
+"""
+replay.py — Accelerated-time replay of the control loops.
+
+ReplayHarness runs the real control_loops steps on a ControlScheduler whose
+clock is a VirtualClock: nothing waits, pump pulses and light-pause sleeps
+just move the clock, so days of control run in seconds. The steps talk to
+stand-in sensors and actuators fed by one of two sources:
+
+  - PlantSource: a GreenhouseModel on the same virtual clock (closed loop —
+    the readings react to the actuators);
+  - HistorySource: recorded sensors_data readings, interpolated (open loop —
+    the readings are what happened, so the replay shows what the controller
+    would have commanded, and at what energy, on that day).
+
+A setpoint schedule changes setpoints at given times and wakes the affected
+loops, as GH_Setpoints change events do in the app. run() returns a report:
+per loop the settling time and overshoot of every setpoint segment and the
+tracking error, per actuator the duty integral and energy — and, given a
+tariff.Tariff and the local time the run starts at, its cost per band.
+
+    clock = VirtualClock()
+    source = PlantSource(GreenhouseModel(start_hour=0.0, seed=1, clock=clock.monotonic))
+    report = ReplayHarness(source, clock, schedule=[(3600, 'temperature', 24.0)]).run(2 * 86400)
+
+Build a new clock, source and harness for every run.
+"""
+import time
+import datetime
+import threading
+
+import numpy as np
+
+import control_loops
+from control_scheduler import ControlScheduler
+from .physics import GreenhouseModel, clear_day_lux
+
+DUTY_FULL = 4095.0
+DEFAULT_LOOPS = ('temperature', 'soil', 'fertilizer')
+
+# A loop has settled once the PV stays inside its band this long; later
+# excursions (daytime heat the fan cannot shed) are disturbances
+SETTLE_HOLD_SEC = 900.0
+
+# Rated draw of each load at full duty (W), as in the plant model
+RATED_POWER_W = {
+    'heater':          GreenhouseModel.HEATER_POWER_W,
+    'heater_fan':      GreenhouseModel.FAN_POWER_W,
+    'fan':             GreenhouseModel.FAN_POWER_W,
+    'light_strip_1':   GreenhouseModel.LED_POWER_W,
+    'light_strip_2':   GreenhouseModel.LED_POWER_W,
+    'water_pump':      GreenhouseModel.PUMP_POWER_W,
+    'fertilizer_pump': GreenhouseModel.PUMP_POWER_W,
+}
+
+# Loop → (traced process value, setpoint field, settling band). Loops without
+# a setpoint field work on fixed thresholds and only get PV statistics. The
+# PID temperature loop regulates to the edge of its deadband, so its band is
+# measured from setpoint ± deadband (ReplayHarness).
+LOOP_PV = {
+    'temperature': ('air_temperature', 'temperature', 0.5),   # °C past the deadband edge
+    'light':       ('light',           'light',       20.0),  # lux — the adaptive-rate band
+    'soil':        ('soil_moisture',   None,          None),
+    'fertilizer':  ('soil_ec',         None,          None),
+}
+
+# sensors_data sensor_id → HistorySource channel
+HISTORY_CHANNELS = {
+    'dht22.temperature':       'air_temperature',
+    'dht22.humidity':          'air_humidity',
+    'ads1115.light_intensity': 'light',
+    'soil_ph':                 'soil_ph',
+    'soil_ec':                 'soil_ec',
+    'soil_humidity':           'soil_moisture',
+    'soil_temp':               'soil_temp',
+    'water_flow':              'water_flow',
+    'fertilizer_flow':         'fertilizer_flow',
+    'pzem-004t.voltage':       'voltage',
+    'pzem-004t.current':       'current',
+}
+
+
+class VirtualClock:
+    """Monotonic seconds that only move when told to."""
+    def __init__(self, start=0.0):
+        self.__now = float(start)
+
+    def monotonic(self):
+        return self.__now
+
+    def sleep(self, sec):
+        self.__now += max(0.0, sec)
+
+    def advance_to(self, t):
+        self.__now = max(self.__now, t)
+
+
+# ── Sources ─────────────────────────────────────────────────────────────────
+class PlantSource:
+    """Closed loop on a GreenhouseModel that runs on the replay clock."""
+    def __init__(self, model):
+        self.model = model
+
+    def air(self):
+        return self.model.air()
+
+    def light(self):
+        return self.model.light_lux()
+
+    def soil(self):
+        moisture, soil_temp, ec, ph = self.model.soil()
+        return ph, ec, moisture, soil_temp
+
+    def flow(self, load):
+        return self.model.flow_l_min(load)
+
+    def volume(self, load):
+        return self.model.pumped_volume(load)
+
+    def set_duty(self, load, duty_cycle):
+        self.model.set_duty(load, duty_cycle)
+
+    def energy_wh(self):
+        """Plant meter reading, including the base load."""
+        return self.model.snapshot()['energy_wh']
+
+
+class HistorySource:
+    """
+    Open loop on recorded readings. channels maps a HISTORY_CHANNELS name to
+    (t_sec, values) with t_sec relative to the start of the recording;
+    readings are linearly interpolated at the replay clock. start_time is the
+    local datetime of the first reading, when known.
+    """
+    def __init__(self, channels, clock, start_time=None):
+        self.__channels = {name: (np.asarray(t, dtype=float), np.asarray(v, dtype=float))
+                           for name, (t, v) in channels.items() if len(t)}
+        self.__clock = clock
+        self.__start = clock.monotonic()
+        self.duration_sec = max((t[-1] for t, _ in self.__channels.values()), default=0.0)
+        self.start_time = start_time
+
+    @classmethod
+    def from_docs(cls, docs, clock):
+        """Build from sensors_data documents (sensor_id, sensor_value, timestamp)."""
+        samples = {}
+        for doc in docs:
+            channel = HISTORY_CHANNELS.get(doc.get('sensor_id'))
+            if channel is None or doc.get('sensor_value') is None:
+                continue
+            samples.setdefault(channel, []).append((_timestamp(doc['timestamp']), float(doc['sensor_value'])))
+        if not samples:
+            return cls({}, clock)
+        t0 = min(s[0][0] for s in samples.values())
+        channels = {}
+        for name, rows in samples.items():
+            rows.sort()
+            channels[name] = ([t - t0 for t, _ in rows], [v for _, v in rows])
+        return cls(channels, clock, start_time=datetime.datetime.fromtimestamp(t0))
+
+    @classmethod
+    def from_mongo(cls, mongo_db_handler, since, until, clock):
+        return cls.from_docs(mongo_db_handler.get_sensor_history(since, until, HISTORY_CHANNELS), clock)
+
+    def __value(self, channel):
+        if channel not in self.__channels:
+            return None
+        t, v = self.__channels[channel]
+        return float(np.interp(self.__clock.monotonic() - self.__start, t, v))
+
+    def weather(self, model=GreenhouseModel, step_sec=60.0, smooth_sec=1800.0):
+        """
+        The recording's weather for GreenhouseModel(weather=...): seconds since
+        the first reading → (outside °C, daylight lux). Daylight is the model's
+        clear day, capped by the recorded lux; the lux above it is LED light,
+        which sets the LED share of the recorded power (V × I × power factor).
+        The rest above the base load is heater. The outside temperature solves
+        the model's heat balance C·dT/dt = Q − UA·(T − T_out) on the recorded
+        air temperature, smoothed over smooth_sec. Needs start_time.
+        """
+        if 'air_temperature' not in self.__channels or self.start_time is None:
+            raise ValueError("weather() needs an air temperature recording with a start time")
+        grid = np.arange(0.0, self.duration_sec + step_sec, step_sec)
+
+        def series(name, default):
+            if name not in self.__channels:
+                return np.full(len(grid), default)
+            t, v = self.__channels[name]
+            return np.interp(grid, t, v)
+
+        window = max(1, int(smooth_sec / step_sec))
+
+        def smooth(x):
+            padded = np.pad(x, (window // 2, window - 1 - window // 2), mode='edge')
+            return np.convolve(padded, np.ones(window) / window, mode='valid')
+
+        start = self.start_time
+        hours = (start.hour + start.minute / 60.0 + start.second / 3600.0 + grid / 3600.0) % 24.0
+        lux = series('light', 0.0)
+        daylight = np.minimum(lux, [clear_day_lux(h, model.DAYLIGHT_PEAK_LUX) for h in hours])
+        led_w = np.clip((lux - daylight) / model.LED_LUX * model.LED_POWER_W, 0.0, 2 * model.LED_POWER_W)
+        power = series('voltage', model.MAINS_VOLTAGE_V) * series('current', 0.0) * model.POWER_FACTOR
+        heater_w = np.clip(power - model.BASE_POWER_W - led_w, 0.0, model.HEATER_POWER_W)
+
+        temp = smooth(series('air_temperature', 0.0))
+        heat_w = smooth(heater_w + model.LED_HEAT_FRACTION * led_w)
+        outside = temp - (heat_w - model.HEAT_CAPACITY_J_K * np.gradient(temp, step_sec)) / model.ENVELOPE_UA_W_K
+
+        def weather(elapsed_sec):
+            return float(np.interp(elapsed_sec, grid, outside)), float(np.interp(elapsed_sec, grid, daylight))
+        return weather
+
+    def air(self):
+        return self.__value('air_temperature'), self.__value('air_humidity')
+
+    def light(self):
+        return self.__value('light')
+
+    def soil(self):
+        return (self.__value('soil_ph'), self.__value('soil_ec'),
+                self.__value('soil_moisture'), self.__value('soil_temp'))
+
+    def flow(self, load):
+        return self.__value('water_flow' if load == 'water_pump' else 'fertilizer_flow') or 0.0
+
+    def volume(self, load):
+        # Nothing is pumped in open loop — volumetric doses end on their no-flow fallback
+        return 0.0
+
+    def set_duty(self, load, duty_cycle):
+        pass
+
+    def energy_wh(self):
+        return None
+
+
+def _timestamp(value):
+    """datetime, ISO string or mongoexport {'$date': ...} → epoch seconds."""
+    if isinstance(value, dict):
+        value = value.get('$date')
+    if isinstance(value, dict):
+        value = int(value['$numberLong'])
+    if isinstance(value, (int, float)):
+        return value / 1000.0                  # mongoexport epoch milliseconds
+    if isinstance(value, str):
+        value = datetime.datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return value.timestamp()
+
+
+# ── Stand-ins for GH_Sensors / GH_Actuators / GH_Setpoints / MongoDBHandler ──
+class _ReplaySensors:
+    def __init__(self, source, clock, traces):
+        self.__source = source
+        self.__clock = clock
+        self.__traces = traces
+
+    def __trace(self, name, value):
+        if value is not None:
+            self.__traces.setdefault(name, ([], []))
+            self.__traces[name][0].append(self.__clock.monotonic())
+            self.__traces[name][1].append(value)
+        return value
+
+    def get_air_values_conditioned(self):
+        temp_c, humidity = self.__source.air()
+        return self.__trace('air_temperature', temp_c), humidity
+
+    def get_light_intensity_conditioned(self):
+        return self.__trace('light', self.__source.light())
+
+    def get_soil_values(self):
+        ph, ec, moisture, soil_temp = self.__source.soil()
+        self.__trace('soil_moisture', moisture)
+        self.__trace('soil_ec', ec)
+        return ph, ec, moisture, soil_temp
+
+    def get_water_flow_rate(self):
+        return self.__source.flow('water_pump')
+
+    def get_fertilizer_flow_rate(self):
+        return self.__source.flow('fertilizer_pump')
+
+    def get_water_counted_volume(self):
+        return self.__source.volume('water_pump')
+
+    def get_fertilizer_counted_volume(self):
+        return self.__source.volume('fertilizer_pump')
+
+
+class _ReplayActuators:
+    """Applies duties to the source and integrates them per load (and per tariff band)."""
+    def __init__(self, source, clock, tariff=None, start_time=None):
+        self.__source = source
+        self.__clock = clock
+        self.__tariff = tariff
+        self.__start_time = start_time
+        self.__t0 = clock.monotonic()
+        self.__by_band = {load: {} for load in RATED_POWER_W}    # band → [Wh, ₪]
+        self.__duty = {load: 0.0 for load in RATED_POWER_W}
+        self.__since = {load: clock.monotonic() for load in RATED_POWER_W}
+        self.__duty_sec = {load: 0.0 for load in RATED_POWER_W}    # ∫ duty/4095 dt
+        self.__on_sec = {load: 0.0 for load in RATED_POWER_W}
+        self.__switch_ons = {load: 0 for load in RATED_POWER_W}
+
+    def __close(self, load, now):
+        dt = now - self.__since[load]
+        self.__duty_sec[load] += self.__duty[load] / DUTY_FULL * dt
+        if self.__tariff is not None and self.__duty[load] > 0 and dt > 0:
+            wh = RATED_POWER_W[load] * self.__duty[load] / DUTY_FULL * dt / 3600.0
+            offset = datetime.timedelta(seconds=self.__since[load] - self.__t0)
+            start = self.__start_time + offset
+            for band, (band_wh, cost) in self.__tariff.cost(wh, start, start + datetime.timedelta(seconds=dt)).items():
+                totals = self.__by_band[load].setdefault(band, [0.0, 0.0])
+                totals[0] += band_wh
+                totals[1] += cost
+        if self.__duty[load] > 0:
+            self.__on_sec[load] += dt
+        self.__since[load] = now
+
+    def __set(self, load, duty_cycle):
+        duty_cycle = min(max(float(duty_cycle), 0.0), DUTY_FULL)
+        now = self.__clock.monotonic()
+        self.__close(load, now)
+        if duty_cycle > 0 and self.__duty[load] == 0:
+            self.__switch_ons[load] += 1
+        self.__duty[load] = duty_cycle
+        self.__source.set_duty(load, duty_cycle)
+        return True
+
+    def set_heater_and_heater_fan_duty_cycle(self, duty_cycle, force=False):
+        return self.__set('heater', duty_cycle) and self.__set('heater_fan', duty_cycle)
+
+    def set_fan_duty_cycle(self, duty_cycle, force=False):
+        return self.__set('fan', duty_cycle)
+
+    def set_light_strips_duty_cycle(self, duty_cycle, force=False):
+        return self.__set('light_strip_1', duty_cycle) and self.__set('light_strip_2', duty_cycle)
+
+    def set_water_pump_duty_cycle(self, duty_cycle, force=False):
+        return self.__set('water_pump', duty_cycle)
+
+    def set_fertilizer_pump_duty_cycle(self, duty_cycle, force=False):
+        return self.__set('fertilizer_pump', duty_cycle)
+
+    def set_mqtt_dc_value_water_pump(self, mqtt_dc_value):
+        pass
+
+    def summary(self, elapsed_sec) -> dict:
+        now = self.__clock.monotonic()
+        loads = {}
+        for load in RATED_POWER_W:
+            self.__close(load, now)
+            loads[load] = {
+                'duty_integral_sec': round(self.__duty_sec[load], 2),
+                'mean_duty':         round(self.__duty_sec[load] / elapsed_sec, 5) if elapsed_sec > 0 else 0.0,
+                'on_sec':            round(self.__on_sec[load], 2),
+                'switch_ons':        self.__switch_ons[load],
+                'energy_wh':         round(RATED_POWER_W[load] * self.__duty_sec[load] / 3600.0, 3),
+            }
+            if self.__tariff is not None:
+                loads[load]['cost_nis'] = round(sum(cost for _, cost in self.__by_band[load].values()), 4)
+                loads[load]['energy_by_band'] = {band: {'energy_wh': round(wh, 3), 'cost_nis': round(cost, 4)}
+                                                 for band, (wh, cost) in self.__by_band[load].items()}
+        return loads
+
+
+class _ReplaySetpoints:
+    """The GH_Setpoints getters the steps use; values change on the schedule."""
+    DEFAULTS = {'temperature': 21.0, 'light': 600.0, 'soil_moisture': 70.0, 'soil_hysteresis': 10.0,
+                'operation_mode': 'autonomous'}
+
+    def __init__(self, initial, clock):
+        self.__values = {**self.DEFAULTS, **(initial or {})}
+        self.__clock = clock
+        # field → [(t, value)] — the segments the metrics are cut into
+        self.history = {field: [(clock.monotonic(), value)] for field, value in self.__values.items()}
+
+    def set(self, field, value):
+        self.__values[field] = value
+        self.history.setdefault(field, []).append((self.__clock.monotonic(), value))
+
+    def get_operation_mode(self):
+        return self.__values['operation_mode']
+
+    def get_temperature_setpoint(self):
+        return self.__values['temperature']
+
+    def get_light_setpoint(self):
+        return self.__values['light']
+
+    def get_soil_humidity_setpoint(self):
+        return self.__values['soil_moisture']
+
+    def get_soil_humidity_hysteresis(self):
+        return self.__values['soil_hysteresis']
+
+
+class _ReplayPumpLog:
+    def __init__(self, clock):
+        self.__clock = clock
+        self.pulses = []
+
+    def insert_pump_log(self, pump_type, pulse_sec, duty_cycle, flow_rate_l_min=0.0,
+                        target_ml=None, delivered_ml=None, stop_reason=None):
+        pulse = {'t_sec': round(self.__clock.monotonic(), 1), 'pump': pump_type,
+                 'pulse_sec': pulse_sec, 'duty_cycle': duty_cycle}
+        if target_ml is not None:
+            pulse.update(target_ml=round(target_ml, 2), delivered_ml=round(delivered_ml, 2), stop_reason=stop_reason)
+        self.pulses.append(pulse)
+        return True
+
+
+# ── Metrics ─────────────────────────────────────────────────────────────────
+def setpoint_response(t, pv, t_start, setpoint, band, deadband=0.0, hold_sec=SETTLE_HOLD_SEC):
+    """
+    Step-response metrics of one setpoint segment (samples t, pv from t_start on):
+    settling time (s until the PV enters ±band and stays there hold_sec or to
+    the segment end, None if it never does), the share of the samples after
+    that outside the band, overshoot past the setpoint in the direction of the
+    step, and tracking error. With a deadband
+    the settling band and the overshoot count from setpoint ± deadband, where
+    the loop stops acting; IAE and RMS stay on the error from the setpoint.
+    """
+    t, pv = np.asarray(t, dtype=float), np.asarray(pv, dtype=float)
+    error = pv - setpoint
+    step = setpoint - pv[0]
+    if deadband:
+        step = np.sign(step) * max(0.0, abs(step) - deadband)
+    beyond = np.sign(error) * np.maximum(0.0, np.abs(error) - deadband)
+    inside = np.abs(beyond) <= band
+    edges = np.flatnonzero(np.diff(np.concatenate(([0], inside.astype(int), [0]))))
+    settling, outside_pct = None, None
+    for first, after in zip(edges[::2], edges[1::2]):
+        if after == len(t) or t[after] - t[first] >= hold_sec:
+            settling = float(t[first] - t_start)
+            outside_pct = round(float(100.0 * np.mean(~inside[first:])), 1)
+            break
+    # Overshoot only means something for a step bigger than the band
+    overshoot = float(max(0.0, np.max(np.sign(step) * beyond))) if abs(step) > band else 0.0
+    return {
+        'start_sec':     round(t_start, 1),
+        'setpoint':      setpoint,
+        'initial_pv':    round(float(pv[0]), 3),
+        'settling_sec':  None if settling is None else round(settling, 1),
+        'outside_pct':   outside_pct,
+        'overshoot':     round(overshoot, 3),
+        'overshoot_pct': round(float(100.0 * overshoot / abs(step)), 1) if abs(step) > band else None,
+        'iae':           round(float(np.sum((np.abs(error[1:]) + np.abs(error[:-1])) / 2 * np.diff(t))), 2),
+        'rms_error':     round(float(np.sqrt(np.mean(error ** 2))), 4),
+        'samples':       len(t),
+    }
+
+
+def _loop_metrics(trace, segments, band, deadband=0.0):
+    t, pv = np.asarray(trace[0]), np.asarray(trace[1])
+    metrics = {
+        'pv_min':  round(float(pv.min()), 3),
+        'pv_max':  round(float(pv.max()), 3),
+        'pv_mean': round(float(pv.mean()), 3),
+    }
+    if segments is None:
+        return metrics
+    metrics['segments'] = []
+    for i, (t_start, setpoint) in enumerate(segments):
+        t_end = segments[i + 1][0] if i + 1 < len(segments) else np.inf
+        mask = (t >= t_start) & (t < t_end)
+        if mask.any():
+            metrics['segments'].append(setpoint_response(t[mask], pv[mask], t_start, setpoint, band, deadband))
+    error = pv - np.array([_setpoint_at(segments, x) for x in t])
+    metrics['rms_error'] = round(float(np.sqrt(np.mean(error ** 2))), 4)
+    return metrics
+
+
+def _setpoint_at(segments, t):
+    value = segments[0][1]
+    for t_start, setpoint in segments:
+        if t_start > t:
+            break
+        value = setpoint
+    return value
+
+
+# ── Harness ─────────────────────────────────────────────────────────────────
+class ReplayHarness:
+    """
+    Runs the control loops named in loops against a source on a VirtualClock.
+
+    schedule is a list of (t_sec, field, value) setpoint changes with t_sec
+    from the start of the run and field as in control_loops.SETPOINT_TASKS
+    ('temperature', 'light', ...). gains maps a PID loop to (kp, ki, kd) to
+    try instead of the built-in gains. temperature_controller 'mpc' needs
+    mpc_model (a temperature_mpc.FOPDTModel); temperature_options (e.g.
+    deadband), mpc_options and light_options are passed on to the step
+    factories; soil_planner (an irrigation_planner.IrrigationPlanner built on
+    the replay clock) makes the soil loop predictive and fertilizer_planner
+    (a fertilizer_planner.FertilizerPlanner) doses EC from its learned gain.
+    dose_ml_per_sec maps 'water' / 'fertilizer' to the nominal pump flow for
+    volumetric dosing; the fertilizer planner needs the 'fertilizer' entry.
+    With a tariff (tariff.Tariff) the actuator energy is also priced per band
+    from start_time, the local datetime at the start of the run.
+    """
+    def __init__(self, source, clock, loops=DEFAULT_LOOPS, schedule=(), initial_setpoints=None,
+                 gains=None, temperature_controller='pid', temperature_options=None,
+                 mpc_model=None, mpc_options=None, light_options=None, soil_planner=None,
+                 fertilizer_planner=None, dose_ml_per_sec=None, tariff=None, start_time=None):
+        self.__source = source
+        self.__clock = clock
+        self.__loops = tuple(loops)
+        self.__schedule = sorted(schedule, key=lambda change: change[0])
+        self.__initial = initial_setpoints
+        self.__gains = gains or {}
+        self.__controller = temperature_controller
+        self.__temperature_options = temperature_options or {}
+        self.__mpc_model = mpc_model
+        self.__mpc_options = mpc_options or {}
+        self.__light_options = light_options or {}
+        self.__soil_planner = soil_planner
+        self.__fertilizer_planner = fertilizer_planner
+        self.__dose_ml_per_sec = dose_ml_per_sec or {}
+        self.__tariff = tariff
+        self.__start_time = start_time
+
+    def __deadband(self, loop):
+        """Band around the setpoint the loop leaves alone (make_temperature_step's 1 °C)."""
+        if loop == 'temperature' and self.__controller != 'mpc':
+            return self.__temperature_options.get('deadband', 1.0)
+        return 0.0
+
+    def __build_steps(self, sensors, actuators, setpoints, pump_log, light_pause_event):
+        clock, sleep = self.__clock.monotonic, self.__clock.sleep
+        steps = {}
+        if 'temperature' in self.__loops:
+            if self.__controller == 'mpc':
+                steps['temperature'] = control_loops.make_temperature_mpc_step(
+                    sensors, actuators, setpoints, threading.Semaphore(1),
+                    self.__mpc_model, clock=clock, **self.__mpc_options,
+                )
+            else:
+                steps['temperature'] = control_loops.make_temperature_step(
+                    sensors, actuators, setpoints, threading.Semaphore(1),
+                    clock=clock, **self.__temperature_options,
+                )
+        if 'light' in self.__loops:
+            steps['light'] = control_loops.make_light_step(
+                sensors, actuators, setpoints, threading.Semaphore(1), clock=clock, **self.__light_options,
+            )
+        if 'soil' in self.__loops:
+            steps['soil'] = control_loops.make_soil_moisture_step(
+                sensors, actuators, setpoints, threading.Semaphore(1), pump_log,
+                light_pause_event=light_pause_event, planner=self.__soil_planner,
+                dose_ml_per_sec=self.__dose_ml_per_sec.get('water'), clock=clock, sleep=sleep,
+            )
+        if 'fertilizer' in self.__loops:
+            steps['fertilizer'] = control_loops.make_fertilizer_step(
+                sensors, actuators, setpoints, threading.Semaphore(1), pump_log,
+                light_pause_event=light_pause_event, planner=self.__fertilizer_planner,
+                dose_ml_per_sec=self.__dose_ml_per_sec.get('fertilizer'), clock=clock, sleep=sleep,
+            )
+        for name, (kp, ki, kd) in self.__gains.items():
+            steps[name].set_gains(kp, ki, kd)
+        return steps
+
+    def run(self, duration_sec) -> dict:
+        clock = self.__clock
+        traces = {}
+        sensors = _ReplaySensors(self.__source, clock, traces)
+        actuators = _ReplayActuators(self.__source, clock, self.__tariff, self.__start_time)
+        setpoints = _ReplaySetpoints(self.__initial, clock)
+        pump_log = _ReplayPumpLog(clock)
+        light_pause_event = threading.Event()
+        light_pause_event.set()
+        steps = self.__build_steps(sensors, actuators, setpoints, pump_log, light_pause_event)
+
+        scheduler = ControlScheduler(clock=clock.monotonic, publish_timing=False)
+        for name, step in steps.items():
+            scheduler.add_task(name, step, pause_event=light_pause_event if name == 'light' else None)
+
+        start = clock.monotonic()
+        end = start + duration_sec
+        wall_start = time.perf_counter()
+        for t_sec, field, value in self.__schedule:
+            if start + t_sec >= end:
+                break
+            scheduler.run_until(start + t_sec, clock.advance_to)
+            clock.advance_to(start + t_sec)
+            setpoints.set(field, value)
+            for name in control_loops.SETPOINT_TASKS.get(field, ()):
+                if name in steps:
+                    scheduler.wake(name)
+        scheduler.run_until(end, clock.advance_to)
+        clock.advance_to(end)
+        wall_sec = time.perf_counter() - wall_start
+
+        tasks = scheduler.get_tasks()
+        loops = {}
+        for name in steps:
+            pv_name, field, band = LOOP_PV[name]
+            loops[name] = {'cycles': tasks[name]['runs'], 'errors': tasks[name]['errors']}
+            if pv_name in traces:
+                trace = ([t - start for t in traces[pv_name][0]], traces[pv_name][1])
+                segments = None
+                if field is not None:
+                    segments = [(t - start, value) for t, value in setpoints.history[field]]
+                loops[name].update(_loop_metrics(trace, segments, band, self.__deadband(name)))
+            if 'stats' in tasks[name]:
+                loops[name]['stats'] = tasks[name]['stats']
+
+        elapsed = end - start
+        actuator_summary = actuators.summary(elapsed)
+        plant_energy = self.__source.energy_wh()
+        report = {
+            'simulated_sec':   round(elapsed, 1),
+            'wall_sec':        round(wall_sec, 3),
+            'speedup':         round(elapsed / wall_sec) if wall_sec > 0 else None,
+            'loops':           loops,
+            'actuators':       actuator_summary,
+            'energy_wh':       round(sum(a['energy_wh'] for a in actuator_summary.values()), 3),
+            'plant_energy_wh': None if plant_energy is None else round(plant_energy, 3),
+            'pump_pulses':     pump_log.pulses,
+        }
+        if self.__tariff is not None:
+            by_band = {}
+            for a in actuator_summary.values():
+                for band, totals in a['energy_by_band'].items():
+                    merged = by_band.setdefault(band, {'energy_wh': 0.0, 'cost_nis': 0.0})
+                    merged['energy_wh'] = round(merged['energy_wh'] + totals['energy_wh'], 3)
+                    merged['cost_nis'] = round(merged['cost_nis'] + totals['cost_nis'], 4)
+            report['cost_nis'] = round(sum(a['cost_nis'] for a in actuator_summary.values()), 4)
+            report['energy_by_band'] = by_band
+        return report
@@ -0,0 +1,81 @@
+"""
+tariff.py — Time-of-use (TOU) electricity prices.
+
+A Tariff is a list of bands, each a dict:
+
+    {'name': 'peak', 'price': 1.69, 'hours': (17, 23),
+     'days': (6, 0, 1, 2, 3), 'months': (6, 7, 8, 9)}
+
+hours is [start, end) in local time and may wrap midnight; days are
+datetime.weekday() numbers (0 = Monday) and months 1–12, both optional (all
+days / months when left out). Bands are checked in order and the first match
+sets the price; any other time is off_peak_name at off_peak_price. With no
+bands the tariff is flat. Band edges fall on quarter hours.
+"""
+import datetime
+
+_STEP = datetime.timedelta(minutes=15)
+
+
+def _next_quarter(when):
+    floor = when.replace(minute=when.minute - when.minute % 15, second=0, microsecond=0)
+    return floor + _STEP
+
+
+class Tariff:
+    def __init__(self, bands=(), off_peak_price=0.6432, off_peak_name='off_peak'):
+        self.__bands = [dict(band) for band in bands]
+        self.off_peak_price = float(off_peak_price)
+        self.off_peak_name = off_peak_name
+        self.max_price = max([self.off_peak_price] + [float(b['price']) for b in self.__bands])
+
+    @staticmethod
+    def __matches(band, when):
+        if 'months' in band and when.month not in band['months']:
+            return False
+        if 'days' in band and when.weekday() not in band['days']:
+            return False
+        start, end = band['hours']
+        hour = when.hour + when.minute / 60.0
+        if start <= end:
+            return start <= hour < end
+        return hour >= start or hour < end
+
+    def band_at(self, when):
+        """(band name, ₪/kWh) at a local datetime."""
+        for band in self.__bands:
+            if self.__matches(band, when):
+                return band['name'], float(band['price'])
+        return self.off_peak_name, self.off_peak_price
+
+    def price_at(self, when) -> float:
+        return self.band_at(when)[1]
+
+    def segments(self, start, end):
+        """(band name, ₪/kWh, seconds) pieces of [start, end), in order."""
+        t = start
+        while t < end:
+            nxt = min(end, _next_quarter(t))
+            name, price = self.band_at(t)
+            yield name, price, (nxt - t).total_seconds()
+            t = nxt
+
+    def cost(self, energy_wh, start, end) -> dict:
+        """
+        energy_wh drawn evenly over [start, end), split by band:
+        {band: (Wh, ₪)}. A zero-length interval is priced at start.
+        """
+        total = (end - start).total_seconds()
+        if total <= 0:
+            name, price = self.band_at(start)
+            return {name: (energy_wh, energy_wh / 1000.0 * price)}
+        split = {}
+        for name, price, sec in self.segments(start, end):
+            wh = energy_wh * sec / total
+            prev_wh, prev_cost = split.get(name, (0.0, 0.0))
+            split[name] = (prev_wh + wh, prev_cost + wh / 1000.0 * price)
+        return split
+
+    def describe(self) -> dict:
+        return {'bands': [dict(b) for b in self.__bands],
+                'off_peak': {'name': self.off_peak_name, 'price': self.off_peak_price}}
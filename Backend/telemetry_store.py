@@ -0,0 +1,144 @@
+"""
+telemetry_store.py — Fixed-memory in-process history of recent telemetry.
+
+Each channel is a pair of preallocated NumPy arrays (timestamps, values) used
+as a ring buffer, so appends are O(1) and memory never grows. Window queries
+(mean / min / max / slope over the last N seconds) are vectorised and never
+touch MongoDB.
+"""
+import time
+import threading
+
+import numpy as np
+
+
+class _Channel:
+    def __init__(self, capacity):
+        self.capacity = int(capacity)
+        self.t = np.zeros(self.capacity)
+        self.v = np.zeros(self.capacity)
+        self.idx = 0        # next write position
+        self.count = 0
+
+    def append(self, t, v):
+        self.t[self.idx] = t
+        self.v[self.idx] = v
+        self.idx = (self.idx + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+
+    def since(self, t_start):
+        """Chronological copies of (t, v) for samples with t >= t_start."""
+        if self.count < self.capacity:
+            segments = [(0, self.count)]
+        else:
+            # Oldest segment first: [idx, capacity) then [0, idx)
+            segments = [(self.idx, self.capacity), (0, self.idx)]
+        ts, vs = [], []
+        for lo, hi in segments:
+            if hi <= lo:
+                continue
+            seg_t = self.t[lo:hi]
+            start = lo + int(np.searchsorted(seg_t, t_start, side='left'))
+            if start < hi:
+                ts.append(self.t[start:hi])
+                vs.append(self.v[start:hi])
+        if not ts:
+            return np.empty(0), np.empty(0)
+        return np.concatenate(ts), np.concatenate(vs)
+
+
+class TelemetryStore:
+    """
+    Ring-buffer time-series store, one channel per telemetry signal.
+
+    Channels are declared up front from a {name: sample period (s)} mapping;
+    capacity = retention_sec / period. Appending to an unknown channel creates
+    it with default_period_sec.
+    """
+    def __init__(self, channel_periods=None, retention_sec=86400, default_period_sec=10.0):
+        self.__retention_sec = float(retention_sec)
+        self.__default_period_sec = float(default_period_sec)
+        self.__channels = {}
+        self.__lock = threading.Lock()
+        for name, period_sec in (channel_periods or {}).items():
+            self.add_channel(name, period_sec)
+
+    def __capacity(self, period_sec):
+        return max(1, int(self.__retention_sec / period_sec))
+
+    def add_channel(self, name, period_sec):
+        with self.__lock:
+            self.__channels[name] = _Channel(self.__capacity(period_sec))
+
+    def has_channel(self, name) -> bool:
+        return name in self.__channels
+
+    def channels(self) -> list:
+        return list(self.__channels.keys())
+
+    def append(self, name, value, t=None):
+        """Record one sample (t = wall-clock seconds, defaults to now). O(1)."""
+        if value is None:
+            return
+        if t is None:
+            t = time.time()
+        with self.__lock:
+            channel = self.__channels.get(name)
+            if channel is None:
+                channel = self.__channels[name] = _Channel(self.__capacity(self.__default_period_sec))
+            channel.append(t, float(value))
+
+    def append_many(self, values: dict, t=None):
+        """Record several channels sampled at the same instant."""
+        if t is None:
+            t = time.time()
+        for name, value in values.items():
+            self.append(name, value, t)
+
+    def window(self, name, seconds, now=None):
+        """Return (timestamps, values) arrays for the last `seconds` seconds."""
+        if now is None:
+            now = time.time()
+        with self.__lock:
+            channel = self.__channels.get(name)
+            if channel is None:
+                return np.empty(0), np.empty(0)
+            return channel.since(now - seconds)
+
+    def latest(self, name):
+        """Return (timestamp, value) of the newest sample, or None."""
+        with self.__lock:
+            channel = self.__channels.get(name)
+            if channel is None or channel.count == 0:
+                return None
+            i = (channel.idx - 1) % channel.capacity
+            return float(channel.t[i]), float(channel.v[i])
+
+    def stats(self, name, seconds, now=None) -> dict:
+        """
+        Window statistics over the last `seconds` seconds:
+        count, mean, min, max, last and slope (units per second, least squares).
+        """
+        t, v = self.window(name, seconds, now)
+        n = len(v)
+        if n == 0:
+            return {'count': 0, 'mean': None, 'min': None, 'max': None, 'last': None, 'slope': None}
+        slope = None
+        if n >= 2:
+            tc = t - t.mean()
+            denom = float(np.dot(tc, tc))
+            if denom > 0:
+                slope = float(np.dot(tc, v - v.mean()) / denom)
+        return {
+            'count': n,
+            'mean':  float(v.mean()),
+            'min':   float(v.min()),
+            'max':   float(v.max()),
+            'last':  float(v[-1]),
+            'slope': slope,
+        }
+
+    def memory_bytes(self) -> int:
+        with self.__lock:
+            return sum(ch.t.nbytes + ch.v.nbytes for ch in self.__channels.values())
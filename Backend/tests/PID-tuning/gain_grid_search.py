@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+PID Gain Grid Search on an Identified FOPDT Model
+-------------------------------------------------
+Simulates thousands of (Kp, Ki, Kd, deadband) combinations against the plant
+model from a reaction-curve test and ranks them by IAE, overshoot and
+actuator effort (simulation/gain_grid.py). No hardware needed.
+
+The model comes from:
+  --reaction-file  the parameter file ziegler_nichols_open_loop.py writes
+                   (temperature_pid_parameters_open_loop.txt)
+  --K --L --T      the same values by hand (K per duty unit, L and T in s)
+  --mpc-model      config.MPC_INITIAL_MODEL (temperature only)
+
+Run from the Backend folder:
+    python3 tests/PID-tuning/gain_grid_search.py --reaction-file temperature_pid_parameters_open_loop.txt
+    python3 tests/PID-tuning/gain_grid_search.py --mpc-model --k-cool -8 --points 24
+    python3 tests/PID-tuning/gain_grid_search.py --loop light --K 0.15 --L 0.1 --T 0.3 --ambient 100 --noise 2
+
+Check the winner closed-loop on the greenhouse model before using it:
+    python3 tests/control_replay.py --gains KP,KI,KD --deadband DB --step 3600:24
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..'))
+
+import re
+import json
+import time
+import argparse
+
+from simulation.gain_grid import (
+    LOOPS, model_from_reaction_curve, zn_gains, default_grid, evaluate_grid, rank,
+)
+
+
+def read_reaction_file(path):
+    """K, L, T and the initial temperature from ziegler_nichols_open_loop.py's output file."""
+    values = {}
+    with open(path) as f:
+        for line in f:
+            match = re.match(r'#\s*(K|L|T)\s*=\s*([-\d.eE+]+)', line) or \
+                    re.match(r'#\s*(Initial Temp):\s*([-\d.eE+]+)', line)
+            if match:
+                values[match.group(1)] = float(match.group(2))
+    missing = {'K', 'L', 'T'} - set(values)
+    if missing:
+        raise SystemExit(f"{path}: missing {', '.join(sorted(missing))}")
+    return values
+
+
+def parse_weights(value):
+    return {name: float(weight) for name, weight in (item.split('=') for item in value.split(','))}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rank PID gains on an FOPDT model")
+    parser.add_argument('--loop', choices=tuple(LOOPS), default='temperature')
+    parser.add_argument('--reaction-file', help="parameter file written by ziegler_nichols_open_loop.py")
+    parser.add_argument('--K', type=float, help="process gain, PV units per duty unit (0-4095)")
+    parser.add_argument('--L', type=float, help="dead time (s)")
+    parser.add_argument('--T', type=float, help="time constant (s)")
+    parser.add_argument('--ambient', type=float, help="PV with the actuator off (°C / lux)")
+    parser.add_argument('--k-cool', type=float, default=0.0, help="temperature change at full fan duty (°C, < 0)")
+    parser.add_argument('--mpc-model', action='store_true', help="use config.MPC_INITIAL_MODEL")
+    parser.add_argument('--points', type=int, default=16, help="Kp and Ki values each")
+    parser.add_argument('--span', type=float, default=10.0, help="grid spans ZN gain ÷span … ×span")
+    parser.add_argument('--setpoint', type=float, help="setpoint of the step (default ambient + loop step)")
+    parser.add_argument('--duration', type=float, help="scenario length (s)")
+    parser.add_argument('--noise', type=float, default=0.0, help="measurement noise sigma")
+    parser.add_argument('--weights', type=parse_weights, default=None,
+                        help="e.g. iae=1,overshoot=1,effort=0.5 (also energy, moves, recovery)")
+    parser.add_argument('--processes', type=int, default=None, help="pool size (default: CPU count)")
+    parser.add_argument('--top', type=int, default=15)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    if args.mpc_model:
+        os.environ.setdefault('PLANTMIND_HARDWARE', 'sim')   # config imports board
+        import config
+        from temperature_mpc import FOPDTModel
+        model = FOPDTModel(r2=None, **config.MPC_INITIAL_MODEL)
+    else:
+        if args.reaction_file:
+            curve = read_reaction_file(args.reaction_file)
+        elif None not in (args.K, args.L, args.T):
+            curve = {'K': args.K, 'L': args.L, 'T': args.T}
+        else:
+            parser.error("give --reaction-file, --K/--L/--T or --mpc-model")
+        ambient = args.ambient if args.ambient is not None else curve.get('Initial Temp')
+        if ambient is None:
+            parser.error("--ambient is required without an Initial Temp in the reaction file")
+        model = model_from_reaction_curve(curve, ambient, k_cool=args.k_cool)
+
+    grid = default_grid(model, args.loop, points=args.points, span=args.span)
+    scenario = {'setpoint': args.setpoint, 'duration_sec': args.duration, 'noise': args.noise, 'seed': 1}
+    started = time.perf_counter()
+    results = evaluate_grid(model, grid, loop=args.loop, processes=args.processes, **scenario)
+    elapsed = time.perf_counter() - started
+    ranked = rank(results, weights=args.weights, top=args.top)
+
+    if args.json:
+        print(json.dumps({'model': model._asdict(), 'candidates': len(grid['kp']), 'ranked': ranked}, indent=2))
+        return
+
+    kp0, ki0, kd0 = zn_gains(model, args.loop)
+    print(f"\nModel: {model._asdict()}")
+    print(f"ZN open-loop centre: Kp={kp0:.4g} Ki={ki0:.4g} Kd={kd0:.4g}")
+    print(f"{len(grid['kp'])} candidates simulated in {elapsed:.1f} s, "
+          f"{int(results['settled'].sum())} settled\n")
+    print(f"  {'#':>3} {'Kp':>10} {'Ki':>10} {'Kd':>10} {'DB':>6} {'score':>7} {'IAE':>10} "
+          f"{'overshoot':>9} {'settle s':>9} {'effort s':>9} {'Wh':>8} {'moves':>7}")
+    for i, c in enumerate(ranked, 1):
+        print(f"  {i:>3} {c['kp']:>10.4g} {c['ki']:>10.4g} {c['kd']:>10.4g} {c['deadband']:>6g} "
+              f"{'-' if c['score'] is None else c['score']:>7} {c['iae']:>10.1f} {c['overshoot']:>9.3f} "
+              f"{'-' if c['settling_sec'] is None else c['settling_sec']:>9} {c['effort_sec']:>9.0f} "
+              f"{c['energy_wh']:>8.2f} {c['moves']:>7.2f}")
+
+
+if __name__ == "__main__":
+    main()
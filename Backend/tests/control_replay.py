@@ -0,0 +1,215 @@
+"""
+Accelerated Control Replay
+--------------------------
+Runs the real control loop steps (control_loops.py) on a virtual clock with
+simulation/replay.py — days of control in seconds, no Pi or database needed.
+
+Closed loop on the greenhouse model (default), or open loop on recorded
+sensors_data exported with mongoexport (--history). Prints settling time,
+overshoot and tracking error per loop and duty integral / energy per actuator.
+
+Run from the Backend folder:
+    python3 tests/control_replay.py
+    python3 tests/control_replay.py --days 3 --step 3600:24 --step 21600:21
+    python3 tests/control_replay.py --gains 800,1.0,0 --deadband 0.5
+    python3 tests/control_replay.py --controller mpc --loops temperature
+    python3 tests/control_replay.py --loops soil --soil-planner
+    python3 tests/control_replay.py --loops soil,fertilizer --dose-by-volume --supply 0.6
+    python3 tests/control_replay.py --loops soil,fertilizer --soil-ec 800 --fertilizer-planner
+    python3 tests/control_replay.py --loops light --dli 0.64
+    python3 tests/control_replay.py --history sensors_data.json
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import json
+import argparse
+import datetime
+
+from utils.utils import set_serial_log_enabled
+from simulation.physics import GreenhouseModel
+from simulation.replay import VirtualClock, PlantSource, HistorySource, ReplayHarness
+
+# Nominal pump flow (mL/s) the volumetric doses assume when config leaves
+# WATER/FERTILIZER_DOSE_ML_PER_SEC unset: the model's pumps at the loops' duty
+# cycles (1800 / 2662) at --supply 1
+MODEL_DOSE_ML_PER_SEC = {
+    'water':      GreenhouseModel.WATER_PUMP_L_MIN * 1800 / 4095 / 0.06,
+    'fertilizer': GreenhouseModel.FERTILIZER_PUMP_L_MIN * 2662 / 4095 / 0.06,
+}
+
+
+def load_history(path):
+    """mongoexport output — a JSON array or one document per line."""
+    with open(path) as f:
+        text = f.read().strip()
+    if text.startswith('['):
+        return json.loads(text)
+    return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+
+def parse_step(value):
+    t_sec, setpoint = value.split(':')
+    return float(t_sec), float(setpoint)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Accelerated-time replay of the control loops")
+    parser.add_argument('--days', type=float, default=2.0, help="simulated duration (model source)")
+    parser.add_argument('--loops', default='temperature,soil,fertilizer',
+                        help="comma-separated: temperature, light, soil, fertilizer")
+    parser.add_argument('--controller', choices=('pid', 'mpc'), default='pid', help="temperature controller")
+    parser.add_argument('--gains', help="temperature PID kp,ki,kd to try")
+    parser.add_argument('--deadband', type=float, help="temperature PID deadband (°C) to try")
+    parser.add_argument('--step', action='append', type=parse_step, default=[],
+                        help="temperature setpoint change T_SEC:VALUE (repeatable)")
+    parser.add_argument('--light-step', action='append', type=parse_step, default=[],
+                        help="light setpoint change T_SEC:VALUE (repeatable)")
+    parser.add_argument('--dli', type=float, help="daily light integral target (mol/m²/day, dli_planner.py)")
+    parser.add_argument('--soil-planner', action='store_true', help="predictive irrigation (irrigation_planner.py)")
+    parser.add_argument('--fertilizer-planner', action='store_true',
+                        help="model-based EC dosing (fertilizer_planner.py); doses by volume")
+    parser.add_argument('--dose-by-volume', action='store_true',
+                        help="flow-verified pump doses (config WATER/FERTILIZER_DOSE_ML_PER_SEC, else the model's pumps)")
+    parser.add_argument('--supply', type=float, default=1.0,
+                        help="scale the model's pump flow (supply pressure), e.g. 0.6")
+    parser.add_argument('--soil-ec', type=float, default=1200.0, help="model soil EC at the start (µS/cm)")
+    parser.add_argument('--soil-moisture', type=float, default=55.0, help="model soil moisture at the start (%%)")
+    parser.add_argument('--drying', type=float,
+                        help=f"model soil drying rate at 20 °C in the dark (%%/h, default {GreenhouseModel.DRYING_PCT_PER_HOUR:.1f})")
+    parser.add_argument('--start-hour', type=float, default=0.0, help="model time of day at the start")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--history', help="sensors_data export to replay instead of the model")
+    parser.add_argument('--json', action='store_true', help="print the full report as JSON")
+    parser.add_argument('--verbose', action='store_true', help="keep the control loop log output")
+    args = parser.parse_args()
+
+    if not args.verbose:
+        set_serial_log_enabled(True)     # silences _CUSTOM_PRINT_FUNC
+
+    clock = VirtualClock()
+    if args.history:
+        source = HistorySource.from_docs(load_history(args.history), clock)
+        duration = source.duration_sec
+    else:
+        model = GreenhouseModel(start_hour=args.start_hour, soil_moisture=args.soil_moisture, soil_ec=args.soil_ec,
+                                seed=args.seed, clock=clock.monotonic)
+        model.WATER_PUMP_L_MIN *= args.supply
+        model.FERTILIZER_PUMP_L_MIN *= args.supply
+        if args.drying is not None:
+            model.DRYING_PCT_PER_HOUR = args.drying
+        source = PlantSource(model)
+        duration = args.days * 86400
+
+    if args.controller == 'mpc' or args.dose_by_volume or args.fertilizer_planner or args.dli is not None:
+        os.environ.setdefault('PLANTMIND_HARDWARE', 'sim')   # config imports board
+        import config
+
+    mpc_model, mpc_options = None, None
+    if args.controller == 'mpc':
+        from temperature_mpc import FOPDTModel
+        mpc_model = FOPDTModel(r2=None, **config.MPC_INITIAL_MODEL)
+        mpc_options = {
+            'horizon_steps':          config.MPC_HORIZON_STEPS,
+            'control_moves':          config.MPC_CONTROL_MOVES,
+            'heater_power_w':         config.MPC_HEATER_POWER_W,
+            'fan_power_w':            config.MPC_FAN_POWER_W,
+            'price_per_kwh':          config.ELECTRICITY_PRICE_PER_KWH_NIS,
+            'error_cost_per_c2_hour': config.MPC_ERROR_COST_NIS_C2_HOUR,
+        }
+
+    soil_planner = None
+    if args.soil_planner:
+        from irrigation_planner import IrrigationPlanner
+        soil_planner = IrrigationPlanner(clock=clock.monotonic)
+
+    dose_ml_per_sec = {}
+    if args.dose_by_volume:
+        dose_ml_per_sec = {'water':      config.WATER_DOSE_ML_PER_SEC or MODEL_DOSE_ML_PER_SEC['water'],
+                           'fertilizer': config.FERTILIZER_DOSE_ML_PER_SEC or MODEL_DOSE_ML_PER_SEC['fertilizer']}
+
+    fertilizer_planner = None
+    if args.fertilizer_planner:
+        from fertilizer_planner import FertilizerPlanner
+        fertilizer_planner = FertilizerPlanner(max_dose_ml=config.FERTILIZER_PLANNER_MAX_DOSE_ML, clock=clock.monotonic)
+        dose_ml_per_sec['fertilizer'] = config.FERTILIZER_DOSE_ML_PER_SEC or MODEL_DOSE_ML_PER_SEC['fertilizer']
+
+    light_options = None
+    if args.dli is not None:
+        from dli_planner import DLIPlanner
+        midnight = datetime.datetime(2026, 1, 1)
+        light_options = {'dli_planner': DLIPlanner(
+            target_mol=args.dli,
+            lux_to_ppfd=config.DLI_LUX_TO_PPFD,
+            photoperiod=config.DLI_PHOTOPERIOD_HOURS,
+            led_power_w=config.DLI_LED_POWER_W,
+            led_lux_full=config.DLI_LED_LUX_FULL,
+            clock=clock.monotonic,
+            wallclock=lambda: midnight + datetime.timedelta(hours=args.start_hour, seconds=clock.monotonic()),
+        )}
+
+    schedule = ([(t, 'temperature', v) for t, v in args.step]
+                + [(t, 'light', v) for t, v in args.light_step])
+    gains = {'temperature': tuple(float(g) for g in args.gains.split(','))} if args.gains else None
+    harness = ReplayHarness(
+        source, clock,
+        loops=[name.strip() for name in args.loops.split(',') if name.strip()],
+        schedule=schedule,
+        gains=gains,
+        temperature_controller=args.controller,
+        temperature_options={'deadband': args.deadband} if args.deadband is not None else None,
+        mpc_model=mpc_model,
+        mpc_options=mpc_options,
+        light_options=light_options,
+        soil_planner=soil_planner,
+        fertilizer_planner=fertilizer_planner,
+        dose_ml_per_sec=dose_ml_per_sec,
+    )
+    report = harness.run(duration)
+    set_serial_log_enabled(False)
+
+    if args.json:
+        print(json.dumps(report, indent=2, default=str))
+        return
+
+    print(f"\nSimulated {report['simulated_sec'] / 3600:.1f} h in {report['wall_sec']:.2f} s "
+          f"({report['speedup']}x real time)\n")
+    print("Loops")
+    for name, loop in report['loops'].items():
+        line = f"  {name:<12} cycles={loop['cycles']:>7}  errors={loop['errors']}"
+        if 'pv_mean' in loop:
+            line += f"  PV min/mean/max={loop['pv_min']}/{loop['pv_mean']}/{loop['pv_max']}"
+        if 'rms_error' in loop:
+            line += f"  RMS error={loop['rms_error']}"
+        print(line)
+        for seg in loop.get('segments', []):
+            settling = 'not settled' if seg['settling_sec'] is None else \
+                f"settled in {seg['settling_sec'] / 60:.1f} min, {seg['outside_pct']}% out"
+            print(f"      t={seg['start_sec'] / 3600:6.2f} h  SP={seg['setpoint']:<7} from {seg['initial_pv']:<8} "
+                  f"{settling:<30} overshoot={seg['overshoot']} ({seg['overshoot_pct']}%)  IAE={seg['iae']}")
+    print("\nActuators")
+    for load, a in report['actuators'].items():
+        print(f"  {load:<16} duty integral={a['duty_integral_sec'] / 3600:8.3f} h  on={a['on_sec'] / 3600:7.2f} h  "
+              f"switch-ons={a['switch_ons']:>5}  energy={a['energy_wh']:9.2f} Wh")
+    print(f"\n  Actuator energy: {report['energy_wh']:.1f} Wh"
+          + (f"   (plant meter incl. base load: {report['plant_energy_wh']:.1f} Wh)"
+             if report['plant_energy_wh'] is not None else ""))
+    print(f"  Pump pulses: {len(report['pump_pulses'])}")
+    dli = report['loops'].get('light', {}).get('stats', {}).get('dli')
+    if dli:
+        for day in dli['history'] + [dli['today']]:
+            print(f"  DLI {day['date']}  {day['dli_mol']:.3f}/{day['target_mol']} mol/m²  LEDs {day['led_wh']:.1f} Wh "
+                  f"(baseline {day['baseline_wh']:.1f} Wh, saved {day['saved_wh']:.1f} Wh)  lit {day['lit_hours']} h")
+    for pump in ('water', 'fertilizer'):
+        doses = [p for p in report['pump_pulses'] if p['pump'] == pump and 'target_ml' in p]
+        if doses:
+            target = sum(p['target_ml'] for p in doses)
+            delivered = sum(p['delivered_ml'] for p in doses)
+            print(f"  {pump:<11} doses={len(doses):>4}  target={target:8.1f} mL  delivered={delivered:8.1f} mL "
+                  f"({delivered / target * 100:.1f}%)  time-capped={sum(p['stop_reason'] == 'time_cap' for p in doses)}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Irrigation Planner Check
+------------------------
+Regression check for irrigation_planner.py: replays the soil loop for --days
+on the greenhouse model (simulation/replay.py) with the fixed moisture bands
+and with the planner, and checks that the planner learned a pulse gain and
+used fewer soil reads and fewer pulses without letting the soil dry further.
+
+The model runs at its default drying rate unless --drying (%/h) is given;
+above about 1 %/h the capped pulses cannot keep up and both runs just dry
+out, leaving nothing to compare.
+
+Run from the Backend folder:
+    python3 tests/irrigation_planner_check.py
+    python3 tests/irrigation_planner_check.py --days 5 --drying 0.3
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('PLANTMIND_HARDWARE', 'sim')   # config imports board
+
+import argparse
+
+import config
+from utils.utils import set_serial_log_enabled
+from simulation.physics import GreenhouseModel
+from simulation.replay import VirtualClock, PlantSource, ReplayHarness
+from irrigation_planner import IrrigationPlanner
+
+
+def run(args, planned):
+    """One soil loop replay; returns (loop report, pulses, planner stats or None)."""
+    clock = VirtualClock()
+    model = GreenhouseModel(soil_moisture=args.soil_moisture, seed=args.seed, clock=clock.monotonic)
+    model.DRYING_PCT_PER_HOUR = args.drying
+    planner = None
+    if planned:
+        planner = IrrigationPlanner(
+            min_pulse_sec=config.SOIL_PLANNER_MIN_PULSE_SEC,
+            prior_drying_pct_h=config.SOIL_PLANNER_PRIOR_DRYING_PCT_H,
+            max_read_sec=config.SOIL_PLANNER_MAX_READ_SEC,
+            read_fraction=config.SOIL_PLANNER_READ_FRACTION,
+            clock=clock.monotonic,
+        )
+    harness = ReplayHarness(PlantSource(model), clock, loops=['soil'], soil_planner=planner)
+    report = harness.run(args.days * 86400)
+    return report['loops']['soil'], len(report['pump_pulses']), None if planner is None else planner.get_stats()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Soil loop with and without the irrigation planner")
+    parser.add_argument('--days', type=float, default=3.0)
+    parser.add_argument('--drying', type=float, default=GreenhouseModel.DRYING_PCT_PER_HOUR,
+                        help="model soil drying rate at 20 °C in the dark (%%/h, default: the model's)")
+    parser.add_argument('--soil-moisture', type=float, default=62.0, help="model soil moisture at the start (%%)")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    set_serial_log_enabled(True)     # silences _CUSTOM_PRINT_FUNC
+    base_loop, base_pulses, _ = run(args, planned=False)
+    plan_loop, plan_pulses, stats = run(args, planned=True)
+    set_serial_log_enabled(False)
+
+    print(f"Soil loop, {args.days:g} days at {args.drying} %/h drying")
+    for name, loop, pulses in (('fixed bands', base_loop, base_pulses), ('planner', plan_loop, plan_pulses)):
+        print(f"  {name:<12} reads={loop['cycles']:>6}  pulses={pulses:>4}  "
+              f"moisture min/mean/max={loop['pv_min']}/{loop['pv_mean']}/{loop['pv_max']}")
+    print(f"  planner: drying={stats['drying_pct_h']} %/h  gain={stats['gain_pct_per_sec']} %/s  "
+          f"gain updates={stats['gain_updates']} rejected={stats['gain_rejected']}")
+
+    checks = {
+        'planner learned a pulse gain': stats['gain_updates'] > 0 and stats['gain_pct_per_sec'] is not None,
+        'fewer soil reads':             plan_loop['cycles'] < base_loop['cycles'],
+        'fewer pulses':                 plan_pulses < base_pulses,
+        'soil kept as moist':           plan_loop['pv_min'] >= base_loop['pv_min'] - 0.5,
+    }
+    for name, ok in checks.items():
+        print(f"  [{'OK' if ok else 'FAIL'}] {name}")
+    ok = all(checks.values())
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,116 @@
+"""
+Pulse Counter Benchmark
+-----------------------
+Feeds synthetic YF-S201 edge streams into Sensors.pulse_counter.PulseCounter
+and checks throughput, lost pulses and flow-rate accuracy. No hardware needed.
+
+YF-S201 is rated up to 30 L/min → 7.5 * 30 = 225 Hz. The stress case runs far
+above that to show headroom for the batched path.
+
+Run from the Backend folder:
+    python3 tests/pulse_counter_benchmark.py
+    python3 tests/pulse_counter_benchmark.py --seconds 60 --batch 16
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+import time
+import random
+import argparse
+import threading
+
+from Sensors.pulse_counter import PulseCounter
+
+PULSES_PER_LITRE = 450.0
+YF_S201_MAX_L_MIN = 30.0
+
+
+def synthetic_edges(flow_l_min, seconds, jitter=0.02, start_ns=0):
+    """Rising-edge timestamps (ns) for a constant flow, with per-pulse jitter."""
+    freq_hz = flow_l_min * PULSES_PER_LITRE / 60.0
+    period_ns = 1e9 / freq_hz
+    n = int(freq_hz * seconds)
+    rnd = random.Random(1234)
+    return [int(start_ns + i * period_ns + rnd.uniform(-jitter, jitter) * period_ns) for i in range(n)]
+
+
+def run_case(label, flow_l_min, seconds, batch):
+    edges = synthetic_edges(flow_l_min, seconds)
+    counter = PulseCounter(pulses_per_litre=PULSES_PER_LITRE)
+    taken = 0
+    stop = threading.Event()
+
+    def consumer():
+        # Aggressive consumer — hammers the count/reset handoff while edges arrive
+        nonlocal taken
+        while not stop.is_set():
+            taken += counter.take_count()
+        taken += counter.take_count()
+
+    t = threading.Thread(target=consumer)
+    t.start()
+    t0 = time.perf_counter()
+    for i in range(0, len(edges), batch):
+        counter.feed(edges[i:i + batch])
+    elapsed = time.perf_counter() - t0
+    stop.set()
+    t.join()
+
+    est = counter.flow_rate_l_min(now_ns=edges[-1])
+    err_pct = abs(est - flow_l_min) / flow_l_min * 100.0
+    rate = len(edges) / elapsed if elapsed > 0 else float('inf')
+    lost = len(edges) - taken
+    print(
+        f"  {label:<28} edges={len(edges):>8}  ingest={rate / 1e3:>9.1f} k edges/s  "
+        f"lost={lost:<4} flow est={est:7.2f} L/min (true {flow_l_min:.2f}, err {err_pct:.2f}%)"
+    )
+    return lost == 0 and err_pct < 5.0
+
+
+def run_legacy_race(seconds):
+    """The old pattern: per-event `+= 1` against `count = c; c = 0` in another thread."""
+    state = {'counter': 0}
+    taken = 0
+    n = int(YF_S201_MAX_L_MIN * PULSES_PER_LITRE / 60.0 * seconds) * 50
+    stop = threading.Event()
+
+    def consumer():
+        nonlocal taken
+        while not stop.is_set():
+            count = state['counter']
+            state['counter'] = 0
+            taken += count
+        taken += state['counter']
+
+    t = threading.Thread(target=consumer)
+    t.start()
+    for i in range(n):
+        state['counter'] += 1
+        if i % 8 == 7:
+            time.sleep(0)                      # edges arrive in small bursts, as from gpiod
+    stop.set()
+    t.join()
+    print(f"  {'legacy read-then-reset':<28} edges={n:>8}  lost={n - taken}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PulseCounter synthetic benchmark")
+    parser.add_argument('--seconds', type=float, default=20.0, help="simulated seconds per case")
+    parser.add_argument('--batch', type=int, default=8, help="edges drained per wakeup")
+    args = parser.parse_args()
+
+    print(f"PulseCounter benchmark — {args.seconds:.0f}s simulated per case, batch={args.batch}")
+    ok = True
+    ok &= run_case("low flow 1 L/min", 1.0, args.seconds, args.batch)
+    ok &= run_case("nominal 5 L/min", 5.0, args.seconds, args.batch)
+    ok &= run_case("YF-S201 max 30 L/min", YF_S201_MAX_L_MIN, args.seconds, args.batch)
+    ok &= run_case("stress 10x max (2.25 kHz)", YF_S201_MAX_L_MIN * 10, args.seconds, args.batch)
+    run_legacy_race(args.seconds)
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,148 @@
+"""
+Simulated Rig Load / Latency Test
+---------------------------------
+Runs the real sensor and actuator drivers against the simulated rig
+(simulation/hardware.py) — no Pi, ESP32 or sensors needed, so it can run in CI.
+
+Several threads hit the drivers the way the app does (light PID writes at
+10 Hz, temperature loop, soil/PZEM Modbus polls, flow sensor) while the
+greenhouse model runs time_scale times faster than real time. Reports per-call
+latency percentiles and checks that the model reacted to the actuators.
+
+Run from the Backend folder:
+    python3 tests/sim_load_test.py
+    python3 tests/sim_load_test.py --seconds 30 --time-scale 120
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import time
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+from simulation.physics import GreenhouseModel
+from simulation.hardware import SimulatedRig, install
+
+
+def percentile_row(label, samples):
+    if not samples:
+        return f"  {label:<26} no samples"
+    ms = np.array(samples) * 1000.0
+    return (f"  {label:<26} n={len(ms):>6}  p50={np.percentile(ms, 50):7.2f} ms  "
+            f"p95={np.percentile(ms, 95):7.2f} ms  p99={np.percentile(ms, 99):7.2f} ms  max={ms.max():7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load / latency test on the simulated rig")
+    parser.add_argument('--seconds', type=float, default=15.0, help="wall-clock test duration")
+    parser.add_argument('--time-scale', type=float, default=240.0, help="model seconds per wall second")
+    args = parser.parse_args()
+
+    os.chdir(tempfile.mkdtemp(prefix='plantmind_sim_'))    # flow checkpoints stay out of the tree
+    rig = install(SimulatedRig(model=GreenhouseModel(start_hour=0.0, seed=1, time_scale=args.time_scale), seed=1))
+
+    import board
+    import busio
+    from Sensors.sensors import GH_Sensors
+    from Actuators.actuators import GH_Actuators
+    from i2c_arbiter import I2CBusArbiter, PRIORITY_CONTROL, PRIORITY_TELEMETRY
+
+    arbiter = I2CBusArbiter(busio.I2C(board.SCL, board.SDA))
+    sensors = GH_Sensors(arbiter.client(PRIORITY_TELEMETRY))
+    sensors.set_dht22_pin(board.D26)
+    sensors.set_light_intensity_ads1115_channel(1)
+    sensors.set_soil_moisture_ads1115_channel(0)
+    sensors.start_ads1115_scan([1, 0])
+    sensors.set_soil_sensor_pins()
+    sensors.set_electricity_sensor_pin()
+    sensors.set_water_flow_sensor_pin(12)
+
+    actuators = GH_Actuators(0x30, arbiter.client(PRIORITY_CONTROL))
+    actuators.setup_light_strip_1_esp32(pin=16, channel=0, timer_src=0, frequency=5000, duty_cycle=0)
+    actuators.setup_light_strip_2_esp32(pin=15, channel=5, timer_src=0, frequency=5000, duty_cycle=0)
+    actuators.setup_heater_esp32(pin=17, channel=1, timer_src=1, frequency=50, duty_cycle=0)
+    actuators.setup_heater_fan_esp32(pin=18, channel=2, timer_src=0, frequency=5000, duty_cycle=0)
+    actuators.setup_water_pump_esp32(pin=33, channel=4, timer_src=2, frequency=1000, duty_cycle=0)
+
+    start_state = rig.model.snapshot()
+    latencies = {}
+    stop = threading.Event()
+
+    def timed(label, fn):
+        t0 = time.perf_counter()
+        result = fn()
+        latencies.setdefault(label, []).append(time.perf_counter() - t0)
+        return result
+
+    def light_loop():
+        while not stop.is_set():
+            lux = timed('light read', sensors.get_light_intensity)
+            dc = 4095 if lux < 600 else 0
+            timed('light strips write', lambda: actuators.set_light_strips_duty_cycle(dc))
+            stop.wait(0.1)
+
+    def temperature_loop():
+        while not stop.is_set():
+            timed('air read (DHT22)', sensors.get_air_values)
+            timed('heater + fan write', lambda: actuators.set_heater_and_heater_fan_duty_cycle(4095))
+            stop.wait(1.0)
+
+    def bus_poll_loop():
+        while not stop.is_set():
+            timed('soil read (RS485)', sensors.get_soil_values)
+            timed('electricity read (PZEM)', sensors.get_electricity_values)
+            timed('soil moisture (ADS1115)', sensors.get_soil_moisture_ads1115)
+            stop.wait(0.5)
+
+    def irrigation_loop():
+        timed('water pump write', lambda: actuators.set_water_pump_duty_cycle(4095))
+        stop.wait(args.seconds / 3)
+        timed('water pump write', lambda: actuators.set_water_pump_duty_cycle(0))
+
+    threads = [threading.Thread(target=fn) for fn in (light_loop, temperature_loop, bus_poll_loop, irrigation_loop)]
+    for t in threads:
+        t.start()
+    time.sleep(args.seconds)
+    stop.set()
+    for t in threads:
+        t.join()
+    sensors.stop_flow_sensors()
+    end_state = rig.model.snapshot()
+
+    print(f"Simulated rig — {args.seconds:.0f}s wall, x{args.time_scale:.0f} model time "
+          f"({end_state['elapsed_sec'] / 60:.1f} simulated minutes)")
+    for label in sorted(latencies):
+        print(percentile_row(label, latencies[label]))
+    print(f"  ESP32 frames={rig.esp32.frames} bad={rig.esp32.bad_frames}  "
+          f"ADS1115 scan={sensors.get_ads1115_scan_stats()['actual_conversions_sec']} conv/s")
+    for name, cls in arbiter.get_stats()['classes'].items():
+        wait = cls['wait']
+        print(f"  I2C {name:<9} waits n={wait['count']:>5}  p95<={wait['p95_ms']} ms  max={wait['max_ms']} ms")
+    write_stats = actuators.get_write_stats()
+    print(f"  duty writes sent={write_stats['sent']} in {write_stats['frames']} frames, "
+          f"skipped (unchanged)={write_stats['skipped']}")
+
+    pumped = end_state['water_l'] - start_state['water_l']
+    measured = sensors.get_total_water_amount()
+    checks = {
+        'heater raised air temperature': end_state['air_temp_c'] > start_state['air_temp_c'],
+        'LEDs raised light level':       end_state['light_lux'] > start_state['light_lux'] or end_state['duty']['light_strip_1'] == 0,
+        'flow sensor tracked the pump':  pumped > 0 and abs(measured - pumped) / pumped < 0.05,
+        'no rejected ESP32 frames':      rig.esp32.bad_frames == 0,
+    }
+    print(f"  pumped {pumped:.3f} L, flow sensor counted {measured:.3f} L; "
+          f"air {start_state['air_temp_c']:.2f} → {end_state['air_temp_c']:.2f} °C")
+    for name, ok in checks.items():
+        print(f"  [{'OK' if ok else 'FAIL'}] {name}")
+    ok = all(checks.values())
+    print("PASS" if ok else "FAIL")
+    return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
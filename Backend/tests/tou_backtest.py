@@ -0,0 +1,161 @@
+"""
+Time-of-Use Backtest
+--------------------
+Prices the heater / fan / LED energy of the control loops under the TOU
+tariff in config.py (ELECTRICITY_TOU_BANDS), once as the loops run today and
+once with the TOU planner shaping their setpoints (tou_planner.py: pre-heat
+and setback around expensive bands, DLI lighting moved ahead of them), and
+reports the cost saved.
+
+Both runs close the loops on the greenhouse model (simulation/replay.py),
+so the heat a setback does not keep is paid for after the window:
+
+  - with --history (sensors_data exported with mongoexport) the model runs
+    over the recorded days, at their dates and hours, under the recorded
+    weather — the outside temperature and daylight backed out of the recorded
+    air temperature, light and power (HistorySource.weather());
+  - otherwise from --start for --days on the model's sine-shaped days.
+
+The default replays the temperature loop only and finishes in seconds. The
+light loop steps at 10 Hz: --loops temperature,light (DLI lighting moved
+ahead of the bands too) takes about 6 minutes for the default 3 days.
+
+Run from the Backend folder:
+    python3 tests/tou_backtest.py
+    python3 tests/tou_backtest.py --history sensors_data.json
+    python3 tests/tou_backtest.py --start 2026-01-04 --days 3 --outside-temp 12
+    python3 tests/tou_backtest.py --loops temperature,light
+    python3 tests/tou_backtest.py --start 2026-07-05 --days 1 --loops light
+"""
+
+import sys
+import os
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+os.environ.setdefault('PLANTMIND_HARDWARE', 'sim')   # config imports board
+
+import json
+import argparse
+import datetime
+
+import config
+from utils.utils import set_serial_log_enabled
+from simulation.physics import GreenhouseModel
+from simulation.replay import VirtualClock, PlantSource, HistorySource, ReplayHarness
+from tariff import Tariff
+from tou_planner import TOUPlanner
+from dli_planner import DLIPlanner
+from control_replay import load_history
+
+
+def run(args, tariff, shifted, history):
+    """One replay; shifted → with the TOU planner. Returns the report."""
+    clock = VirtualClock()
+    if history is not None:
+        recording = HistorySource.from_docs(history, VirtualClock())
+        start_time, duration = recording.start_time, recording.duration_sec
+        model = GreenhouseModel(start_hour=start_time.hour + start_time.minute / 60.0,
+                                air_temp_c=recording.air()[0], weather=recording.weather(),
+                                seed=args.seed, clock=clock.monotonic)
+    else:
+        start_time = datetime.datetime.combine(args.start, datetime.time()) + datetime.timedelta(hours=args.start_hour)
+        model = GreenhouseModel(outside_temp_c=args.outside_temp, start_hour=args.start_hour,
+                                seed=args.seed, clock=clock.monotonic)
+        duration = args.days * 86400
+    source = PlantSource(model)
+
+    def wallclock():
+        return start_time + datetime.timedelta(seconds=clock.monotonic())
+
+    tou_planner = None
+    if shifted:
+        tou_planner = TOUPlanner(tariff, peak_ratio=config.TOU_PEAK_RATIO, preheat_c=config.TOU_PREHEAT_C,
+                                 setback_c=config.TOU_SETBACK_C, preheat_hours=config.TOU_PREHEAT_HOURS,
+                                 min_air_c=config.TOU_MIN_AIR_C, max_air_c=config.TOU_MAX_AIR_C,
+                                 clock=clock.monotonic, wallclock=wallclock)
+    dli_planner = DLIPlanner(
+        target_mol=config.DLI_TARGET_MOL_M2_D,
+        lux_to_ppfd=config.DLI_LUX_TO_PPFD,
+        photoperiod=config.DLI_PHOTOPERIOD_HOURS,
+        led_power_w=config.DLI_LED_POWER_W,
+        led_lux_full=config.DLI_LED_LUX_FULL,
+        tou_planner=tou_planner,
+        clock=clock.monotonic,
+        wallclock=wallclock,
+    )
+    harness = ReplayHarness(
+        source, clock,
+        loops=[name.strip() for name in args.loops.split(',') if name.strip()],
+        initial_setpoints={'temperature': args.setpoint},
+        temperature_options={'tou_planner': tou_planner},
+        light_options={'dli_planner': dli_planner},
+        tariff=tariff,
+        start_time=start_time,
+    )
+    return harness.run(duration)
+
+
+def summary(report):
+    loops = report['loops']
+    dli = loops.get('light', {}).get('stats', {}).get('dli')
+    return {
+        'energy_wh':       report['energy_wh'],
+        'flat_cost_nis':   round(report['energy_wh'] / 1000.0 * config.ELECTRICITY_PRICE_PER_KWH_NIS, 4),
+        'tou_cost_nis':    report['cost_nis'],
+        'energy_by_band':  report['energy_by_band'],
+        'temperature':     {k: loops['temperature'].get(k) for k in ('pv_min', 'pv_mean', 'pv_max', 'rms_error')}
+                           if 'temperature' in loops else None,
+        'dli_mol':         None if dli is None else [d['dli_mol'] for d in dli['history'] + [dli['today']]],
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cost of the control loops under the TOU tariff, with and without load shifting")
+    parser.add_argument('--history', help="sensors_data export: run over its days under its weather")
+    parser.add_argument('--start', type=datetime.date.fromisoformat, default=datetime.date(2026, 1, 4),
+                        help="model run: first day (sets the season and weekdays)")
+    parser.add_argument('--start-hour', type=float, default=0.0, help="model run: time of day at the start")
+    parser.add_argument('--days', type=float, default=3.0, help="model run: simulated duration")
+    parser.add_argument('--outside-temp', type=float, default=14.0, help="model run: mean outside temperature (°C)")
+    parser.add_argument('--setpoint', type=float, default=21.0, help="user temperature setpoint (°C)")
+    parser.add_argument('--loops', default='temperature',
+                        help="comma-separated: temperature, light (the light loop takes minutes per simulated day)")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--json', action='store_true', help="print the full comparison as JSON")
+    args = parser.parse_args()
+
+    if not config.ELECTRICITY_TOU_BANDS:
+        sys.exit("ELECTRICITY_TOU_BANDS is empty — nothing to shift on a flat tariff")
+    tariff = Tariff(config.ELECTRICITY_TOU_BANDS, config.ELECTRICITY_OFF_PEAK_PRICE_PER_KWH_NIS)
+    history = load_history(args.history) if args.history else None
+
+    set_serial_log_enabled(True)     # silences _CUSTOM_PRINT_FUNC
+    results = {name: summary(run(args, tariff, shifted, history))
+               for name, shifted in (('baseline', False), ('tou_planner', True))}
+    set_serial_log_enabled(False)
+
+    base, tou = results['baseline']['tou_cost_nis'], results['tou_planner']['tou_cost_nis']
+    results['saved_nis'] = round(base - tou, 4)
+    results['saved_pct'] = round((base - tou) / base * 100.0, 1) if base > 0 else None
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+
+    print(f"\nTOU backtest — {'recorded weather' if history is not None else 'model weather'}\n")
+    for name in ('baseline', 'tou_planner'):
+        r = results[name]
+        print(f"  {name:<12} energy={r['energy_wh']:8.1f} Wh  flat={r['flat_cost_nis']:7.3f} ₪  "
+              f"TOU={r['tou_cost_nis']:7.3f} ₪")
+        for band, b in sorted(r['energy_by_band'].items()):
+            print(f"      {band:<10} {b['energy_wh']:8.1f} Wh  {b['cost_nis']:7.3f} ₪")
+        if r['temperature']:
+            t = r['temperature']
+            print(f"      air min/mean/max={t['pv_min']}/{t['pv_mean']}/{t['pv_max']} °C  RMS error={t['rms_error']}")
+        if r['dli_mol']:
+            print(f"      DLI per day: {', '.join(f'{d:.3f}' for d in r['dli_mol'])} mol/m²")
+    pct = 'n/a' if results['saved_pct'] is None else f"{results['saved_pct']}%"
+    print(f"\n  Saved {results['saved_nis']:.3f} ₪ ({pct}) under the TOU tariff")
+
+
+if __name__ == '__main__':
+    main()
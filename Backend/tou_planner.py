@@ -0,0 +1,132 @@
+"""
+tou_planner.py — Moves heater and LED load out of expensive tariff bands.
+
+TOUPlanner looks ahead on a tariff.Tariff for the next expensive window — a
+band priced at least peak_ratio × the off-peak price — and shapes the
+setpoints around it, within comfort bounds:
+
+  - temperature_setpoint(): preheat_hours before the window the heater runs
+    to setpoint + preheat_c, storing heat in the air and the pots; inside the
+    window the setpoint drops by setback_c so the heater coasts on that heat.
+    The loop holds the air about its deadband below the setpoint while
+    heating, so the setback setpoint stays at least min_air_c + deadband and
+    the pre-heat setpoint at most max_air_c + deadband. Should the measured air
+    still fall floor_slack_c below min_air_c (the heater cannot hold it), the
+    setback ends for the rest of the window;
+  - split_seconds() tells the DLI planner how much of the photoperiod left is
+    cheap and how much expensive, so it lights ahead of the window
+    (dli_planner.py) and only lights inside it what the cheap hours cannot.
+
+The window is looked up lookahead_hours ahead, at most every replan_sec.
+"""
+import time
+import datetime
+
+
+class TOUPlanner:
+    def __init__(self, tariff, peak_ratio=1.5, preheat_c=1.0, setback_c=1.0, preheat_hours=2.0,
+                 min_air_c=None, max_air_c=None, floor_slack_c=0.5, lookahead_hours=24.0, replan_sec=300.0,
+                 clock=time.monotonic, wallclock=datetime.datetime.now):
+        self.tariff = tariff
+        self.__threshold = float(peak_ratio) * tariff.off_peak_price
+        self.__preheat = float(preheat_c)
+        self.__setback = float(setback_c)
+        self.__preheat_ahead = datetime.timedelta(hours=preheat_hours)
+        self.__min_air = None if min_air_c is None else float(min_air_c)
+        self.__max_air = None if max_air_c is None else float(max_air_c)
+        self.__floor_slack = float(floor_slack_c)
+        self.__lookahead = datetime.timedelta(hours=lookahead_hours)
+        self.__replan = float(replan_sec)
+        self.__clock = clock
+        self.__wallclock = wallclock
+
+        self.__window = None           # (start, end) of the next expensive window, or None
+        self.__planned_at = None
+        self.__mode = 'normal'
+        self.__stats = {'preheat_sec': 0.0, 'setback_sec': 0.0, 'setbacks_ended': 0}
+        self.__last = None             # (clock, mode) of the previous temperature plan
+        self.__setback_ended = None    # end of the window whose setback fell through the floor
+
+    def expensive(self, when) -> bool:
+        return self.tariff.price_at(when) >= self.__threshold
+
+    def __next_window(self, now):
+        if (self.__planned_at is not None and self.__clock() - self.__planned_at < self.__replan
+                and (self.__window is None or now < self.__window[1])):
+            return self.__window
+        start = end = None
+        t = now
+        for _, price, sec in self.tariff.segments(now, now + self.__lookahead):
+            nxt = t + datetime.timedelta(seconds=sec)
+            if price >= self.__threshold:
+                start = start or t
+                end = nxt
+            elif start is not None:
+                break
+            t = nxt
+        self.__window = None if start is None else (start, end)
+        self.__planned_at = self.__clock()
+        return self.__window
+
+    # ── Temperature ───────────────────────────────────────────────────────────
+    def temperature_setpoint(self, setpoint, current_temp=None, deadband=0.0):
+        """
+        The temperature loop's setpoint for the user's setpoint and the measured
+        air; deadband is how far below its setpoint the loop holds the air.
+        """
+        now = self.__wallclock()
+        window = self.__next_window(now)
+        mode = 'normal'
+        if window is not None:
+            start, end = window
+            if start <= now < end:
+                mode = 'setback'
+                if (self.__setback_ended != end and current_temp is not None and self.__min_air is not None
+                        and current_temp < self.__min_air - self.__floor_slack):
+                    self.__setback_ended = end
+                    self.__stats['setbacks_ended'] += 1
+                if self.__setback_ended == end:
+                    mode = 'normal'
+            elif start - now <= self.__preheat_ahead:
+                mode = 'preheat'
+                if current_temp is not None and self.__max_air is not None and current_temp >= self.__max_air:
+                    mode = 'normal'
+        t = self.__clock()
+        if self.__last is not None and self.__last[1] != 'normal':
+            self.__stats[f'{self.__last[1]}_sec'] += t - self.__last[0]
+        self.__last = (t, mode)
+        self.__mode = mode
+        if mode == 'preheat':
+            target = setpoint + self.__preheat
+            return target if self.__max_air is None else max(setpoint, min(target, self.__max_air + deadband))
+        if mode == 'setback':
+            target = setpoint - self.__setback
+            return target if self.__min_air is None else min(setpoint, max(target, self.__min_air + deadband))
+        return setpoint
+
+    # ── Light ─────────────────────────────────────────────────────────────────
+    def split_seconds(self, start, end):
+        """(cheap seconds, expensive seconds) in [start, end)."""
+        cheap = costly = 0.0
+        for _, price, sec in self.tariff.segments(start, end):
+            if price >= self.__threshold:
+                costly += sec
+            else:
+                cheap += sec
+        return cheap, costly
+
+    def get_stats(self) -> dict:
+        now = self.__wallclock()
+        band, price = self.tariff.band_at(now)
+        window = self.__window
+        return {
+            'band':            band,
+            'price_per_kwh':   price,
+            'expensive':       price >= self.__threshold,
+            'next_window':     None if window is None else [w.isoformat(timespec='minutes') for w in window],
+            'temperature_mode': self.__mode,
+            'preheat_hours':   round(self.__stats['preheat_sec'] / 3600.0, 2),
+            'setback_hours':   round(self.__stats['setback_sec'] / 3600.0, 2),
+            'setbacks_ended':  self.__stats['setbacks_ended'],
+            'comfort_c':       [self.__min_air, self.__max_air],
+        }
@@ -188,6 +188,97 @@ function PumpLogs() {
   );
 }
 
+const ACTUATOR_LABELS = {
+  heater:          'Heater',
+  lights:          'Grow Lights',
+  fan:             'Fan',
+  water_pump:      'Water Pump',
+  fertilizer_pump: 'Fertilizer Pump',
+};
+
+function ActuatorEnergy() {
+  const [data, setData]       = useState(null);
+  const [loading, setLoading] = useState(true);
+
+  useEffect(() => {
+    const fetch_energy = () => {
+      fetch('/api/energy/actuators')
+        .then(r => r.json())
+        .then(d => { if (d.success) setData(d.data); })
+        .catch(() => {})
+        .finally(() => setLoading(false));
+    };
+    fetch_energy();
+    const id = setInterval(fetch_energy, 10000);
+    return () => clearInterval(id);
+  }, []);
+
+  const rows = data
+    ? [
+        ...Object.entries(data.actuators).map(([name, a]) => ({ name, label: ACTUATOR_LABELS[name] || name, ...a })),
+        { name: 'base', label: 'Base Load', ...data.base },
+      ]
+    : [];
+  const cell = { padding: '7px 10px' };
+  const dash = <span style={{ color: 'var(--text-light)' }}>—</span>;
+
+  return (
+    <div className="resource-big-card page-section">
+      <div className="resource-section-title">
+        <svg viewBox="0 0 24 24" fill="none" stroke="#f59e0b" strokeWidth="2" strokeLinecap="round" strokeLinejoin="round">
+          <path d="M21 12a9 9 0 11-9-9v9h9z"/>
+          <path d="M15 3.5A9 9 0 0120.5 9H15V3.5z"/>
+        </svg>
+        Energy by Actuator
+        <span className="status-badge status-badge-amber" style={{ marginLeft: 'auto', fontWeight: 600 }}>Auto-refresh 10s</span>
+      </div>
+
+      {loading ? (
+        <div className="chart-empty">Loading…</div>
+      ) : !data ? (
+        <div className="chart-empty">Per-actuator metering is not enabled.</div>
+      ) : (
+        <>
+          <div className="resource-metrics" style={{ marginBottom: 16 }}>
+            <MetricBox label="Metered Energy" value={fmtN(data.measured_wh)} unit="Wh" />
+            <MetricBox label="Cost"           value={<CostBadge value={data.total_cost_nis} />} />
+            <MetricBox label="Power Steps Fitted" value={data.steps_used} />
+          </div>
+
+          <div style={{ overflowX: 'auto' }}>
+            <table style={{ width: '100%', borderCollapse: 'collapse', fontSize: 13 }}>
+              <thead>
+                <tr style={{ borderBottom: '2px solid var(--border)' }}>
+                  {['Actuator', 'Power Now', 'Energy', 'Cost', 'Model at Full Duty'].map(h => (
+                    <th key={h} style={{ textAlign: 'left', padding: '6px 10px', color: 'var(--text-muted)', fontWeight: 600, whiteSpace: 'nowrap' }}>{h}</th>
+                  ))}
+                </tr>
+              </thead>
+              <tbody>
+                {rows.map((row, i) => (
+                  <tr key={row.name} style={{ borderBottom: '1px solid var(--border)', background: i % 2 === 0 ? 'transparent' : 'var(--surface)' }}>
+                    <td style={{ ...cell, fontWeight: 600 }}>{row.label}</td>
+                    <td style={cell}>
+                      {row.power_w !== null && row.power_w !== undefined ? `${row.power_w} W` : dash}
+                      {row.duty_pct > 0 && <span style={{ color: 'var(--text-muted)', fontSize: 11 }}> · {row.duty_pct}%</span>}
+                    </td>
+                    <td style={cell}>{(row.energy_wh / 1000).toFixed(3)} kWh</td>
+                    <td style={cell}><CostBadge value={row.cost_nis} /></td>
+                    <td style={cell}>
+                      {row.model_w_full !== undefined ? `${row.model_w_full} W` : dash}
+                      {row.rated_w !== undefined && <span style={{ color: 'var(--text-muted)', fontSize: 11 }}> (rated {row.rated_w} W)</span>}
+                    </td>
+                  </tr>
+                ))}
+              </tbody>
+            </table>
+          </div>
+        </>
+      )}
+    </div>
+  );
+}
+
 export default function ResourceConsumption({ sensors, sensorHistory }) {
   const s = sensors || {};
 
@@ -251,6 +342,9 @@ export default function ResourceConsumption({ sensors, sensorHistory }) {
         </div>
       </div>
 
+      {/* ── Energy by Actuator ── */}
+      <ActuatorEnergy />
+
       {/* ── Water ── */}
       <div className="resource-big-card page-section">
         <div className="resource-section-title">